@@ -0,0 +1,128 @@
+# File: benchmarks/auth_load.py
+"""
+Всплеск логинов на фоне трафика графиков: латентность /charts и интервалы между
+сообщениями /ws/tasks (шлются каждые 0.5 с) до и во время всплеска. Если bcrypt или запрос
+к users выполняются в event loop, растут интервалы WebSocket и хвост /charts.
+
+Нужны запущенный API (uvicorn src.api.app:app), Postgres и Redis; пользователь bench создается здесь.
+    python -m benchmarks.auth_load --logins 200 --concurrency 50 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+import numpy as np
+
+WS_PERIOD = 0.5
+
+
+def percentiles(samples: list) -> dict:
+    arr = np.array(samples) * 1000
+    if not len(arr):
+        return {"n": 0}
+    return {"n": len(arr), "p50_ms": round(float(np.percentile(arr, 50)), 1),
+            "p95_ms": round(float(np.percentile(arr, 95)), 1), "max_ms": round(float(arr.max()), 1)}
+
+
+async def login(session: aiohttp.ClientSession, api_url: str, username: str, password: str):
+    started = time.perf_counter()
+    async with session.post(f"{api_url}/token", data={"username": username, "password": password}) as resp:
+        body = await resp.json()
+        return resp.status, time.perf_counter() - started, body
+
+
+async def chart_traffic(session, api_url: str, token: str, until: float) -> list:
+    samples = []
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.perf_counter() < until:
+        started = time.perf_counter()
+        async with session.get(f"{api_url}/charts", headers=headers) as resp:
+            await resp.read()
+            resp.raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def ws_stalls(ws_url: str, until: float) -> list:
+    """Задержка сверх периода между соседними сообщениями /ws/tasks"""
+    import websockets
+
+    stalls, last = [], None
+    async with websockets.connect(f"{ws_url}/ws/tasks") as ws:
+        while time.perf_counter() < until:
+            try:
+                await asyncio.wait_for(ws.recv(), timeout=max(0.1, until - time.perf_counter()))
+            except asyncio.TimeoutError:
+                break
+            now = time.perf_counter()
+            if last is not None:
+                stalls.append(max(0.0, now - last - WS_PERIOD))
+            last = now
+    return stalls
+
+
+async def login_burst(session, api_url: str, username: str, password: str, logins: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses, latencies = {}, []
+
+    async def one():
+        async with semaphore:
+            status, elapsed, _ = await login(session, api_url, username, password)
+        statuses[status] = statuses.get(status, 0) + 1
+        latencies.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    return {"statuses": statuses, "latency": percentiles(latencies), "logins_per_s": round(logins / elapsed, 1)}
+
+
+async def phase(session, args, token: str, burst: bool) -> dict:
+    until = time.perf_counter() + args.seconds
+    jobs = [chart_traffic(session, args.api_url, token, until) for _ in range(args.chart_clients)]
+    jobs.append(ws_stalls(args.ws_url, until))
+    if burst:
+        jobs.append(login_burst(session, args.api_url, args.username, args.password, args.logins, args.concurrency))
+    results = await asyncio.gather(*jobs)
+    charts = [s for r in results[:args.chart_clients] for s in r]
+    out = {"charts": percentiles(charts), "ws_stall": percentiles(results[args.chart_clients])}
+    if burst:
+        out["logins"] = results[-1]
+    return out
+
+
+async def run(args) -> dict:
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120)) as session:
+        async with session.post(f"{args.api_url}/register",
+                                json={"username": args.username, "password": args.password}) as resp:
+            if resp.status not in (201, 400):
+                resp.raise_for_status()
+        status, _, body = await login(session, args.api_url, args.username, args.password)
+        if status != 200:
+            raise RuntimeError(f"login failed: {status} {body}")
+        token = body["access_token"]
+        async with session.post(f"{args.api_url}/charts", json={"name": "bench", "code": "pass"},
+                                headers={"Authorization": f"Bearer {token}"}) as resp:
+            resp.raise_for_status()
+        return {"baseline": await phase(session, args, token, burst=False),
+                "burst": await phase(session, args, token, burst=True)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login burst vs chart traffic load test")
+    parser.add_argument("--api-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--ws-url", default="ws://127.0.0.1:8000")
+    parser.add_argument("--username", default="bench_auth")
+    parser.add_argument("--password", default="bench_auth_password")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--chart-clients", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# File: benchmarks/fake_iss.py
+"""
+Локальный фейковый MOEX ISS для бенчмарков: детерминированные свечи, пагинация по 500 строк,
+настраиваемая задержка ответа и инъекция 429 (Too Many Requests).
+Свечи только в торговые часы (будни, 10:00-18:40), как у настоящего TQBR; минутки
+"текущего дня" растут в реальном времени, поэтому live-поллер видит новые бары.
+
+    python -m benchmarks.fake_iss --port 8765 --latency-ms 50 --error-rate 0.05
+    MOEX_ISS_URL=http://127.0.0.1:8765/iss python -m src.ingestion.live
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 500
+COLUMNS = ["open", "close", "high", "low", "value", "volume", "begin", "end"]
+INTERVAL_DELTAS = {1: timedelta(minutes=1), 24: timedelta(days=1)}
+SESSION_OPEN, SESSION_CLOSE = 10 * 60, 18 * 60 + 40  # минуты от полуночи
+
+
+def candle_times(start: datetime, end: datetime, interval: int = 1, sessions: bool = True) -> pd.DatetimeIndex:
+    """Начала свечей за период: будни, для минуток - только основная сессия (sessions=False - круглосуточно)"""
+    freq = "1min" if interval == 1 else "1D"
+    ts = pd.date_range(start, end, freq=freq)
+    if not sessions:
+        return ts
+    ts = ts[ts.dayofweek < 5]
+    if interval == 1:
+        minutes = ts.hour * 60 + ts.minute
+        ts = ts[(minutes >= SESSION_OPEN) & (minutes < SESSION_CLOSE)]
+    return ts
+
+
+def make_candle(ticker: str, ts: datetime, interval: int = 1) -> list:
+    """Seed от тикера и начала свечи: один и тот же бар всегда одинаковый при любой пагинации"""
+    rng = np.random.default_rng(zlib.crc32(f"{ticker}:{interval}:{ts.isoformat()}".encode()))
+    base = 100 + (zlib.crc32(ticker.encode()) % 200)
+    o = base * (1 + rng.normal(0, 0.01))
+    c = o * (1 + rng.normal(0, 0.002))
+    h, l = max(o, c) * (1 + abs(rng.normal(0, 0.001))), min(o, c) * (1 - abs(rng.normal(0, 0.001)))
+    vol = int(rng.integers(100, 10_000))
+    end = ts + INTERVAL_DELTAS[interval] - timedelta(seconds=1)
+    return [round(o, 2), round(c, 2), round(h, 2), round(l, 2), round(c * vol, 2), vol,
+            ts.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")]
+
+
+def make_candles(ticker: str, start: datetime, end: datetime, interval: int = 1,
+                 offset: int = 0, limit: int = None, sessions: bool = True) -> list:
+    times = candle_times(start, end, interval, sessions)[offset:None if limit is None else offset + limit]
+    return [make_candle(ticker, t.to_pydatetime(), interval) for t in times]
+
+
+@dataclass
+class ServerStats:
+    requests: int = 0
+    throttled: int = 0
+    rows: int = 0
+    bytes: int = 0
+
+
+class FakeISSHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    retry_after = 1
+    sessions = True
+    rng: random.Random = None
+    stats: ServerStats = None
+    lock: threading.Lock = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.split("/")
+        if "securities" not in parts or not url.path.endswith("candles.json"):
+            self.send_error(404)
+            return
+        with self.lock:
+            self.stats.requests += 1
+            throttle = self.rng.random() < self.error_rate
+            if throttle:
+                self.stats.throttled += 1
+        if throttle:
+            self.send_response(429)
+            self.send_header("Retry-After", str(self.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        ticker = parts[parts.index("securities") + 1]
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        interval = int(q.get("interval", 24))
+        start = datetime.fromisoformat(q.get("from", datetime.now().strftime("%Y-%m-%d")))
+        now = datetime.now().replace(second=0, microsecond=0)
+        end = min(datetime.fromisoformat(q["till"]) + timedelta(days=1) - timedelta(minutes=1) if "till" in q else now, now)
+        rows = make_candles(ticker, start, end, interval, offset=int(q.get("start", 0)), limit=PAGE_SIZE,
+                            sessions=self.sessions)
+
+        body = json.dumps({"candles": {"columns": COLUMNS, "data": rows}}).encode()
+        with self.lock:
+            self.stats.rows += len(rows)
+            self.stats.bytes += len(body)
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeISS:
+    """Сервер + счетчики запросов; seed делает последовательность 429 воспроизводимой"""
+
+    def __init__(self, port: int = 8765, latency_ms: float = 0.0, error_rate: float = 0.0,
+                 retry_after: int = 1, sessions: bool = True, seed: int = 42):
+        self.stats = ServerStats()
+        handler = type("Handler", (FakeISSHandler,), {
+            "latency": latency_ms / 1000, "error_rate": error_rate, "retry_after": retry_after,
+            "sessions": sessions, "rng": random.Random(seed), "stats": self.stats, "lock": threading.Lock(),
+        })
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/iss"
+
+    def start(self) -> "FakeISS":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def snapshot(self) -> dict:
+        return asdict(self.stats)
+
+
+def serve(port: int = 8765, latency_ms: float = 0.0, background: bool = False, **kwargs) -> FakeISS:
+    fake = FakeISS(port, latency_ms, **kwargs)
+    if background:
+        fake.start()
+    else:
+        fake.server.serve_forever()
+    return fake
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake MOEX ISS candles server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--always-open", action="store_true", help="минутки круглосуточно (live в выходные)")
+    args = parser.parse_args()
+    print(f"🧪 Fake ISS on http://127.0.0.1:{args.port}/iss (latency {args.latency_ms} ms, 429 rate {args.error_rate})")
+    serve(args.port, args.latency_ms, error_rate=args.error_rate, retry_after=args.retry_after,
+          sessions=not args.always_open)
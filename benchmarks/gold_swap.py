@@ -0,0 +1,142 @@
+# File: benchmarks/gold_swap.py
+"""
+Латентность читателей Gold во время полной перезаливки (src/storage/gold_swap.py).
+
+Потоки-читатели крутят запрос /metrics (последние бары тикера), пока идет перезаливка
+текущего содержимого stock_metrics из staging-копии:
+
+  truncate - прежний путь: TRUNCATE + INSERT в одной транзакции (в конце ROLLBACK, данные не меняются)
+  swap     - теневая таблица, индексы, ANALYZE и переименование (оставляет stock_metrics_old)
+
+Читатели в режиме truncate ждут всю загрузку, в режиме swap - только переименование:
+    python -m benchmarks.gold_swap --readers 8 --modes truncate,swap
+"""
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+import psycopg2
+
+from src.config import settings
+from src.storage import gold_swap
+
+STAGING = "temp_metrics_bench"
+READ_QUERY = "SELECT ts, close FROM stock_metrics WHERE ticker = %s AND interval = %s ORDER BY ts DESC LIMIT 500"
+
+
+def connect():
+    return psycopg2.connect(host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT, user=settings.POSTGRES_USER,
+                            password=settings.POSTGRES_PASSWORD, dbname=settings.POSTGRES_DB)
+
+
+def load_sql(target: str) -> str:
+    return f"""
+        INSERT INTO {target} (ticker, interval, ts, open, high, low, close, volume, sma_20, rsi_14, indicators)
+        SELECT ticker, interval, ts_str::timestamp, open, high, low, close, volume, sma_20, rsi_14, indicators::jsonb
+        FROM {STAGING}
+    """
+
+
+def prepare_staging() -> list:
+    """Staging в формате JDBC-записи Spark (ts строкой, indicators текстом) из текущего Gold"""
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {STAGING}")
+            cur.execute(f"""
+                CREATE TABLE {STAGING} AS
+                SELECT ticker, interval, to_char(ts, 'YYYY-MM-DD HH24:MI:SS') AS ts_str, open, high, low, close,
+                       volume, sma_20, rsi_14, indicators::text AS indicators
+                FROM stock_metrics
+            """)
+            cur.execute("SELECT DISTINCT ticker, interval FROM stock_latest")
+            pairs = cur.fetchall()
+        conn.commit()
+        return pairs
+    finally:
+        conn.close()
+
+
+def rebuild(mode: str):
+    conn = connect()
+    try:
+        if mode == "swap":
+            with gold_swap.rebuild(conn):
+                gold_swap.build_shadow(conn, load_sql(gold_swap.SHADOW_TABLE))
+                gold_swap.swap_in(conn)
+        else:
+            with conn.cursor() as cur:
+                cur.execute("TRUNCATE TABLE stock_metrics")
+                cur.execute(load_sql("stock_metrics"))
+                cur.execute("DELETE FROM stock_latest")
+                cur.execute(gold_swap.LATEST_QUERY.format(latest="stock_latest", table="stock_metrics"))
+            conn.rollback()
+    finally:
+        conn.close()
+
+
+def reader(pairs: list, stop: threading.Event, samples: list):
+    conn = connect()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            i = 0
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                cur.execute(READ_QUERY, pairs[i % len(pairs)])
+                cur.fetchall()
+                samples.append(time.perf_counter() - t0)
+                i += 1
+    finally:
+        conn.close()
+
+
+def run(mode: str, pairs: list, readers: int, warmup: float) -> dict:
+    stop = threading.Event()
+    samples = [[] for _ in range(readers)]
+    threads = [threading.Thread(target=reader, args=(pairs, stop, s), daemon=True) for s in samples]
+    for t in threads:
+        t.start()
+    time.sleep(warmup)
+    t0 = time.perf_counter()
+    rebuild(mode)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    for t in threads:
+        t.join()
+    latencies = np.array([x for s in samples for x in s]) * 1000
+    return {
+        "rebuild_s": round(elapsed, 2),
+        "queries": int(latencies.size),
+        **{f"p{q}_ms": round(float(np.percentile(latencies, q)), 2) for q in (50, 99)},
+        "max_ms": round(float(latencies.max()), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reader latency during a full Gold rebuild")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--modes", default="truncate,swap")
+    parser.add_argument("--warmup", type=float, default=1.0, help="секунд чтений до старта перезаливки")
+    args = parser.parse_args()
+
+    pairs = prepare_staging()
+    report = {"params": {"readers": args.readers, "pairs": len(pairs)}, "modes": {}}
+    try:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            report["modes"][mode] = run(mode, pairs, args.readers, args.warmup)
+    finally:
+        conn = connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {STAGING}")
+            conn.commit()
+        finally:
+            conn.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# File: benchmarks/import_time.py
+"""
+Время холодного импорта точек входа (python -X importtime) и страж тяжелых зависимостей.
+
+API ставит задачи через тонкий клиент (src/worker/client.py) и не должен грузить Prefect, Dask,
+pyspark и s3fs; клиенты MinIO/Redis создаются при первом обращении, поэтому импорт не ходит в сеть.
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 1500 --top 15
+Код выхода 1 - тяжелый модуль в точке входа или превышен бюджет.
+"""
+import argparse
+import re
+import subprocess
+import sys
+from typing import Dict, List
+
+HEAVY = ("prefect", "pyspark", "dask", "s3fs", "aiobotocore", "flows", "src.worker.tasks", "src.processing.spark_job")
+
+# Точка входа -> модули, которых в ней быть не должно
+ENTRYPOINTS = {
+    "src.api.app": HEAVY,
+    "src.worker.client": HEAVY,
+    # Воркер грузит Prefect и Dask, но pyspark - только в Spark-задачах
+    "src.worker.tasks": ("pyspark", "src.processing.spark_job"),
+}
+
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """модуль -> кумулятивное время импорта, мкс"""
+    modules = {}
+    for line in stderr.splitlines():
+        m = LINE.match(line)
+        if m:
+            modules[m.group(4)] = int(m.group(2))
+    return modules
+
+
+def measure(module: str) -> dict:
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, timeout=120)
+    modules = parse_importtime(proc.stderr)
+    return {"module": module, "ok": proc.returncode == 0, "total_ms": modules.get(module, 0) / 1000,
+            "modules": modules, "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None}
+
+
+def violations(report: dict, forbidden) -> List[str]:
+    return sorted(name for name in report["modules"]
+                  if any(name == f or name.startswith(f + ".") for f in forbidden))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time benchmark for API/worker entrypoints")
+    parser.add_argument("--budget-ms", type=float, default=None, help="предел холодного импорта src.api.app")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    failed = False
+    for module, forbidden in ENTRYPOINTS.items():
+        report = measure(module)
+        if not report["ok"]:
+            print(f"⚠️ {module}: import failed ({report['error']})")
+            continue
+        print(f"⏱️ {module}: {report['total_ms']:.0f} ms")
+        top = sorted(((us, name) for name, us in report["modules"].items()
+                      if "." not in name and name != module), reverse=True)[:args.top]
+        for us, name in top:
+            print(f"    {us / 1000:8.1f} ms  {name}")
+        bad = violations(report, forbidden)
+        if bad:
+            failed = True
+            print(f"❌ {module} imports heavy modules: {', '.join(bad[:10])}")
+        if module == "src.api.app" and args.budget_ms and report["total_ms"] > args.budget_ms:
+            failed = True
+            print(f"❌ {module}: {report['total_ms']:.0f} ms > budget {args.budget_ms:.0f} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
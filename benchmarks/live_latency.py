@@ -0,0 +1,72 @@
+# File: benchmarks/live_latency.py
+"""
+Задержка live-пути ISS -> поллер -> Redis Stream -> WebSocket API -> клиент на фейковом ISS.
+Нужны запущенные Redis и API (uvicorn src.api.app:app); фейковый ISS и поллер стартуют здесь.
+
+    python -m benchmarks.live_latency --seconds 60 --latency-ms 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.fake_iss import serve
+
+
+def percentile_report(samples: list) -> dict:
+    arr = np.array(samples) * 1000
+    if not len(arr):
+        return {"samples": 0}
+    return {"samples": len(arr), "p50_ms": round(float(np.percentile(arr, 50)), 1),
+            "p95_ms": round(float(np.percentile(arr, 95)), 1), "max_ms": round(float(arr.max()), 1)}
+
+
+async def collect(ws_url: str, seconds: float, started: float) -> dict:
+    import websockets
+
+    total, transport = [], []
+    async with websockets.connect(ws_url) as ws:
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            try:
+                bar = json.loads(await asyncio.wait_for(ws.recv(), timeout=max(0.1, deadline - time.time())))
+            except asyncio.TimeoutError:
+                break
+            if bar["fetched_at"] < started:
+                continue  # хвост стрима от прошлых запусков
+            now = time.time()
+            total.append(now - bar["fetched_at"])         # запрос к ISS -> клиент
+            transport.append(now - bar["published_at"])   # Redis -> WebSocket -> клиент
+    return {"end_to_end": percentile_report(total), "stream_to_client": percentile_report(transport)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live streaming latency benchmark")
+    parser.add_argument("--ticker", default="SBER")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--poll-seconds", type=float, default=1.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="искусственная задержка фейкового ISS")
+    parser.add_argument("--iss-port", type=int, default=8765)
+    parser.add_argument("--api-ws", default="ws://127.0.0.1:8000")
+    args = parser.parse_args()
+
+    # Поллер читает URL ISS из настроек при импорте, поэтому подменяем до импорта
+    os.environ["MOEX_ISS_URL"] = f"http://127.0.0.1:{args.iss_port}/iss"
+    from src.ingestion.live import LivePoller
+
+    serve(args.iss_port, args.latency_ms, background=True, sessions=False)  # live меряем в любое время суток
+    poller = LivePoller([args.ticker])
+    started = time.time()
+    threading.Thread(target=poller.run_forever, args=(args.poll_seconds,), daemon=True).start()
+
+    report = asyncio.run(collect(f"{args.api_ws}/ws/live/{args.ticker}", args.seconds, started))
+    report.update(ticker=args.ticker, poll_seconds=args.poll_seconds, iss_latency_ms=args.latency_ms)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# File: benchmarks/run_pipeline.py
+"""
+Сквозной бенчмарк пайплайна на фейковом ISS: N синтетических тикеров x M лет.
+
+Стадии (--stages, по умолчанию все):
+  ingest     - ISS -> Bronze (MinIO): чанков/строк/МБ в секунду, число 429
+  transform  - Bronze -> Silver -> Gold (Spark): время стадий, строк Silver/Gold, скорость загрузки в Postgres
+  api        - латентность /metrics, /metrics/batch, /screener (p50/p95, холодный первый запрос)
+
+Результат - JSON-отчет (коммит, параметры, метрики) для сравнения между коммитами:
+    python -m benchmarks.run_pipeline --tickers 5 --years 1 --output benchmarks/reports/head.json
+    python -m benchmarks.run_pipeline --compare benchmarks/reports/base.json benchmarks/reports/head.json
+
+Нужны MinIO/Postgres/Spark из docker-compose (запускать внутри etl-runner) и API для стадии api.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.fake_iss import FakeISS
+
+STAGES = ["ingest", "transform", "api"]
+ROWS_RE = re.compile(r"\((\d+) rows\)")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def bench_tickers(n: int) -> list:
+    # 6 символов: проходит regex тикера в Spark и фильтр list_downloaded_tickers
+    return [f"BNCH{i:02d}" for i in range(n)]
+
+
+def latency_stats(samples: list) -> dict:
+    arr = np.array(samples) * 1000
+    return {"n": len(arr), "first_ms": round(float(arr[0]), 2), "p50_ms": round(float(np.percentile(arr, 50)), 2),
+            "p95_ms": round(float(np.percentile(arr, 95)), 2), "max_ms": round(float(arr.max()), 2)}
+
+
+# --- Стадии ---
+def bench_ingest(tickers: list, years: int, fake: FakeISS, workers: int) -> dict:
+    import dask
+
+    from flows.ingest_flow import generate_download_tasks
+    from src.storage.minio_client import minio_client
+
+    # Чистый прогон: иначе download_chunk пропустит уже скачанные файлы (SKIP)
+    for t in tickers:
+        minio_client.delete(t)
+
+    lazy = generate_download_tasks.fn(tickers, years)
+    before = fake.snapshot()
+    started = time.perf_counter()
+    results = dask.compute(*lazy, scheduler="threads", num_workers=workers)
+    elapsed = time.perf_counter() - started
+    server = {k: v - before[k] for k, v in fake.snapshot().items()}
+
+    rows = sum(int(m.group(1)) for r in results if (m := ROWS_RE.search(r)))
+    return {
+        "chunks": len(results),
+        "chunks_saved": sum(r.startswith("SUCCESS") for r in results),
+        "rows": rows,
+        "iss_requests": server["requests"],
+        "iss_throttled": server["throttled"],
+        "iss_mb": round(server["bytes"] / 1024 / 1024, 2),
+        "elapsed_s": round(elapsed, 2),
+        "rows_per_s": round(rows / elapsed, 1),
+        "chunks_per_s": round(len(results) / elapsed, 2),
+    }
+
+
+def bench_transform(tickers: list) -> dict:
+    import psycopg2
+
+    from src.config import settings
+    from src.processing.spark_job import get_spark_session, process_bronze_to_silver, process_silver_to_gold_atomic
+
+    out = {}
+    started = time.perf_counter()
+    spark = get_spark_session("MOEX_Benchmark")
+    out["spark_startup_s"] = round(time.perf_counter() - started, 2)
+    try:
+        t0 = time.perf_counter()
+        process_bronze_to_silver(spark, tickers)
+        out["bronze_to_silver_s"] = round(time.perf_counter() - t0, 2)
+        out["silver_rows"] = (spark.read.parquet(f"s3a://{settings.MINIO_BUCKET_SILVER}/market_data")
+                              .where(f"ticker IN ({','.join(repr(t) for t in tickers)})").count())
+
+        t0 = time.perf_counter()
+        process_silver_to_gold_atomic(spark, tickers)
+        out["silver_to_gold_s"] = round(time.perf_counter() - t0, 2)
+    finally:
+        spark.stop()
+
+    conn = psycopg2.connect(host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT, user=settings.POSTGRES_USER,
+                            password=settings.POSTGRES_PASSWORD, dbname=settings.POSTGRES_DB)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM stock_metrics WHERE ticker = ANY(%s)", (tickers,))
+            out["gold_rows"] = cur.fetchone()[0]
+    finally:
+        conn.close()
+    out["gold_rows_per_s"] = round(out["gold_rows"] / out["silver_to_gold_s"], 1)
+    out["elapsed_s"] = round(time.perf_counter() - started, 2)
+    return out
+
+
+def bench_api(tickers: list, api_url: str, requests_per_endpoint: int) -> dict:
+    from src.dashboard.data_cache import get_api_session
+
+    session = get_api_session()
+    endpoints = {
+        "metrics_1d_json": (f"/metrics/{tickers[0]}", {"interval": "1d"}),
+        "metrics_1m_json": (f"/metrics/{tickers[0]}", {"interval": "1m"}),
+        "metrics_1m_arrow": (f"/metrics/{tickers[0]}", {"interval": "1m", "format": "arrow"}),
+        "metrics_batch_1d": ("/metrics/batch", {"tickers": ",".join(tickers), "interval": "1d", "fields": "close,rsi_14"}),
+        "screener_1d": ("/screener", {"interval": "1d", "where": "rsi_14:lt:50", "sort": "volume"}),
+    }
+    out = {}
+    for name, (path, params) in endpoints.items():
+        samples, size = [], 0
+        for _ in range(requests_per_endpoint):
+            t0 = time.perf_counter()
+            resp = session.get(f"{api_url}{path}", params=params, timeout=60)
+            samples.append(time.perf_counter() - t0)
+            resp.raise_for_status()
+            size = len(resp.content)
+        out[name] = {**latency_stats(samples), "bytes": size}
+    return out
+
+
+# --- Сравнение отчетов ---
+def metric_direction(name: str) -> int:
+    """+1 - больше лучше, -1 - меньше лучше, 0 - информационная метрика"""
+    if name.endswith("_per_s"):
+        return 1
+    if name.endswith("_s") or name.endswith("_ms"):
+        return -1
+    return 0
+
+
+def flatten(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(flatten(v, f"{key}."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+
+def compare_reports(base: dict, head: dict, threshold: float = 0.10) -> list:
+    """Строки сравнения по общим метрикам; regression=True, если хуже больше чем на threshold"""
+    a, b = flatten(base["results"]), flatten(head["results"])
+    rows = []
+    for key in sorted(a.keys() & b.keys()):
+        direction = metric_direction(key)
+        change = (b[key] - a[key]) / a[key] if a[key] else 0.0
+        rows.append({"metric": key, "base": a[key], "head": b[key], "change": round(change, 4),
+                     "regression": direction != 0 and direction * change < -threshold})
+    return rows
+
+
+def print_comparison(rows: list, base: dict, head: dict):
+    print(f"📊 {base['meta']['commit']} -> {head['meta']['commit']}")
+    for r in rows:
+        flag = "❌" if r["regression"] else "  "
+        print(f"{flag} {r['metric']:<40} {r['base']:>12} -> {r['head']:>12} ({r['change']:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark on a fake ISS")
+    parser.add_argument("--tickers", type=int, default=3)
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="задержка ответа фейкового ISS")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="доля ответов 429")
+    parser.add_argument("--workers", type=int, default=12, help="потоков Dask на ingest (как в ingest_flow)")
+    parser.add_argument("--api-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-requests", type=int, default=20)
+    parser.add_argument("--iss-port", type=int, default=8765)
+    parser.add_argument("--output", default=None, help="путь JSON-отчета (по умолчанию benchmarks/reports/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="сравнить два отчета и выйти")
+    parser.add_argument("--threshold", type=float, default=0.10, help="порог регрессии для --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        base, head = (json.load(open(p)) for p in args.compare)
+        rows = compare_reports(base, head, args.threshold)
+        print_comparison(rows, base, head)
+        sys.exit(1 if any(r["regression"] for r in rows) else 0)
+
+    # Ingestion читает URL ISS из настроек при импорте, поэтому подменяем до импорта src.*
+    fake = FakeISS(args.iss_port, args.latency_ms, error_rate=args.error_rate).start()
+    os.environ["MOEX_ISS_URL"] = fake.url
+
+    stages = [s for s in args.stages.split(",") if s in STAGES]
+    tickers = bench_tickers(args.tickers)
+    report = {
+        "meta": {
+            "commit": git_commit(), "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "host": platform.node(), "python": platform.python_version(), "cpus": os.cpu_count(),
+            "params": {"tickers": args.tickers, "years": args.years, "latency_ms": args.latency_ms,
+                       "error_rate": args.error_rate, "workers": args.workers},
+        },
+        "results": {},
+    }
+    try:
+        if "ingest" in stages:
+            print(f"🌍 ingest: {len(tickers)} tickers x {args.years}y")
+            report["results"]["ingest"] = bench_ingest(tickers, args.years, fake, args.workers)
+        if "transform" in stages:
+            print("🔥 transform: Bronze -> Silver -> Gold")
+            report["results"]["transform"] = bench_transform(tickers)
+        if "api" in stages:
+            print("🔌 api latency")
+            report["results"]["api"] = bench_api(tickers, args.api_url, args.api_requests)
+    finally:
+        fake.stop()
+
+    output = args.output or os.path.join("benchmarks", "reports", f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    print(f"💾 Report: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# File: benchmarks/storage.py
+"""
+Бенчмарк клиента Bronze (src/storage/minio_client.py) на локальном MinIO или moto_server:
+последовательные PUT против пакетного save_many и HEAD на объект против листинга по тикеру.
+
+    python -m benchmarks.storage --objects 500 --tickers 5
+    MINIO_ENDPOINT=http://127.0.0.1:5000 python -m benchmarks.storage   # moto_server -p 5000
+
+Пишет во временный бакет bench-storage-<id> и удаляет его в конце.
+"""
+import argparse
+import json
+import time
+import uuid
+
+
+def timed_call(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return round(time.perf_counter() - started, 3)
+
+
+def run(objects: int, tickers: int, size_kb: int) -> dict:
+    from src.storage.minio_client import MinioClient
+
+    client = MinioClient(bucket=f"bench-storage-{uuid.uuid4().hex[:8]}")
+    payload = b"x" * (size_kb * 1024)
+    names = [f"BENCH{t}/1m/2024/{i:04d}.json" for t in range(tickers) for i in range(objects // tickers)]
+    serial, batch = names[: len(names) // 2], names[len(names) // 2:]
+    try:
+        report = {
+            "put_serial_s": timed_call(lambda: [client.save_bytes(payload, p) for p in serial]),
+            "put_batch_s": timed_call(lambda: client.save_many({p: payload for p in batch})),
+        }
+        client.inventory.invalidate()
+        report["head_serial_s"] = timed_call(lambda: [client.fs.exists(client._full(p)) for p in names])
+        report["list_batch_s"] = timed_call(lambda: client.exists_many(names))
+        report["cached_batch_s"] = timed_call(lambda: client.exists_many(names))
+        assert client.exists_many(names) == set(names)
+    finally:
+        client.fs.rm(client.bucket, recursive=True)
+    report.update(objects=len(names), tickers=tickers, size_kb=size_kb)
+    report["put_speedup"] = round(report["put_serial_s"] / max(report["put_batch_s"], 1e-3), 1)
+    report["exists_speedup"] = round(report["head_serial_s"] / max(report["list_batch_s"], 1e-3), 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bronze object-store client benchmark")
+    parser.add_argument("--objects", type=int, default=500)
+    parser.add_argument("--tickers", type=int, default=5)
+    parser.add_argument("--size-kb", type=int, default=16)
+    args = parser.parse_args()
+    print(json.dumps(run(args.objects, args.tickers, args.size_kb), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# File: benchmarks/tiers.py
+"""
+Многолетние диапазоны на двух уровнях и выигрыш по размеру Postgres (src/storage/tiers.py).
+
+  range  - один и тот же диапазон [start, end) тикера: Gold (Postgres, индекс по PK) против
+           Silver Parquet через pyarrow.dataset (src/storage/silver_reader.py): время, строки/с
+  size   - stock_metrics сейчас и доля холодной истории (строки старше границы уровней);
+           --apply удаляет ее (trim_gold) и делает VACUUM FULL - реальный размер после (блокирует таблицу!)
+
+Запускать до retention, пока Gold еще хранит всю историю, иначе у Postgres в холодном диапазоне нет строк:
+    python -m benchmarks.tiers --tickers SBER,GAZP --interval 1m --years 3
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from src.config import settings
+
+
+def connect():
+    return psycopg2.connect(host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT, user=settings.POSTGRES_USER,
+                            password=settings.POSTGRES_PASSWORD, dbname=settings.POSTGRES_DB)
+
+
+def bench_postgres(ticker: str, interval: str, start: datetime, end: datetime) -> dict:
+    conn = connect()
+    try:
+        t0 = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT ts, open, high, low, close, volume FROM stock_metrics
+                WHERE ticker = %s AND interval = %s AND ts >= %s AND ts < %s ORDER BY ts
+            """, (ticker, interval, start, end))
+            rows = len(cur.fetchall())
+        return rate(rows, time.perf_counter() - t0)
+    finally:
+        conn.close()
+
+
+def bench_silver(ticker: str, interval: str, start: datetime, end: datetime) -> dict:
+    from src.storage.silver_reader import silver_reader
+
+    t0 = time.perf_counter()
+    rows = silver_reader.read(ticker, interval, start, end).num_rows
+    return rate(rows, time.perf_counter() - t0)
+
+
+def rate(rows: int, elapsed: float) -> dict:
+    return {"rows": rows, "elapsed_s": round(elapsed, 3), "rows_per_s": round(rows / elapsed, 1) if elapsed else None}
+
+
+def size_report(apply: bool) -> dict:
+    from src.storage.tiers import cold_cutoff, cold_intervals, gold_size, trim_gold
+
+    out = {"before": gold_size(), "cold_rows": {}}
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            for interval in cold_intervals():
+                cur.execute("SELECT count(*) FROM stock_metrics WHERE interval = %s AND ts < %s",
+                            (interval, cold_cutoff(interval)))
+                out["cold_rows"][interval] = cur.fetchone()[0]
+    finally:
+        conn.close()
+    cold = sum(out["cold_rows"].values())
+    total = max(out["before"]["rows"], 1)
+    # Индексы и TOAST растут с числом строк: оценка пропорцией
+    out["estimated_reduction_bytes"] = int(out["before"]["bytes"] * min(cold / total, 1.0))
+
+    if apply:
+        out["deleted"] = trim_gold()
+        conn = connect()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("VACUUM FULL stock_metrics")
+        finally:
+            conn.close()
+        out["after"] = gold_size()
+        out["reduction_bytes"] = out["before"]["bytes"] - out["after"]["bytes"]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot (Postgres) vs cold (Silver Parquet) range queries")
+    parser.add_argument("--tickers", default="SBER")
+    parser.add_argument("--interval", default="1m")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="прогонов на диапазон (берется лучший)")
+    parser.add_argument("--apply", action="store_true", help="выполнить retention и VACUUM FULL")
+    args = parser.parse_args()
+
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=365 * args.years)
+    report = {"params": {"interval": args.interval, "start": start.isoformat(), "end": end.isoformat()}, "range": {}}
+    for ticker in [t.strip().upper() for t in args.tickers.split(",") if t.strip()]:
+        runs = {"postgres": [], "silver": []}
+        for _ in range(args.repeat):
+            runs["postgres"].append(bench_postgres(ticker, args.interval, start, end))
+            runs["silver"].append(bench_silver(ticker, args.interval, start, end))
+        report["range"][ticker] = {tier: min(r, key=lambda x: x["elapsed_s"]) for tier, r in runs.items()}
+    report["size"] = size_report(args.apply)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
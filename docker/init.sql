@@ -41,10 +41,50 @@ CREATE TABLE IF NOT EXISTS stock_metrics (
     volume DOUBLE PRECISION,
     sma_20 DOUBLE PRECISION,
     rsi_14 DOUBLE PRECISION,
+    indicators JSONB,           -- остальные индикаторы реестра (EMA, MACD, BB, ATR, VWAP, ...)
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (ticker, interval, ts)
 );
 
 -- Индексы
 CREATE INDEX IF NOT EXISTS idx_ticker_interval ON stock_metrics(ticker, interval);
-CREATE INDEX IF NOT EXISTS idx_ts ON stock_metrics(ts);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_ts ON stock_metrics(ts);
+
+-- Состояние рекурсивных индикаторов для инкрементального пересчета Gold
+CREATE TABLE IF NOT EXISTS indicator_state (
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    state JSONB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (ticker, interval)
+);
+
+-- Последний бар каждой пары (ticker, interval) для скринера и водяных знаков.
+-- Merge Gold делает upsert только пар из staging (в транзакции merge), полная перезаливка собирает его заново
+CREATE TABLE IF NOT EXISTS stock_latest (
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    ts TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    open DOUBLE PRECISION,
+    high DOUBLE PRECISION,
+    low DOUBLE PRECISION,
+    close DOUBLE PRECISION,
+    volume DOUBLE PRECISION,
+    sma_20 DOUBLE PRECISION,
+    rsi_14 DOUBLE PRECISION,
+    indicators JSONB
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_stock_latest_pk ON stock_latest(ticker, interval);
+CREATE INDEX IF NOT EXISTS idx_stock_latest_interval ON stock_latest(interval);
+
+-- Отчеты профилирования run_etl_task (opt-in, src/profiling.py)
+CREATE TABLE IF NOT EXISTS etl_run_profiles (
+    task_id TEXT PRIMARY KEY,
+    started_at TIMESTAMP NOT NULL,
+    status TEXT NOT NULL,
+    tickers_count INTEGER NOT NULL,
+    wall_s DOUBLE PRECISION,
+    cpu_s DOUBLE PRECISION,
+    report JSONB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_etl_run_profiles_started ON etl_run_profiles(started_at DESC);
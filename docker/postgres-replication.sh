@@ -0,0 +1,5 @@
+#!/bin/bash
+# Разрешает streaming-реплику (сервис postgres-replica, профиль replica). Выполняется только при
+# инициализации пустого ./data/postgres; для существующей базы добавьте строку в pg_hba.conf вручную.
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
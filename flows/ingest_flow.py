@@ -5,6 +5,9 @@ from dask.diagnostics import Callback
 from datetime import datetime
 from src.ingestion.moex import process_ticker_year
 from src.storage.task_registry import task_registry
+from src.storage.minio_client import minio_client
+from src.telemetry import STAGE_SECONDS, span, timed
+from src import profiling
 
 # --- Custom Dask Callback (RedisProgressBar) ---
 class RedisProgressBar(Callback):
@@ -39,6 +42,11 @@ def generate_download_tasks(tickers: list, years_back: int = 5):
     current_year = datetime.now().year
     start_year = current_year - years_back
     years = range(start_year, current_year + 1)
+
+    # Один LIST на тикер заранее: проверки чанков в потоках Dask идут по кэшу, а не HEAD на объект.
+    # Свежий, а не теплый снимок: вызывающий держит блокировку тикеров, и до нее другой воркер
+    # мог закрыть чанки (.done) и удалить их страницы .part
+    minio_client.inventory.prefetch((t.upper().strip() for t in tickers), fresh=True)
     
     tasks = []
     
@@ -68,7 +76,8 @@ def generate_download_tasks(tickers: list, years_back: int = 5):
 def ingest_flow(tickers: list, years_back: int, task_id: str = None):
     print(f"🚀 Starting Ingestion for: {tickers}")
     
-    lazy_results = generate_download_tasks(tickers, years_back)
+    with profiling.stage("plan"):
+        lazy_results = generate_download_tasks(tickers, years_back)
     
     if not lazy_results:
         print("⚠️ No tasks generated.")
@@ -79,14 +88,16 @@ def ingest_flow(tickers: list, years_back: int, task_id: str = None):
     # Используем больше потоков, так как задачи стали меньше
     num_workers = 12 
     
-    if task_id:
-        with RedisProgressBar(task_id, start_pct=10, end_pct=70):
+    with span("ingest_flow", task_id=task_id or "", tickers=list(tickers), chunks=len(lazy_results)), timed(STAGE_SECONDS, "ingest"):
+        if task_id:
+            with RedisProgressBar(task_id, start_pct=10, end_pct=70):
+                results = dask.compute(*lazy_results, scheduler='threads', num_workers=num_workers)
+        else:
             results = dask.compute(*lazy_results, scheduler='threads', num_workers=num_workers)
-    else:
-        results = dask.compute(*lazy_results, scheduler='threads', num_workers=num_workers)
     
     success_cnt = sum(1 for r in results if "SUCCESS" in r)
-    print(f"🏁 Flow finished. Processed: {len(results)}. Saved: {success_cnt}.")
+    partial_cnt = sum(1 for r in results if r.startswith("PARTIAL"))
+    print(f"🏁 Flow finished. Processed: {len(results)}. Saved: {success_cnt}. Interrupted (will resume): {partial_cnt}.")
 
 if __name__ == "__main__":
     ingest_flow(['SBER'], 1)
\ No newline at end of file
@@ -0,0 +1,28 @@
+# File: flows/refresh_flow.py
+from prefect import flow
+import dask
+from src.ingestion.incremental import refresh_ticker
+from flows.transform_flow import transform_flow
+from src.telemetry import STAGE_SECONDS, span, timed
+
+@flow(name="MOEX Incremental Refresh")
+def refresh_flow(due: dict, now=None):
+    """
+    due: {interval: {ticker: watermark}} из plan_refresh.
+    Одна загрузка на все тикеры (потоки Dask) и один инкрементальный Spark-прогон на все обновленные:
+    старт Spark и соединений окупается на всем наборе, а не на каждом тикере.
+    """
+    jobs = [(ticker, interval, since) for interval, tickers in due.items() for ticker, since in tickers.items()]
+    if not jobs:
+        return []
+
+    print(f"⏱️ Incremental refresh: {len(jobs)} (ticker, interval) pairs")
+    with span("refresh_flow", pairs=len(jobs)), timed(STAGE_SECONDS, "refresh_ingest"):
+        results = dask.compute(*[dask.delayed(refresh_ticker)(t, i, since, now) for t, i, since in jobs],
+                               scheduler='threads', num_workers=8)
+
+    updated = sorted({t for (t, _, _), r in zip(jobs, results) if r.startswith("SUCCESS")})
+    print(f"🏁 Refresh downloaded: {len(updated)} tickers with new bars")
+    if updated:
+        transform_flow(updated, incremental=True)
+    return updated
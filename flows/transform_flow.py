@@ -1,18 +1,22 @@
 # File: flows/transform_flow.py
 from prefect import flow, task
-from src.processing.spark_job import process_data
+from src.telemetry import span
 from typing import List
 
 @task(name="Run PySpark Job")
-def run_spark_job(tickers: List[str] = None):
+def run_spark_job(tickers: List[str] = None, incremental: bool = False, force: bool = False):
     # Теперь мы передаем конкретный список тикеров
     # Это позволяет Spark обрабатывать только их, не блокируя всю базу
-    process_data(tickers)
+    # (и из них - только те, чей Bronze изменился, см. src/storage/bronze_manifest.py)
+    from src.processing.spark_job import process_data  # pyspark грузится только там, где запускается Spark
+
+    return process_data(tickers, incremental=incremental, force=force)
 
 @flow(name="MOEX Transformation Bronze-Gold")
-def transform_flow(tickers: List[str] = None):
+def transform_flow(tickers: List[str] = None, incremental: bool = False, force: bool = False):
     print(f"🔥 Starting Spark ETL for: {tickers or 'ALL'}")
-    run_spark_job(tickers)
+    with span("transform_flow", tickers=list(tickers or []), incremental=incremental, force=force):
+        return run_spark_job(tickers, incremental, force)
 
 if __name__ == "__main__":
     transform_flow(["SBER"])
\ No newline at end of file
@@ -1,23 +1,44 @@
 # File: src/api/app.py
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Depends, status
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect, Depends, Query, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 from datetime import datetime
 import asyncio
 import json
+import re
+import time
+import uuid
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
 from src.config import settings
 from src.storage.task_registry import task_registry
-from src.worker.tasks import run_etl_task, celery_app
+from src.storage.live_stream import live_stream
+from src.api.hot_tail import (HotTailStore, align, concat_columns, rows_to_columns, to_arrow_ipc, to_columnar,
+                              to_records)
+# Тонкий клиент: задачи ставятся по имени, код воркера (Prefect, Dask, pyspark) в API не грузится
+from src.worker.client import EXPORT_TASK, REPAIR_GAPS_TASK, celery_app, etl_pipeline, etl_scheduler
+from src.worker.scheduler import BULK, INTERACTIVE, QUEUES
+from src.worker.pipeline import PIPELINE_QUEUES
 from src.storage.minio_client import minio_client
+from src.storage.lazy import LazyProxy
+from src.storage.db import data_lsn, db_router
+from src.storage.silver_reader import silver_reader, table_to_columns
+from src.storage.tiers import split_range
+from src.storage.exporter import EXPORT_FORMATS, export_filename, iter_export
+from src.storage.run_profiles import get_profile, list_profiles
+from src.ingestion.gaps import quality_summary
+from src.profiling import compare_stages
+from src.telemetry import (API_REQUEST_SECONDS, DB_CONNECT_SECONDS, CeleryQueueCollector, init_tracing,
+                           register_collector, render_metrics, span, timed, trace_carrier)
 from src.api.auth import (
-    Token, User, verify_password, create_access_token, 
-    get_current_user, get_current_admin, get_password_hash # <--- Добавили импорт хеширования
+    Token, User, verify_password_async, create_access_token, 
+    get_current_user, get_current_admin, get_password_hash_async
 )
+from src.api.users import user_directory
 
 app = FastAPI(title="MOEX Enterprise Analytics API")
 
@@ -26,6 +47,30 @@ app.add_middleware(
     allow_methods=["*"], allow_headers=["*"]
 )
 
+# --- Observability ---
+init_tracing("moex-api")
+register_collector(CeleryQueueCollector(LazyProxy(lambda: task_registry.redis), ["celery", *QUEUES, *PIPELINE_QUEUES]))
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Латентность по шаблону маршрута (/metrics/{ticker}), а не по сырому пути - иначе взрыв кардинальности"""
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        API_REQUEST_SECONDS.labels(request.method, getattr(route, "path", "unmatched"),
+                                   str(status_code)).observe(time.perf_counter() - started)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Scrape-эндпоинт Prometheus: агрегирует метрики API, воркеров и Spark-драйвера"""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 # --- Models ---
 class StockMetric(BaseModel):
     ticker: str
@@ -38,10 +83,13 @@ class StockMetric(BaseModel):
     volume: float
     sma_20: Optional[float]
     rsi_14: Optional[float]
+    indicators: Optional[Dict[str, Optional[float]]] = None
 
 class IngestRequest(BaseModel):
     tickers: List[str]
     years_back: int = 3
+    profile: bool = False  # отчет по стадиям (wall/CPU, Spark, сэмплы Python) в etl_run_profiles
+    force: bool = False  # пересчитать Silver/Gold, даже если Bronze не изменился (bronze_manifest)
 
 class ChartModel(BaseModel):
     name: str
@@ -59,75 +107,67 @@ class UserCreate(BaseModel):
 
 # --- Database ---
 def get_db_connection():
-    return psycopg2.connect(
-        host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT,
-        user=settings.POSTGRES_USER, password=settings.POSTGRES_PASSWORD,
-        dbname=settings.POSTGRES_DB
-    )
+    with timed(DB_CONNECT_SECONDS, "api"):
+        return psycopg2.connect(
+            host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT,
+            user=settings.POSTGRES_USER, password=settings.POSTGRES_PASSWORD,
+            dbname=settings.POSTGRES_DB
+        )
+
+def get_read_connection():
+    """
+    Только чтение Gold: реплика с допустимым лагом, проигравшая коммит текущей версии данных,
+    иначе primary (src/storage/db.py). Горячий хвост перегружается по новой версии - и не со старого среза
+    """
+    with timed(DB_CONNECT_SECONDS, "api_read"):
+        return db_router.read(min_lsn=data_lsn())
 
 # --- AUTH ROUTES ---
 
 @app.post("/register", status_code=201)
-def register_user(user: UserCreate):
+async def register_user(user: UserCreate):
     """Регистрация нового пользователя (всегда role='user')"""
-    conn = get_db_connection()
+    hashed_pw = await get_password_hash_async(user.password)
     try:
-        with conn.cursor() as cur:
-            # Проверка на существование
-            cur.execute("SELECT id FROM users WHERE username = %s", (user.username,))
-            if cur.fetchone():
-                raise HTTPException(status_code=400, detail="Username already registered")
-            
-            # Хеширование и вставка
-            hashed_pw = get_password_hash(user.password)
-            cur.execute(
-                "INSERT INTO users (username, password_hash, role) VALUES (%s, %s, 'user')",
-                (user.username, hashed_pw)
-            )
-            conn.commit()
-        return {"status": "created", "username": user.username}
-    except HTTPException as he:
-        raise he
+        created = await user_directory.create(user.username, hashed_pw)
     except Exception as e:
         print(f"Registration error: {e}")
         raise HTTPException(status_code=500, detail="Registration failed")
-    finally:
-        conn.close()
+    if created is None:
+        raise HTTPException(status_code=400, detail="Username already registered")
+    return {"status": "created", "username": user.username}
 
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    conn = get_db_connection()
-    user = None
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT * FROM users WHERE username = %s", (form_data.username,))
-            user = cur.fetchone()
-    finally:
-        conn.close()
-
-    if not user or not verify_password(form_data.password, user['password_hash']):
+    # asyncpg и bcrypt в пуле потоков: всплеск логинов не останавливает /ws/tasks и async-эндпоинты
+    found = await user_directory.credentials(form_data.username)
+    user, password_hash = found if found else (None, None)
+    if not await verify_password_async(form_data.password, password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token = create_access_token(data={"sub": user['username'], "role": user['role']})
-    return {"access_token": access_token, "token_type": "bearer", "role": user['role'], "username": user['username']}
+    access_token = create_access_token(data={"sub": user.username, "uid": user.id, "role": user.role})
+    return {"access_token": access_token, "token_type": "bearer", "role": user.role, "username": user.username}
+
+@app.on_event("shutdown")
+async def close_user_directory():
+    await user_directory.close()
 
 # --- USER CHART ROUTES ---
+# id пользователя берется из JWT (uid), без поиска по users на каждый запрос
 @app.post("/charts", response_model=Dict[str, str])
 def save_chart(chart: ChartModel, current_user: User = Depends(get_current_user)):
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT id FROM users WHERE username = %s", (current_user.username,))
-            user_id = cur.fetchone()[0]
             query = """
                 INSERT INTO user_charts (user_id, name, code) VALUES (%s, %s, %s)
                 ON CONFLICT (user_id, name) DO UPDATE SET code = EXCLUDED.code
             """
-            cur.execute(query, (user_id, chart.name, chart.code))
+            cur.execute(query, (current_user.id, chart.name, chart.code))
             conn.commit()
         return {"status": "saved", "name": chart.name}
     except Exception as e:
@@ -141,12 +181,11 @@ def get_my_charts(current_user: User = Depends(get_current_user)):
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
-                SELECT uc.id, uc.name, uc.code 
-                FROM user_charts uc 
-                JOIN users u ON uc.user_id = u.id 
-                WHERE u.username = %s
-                ORDER BY uc.created_at DESC
-            """, (current_user.username,))
+                SELECT id, name, code 
+                FROM user_charts 
+                WHERE user_id = %s
+                ORDER BY created_at DESC
+            """, (current_user.id,))
             return cur.fetchall()
     finally:
         conn.close()
@@ -154,7 +193,7 @@ def get_my_charts(current_user: User = Depends(get_current_user)):
 # --- PUBLIC/PROTECTED DATA ENDPOINTS ---
 @app.get("/tickers", response_model=List[str])
 def get_tickers():
-    conn = get_db_connection()
+    conn = get_read_connection()
     try:
         with conn.cursor() as cur:
             # Проверяем существование таблицы
@@ -162,9 +201,8 @@ def get_tickers():
             if cur.fetchone()[0] is None:
                 return []
             
-            # Читаем тикеры. 
-            # Внимание: если транзакция в Spark идет прямо сейчас, этот запрос подождет COMMIT.
-            # Это хорошо! Мы не получим неполные данные.
+            # Читаем тикеры (реплика или primary): MVCC отдает последний закоммиченный срез Gold,
+            # незавершенный swap не виден.
             cur.execute("SELECT DISTINCT ticker FROM stock_metrics ORDER BY ticker")
             res = [r[0] for r in cur.fetchall()]
             return res
@@ -176,64 +214,327 @@ def get_tickers():
 
 @app.get("/availability/{ticker}")
 def check_availability(ticker: str):
-    conn = get_db_connection()
+    conn = get_read_connection()
     try:
         with conn.cursor() as cur:
             cur.execute("SELECT DISTINCT interval FROM stock_metrics WHERE ticker = %s", (ticker.upper(),))
             existing = {r[0] for r in cur.fetchall()}
-            return {"1d": "1d" in existing, "1m": "1m" in existing}
+            # Базовые интервалы + роллапы Gold (5m/15m/1h/1w/1mo), которые есть у тикера
+            return {"1d": "1d" in existing, "1m": "1m" in existing, **{i: True for i in existing}}
     except: return {"1d": False, "1m": False}
     finally: conn.close()
 
-@app.get("/metrics/{ticker}", response_model=List[StockMetric])
-def get_metrics(ticker: str, limit: int = 5000, interval: str = "1d"):
-    conn = get_db_connection()
+@app.get("/data/version")
+def get_data_version():
+    """Версия данных Gold: растет после каждого ETL, клиенты используют ее как ключ кэша"""
+    return {"version": task_registry.get_data_version()}
+
+# LATERAL по PK (ticker, interval, ts): последние N баров каждого тикера одним запросом
+METRICS_QUERY = """
+    SELECT m.* FROM unnest(%s::text[]) AS t(ticker)
+    CROSS JOIN LATERAL (
+        SELECT ticker, ts, open, high, low, close, volume, sma_20, rsi_14, indicators
+        FROM stock_metrics
+        WHERE ticker = t.ticker AND interval = %s
+        ORDER BY ts DESC LIMIT %s
+    ) m
+    ORDER BY m.ticker, m.ts ASC
+"""
+
+def load_metrics_tail(tickers: List[str], interval: str, limit: int) -> Dict[str, dict]:
+    conn = get_read_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            query = """
-                SELECT * FROM (
-                    SELECT ticker, interval, ts, open, high, low, close, volume, sma_20, rsi_14
-                    FROM stock_metrics
-                    WHERE ticker = %s AND interval = %s
-                    ORDER BY ts DESC LIMIT %s
-                ) sub ORDER BY ts ASC
-            """
-            cur.execute(query, (ticker.upper(), interval, limit))
-            return cur.fetchall() or []
-    except: return []
-    finally: conn.close()
+            cur.execute(METRICS_QUERY, (tickers, interval, limit))
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+    by_ticker: Dict[str, list] = {}
+    for r in rows:
+        by_ticker.setdefault(r["ticker"], []).append(r)
+    return {t: rows_to_columns(r) for t, r in by_ticker.items()}
+
+# Диапазон по времени в горячем окне Gold (холодная часть - из Silver, см. load_metrics_range)
+RANGE_QUERY = """
+    SELECT ticker, ts, open, high, low, close, volume, sma_20, rsi_14, indicators
+    FROM stock_metrics
+    WHERE ticker = %s AND interval = %s
+      AND ts >= COALESCE(%s, '-infinity'::timestamp) AND ts < COALESCE(%s, 'infinity'::timestamp)
+    ORDER BY ts ASC LIMIT %s
+"""
+MAX_RANGE_BARS = 1_000_000
+
+def load_metrics_range(ticker: str, interval: str, start: Optional[datetime], end: Optional[datetime],
+                       limit: int) -> dict:
+    """Первые `limit` баров [start, end): старше границы уровней - из Silver Parquet, новее - из Gold"""
+    tiers = split_range(interval, start, end)
+    parts = []
+    if tiers["cold"]:
+        with span("metrics.cold_read", ticker=ticker, interval=interval):
+            parts.append(table_to_columns(silver_reader.read(ticker, interval, *tiers["cold"], limit=limit)))
+    remaining = limit - sum(len(p["ts"]) for p in parts)
+    if tiers["hot"] and remaining > 0:
+        conn = get_read_connection()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(RANGE_QUERY, (ticker, interval, *tiers["hot"], remaining))
+                parts.append(rows_to_columns(cur.fetchall()))
+        finally:
+            conn.close()
+    return concat_columns(parts)
+
+hot_tail = HotTailStore(load_metrics_tail, task_registry.get_data_version,
+                        capacity=settings.HOT_TAIL_BARS, max_series=settings.HOT_TAIL_MAX_SERIES)
+
+async def feed_hot_tail(ticker: str):
+    while True:
+        try:
+            async for bar in live_stream.subscribe(ticker):
+                hot_tail.append(ticker, bar["interval"], [bar])
+        except Exception as e:
+            print(f"⚠️ Live feed {ticker} interrupted: {e}")
+            await asyncio.sleep(5)
+
+@app.on_event("startup")
+async def start_hot_tail_feed():
+    """Live-бары watchlist дописываются в горячий хвост, не дожидаясь batch ETL"""
+    for ticker in filter(None, map(str.strip, settings.LIVE_WATCHLIST.split(","))):
+        asyncio.create_task(feed_hot_tail(ticker))
+
+MAX_BATCH_TICKERS = 250
+
+def parse_list(value: str) -> List[str]:
+    return list(dict.fromkeys(v.strip() for v in value.split(",") if v.strip()))
+
+@app.get("/metrics/batch")
+def get_metrics_batch(tickers: str, interval: str = "1d", limit: int = 500,
+                      fields: str = "close", format: str = "columnar"):
+    """
+    Выровненные ряды нескольких тикеров одним ответом: общая ось ts, колонки "TICKER.field".
+    tickers/fields - через запятую. format: columnar или arrow.
+    """
+    symbols = [t.upper() for t in parse_list(tickers)]
+    field_list = parse_list(fields)
+    if not symbols or len(symbols) > MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400, detail=f"tickers: 1..{MAX_BATCH_TICKERS} symbols")
+    if format not in ("columnar", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be columnar or arrow")
+
+    series = hot_tail.get_many(symbols, interval, limit)
+    if series is None:
+        loaded = load_metrics_tail(symbols, interval, limit)
+        series = {t: loaded.get(t) or rows_to_columns([]) for t in symbols}
+    columns = align(series, field_list)
+
+    if format == "arrow":
+        return Response(to_arrow_ipc(columns), media_type="application/vnd.apache.arrow.stream")
+    return JSONResponse(to_columnar(columns, interval=interval, tickers=symbols, fields=field_list))
+
+# Скринер: whitelist колонок stock_latest; остальное - ключи JSONB indicators
+SCREENER_COLUMNS = {"open", "high", "low", "close", "volume", "sma_20", "rsi_14", "ts"}
+SCREENER_OPS = {"lt": "<", "lte": "<=", "gt": ">", "gte": ">=", "eq": "="}
+INDICATOR_KEY_RE = re.compile(r"^[a-z][a-z0-9_]{0,63}$")
+
+def screener_expr(field: str):
+    """SQL-выражение для поля скринера (имя колонки из whitelist или параметр для JSONB)"""
+    if field in SCREENER_COLUMNS:
+        return field, ()
+    if INDICATOR_KEY_RE.match(field):
+        return "(indicators->>%s)::float8", (field,)
+    raise HTTPException(status_code=400, detail=f"Unknown screener field: {field}")
+
+@app.get("/screener")
+def screener(interval: str = "1d", where: List[str] = Query(default=[]), sort: str = "volume",
+             desc: bool = True, limit: int = 50, tickers: Optional[str] = None):
+    """
+    Срез по последнему бару каждого тикера (таблица stock_latest).
+    where=rsi_14:lt:30 (можно несколько, объединяются AND), sort - поле сортировки.
+    Пример: /screener?interval=1d&where=rsi_14:lt:30&sort=volume
+    """
+    clauses, params = ["interval = %s"], [interval]
+    for cond in where:
+        try:
+            field, op, value = cond.split(":", 2)
+            value = float(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Bad filter '{cond}', expected field:op:number")
+        if op not in SCREENER_OPS or field == "ts":
+            raise HTTPException(status_code=400, detail=f"Bad filter operator in '{cond}'")
+        expr, expr_params = screener_expr(field)
+        clauses.append(f"{expr} {SCREENER_OPS[op]} %s")
+        params += [*expr_params, value]
+    if tickers:
+        clauses.append("ticker = ANY(%s)")
+        params.append([t.upper() for t in parse_list(tickers)])
+    order_expr, order_params = screener_expr(sort)
+    params += [*order_params, max(1, min(limit, 1000))]
+
+    query = f"""
+        SELECT ticker, interval, ts, open, high, low, close, volume, sma_20, rsi_14, indicators
+        FROM stock_latest
+        WHERE {" AND ".join(clauses)}
+        ORDER BY {order_expr} {"DESC" if desc else "ASC"} NULLS LAST
+        LIMIT %s
+    """
+    conn = get_read_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+    finally:
+        conn.close()
+
+@app.get("/metrics/{ticker}", response_model=List[StockMetric])
+def get_metrics(ticker: str, limit: int = 5000, interval: str = "1d", format: str = "json",
+                start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    Последние `limit` баров. До HOT_TAIL_BARS отдаются из памяти (hot_tail), глубже - из Postgres.
+    start/end - диапазон [start, end): первые `limit` (до MAX_RANGE_BARS) баров, история старше
+    GOLD_HOT_DAYS читается из Silver (индикаторы у таких баров пустые). Следующая страница - start = последний ts + 1 с.
+    format: json (список объектов), columnar (объект массивов), arrow (Arrow IPC stream).
+    """
+    if format not in ("json", "columnar", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be json, columnar or arrow")
+    ticker = ticker.upper()
+    try:
+        if start is not None or end is not None:
+            columns = load_metrics_range(ticker, interval, start, end, max(1, min(limit, MAX_RANGE_BARS)))
+        else:
+            columns = hot_tail.get(ticker, interval, limit)
+        if columns is None:
+            columns = load_metrics_tail([ticker], interval, limit).get(ticker) or rows_to_columns([])
+    except Exception as e:
+        print(f"⚠️ API Error getting metrics: {e}")
+        return []
+
+    if format == "arrow":
+        return Response(to_arrow_ipc(columns), media_type="application/vnd.apache.arrow.stream")
+    if format == "columnar":
+        return JSONResponse(to_columnar(columns, ticker=ticker, interval=interval))
+    return JSONResponse(to_records(columns, ticker, interval))
+
+# --- EXPORT ---
+class ExportRequest(BaseModel):
+    tickers: List[str]
+    interval: str = "1d"
+    format: str = "parquet"
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+def check_export_format(fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(EXPORT_FORMATS)}")
+
+@app.get("/export")
+def export_stream(tickers: str, interval: str = "1d", format: str = "csv",
+                  start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    Полная история из Gold потоком (серверный курсор, CSV или Parquet по батчам):
+    память API не зависит от объема выгрузки. Не больше MAX_BATCH_TICKERS тикеров, как /metrics/batch;
+    больше - POST /export/jobs.
+    """
+    check_export_format(format)
+    symbols = parse_list(tickers)
+    if not symbols or len(symbols) > MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400,
+                            detail=f"tickers: 1..{MAX_BATCH_TICKERS} symbols (larger exports: POST /export/jobs)")
+    filename = export_filename(symbols, interval, format)
+    return StreamingResponse(iter_export(symbols, interval, format, start, end), media_type=EXPORT_FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.post("/export/jobs")
+def export_job(request: ExportRequest, current_user: User = Depends(get_current_user)):
+    """Фоновая выгрузка в MinIO; ссылка появится в result задачи (/tasks, /export/jobs/{id})"""
+    check_export_format(request.format)
+    with span("export_job", interval=request.interval, format=request.format):
+        task = celery_app.send_task(EXPORT_TASK, args=[request.tickers, request.interval, request.format,
+                                                       request.start.isoformat() if request.start else None,
+                                                       request.end.isoformat() if request.end else None],
+                                    kwargs={"trace_context": trace_carrier()})
+    task_registry.add_task(task.id, f"EXPORT: {', '.join(request.tickers[:3])}{'...' if len(request.tickers) > 3 else ''}")
+    task_registry.update_task(task.id, status="⏳ Queued...", progress=0, state="PENDING")
+    return {"task_id": task.id}
+
+@app.get("/export/jobs/{task_id}")
+def export_job_status(task_id: str, current_user: User = Depends(get_current_user)):
+    task = task_registry.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
 
 # --- ADMIN ENDPOINTS ---
 @app.post("/etl/run")
 def trigger_etl(request: IngestRequest, admin: User = Depends(get_current_admin)):
-    task = run_etl_task.delay(request.tickers, request.years_back)
-    task_registry.add_task(task.id, ", ".join(request.tickers))
-    task_registry.update_task(task.id, status="⏳ Queued...", progress=0, state="PENDING")
-    return {"task_id": task.id}
+    # Корневой спан ETL: Celery получает traceparent и продолжает тот же трейс
+    with span("trigger_etl", tickers=request.tickers, years_back=request.years_back):
+        job = etl_scheduler.submit(request.tickers, request.years_back, INTERACTIVE,
+                                   trace_context=trace_carrier(), profile=request.profile, force=request.force)
+    if not job["task_id"]:
+        # Все тикеры уже ждут в очереди: возвращаем существующую задачу вместо дубля
+        return {"task_id": next(iter(job["coalesced"].values()), None), "coalesced": job["coalesced"]}
+    task_registry.add_task(job["task_id"], ", ".join(job["tickers"]))
+    task_registry.update_task(job["task_id"], status="⏳ Queued...", progress=0, state="PENDING")
+    return {"task_id": job["task_id"], "coalesced": job["coalesced"]}
 
 @app.post("/etl/cancel/{task_id}")
 def cancel_etl(task_id: str, admin: User = Depends(get_current_admin)):
-    celery_app.control.revoke(task_id, terminate=True)
+    # Для resync отменяются все дочерние задачи батча
+    celery_app.control.revoke(etl_scheduler.cancel(task_id), terminate=True)
     task_registry.update_task(task_id, status="⛔ Cancelled", state="REVOKED", progress=100)
     return {"status": "cancelled"}
 
 @app.post("/etl/resync")
-def resync_data(admin: User = Depends(get_current_admin)):
+def resync_data(profile: bool = False, batch_size: Optional[int] = Query(None, ge=1, le=500), force: bool = False,
+                admin: User = Depends(get_current_admin)):
     # 1. Сначала идем в MinIO и смотрим, какие тикеры там РЕАЛЬНО есть
-    tickers = minio_client.list_downloaded_tickers()
+    tickers = minio_client.list_downloaded_tickers(fresh=True)
     
     if not tickers: 
         return {"status": "error", "detail": "No data in MinIO to resync"}
     
-    # 2. Запускаем задачу. 
-    # ВАЖНО: Мы передаем СПИСОК тикеров, а не None. 
-    # Это значит, что Spark удалит только их, а не сделает DELETE ALL.
-    task = run_etl_task.delay(tickers, 3)
-    
-    task_registry.add_task(task.id, f"RESYNC: {len(tickers)} tickers")
-    task_registry.update_task(task.id, status=f"♻️ Queued {len(tickers)} tickers", progress=0, state="PENDING")
+    # 2. Конвейер: загрузка по тикеру (etl_ingest) и Spark батчами по batch_size (etl_process)
+    # идут одновременно. Приоритет - bulk: интерактивный запрос забирает ожидающий тикер.
+    # Тикеры, уже стоящие в очереди, не дублируются.
+    # ВАЖНО: каждый батч получает СПИСОК тикеров, а не None - Spark не сделает DELETE ALL.
+    batch_id = str(uuid.uuid4())
+    task_registry.add_task(batch_id, f"RESYNC: {len(tickers)} tickers")
+    with span("resync", tickers_count=len(tickers)):
+        batch = etl_pipeline.start(batch_id, tickers, 3, batch_size or settings.PIPELINE_BATCH_SIZE, force=force,
+                                   trace_context=trace_carrier(), profile=profile)
+    if batch["submitted"]:
+        task_registry.update_task(batch_id, status=f"♻️ Queued {batch['submitted']} tickers", progress=0, state="PENDING")
+    else:
+        task_registry.update_task(batch_id, status="✅ Already queued", progress=100, state="SUCCESS")
     
-    return {"task_id": task.id, "tickers_count": len(tickers)}
+    return {"task_id": batch_id, "tickers_count": len(tickers), **batch}
+
+@app.get("/etl/profiles")
+def etl_profiles(limit: int = Query(20, ge=1, le=200), admin: User = Depends(get_current_admin)):
+    """Последние профилированные запуски: wall/CPU, число тикеров, статус"""
+    return list_profiles(limit)
+
+@app.get("/etl/profiles/{task_id}")
+def etl_profile(task_id: str, admin: User = Depends(get_current_admin)):
+    """Отчет запуска + сравнение стадий с предыдущим успешным запуском того же масштаба"""
+    found = get_profile(task_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    previous = found["previous"]
+    return {**found["report"], "previous_task_id": previous["task_id"] if previous else None,
+            "comparison": compare_stages(found["report"], previous)}
+
+@app.get("/etl/quality")
+def etl_quality(ticker: Optional[str] = None, limit: int = Query(100, ge=1, le=1000),
+                admin: User = Depends(get_current_admin)):
+    """Отчет качества: completeness/брак по (ticker, interval) и худшие дни"""
+    return quality_summary(ticker.upper() if ticker else None, limit)
+
+@app.post("/etl/quality/repair")
+def etl_quality_repair(tickers: Optional[List[str]] = None, admin: User = Depends(get_current_admin)):
+    """Докачка только дней с пропусками (по умолчанию - всех тикеров отчета)"""
+    result = celery_app.send_task(REPAIR_GAPS_TASK, args=[[t.upper() for t in tickers] if tickers else None], queue=BULK)
+    return {"task_id": result.id}
+
 # --- WebSocket ---
 @app.websocket("/ws/tasks")
 async def websocket_endpoint(websocket: WebSocket):
@@ -245,6 +546,18 @@ async def websocket_endpoint(websocket: WebSocket):
             await asyncio.sleep(0.5)
     except: pass
 
+
+@app.websocket("/ws/live/{ticker}")
+async def websocket_live(websocket: WebSocket, ticker: str, interval: str = "1m"):
+    """Живые бары из Redis Stream (пишет src/ingestion/live.py). Batch Gold позже их перезапишет."""
+    await websocket.accept()
+    try:
+        async for bar in live_stream.subscribe(ticker, interval):
+            bar["sent_at"] = time.time()
+            await websocket.send_json(bar)
+    except WebSocketDisconnect:
+        pass
+
 # File: src/api/app.py (Добавь этот кусок)
 
 @app.get("/tasks")
@@ -1,4 +1,7 @@
 # File: src/api/auth.py
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -7,6 +10,10 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 
+from src.config import settings
+from src.api.users import user_directory
+from src.telemetry import AUTH_HASH_REJECTED, AUTH_HASH_SECONDS
+
 SECRET_KEY = "super_secret_moex_key_change_me_in_prod"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
@@ -14,9 +21,14 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Хеш случайного пароля: вход с несуществующим именем тоже платит один bcrypt,
+# иначе по времени ответа видно, какие имена зарегистрированы
+DUMMY_HASH = "$2b$12$qiuTWUbB9RvmHDxHczhgjuQYQTldjCFoHIiuXNHbClgX6CFlkQ0h6"
+
 class User(BaseModel):
     username: str
     role: str
+    id: Optional[int] = None
 
 class Token(BaseModel):
     access_token: str
@@ -30,6 +42,43 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+class HashPool:
+    """
+    bcrypt вне event loop: ограниченный пул потоков (bcrypt отпускает GIL на время хеширования).
+    Сверх max_pending ожидающих запрос сразу получает 503 - всплеск логинов не копит
+    очередь на минуты и не отнимает CPU у остальных эндпоинтов.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def run(self, operation: str, fn, *args):
+        if self.pending >= self.max_pending:
+            AUTH_HASH_REJECTED.labels(operation).inc()
+            raise HTTPException(status_code=503, detail="Authentication is busy, retry later",
+                                headers={"Retry-After": "1"})
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            AUTH_HASH_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+hash_pool = HashPool(settings.AUTH_HASH_WORKERS, settings.AUTH_HASH_MAX_PENDING)
+
+async def verify_password_async(plain_password, hashed_password: Optional[str]) -> bool:
+    ok = await hash_pool.run("verify", verify_password, plain_password, hashed_password or DUMMY_HASH)
+    return ok and hashed_password is not None
+
+async def get_password_hash_async(password) -> str:
+    return await hash_pool.run("hash", get_password_hash, password)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -46,11 +95,18 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         role: str = payload.get("role")
+        uid: Optional[int] = payload.get("uid")
         if username is None:
             raise credentials_exception
-        return User(username=username, role=role)
     except JWTError:
         raise credentials_exception
+    if uid is None:
+        # Токен, выданный до uid в JWT: id из кэша справочника
+        record = await user_directory.resolve(username)
+        if record is None:
+            raise credentials_exception
+        uid = record.id
+    return User(username=username, role=role, id=uid)
 
 async def get_current_admin(user: User = Depends(get_current_user)):
     if user.role != "admin":
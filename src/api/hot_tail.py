@@ -0,0 +1,256 @@
+# File: src/api/hot_tail.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+
+BASE_COLUMNS = ["open", "high", "low", "close", "volume", "sma_20", "rsi_14"]
+
+Columns = Dict[str, np.ndarray]  # "ts" (datetime64[ns]) + float64 колонки
+Loader = Callable[[List[str], str, int], Dict[str, Columns]]  # (tickers, interval, limit) -> {ticker: columns}
+
+
+class TailBuffer:
+    """
+    Последние `capacity` баров одной пары (ticker, interval) в колоночных numpy-массивах.
+    Массивы выделены на capacity + capacity/4 и пишутся подряд; при заполнении хвост копируется
+    в начало (амортизированно O(1) на бар: копия раз в capacity/4 баров), поэтому tail() -
+    непрерывный срез без склейки. Память пары - length * 8 байт на колонку (ts, BASE_COLUMNS и индикаторы).
+    """
+
+    def __init__(self, capacity: int, columns: Columns):
+        self.capacity = capacity
+        self.length = capacity + max(1, capacity // 4)
+        n = min(len(columns["ts"]), capacity)
+        self.size = n
+        self.ts = np.empty(self.length, dtype="datetime64[ns]")
+        self.ts[:n] = columns["ts"][-n:] if n else columns["ts"][:0]
+        self.values: Dict[str, np.ndarray] = {}
+        for name, arr in columns.items():
+            if name != "ts":
+                self._add_column(name)
+                self.values[name][:n] = arr[-n:] if n else arr[:0]
+        for name in BASE_COLUMNS:
+            if name not in self.values: self._add_column(name)
+
+    def _add_column(self, name: str):
+        self.values[name] = np.full(self.length, np.nan)
+
+    @property
+    def last_ts(self) -> Optional[np.datetime64]:
+        return self.ts[self.size - 1] if self.size else None
+
+    def append(self, bar: dict):
+        """Бар с тем же ts, что и последний, заменяет его (незакрытая свеча); более старые игнорируются"""
+        ts = np.datetime64(bar["ts"], "ns")
+        last = self.last_ts
+        if last is not None and ts < last:
+            return
+        if last is None or ts > last:
+            if self.size == self.length:
+                self._compact()
+            self.size += 1
+        i = self.size - 1
+        self.ts[i] = ts
+        # Слот мог хранить бар до _compact или прежнюю версию свечи: колонки, которых нет в баре, - NaN
+        for arr in self.values.values():
+            arr[i] = np.nan
+        for name in BASE_COLUMNS:
+            value = bar.get(name)
+            self.values[name][i] = np.nan if value is None else value
+        for name, value in (bar.get("indicators") or {}).items():
+            if name not in self.values: self._add_column(name)
+            self.values[name][i] = np.nan if value is None else value
+
+    def _compact(self):
+        keep = self.capacity - 1
+        self.ts[:keep] = self.ts[self.size - keep:self.size]
+        for arr in self.values.values():
+            arr[:keep] = arr[self.size - keep:self.size]
+        self.size = keep
+
+    def tail(self, limit: int) -> Columns:
+        lo = max(0, self.size - limit, self.size - self.capacity)
+        out = {"ts": self.ts[lo:self.size].copy()}
+        out.update({name: arr[lo:self.size].copy() for name, arr in self.values.items()})
+        return out
+
+
+class HotTailStore:
+    """
+    Горячий хвост /metrics в памяти процесса API: LRU по парам (ticker, interval).
+    Буфер грузится из Gold один раз на версию данных (task_registry data_version растет
+    после каждого ETL) и дописывается live-стримом. Запросы глубже capacity идут в БД.
+    """
+
+    def __init__(self, loader: Loader, version_fn: Callable[[], int], capacity: int = 5000,
+                 max_series: int = 256, version_ttl: float = 1.0):
+        self.loader = loader
+        self.version_fn = version_fn
+        self.capacity = capacity
+        self.max_series = max_series
+        self.version_ttl = version_ttl
+        self._buffers = OrderedDict()  # (ticker, interval) -> (version, TailBuffer)
+        self._key_locks: Dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._version = (0, 0.0)  # (version, checked_at)
+
+    def data_version(self) -> int:
+        version, checked_at = self._version
+        if time.monotonic() - checked_at < self.version_ttl:
+            return version
+        try:
+            version = self.version_fn()
+        except Exception:
+            pass  # Redis недоступен - живем с последней известной версией
+        self._version = (version, time.monotonic())
+        return version
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, ticker: str, interval: str, limit: int) -> Optional[Columns]:
+        """Последние `limit` баров или None, если запрос не помещается в хвост (нужна БД)"""
+        if limit > self.capacity:
+            return None
+        key, version = (ticker.upper(), interval), self.data_version()
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._buffers.get(key)
+                if entry and entry[0] == version:
+                    self._buffers.move_to_end(key)
+                    return entry[1].tail(limit)
+
+            columns = self.loader([key[0]], interval, self.capacity).get(key[0]) or rows_to_columns([])
+            with self._lock:
+                return self._install(key, version, TailBuffer(self.capacity, columns)).tail(limit)
+
+    def get_many(self, tickers: List[str], interval: str, limit: int) -> Optional[Dict[str, Columns]]:
+        """Как get() для списка тикеров: промахи грузятся одним запросом к БД"""
+        if limit > self.capacity:
+            return None
+        version = self.data_version()
+        out, missing = {}, []
+        with self._lock:
+            for ticker in dict.fromkeys(t.upper() for t in tickers):
+                entry = self._buffers.get((ticker, interval))
+                if entry and entry[0] == version:
+                    self._buffers.move_to_end((ticker, interval))
+                    out[ticker] = entry[1].tail(limit)
+                else:
+                    missing.append(ticker)
+
+        if missing:
+            loaded = self.loader(missing, interval, self.capacity)
+            with self._lock:
+                for ticker in missing:
+                    buf = TailBuffer(self.capacity, loaded.get(ticker) or rows_to_columns([]))
+                    out[ticker] = self._install((ticker, interval), version, buf).tail(limit)
+        return out
+
+    def _install(self, key, version: int, buf: TailBuffer) -> TailBuffer:
+        # Live-бары новее последней строки Gold переживают перезагрузку буфера
+        old = self._buffers.get(key)
+        if old and buf.last_ts is not None:
+            _carry_over(old[1], buf)
+        self._buffers[key] = (version, buf)
+        self._buffers.move_to_end(key)
+        while len(self._buffers) > self.max_series:
+            old_key, _ = self._buffers.popitem(last=False)
+            self._key_locks.pop(old_key, None)
+        return buf
+
+    def append(self, ticker: str, interval: str, bars: List[dict]):
+        """Бары live-стрима дописываются только в уже загруженные буферы"""
+        with self._lock:
+            entry = self._buffers.get((ticker.upper(), interval))
+            if entry:
+                for bar in bars:
+                    entry[1].append(bar)
+
+
+def _carry_over(old: TailBuffer, new: TailBuffer):
+    for i in np.nonzero(old.ts[:old.size] > new.last_ts)[0]:
+        values = {name: (None if np.isnan(arr[i]) else float(arr[i])) for name, arr in old.values.items()}
+        bar = {name: values.pop(name) for name in BASE_COLUMNS}
+        new.append({**bar, "ts": old.ts[i], "indicators": values})
+
+
+def rows_to_columns(rows: list) -> Columns:
+    """Строки stock_metrics (ts, open, ..., rsi_14, indicators) по возрастанию ts -> колонки"""
+    columns: Columns = {"ts": np.array([r["ts"] for r in rows], dtype="datetime64[ns]")}
+    for name in BASE_COLUMNS:
+        columns[name] = np.array([r[name] for r in rows], dtype=float)
+    extras = sorted({k for r in rows for k in (r.get("indicators") or {})})
+    for name in extras:
+        columns[name] = np.array([(r.get("indicators") or {}).get(name) for r in rows], dtype=float)
+    return columns
+
+
+def align(series: Dict[str, Columns], fields: List[str]) -> Columns:
+    """
+    Ряды нескольких тикеров на общей оси ts (объединение меток): колонки "TICKER.field",
+    пропуски - NaN. Сравнение 50 тикеров одним ответом вместо 50 запросов.
+    """
+    stamps = [c["ts"] for c in series.values() if len(c["ts"])]
+    ts = np.unique(np.concatenate(stamps)) if stamps else np.array([], dtype="datetime64[ns]")
+    out: Columns = {"ts": ts}
+    for ticker, columns in series.items():
+        pos = np.searchsorted(ts, columns["ts"])
+        for field in fields:
+            arr = np.full(len(ts), np.nan)
+            if field in columns:
+                arr[pos] = columns[field]
+            out[f"{ticker}.{field}"] = arr
+    return out
+
+
+def concat_columns(parts: List[Columns]) -> Columns:
+    """Склейка кусков одного ряда по времени (холодный Silver + горячий Gold); нет колонки в куске - NaN"""
+    parts = [p for p in parts if len(p["ts"])] or parts[:1] or [rows_to_columns([])]
+    if len(parts) == 1:
+        return parts[0]
+    names = list(dict.fromkeys(name for p in parts for name in p if name != "ts"))
+    out: Columns = {"ts": np.concatenate([p["ts"] for p in parts])}
+    for name in names:
+        out[name] = np.concatenate([p[name] if name in p else np.full(len(p["ts"]), np.nan) for p in parts])
+    return out
+
+
+# --- Форматы ответа ---
+def to_records(columns: Columns, ticker: str, interval: str) -> list:
+    """Прежний формат /metrics: список объектов, индикаторы - вложенный dict без null"""
+    ts = np.datetime_as_string(columns["ts"], unit="s").tolist()
+    base = {name: _nan_to_none(columns[name]) for name in BASE_COLUMNS}
+    extras = {name: columns[name] for name in columns if name != "ts" and name not in BASE_COLUMNS}
+    records = []
+    for i in range(len(ts)):
+        rec = {"ticker": ticker, "interval": interval, "ts": ts[i]}
+        rec.update({name: col[i] for name, col in base.items()})
+        rec["indicators"] = {name: float(col[i]) for name, col in extras.items() if not np.isnan(col[i])}
+        records.append(rec)
+    return records
+
+
+def to_columnar(columns: Columns, **meta) -> dict:
+    """{"ts": [...], "close": [...], ...} - без повторения ключей на каждую строку"""
+    out = {**meta, "ts": np.datetime_as_string(columns["ts"], unit="s").tolist()}
+    out.update({name: _nan_to_none(arr) for name, arr in columns.items() if name != "ts"})
+    return out
+
+
+def to_arrow_ipc(columns: Columns) -> bytes:
+    table = pa.table({name: pa.array(arr, from_pandas=True) for name, arr in columns.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _nan_to_none(arr: np.ndarray) -> list:
+    values = arr.tolist()
+    return [None if v != v else v for v in values]  # NaN != NaN
@@ -0,0 +1,113 @@
+# File: src/api/users.py
+"""
+Справочник пользователей API на asyncpg: вход и регистрация не держат event loop на psycopg2,
+а username -> (id, role) кэшируется в процессе (LRU с TTL).
+
+id пишется в JWT (uid), поэтому графики берут его из токена без запроса к users; кэш обслуживает
+токены без uid (выданные раньше) и обновляется при каждом входе. Хеш пароля не кэшируется -
+вход всегда сверяется с БД. Смена роли или удаление в другом процессе видны через TTL,
+в этом - сразу после invalidate().
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, NamedTuple, Optional, Tuple
+
+from src.config import settings
+
+
+class UserRecord(NamedTuple):
+    id: int
+    username: str
+    role: str
+
+
+def create_pool():
+    import asyncpg  # только в API и только при первом входе
+
+    return asyncpg.create_pool(
+        host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT,
+        user=settings.POSTGRES_USER, password=settings.POSTGRES_PASSWORD,
+        database=settings.POSTGRES_DB, min_size=1, max_size=settings.AUTH_DB_POOL_SIZE,
+    )
+
+
+class UserDirectory:
+    def __init__(self, connect: Callable[[], Awaitable] = create_pool, ttl: float = 300.0, max_size: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.connect = connect
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self._pool = None
+        self._pool_lock: Optional[asyncio.Lock] = None
+        self._cache: "OrderedDict[str, Tuple[float, UserRecord]]" = OrderedDict()
+
+    async def pool(self):
+        if self._pool is None:
+            if self._pool_lock is None:
+                self._pool_lock = asyncio.Lock()
+            async with self._pool_lock:
+                if self._pool is None:
+                    self._pool = await self.connect()
+        return self._pool
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    # --- Кэш ---
+    def _remember(self, record: UserRecord) -> UserRecord:
+        self._cache[record.username] = (self.clock(), record)
+        self._cache.move_to_end(record.username)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return record
+
+    def cached(self, username: str) -> Optional[UserRecord]:
+        entry = self._cache.get(username)
+        if entry is None or self.clock() - entry[0] > self.ttl:
+            return None
+        self._cache.move_to_end(username)
+        return entry[1]
+
+    def invalidate(self, username: Optional[str] = None):
+        if username is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(username, None)
+
+    # --- Запросы ---
+    async def credentials(self, username: str) -> Optional[Tuple[UserRecord, str]]:
+        """(пользователь, хеш пароля) для входа - всегда из БД; заодно освежает кэш"""
+        pool = await self.pool()
+        row = await pool.fetchrow("SELECT id, username, role, password_hash FROM users WHERE username = $1", username)
+        if row is None:
+            self.invalidate(username)
+            return None
+        return self._remember(UserRecord(row["id"], row["username"], row["role"])), row["password_hash"]
+
+    async def resolve(self, username: str) -> Optional[UserRecord]:
+        record = self.cached(username)
+        if record is not None:
+            return record
+        pool = await self.pool()
+        row = await pool.fetchrow("SELECT id, username, role FROM users WHERE username = $1", username)
+        if row is None:
+            self.invalidate(username)
+            return None
+        return self._remember(UserRecord(row["id"], row["username"], row["role"]))
+
+    async def create(self, username: str, password_hash: str, role: str = "user") -> Optional[UserRecord]:
+        """None - имя уже занято (UNIQUE в users, без гонки между проверкой и вставкой)"""
+        pool = await self.pool()
+        row = await pool.fetchrow("""
+            INSERT INTO users (username, password_hash, role) VALUES ($1, $2, $3)
+            ON CONFLICT (username) DO NOTHING
+            RETURNING id, username, role
+        """, username, password_hash, role)
+        return self._remember(UserRecord(row["id"], row["username"], row["role"])) if row else None
+
+
+user_directory = UserDirectory(ttl=settings.AUTH_USER_CACHE_TTL)
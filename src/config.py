@@ -1,6 +1,7 @@
 # File: src/config.py
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # MinIO
@@ -10,6 +11,14 @@ class Settings(BaseSettings):
     
     MINIO_BUCKET_RAW: str = "raw-data"       # Bronze
     MINIO_BUCKET_SILVER: str = "silver-data" # New! Silver Layer (Parquet)
+    MINIO_BUCKET_EXPORTS: str = "exports"    # Фоновые выгрузки (CSV/Parquet по presigned URL)
+    # Чанк Bronze без маркера .done, записанный до чекпоинтов, считается полным (src/ingestion/checkpoints.py).
+    # BRONZE_TRUST_LEGACY=false - перекачать такие чанки (могли быть сохранены оборванными)
+    BRONZE_TRUST_LEGACY: bool = Field(True, alias="BRONZE_TRUST_LEGACY")
+    EXPORT_URL_TTL: int = Field(3600, alias="EXPORT_URL_TTL")  # сек жизни presigned URL
+    # Кэш листингов Bronze (src/storage/inventory.py) и параллельных PUT пакета объектов
+    MINIO_INVENTORY_TTL: float = Field(300.0, alias="MINIO_INVENTORY_TTL")
+    MINIO_UPLOAD_CONCURRENCY: int = Field(16, alias="MINIO_UPLOAD_CONCURRENCY")
     
     # Postgres
     POSTGRES_USER: str = Field("admin", alias="POSTGRES_USER")
@@ -17,9 +26,81 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = Field("moex_dw", alias="POSTGRES_DB")
     POSTGRES_HOST: str = Field("postgres", alias="POSTGRES_HOST")
     POSTGRES_PORT: int = 5432
+    # Streaming-реплики для чтений API (src/storage/db.py): "host[:port],..."; пусто - все на primary
+    POSTGRES_REPLICAS: str = Field("", alias="POSTGRES_REPLICAS")
+    REPLICA_MAX_LAG_SECONDS: float = Field(5.0, alias="REPLICA_MAX_LAG_SECONDS")
+    REPLICA_CHECK_SECONDS: float = Field(5.0, alias="REPLICA_CHECK_SECONDS")
+    # Gold swap ждет реплики (не дольше GOLD_REPLICA_WAIT_SECONDS) до сигнала о новой версии данных
+    GOLD_WAIT_FOR_REPLICAS: bool = Field(False, alias="GOLD_WAIT_FOR_REPLICAS")
+    GOLD_REPLICA_WAIT_SECONDS: float = Field(30.0, alias="GOLD_REPLICA_WAIT_SECONDS")
+
+    # MOEX ISS (переопределяется на локальный фейковый сервер в бенчмарках)
+    MOEX_ISS_URL: str = Field("https://iss.moex.com/iss", alias="MOEX_ISS_URL")
+
+    # Redis (брокер Celery, реестр задач, live-стримы)
+    REDIS_URL: str = Field("redis://redis:6379/0", alias="CELERY_BROKER_URL")
+
+    # Live-стриминг минуток: тикеры через запятую и период опроса ISS
+    LIVE_WATCHLIST: str = Field("SBER,GAZP,LKOH", alias="LIVE_WATCHLIST")
+    LIVE_POLL_SECONDS: float = Field(5.0, alias="LIVE_POLL_SECONDS")
+
+    # Горячий хвост /metrics в памяти API: баров на (ticker, interval) и число пар в LRU.
+    # Пара занимает ~1.25 * HOT_TAIL_BARS * 8 байт на колонку (ts + 7 базовых + индикаторы, ~15):
+    # по умолчанию ~0.75 МБ, до ~95 МБ на процесс API при полном LRU
+    HOT_TAIL_BARS: int = Field(5000, alias="HOT_TAIL_BARS")
+    HOT_TAIL_MAX_SERIES: int = Field(128, alias="HOT_TAIL_MAX_SERIES")
+
+    # Аутентификация (src/api/auth.py, src/api/users.py): потоки bcrypt и предел ожидающих в очереди
+    # (сверх него /token отвечает 503), пул asyncpg и TTL кэша username -> (id, role)
+    AUTH_HASH_WORKERS: int = Field(4, alias="AUTH_HASH_WORKERS")
+    AUTH_HASH_MAX_PENDING: int = Field(64, alias="AUTH_HASH_MAX_PENDING")
+    AUTH_DB_POOL_SIZE: int = Field(10, alias="AUTH_DB_POOL_SIZE")
+    AUTH_USER_CACHE_TTL: float = Field(300.0, alias="AUTH_USER_CACHE_TTL")
+
+    # Инкрементальное обновление по расписанию (celery beat): минутки в сессию, дневки после закрытия
+    ETL_UNIVERSE: str = Field("SBER,GAZP,LKOH,IMOEX", alias="ETL_UNIVERSE")
+    REFRESH_INTRADAY_MINUTES: int = Field(5, alias="REFRESH_INTRADAY_MINUTES")
+    REFRESH_EOD_HOUR: int = Field(19, alias="REFRESH_EOD_HOUR")  # МСК
+    REFRESH_EOD_MINUTE: int = Field(0, alias="REFRESH_EOD_MINUTE")
+
+    # Качество данных (src/processing/quality.py, src/ingestion/gaps.py): день с долей минуток сессии
+    # ниже порога докачивается (не больше DQ_MAX_REPAIRS раз и DQ_REPAIR_MAX_RANGES диапазонов за проход)
+    DQ_MIN_COMPLETENESS: float = Field(0.95, alias="DQ_MIN_COMPLETENESS")
+    DQ_MAX_REPAIRS: int = Field(2, alias="DQ_MAX_REPAIRS")
+    DQ_REPAIR_MAX_RANGES: int = Field(200, alias="DQ_REPAIR_MAX_RANGES")
+
+    # Конвейер resync (src/worker/pipeline.py): тикеров на один Spark-прогон и потоков загрузки на тикер
+    PIPELINE_BATCH_SIZE: int = Field(20, alias="PIPELINE_BATCH_SIZE")
+    PIPELINE_INGEST_THREADS: int = Field(6, alias="PIPELINE_INGEST_THREADS")
+
+    # Профилирование ETL: ETL_PROFILE=true профилирует каждый запуск (иначе только по запросу profile=true)
+    ETL_PROFILE: bool = Field(False, alias="ETL_PROFILE")
+    PROFILE_SAMPLE_MS: float = Field(10.0, alias="PROFILE_SAMPLE_MS")
 
     # Spark
     SPARK_MASTER_URL: str = Field("spark://spark-master:7077", alias="SPARK_MASTER_URL")
+    # Автонастройка по объему входа (src/processing/tuning.py): ядра кластера до старта сессии,
+    # потолки памяти (не больше SPARK_WORKER_MEMORY воркера) и одновременных JDBC-соединений записи Gold
+    SPARK_PARALLELISM: int = Field(4, alias="SPARK_PARALLELISM")
+    SPARK_MAX_DRIVER_MEMORY: str = Field("2g", alias="SPARK_MAX_DRIVER_MEMORY")
+    SPARK_MAX_EXECUTOR_MEMORY: str = Field("2g", alias="SPARK_MAX_EXECUTOR_MEMORY")
+    SPARK_JDBC_MAX_WRITERS: int = Field(4, alias="SPARK_JDBC_MAX_WRITERS")
+
+    # Gold: реестр индикаторов (JSON-список), None -> DEFAULT_INDICATORS
+    # Пример: GOLD_INDICATORS='[{"name": "ema_50", "kind": "ema", "params": {"window": 50}}]'
+    GOLD_INDICATORS: Optional[List[dict]] = Field(None, alias="GOLD_INDICATORS")
+
+    # Уровни хранения (src/storage/tiers.py): интервалы GOLD_COLD_INTERVALS старше GOLD_HOT_DAYS дней
+    # только в Silver Parquet (API читает их через pyarrow), в Postgres - горячее окно. 0 - все в Postgres
+    GOLD_HOT_DAYS: int = Field(365, alias="GOLD_HOT_DAYS")
+    GOLD_COLD_INTERVALS: str = Field("1m", alias="GOLD_COLD_INTERVALS")
+
+    # Полная перезаливка Gold через теневую таблицу (src/storage/gold_swap.py): переименование ждет
+    # блокировку не дольше GOLD_SWAP_LOCK_TIMEOUT_MS (читатели за ним не копятся), прошлый срез хранится для отката
+    GOLD_SWAP_LOCK_TIMEOUT_MS: int = Field(500, alias="GOLD_SWAP_LOCK_TIMEOUT_MS")
+    GOLD_SWAP_LOCK_RETRIES: int = Field(10, alias="GOLD_SWAP_LOCK_RETRIES")
+    GOLD_SWAP_KEEP_OLD_HOURS: float = Field(6.0, alias="GOLD_SWAP_KEEP_OLD_HOURS")
+    GOLD_SWAP_MAINTENANCE_WORK_MEM: str = Field("256MB", alias="GOLD_SWAP_MAINTENANCE_WORK_MEM")
 
     # Pydantic V2 Config
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
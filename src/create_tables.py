@@ -50,6 +50,102 @@ def run_migration():
             );
         """)
         
+        # 2.1 GOLD: миграции без пересоздания stock_metrics (данные не трогаем)
+        print("📈 Migrating Gold schema...")
+        cur.execute("ALTER TABLE IF EXISTS stock_metrics ADD COLUMN IF NOT EXISTS indicators JSONB;")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS indicator_state (
+                ticker TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                state JSONB NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (ticker, interval)
+            );
+        """)
+
+        # Отчеты профилирования ETL (opt-in, src/profiling.py)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS etl_run_profiles (
+                task_id TEXT PRIMARY KEY,
+                started_at TIMESTAMP NOT NULL,
+                status TEXT NOT NULL,
+                tickers_count INTEGER NOT NULL,
+                wall_s DOUBLE PRECISION,
+                cpu_s DOUBLE PRECISION,
+                report JSONB NOT NULL
+            );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_etl_run_profiles_started ON etl_run_profiles(started_at DESC);")
+
+        # Отчет качества Bronze -> Silver по дням (src/processing/quality.py) и попытки докачки пропусков
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS data_quality (
+                ticker TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                day DATE NOT NULL,
+                rows INTEGER NOT NULL,
+                session_rows INTEGER NOT NULL,
+                expected INTEGER,
+                completeness DOUBLE PRECISION NOT NULL,
+                bad_ohlc INTEGER NOT NULL DEFAULT 0,
+                zero_volume INTEGER NOT NULL DEFAULT 0,
+                first_ts TIMESTAMP,
+                last_ts TIMESTAMP,
+                repair_attempts INTEGER NOT NULL DEFAULT 0,
+                checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (ticker, interval, day)
+            );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_data_quality_gaps ON data_quality(ticker, interval, day) WHERE completeness < 1;")
+
+        # Манифест Bronze: Silver/Gold пересчитываются только для тикеров с измененными объектами
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS bronze_manifest (
+                path TEXT PRIMARY KEY,
+                ticker TEXT NOT NULL,
+                etag TEXT NOT NULL,
+                size BIGINT NOT NULL,
+                rows INTEGER,
+                processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_bronze_manifest_ticker ON bronze_manifest(ticker);")
+
+        # Последний бар по (ticker, interval) для /screener и водяных знаков (stock_metrics создает init.sql).
+        # Таблица, а не materialized view: merge Gold обновляет только пары из staging, без пересчета всей таблицы
+        cur.execute("SELECT to_regclass('public.stock_metrics')")
+        if cur.fetchone()[0] is not None:
+            for suffix in ("", "_shadow", "_old"):
+                cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (f"public.stock_latest{suffix}",))
+                row = cur.fetchone()
+                if row and row[0] == "m":
+                    cur.execute(f"DROP MATERIALIZED VIEW stock_latest{suffix}")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stock_latest (
+                    ticker TEXT NOT NULL,
+                    interval TEXT NOT NULL,
+                    ts TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                    open DOUBLE PRECISION,
+                    high DOUBLE PRECISION,
+                    low DOUBLE PRECISION,
+                    close DOUBLE PRECISION,
+                    volume DOUBLE PRECISION,
+                    sma_20 DOUBLE PRECISION,
+                    rsi_14 DOUBLE PRECISION,
+                    indicators JSONB
+                );
+            """)
+            cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_stock_latest_pk ON stock_latest(ticker, interval);")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_stock_latest_interval ON stock_latest(interval);")
+            cur.execute("""
+                INSERT INTO stock_latest
+                SELECT DISTINCT ON (ticker, interval)
+                    ticker, interval, ts, open, high, low, close, volume, sma_20, rsi_14, indicators
+                FROM stock_metrics
+                ORDER BY ticker, interval, ts DESC
+                ON CONFLICT (ticker, interval) DO NOTHING;
+            """)
+
         # 3. СОЗДАНИЕ ПОЛЬЗОВАТЕЛЕЙ
         print("👤 Creating users...")
         # Генерируем хеши "здесь и сейчас", чтобы они точно работали
@@ -1,8 +1,8 @@
 # File: src/dashboard/app.py
 import logging
-import requests
 import pandas as pd
 import json
+import time
 import traceback
 import textwrap
 from dash import Dash, dcc, html, Input, Output, State, ALL, callback_context, no_update
@@ -12,16 +12,30 @@ import dash_ace
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
+import plotly.io as pio
+import pyarrow as pa
+from flask import Response, abort, send_file, stream_with_context
+from src.dashboard.sandbox import sandbox_pool, read_table, SandboxError
+from src.dashboard.result_cache import result_cache
+from src.dashboard.data_cache import DatasetCache
 
 # --- CONFIG ---
 API_URL = "http://127.0.0.1:8000"
 WS_URL = "ws://127.0.0.1:8000/ws/tasks" # URL для вебсокета
+WS_LIVE_URL = "ws://127.0.0.1:8000/ws/live/{ticker}" # живые минутки из Redis Stream
+LIVE_BARS = 240  # сколько последних минуток держим на live-графике
 
 import werkzeug
 werkzeug_log = logging.getLogger('werkzeug')
 werkzeug_log.setLevel(logging.ERROR)
 werkzeug_log.disabled = True
 
+# Больше точек - рисуем линии через WebGL (Scattergl), SVG на таких объемах тормозит
+WEBGL_THRESHOLD = 1000
+
+# Интервалы Gold: базовые (1m/1d) + роллапы, которые Spark материализует в stock_metrics
+INTERVALS = [("1m", "1m"), ("5m", "5m"), ("15m", "15m"), ("1h", "1h"), ("Daily", "1d"), ("Weekly", "1w"), ("Monthly", "1mo")]
+
 # --- PRESETS ---
 PRESETS = {
     "simple": {
@@ -57,6 +71,10 @@ PRESETS = {
 
 app = Dash(__name__, external_stylesheets=[dbc.themes.DARKLY], suppress_callback_exceptions=True)
 
+# Общий кэш датасетов + пул соединений к API для всех колбэков
+data_cache = DatasetCache(API_URL)
+api = data_cache.session
+
 # --- HELPER ---
 def get_auth_header(token_store):
     if not token_store: return {}
@@ -64,7 +82,7 @@ def get_auth_header(token_store):
 
 def fetch_tickers():
     try:
-        resp = requests.get(f"{API_URL}/tickers", timeout=1)
+        resp = api.get(f"{API_URL}/tickers", timeout=1)
         return resp.json() if resp.status_code == 200 else []
     except:
         return []
@@ -121,6 +139,11 @@ def dashboard_layout(username, role):
                     dbc.Button("Queue Task", id='etl-btn', color="primary")
                 ]),
                 dbc.Button("♻️ Restore / Resync All", id='restore-btn', color="warning", outline=True, size="sm", className="mt-3 w-100"),
+                dbc.Checkbox(id='profile-check', label="Profile next run (stage timings)", value=False, className="mt-2 small text-muted"),
+                dbc.Modal([
+                    dbc.ModalHeader(dbc.ModalTitle(id='profile-title')),
+                    dbc.ModalBody(id='profile-body'),
+                ], id='profile-modal', size="xl", is_open=False, scrollable=True),
                 
                 # Сюда будут падать задачи
                 dbc.Collapse(html.Div(id='task-queue-container', className="mt-3"), id="task-collapse", is_open=True)
@@ -137,11 +160,12 @@ def dashboard_layout(username, role):
     return dbc.Container([
         # ВЕРНУЛИ WebSocket (только здесь, внутри dashboard)
         WebSocket(id="ws", url=WS_URL),
+        WebSocket(id="ws-live"),
         
         dcc.Store(id='task-store', data=[]),
+        dcc.Store(id='live-store', data=[]),
         dcc.Store(id='sandbox-data-store'), 
         dcc.Download(id="download-raw-csv"),
-        dcc.Download(id="download-sandbox-csv"),
 
         dbc.Row([
             dbc.Col(html.H2("MOEX Enterprise Analytics Platform", className="text-light fw-bold"), width=8),
@@ -160,10 +184,14 @@ def dashboard_layout(username, role):
                         html.Label("Select Asset:", className="text-muted small"),
                         dcc.Dropdown(id='ticker-dropdown', placeholder="Choose ticker...", className="text-dark mb-2"),
                         dbc.Row([
-                            dbc.Col(dbc.RadioItems(id="interval-selector", options=[{"label": "Daily", "value": "1d"}, {"label": "Minute", "value": "1m"}], value="1d", inline=True, className="text-light mt-1"), width=7),
-                            dbc.Col(dbc.Button("Download Raw CSV", id="btn-download-raw", color="success", size="sm", outline=True, className="w-100"), width=5)
+                            dbc.Col(dbc.RadioItems(id="interval-selector", options=[{"label": l, "value": v} for l, v in INTERVALS], value="1d", inline=True, className="text-light mt-1"), width=7),
+                            dbc.Col(dbc.ButtonGroup([
+                                dbc.Button("Raw CSV", id="btn-download-raw", color="success", size="sm", outline=True),
+                                dbc.Button("Full History", id="btn-export-full", color="success", size="sm", outline=True, external_link=True, disabled=True)
+                            ], size="sm", className="w-100"), width=5)
                         ]),
-                        dbc.Button("🔄 Refresh List", id='refresh-btn', color="secondary", size="sm", className="w-100 mt-2")
+                        dbc.Button("🔄 Refresh List", id='refresh-btn', color="secondary", size="sm", className="w-100 mt-2"),
+                        dbc.Switch(id="live-switch", label="Live 1m stream", value=False, className="text-light mt-2")
                     ])
                 ], className="h-100 border-secondary")
             ], width=12, md=4),
@@ -171,6 +199,10 @@ def dashboard_layout(username, role):
         ], className="mb-4 g-4"),
 
         # ... остальной код (графики, песочница) без изменений ...
+        dbc.Collapse(dbc.Row([dbc.Col([dbc.Card([
+            dbc.CardHeader([html.Span("🔴 Live", className="fw-bold me-2"), html.Span(id="live-latency", className="badge bg-secondary")]),
+            dbc.CardBody(dcc.Graph(id='live-chart', style={'height': '300px'}))
+        ], className="border-secondary bg-dark shadow")], width=12)], className="mb-4"), id="live-collapse", is_open=False),
         dbc.Row([dbc.Col([dbc.Card([dbc.CardBody(dcc.Loading(id="loading-main", type="circle", children=dcc.Graph(id='main-chart', style={'height': '60vh'})))], className="border-secondary bg-dark shadow")], width=12)], className="mb-5"),
         dbc.Row([dbc.Col(html.Hr(className="text-secondary"), width=12), dbc.Col(html.H3("🛠 Custom Analytics Sandbox", className="text-center text-info mb-4"), width=12)]),
         dbc.Row([
@@ -204,7 +236,10 @@ def dashboard_layout(username, role):
                     dbc.CardHeader([
                         dbc.Row([
                             dbc.Col([html.Span("Result", className="fw-bold me-2"), html.Span(id="dataset-info", className="badge bg-info text-dark")], width=8, className="pt-1"),
-                            dbc.Col(dbc.Button("💾 Download Result", id="btn-download-sandbox", color="light", size="sm", className="w-100"), width=4)
+                            dbc.Col(dbc.ButtonGroup([
+                                dbc.Button("💾 CSV", id="btn-download-sandbox", color="light", size="sm", external_link=True, disabled=True),
+                                dbc.Button("Parquet", id="btn-download-sandbox-parquet", color="light", size="sm", outline=True, external_link=True, disabled=True)
+                            ], size="sm", className="w-100"), width=4)
                         ])
                     ], className="bg-secondary text-white"),
                     dbc.CardBody([dcc.Loading(type="cube", children=[html.Div(id='code-error-output'), dcc.Graph(id='custom-chart', style={'height': '400px'}), html.Div(id='data-preview', className="mt-2 small text-muted font-monospace")])])
@@ -227,7 +262,7 @@ app.layout = html.Div([
 def login(n, username, password):
     if not username or not password: return no_update, "Enter credentials"
     try:
-        resp = requests.post(f"{API_URL}/token", data={"username": username, "password": password})
+        resp = api.post(f"{API_URL}/token", data={"username": username, "password": password})
         if resp.status_code == 200: return resp.json(), ""
         else: return None, "Invalid username or password"
     except: return None, "Server error (Check API)"
@@ -236,7 +271,7 @@ def login(n, username, password):
 def register(n, username, password):
     if not username or not password: return "Fill all fields"
     try:
-        resp = requests.post(f"{API_URL}/register", json={"username": username, "password": password})
+        resp = api.post(f"{API_URL}/register", json={"username": username, "password": password})
         if resp.status_code == 201: return "✅ Success! Please switch to Login tab."
         elif resp.status_code == 400: return "⚠️ Username already taken"
         else: return "❌ Error occurred"
@@ -262,21 +297,21 @@ def toggle_collapse(n, is_open):
     if n: return not is_open, "Show Details" if is_open else "Hide Details"
     return is_open, "Hide Details"
 
-@app.callback(Output('new-ticker-input', 'value'), Input('etl-btn', 'n_clicks'), [State('new-ticker-input', 'value'), State('auth-token', 'data')], prevent_initial_call=True)
-def queue_task(n, t, token):
-    if t and token: requests.post(f"{API_URL}/etl/run", json={"tickers": [t.upper().strip()]}, headers=get_auth_header(token))
+@app.callback(Output('new-ticker-input', 'value'), Input('etl-btn', 'n_clicks'), [State('new-ticker-input', 'value'), State('profile-check', 'value'), State('auth-token', 'data')], prevent_initial_call=True)
+def queue_task(n, t, profile, token):
+    if t and token: api.post(f"{API_URL}/etl/run", json={"tickers": [t.upper().strip()], "profile": bool(profile)}, headers=get_auth_header(token))
     return ""
 
-@app.callback(Output('new-ticker-input', 'placeholder'), Input('restore-btn', 'n_clicks'), State('auth-token', 'data'), prevent_initial_call=True)
-def restore_db(n, token):
-    if n and token: requests.post(f"{API_URL}/etl/resync", headers=get_auth_header(token))
+@app.callback(Output('new-ticker-input', 'placeholder'), Input('restore-btn', 'n_clicks'), [State('profile-check', 'value'), State('auth-token', 'data')], prevent_initial_call=True)
+def restore_db(n, profile, token):
+    if n and token: api.post(f"{API_URL}/etl/resync", params={"profile": bool(profile)}, headers=get_auth_header(token))
     return no_update
 
 @app.callback(Output('task-queue-container', 'className'), Input({'type': 'cancel-btn', 'index': ALL}, 'n_clicks'), State('auth-token', 'data'), prevent_initial_call=True)
 def cancel_task(n, token):
     ctx = callback_context
     if ctx.triggered and ctx.triggered[0]['value'] and token:
-        try: requests.post(f"{API_URL}/etl/cancel/{json.loads(ctx.triggered[0]['prop_id'].split('.')[0])['index']}", headers=get_auth_header(token))
+        try: api.post(f"{API_URL}/etl/cancel/{json.loads(ctx.triggered[0]['prop_id'].split('.')[0])['index']}", headers=get_auth_header(token))
         except: pass
     return no_update
 
@@ -291,6 +326,8 @@ def update_queue(msg):
         color = "warning" if st == 'PENDING' else "info" if st in ['RUNNING', 'PROGRESS'] else "success" if st == 'SUCCESS' else "danger"
         animated = st in ['PENDING', 'RUNNING', 'PROGRESS']
         cancel_btn = dbc.Button("✖", id={'type': 'cancel-btn', 'index': task['id']}, color="link", n_clicks=0, className="text-danger p-0 ms-2 text-decoration-none fw-bold") if animated else None
+        if not animated and (task.get('result') or {}).get('profile'):
+            cancel_btn = dbc.Button("📊", id={'type': 'profile-btn', 'index': task['id']}, color="link", n_clicks=0, className="p-0 ms-2 text-decoration-none", title="Stage profile")
         
         children.append(dbc.Card([
             dbc.CardBody([
@@ -308,6 +345,53 @@ def update_queue(msg):
         if len(children) >= 5: break
     return children
 
+# --- ПРОФИЛЬ ЗАПУСКА ETL ---
+def profile_view(report):
+    """Таблица стадий с изменением к прошлому запуску, график wall/CPU, горячие функции и медленные чанки"""
+    rows = pd.DataFrame(report.get('comparison', []))
+    if rows.empty:
+        return html.P("No stages recorded.", className="text-muted")
+    fig = go.Figure(layout=go.Layout(template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', barmode='group', height=320, margin=dict(l=40, r=20, t=10, b=40)))
+    fig.add_trace(go.Bar(x=rows['stage'], y=rows['wall_s'], name='wall, s'))
+    fig.add_trace(go.Bar(x=rows['stage'], y=rows['cpu_s'], name='cpu, s'))
+    if rows['prev_wall_s'].notna().any():
+        fig.add_trace(go.Bar(x=rows['stage'], y=rows['prev_wall_s'], name='prev wall, s', opacity=0.5))
+
+    stages = rows[['stage', 'calls', 'wall_s', 'cpu_s', 'max_wall_s', 'prev_wall_s']].copy()
+    stages['change'] = rows['change'].map(lambda c: "" if pd.isna(c) else f"{c:+.0%}")
+    python = report.get('python') or {}
+    blocks = [
+        html.P(f"{report['status']} · wall {report['wall_s']:.1f}s · cpu {report['cpu_s']:.1f}s · {len(report.get('tickers', []))} tickers"
+               + (f" · vs {report['previous_task_id'][:8]}" if report.get('previous_task_id') else ""), className="text-muted"),
+        dcc.Graph(figure=fig, config={'displayModeBar': False}),
+        dbc.Table.from_dataframe(stages, striped=True, bordered=True, hover=True, size='sm', color='dark'),
+    ]
+    if report.get('slowest'):
+        blocks += [html.H6("🐢 Slowest items"), dbc.Table.from_dataframe(pd.DataFrame(report['slowest']), size='sm', color='dark')]
+    if python.get('top_cumulative'):
+        blocks += [html.H6(f"🐍 Python samples ({python['samples']} @ {python['interval_ms']} ms)"),
+                   dbc.Table.from_dataframe(pd.DataFrame(python['top_cumulative'][:15]), size='sm', color='dark')]
+    if report.get('spark_stages'):
+        spark = pd.DataFrame(report['spark_stages']).groupby('stage')[['num_tasks', 'failed_tasks']].sum().reset_index()
+        blocks += [html.H6("⚡ Spark stages"), dbc.Table.from_dataframe(spark, size='sm', color='dark')]
+    return blocks
+
+@app.callback([Output('profile-modal', 'is_open'), Output('profile-title', 'children'), Output('profile-body', 'children')],
+              Input({'type': 'profile-btn', 'index': ALL}, 'n_clicks'), State('auth-token', 'data'), prevent_initial_call=True)
+def show_profile(n, token):
+    ctx = callback_context
+    # Панель задач перерисовывается по WebSocket: новые кнопки приходят с n_clicks=0
+    if not ctx.triggered or not ctx.triggered[0]['value'] or not token:
+        return no_update, no_update, no_update
+    task_id = json.loads(ctx.triggered[0]['prop_id'].split('.')[0])['index']
+    try:
+        resp = api.get(f"{API_URL}/etl/profiles/{task_id}", headers=get_auth_header(token), timeout=5)
+        if resp.status_code != 200:
+            return True, "📊 Profile", html.P(f"Profile unavailable ({resp.status_code})", className="text-danger")
+        return True, f"📊 Profile {task_id[:8]}", profile_view(resp.json())
+    except Exception as e:
+        return True, "📊 Profile", html.P(str(e), className="text-danger")
+
 # 3. DATA & AUTO REFRESH
 # Обновляем выпадающий список тикеров, когда приходит сообщение от WebSocket (задача завершилась)
 @app.callback(Output('ticker-dropdown', 'options'), [Input('refresh-btn', 'n_clicks'), Input('ws', 'message'), Input('url', 'pathname')])
@@ -316,11 +400,11 @@ def update_dd(n, msg, p): return [{'label': t, 'value': t} for t in fetch_ticker
 # Остальные колбэки (графики, песочница) без изменений
 @app.callback([Output('interval-selector', 'options'), Output('interval-selector', 'value')], [Input('ticker-dropdown', 'value')], [State('interval-selector', 'value')])
 def update_int(t, v):
-    d = [{"label": "Daily", "value": "1d", "disabled": True}, {"label": "Minute", "value": "1m", "disabled": True}]
+    d = [{"label": l, "value": i, "disabled": True} for l, i in INTERVALS]
     if not t: return d, "1d"
     try:
-        a = requests.get(f"{API_URL}/availability/{t}").json()
-        opts = [{"label": "Daily", "value": "1d", "disabled": not a.get('1d')}, {"label": "Minute", "value": "1m", "disabled": not a.get('1m')}]
+        a = data_cache.availability(t)
+        opts = [{"label": l, "value": i, "disabled": not a.get(i)} for l, i in INTERVALS]
         val = v if a.get(v) else ('1d' if a.get('1d') else '1m')
         return opts, val
     except: return d, "1d"
@@ -330,24 +414,55 @@ def main_chart(t, i):
     empty = go.Figure(layout=go.Layout(template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', xaxis={'visible': False}, yaxis={'visible': False}))
     if not t: return empty
     try:
-        d = requests.get(f"{API_URL}/metrics/{t}?interval={i}").json()
-        df = pd.DataFrame(d)
-        df['ts'] = pd.to_datetime(df['ts'])
+        df = data_cache.get_frame(t, i)
+        if df.empty: return empty
+        line = go.Scattergl if len(df) > WEBGL_THRESHOLD else go.Scatter
         fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.05, row_heights=[0.6, 0.2, 0.2])
         fig.add_trace(go.Candlestick(x=df['ts'], open=df['open'], high=df['high'], low=df['low'], close=df['close'], name='OHLC'), row=1, col=1)
-        fig.add_trace(go.Scatter(x=df['ts'], y=df['sma_20'], line=dict(color='yellow'), name='SMA20'), row=1, col=1)
+        fig.add_trace(line(x=df['ts'], y=df['sma_20'], line=dict(color='yellow'), name='SMA20'), row=1, col=1)
         fig.add_trace(go.Bar(x=df['ts'], y=df['volume'], marker_color='teal', name='Vol'), row=2, col=1)
-        fig.add_trace(go.Scatter(x=df['ts'], y=df['rsi_14'], line=dict(color='purple'), name='RSI'), row=3, col=1)
+        fig.add_trace(line(x=df['ts'], y=df['rsi_14'], line=dict(color='purple'), name='RSI'), row=3, col=1)
         fig.update_layout(template="plotly_dark", xaxis_rangeslider_visible=False, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', margin=dict(l=40, r=40, t=10, b=10), height=600)
         return fig
     except: return empty
 
+# --- LIVE STREAM ---
+@app.callback([Output('ws-live', 'url'), Output('live-collapse', 'is_open'), Output('live-store', 'data', allow_duplicate=True)],
+              [Input('ticker-dropdown', 'value'), Input('live-switch', 'value')], prevent_initial_call=True)
+def toggle_live(t, on):
+    # Смена url переподключает WebSocket; API сначала присылает хвост стрима, затем новые бары
+    if not t or not on: return None, False, []
+    return WS_LIVE_URL.format(ticker=t.upper()), True, []
+
+@app.callback([Output('live-store', 'data'), Output('live-latency', 'children')], Input('ws-live', 'message'), State('live-store', 'data'), prevent_initial_call=True)
+def on_live_bar(msg, bars):
+    if not msg or not msg.get('data'): return no_update, no_update
+    bar = json.loads(msg['data'])
+    bars = [b for b in (bars or []) if b['ts'] != bar['ts']]  # незакрытая минутка приходит повторно - заменяем
+    bars = sorted(bars + [bar], key=lambda b: b['ts'])[-LIVE_BARS:]
+    latency = time.time() - bar['fetched_at']
+    return bars, f"ISS → browser {latency * 1000:.0f} ms"
+
+@app.callback(Output('live-chart', 'figure'), Input('live-store', 'data'))
+def live_chart(bars):
+    fig = go.Figure(layout=go.Layout(template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', margin=dict(l=40, r=40, t=10, b=10), xaxis_rangeslider_visible=False))
+    if not bars: return fig
+    df = pd.DataFrame(bars)
+    fig.add_trace(go.Candlestick(x=df['ts'], open=df['open'], high=df['high'], low=df['low'], close=df['close'], name='OHLC'))
+    fig.add_trace(go.Scatter(x=df['ts'], y=df['sma_20'], line=dict(color='yellow'), name='SMA20'))
+    return fig
+
+# Полная история - потоковая выгрузка API (/export), без лимита в 5000 баров
+@app.callback([Output('btn-export-full', 'href'), Output('btn-export-full', 'disabled')], [Input('ticker-dropdown', 'value'), Input('interval-selector', 'value')])
+def update_export_link(t, i):
+    if not t: return None, True
+    return f"{API_URL}/export?tickers={t}&interval={i}&format=csv", False
+
 @app.callback(Output("download-raw-csv", "data"), Input("btn-download-raw", "n_clicks"), [State('ticker-dropdown', 'value'), State('interval-selector', 'value')], prevent_initial_call=True)
 def download_raw_csv(n, ticker, interval):
     if not ticker: return no_update
     try:
-        url = f"{API_URL}/metrics/{ticker}?interval={interval}"
-        df = pd.DataFrame(requests.get(url).json())
+        df = data_cache.get_frame(ticker, interval)
         return dcc.send_data_frame(df.to_csv, f"{ticker}_{interval}_raw.csv", index=False)
     except: return no_update
 
@@ -355,7 +470,7 @@ def download_raw_csv(n, ticker, interval):
 def update_my_charts(p, n, token):
     if not token: return []
     try:
-        resp = requests.get(f"{API_URL}/charts", headers=get_auth_header(token))
+        resp = api.get(f"{API_URL}/charts", headers=get_auth_header(token))
         if resp.status_code == 200: return [{'label': c['name'], 'value': c['code']} for c in resp.json()]
     except: pass
     return []
@@ -373,7 +488,7 @@ def load_code(preset, chart_code):
 def save_chart_action(n, name, code, token):
     if not name or not token: return "💾 Save"
     try:
-        requests.post(f"{API_URL}/charts", json={"name": name, "code": code}, headers=get_auth_header(token))
+        api.post(f"{API_URL}/charts", json={"name": name, "code": code}, headers=get_auth_header(token))
         return "✅ Saved!"
     except: return "❌ Error"
 
@@ -382,30 +497,46 @@ def run_custom_code(n, code, ticker, interval):
     empty = go.Figure(layout=go.Layout(template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)'))
     if not ticker: return empty, dbc.Alert("⚠️ Please select a ticker first.", color="warning"), "No Data", "", None
     try:
-        resp = requests.get(f"{API_URL}/metrics/{ticker}?interval={interval}")
-        data = resp.json()
-        if not data: return empty, dbc.Alert(f"❌ No data for {ticker}.", color="danger"), "0 rows", "", None
-        df = pd.DataFrame(data)
-        df['ts'] = pd.to_datetime(df['ts'])
-        for c in ['open', 'close', 'high', 'low', 'volume', 'sma_20', 'rsi_14']: df[c] = pd.to_numeric(df[c], errors='coerce')
-        local_env = {'df': df, 'pd': pd, 'go': go, 'px': px, 'make_subplots': make_subplots}
-        exec(code, {}, local_env)
-        if 'custom_plot' not in local_env: return empty, dbc.Alert("Error: Function 'custom_plot' missing.", color="danger"), "", "", None
-        fig = local_env['custom_plot'](df)
+        # Тот же датасет, что уже скачан для основного графика (повторный Run не ходит в API)
+        df = data_cache.get_frame(ticker, interval)
+        if df.empty: return empty, dbc.Alert(f"❌ No data for {ticker}.", color="danger"), "0 rows", "", None
+        # Код пользователя выполняется в отдельном процессе пула (лимиты CPU/памяти и таймаут),
+        # а не в потоке Dash-сервера
+        result = sandbox_pool.run(code, df)
+        if result.error: return empty, dbc.Alert(html.Pre(result.error), color="danger"), "Error", "", None
+        fig = pio.from_json(result.figure)
         fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
-        info_str = f"{len(df)} rows | {len(df.columns)} cols"
-        preview_table = dbc.Table.from_dataframe(df.head(3), striped=True, bordered=True, hover=True, size='sm', color='dark')
-        json_data = df.to_json(date_format='iso', orient='split')
-        return fig, "", info_str, preview_table, json_data
+        # Результат остается на сервере (Parquet в result_cache), в браузер уходит только run_id
+        table = read_table(result.data) if result.data else pa.Table.from_pandas(df, preserve_index=False)
+        run_id = result_cache.put(table, label=ticker)
+        info_str = f"{table.num_rows} rows | {table.num_columns} cols"
+        preview_table = dbc.Table.from_dataframe(table.slice(0, 3).to_pandas(), striped=True, bordered=True, hover=True, size='sm', color='dark')
+        return fig, "", info_str, preview_table, {"run_id": run_id, "rows": table.num_rows}
+    except SandboxError as e: return empty, dbc.Alert(f"⏱ {e}", color="warning"), "Error", "", None
     except Exception: return empty, dbc.Alert(html.Pre(traceback.format_exc()), color="danger"), "Error", "", None
 
-@app.callback(Output("download-sandbox-csv", "data"), Input("btn-download-sandbox", "n_clicks"), [State('sandbox-data-store', 'data'), State('ticker-dropdown', 'value')], prevent_initial_call=True)
-def download_sandbox_csv(n, json_data, ticker):
-    if not json_data: return no_update
-    try:
-        df = pd.read_json(json_data, orient='split')
-        return dcc.send_data_frame(df.to_csv, f"{ticker}_analysis_result.csv", index=False)
-    except: return no_update
+@app.callback([Output("btn-download-sandbox", "href"), Output("btn-download-sandbox", "disabled"),
+               Output("btn-download-sandbox-parquet", "href"), Output("btn-download-sandbox-parquet", "disabled")],
+              Input('sandbox-data-store', 'data'))
+def update_sandbox_links(handle):
+    if not handle: return None, True, None, True
+    base = f"/sandbox/results/{handle['run_id']}"
+    return f"{base}.csv", False, f"{base}.parquet", False
+
+# --- SANDBOX RESULT EXPORT (стрим прямо из серверного кэша, минуя dcc.Store) ---
+@app.server.route("/sandbox/results/<run_id>.<fmt>")
+def download_sandbox_result(run_id, fmt):
+    entry = result_cache.get(run_id)
+    if not entry: abort(404)
+    filename = f"{entry.label}_analysis_result.{fmt}"
+    if fmt == "parquet":
+        return send_file(entry.path, mimetype="application/octet-stream", as_attachment=True, download_name=filename)
+    if fmt == "csv":
+        stream = result_cache.iter_csv(run_id)
+        if stream is None: abort(404)
+        return Response(stream_with_context(stream), mimetype="text/csv",
+                        headers={"Content-Disposition": f"attachment; filename={filename}"})
+    abort(404)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8050, debug=True)
\ No newline at end of file
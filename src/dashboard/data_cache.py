@@ -0,0 +1,110 @@
+# File: src/dashboard/data_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import requests
+from requests.adapters import HTTPAdapter
+
+NUMERIC_COLUMNS = ['open', 'close', 'high', 'low', 'volume', 'sma_20', 'rsi_14']
+
+
+def get_api_session(pool_size: int = 16) -> requests.Session:
+    """Одна keep-alive сессия на процесс дашборда вместо нового TCP-соединения на каждый запрос"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def prepare_frame(data: list) -> pd.DataFrame:
+    """JSON /metrics -> DataFrame с типами и развернутыми индикаторами (парсим один раз на датасет)"""
+    df = pd.DataFrame(data)
+    if df.empty:
+        return df
+    df['ts'] = pd.to_datetime(df['ts'])
+    for c in NUMERIC_COLUMNS: df[c] = pd.to_numeric(df[c], errors='coerce')
+    # Индикаторы из JSONB (ema_12, macd, bb_upper, atr_14, vwap, ...) -> обычные колонки
+    if 'indicators' in df: df = df.join(pd.DataFrame([x or {} for x in df.pop('indicators')], index=df.index))
+    return df
+
+
+def read_arrow_frame(content: bytes, ticker: str, interval: str) -> pd.DataFrame:
+    """/metrics?format=arrow -> DataFrame: колонки уже типизированы, индикаторы уже развернуты"""
+    df = pa.ipc.open_stream(content).read_all().to_pandas()
+    if df.empty:
+        return pd.DataFrame()
+    df.insert(0, 'ticker', ticker)
+    df.insert(1, 'interval', interval)
+    return df
+
+
+class DatasetCache:
+    """
+    Кэш датасетов /metrics для всех колбэков дашборда (график, песочница, выгрузка CSV).
+    Ключ: (ticker, interval, limit, data_version). data_version меняется после каждого
+    успешного ETL, поэтому старые записи просто перестают запрашиваться и вытесняются LRU.
+    Параллельные колбэки на один ключ ждут один и тот же запрос (single-flight).
+    Возвращаемые DataFrame общие - их нельзя мутировать, только копировать.
+    """
+
+    def __init__(self, api_url: str, max_items: int = 32, version_ttl: float = 2.0):
+        self.api_url = api_url
+        self.session = get_api_session()
+        self.max_items = max_items
+        self.version_ttl = version_ttl
+        self._frames = OrderedDict()
+        self._availability: Dict[Tuple[str, int], dict] = {}
+        self._key_locks: Dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._version = (0, 0.0)  # (version, checked_at)
+
+    def data_version(self) -> int:
+        version, checked_at = self._version
+        if time.monotonic() - checked_at < self.version_ttl:
+            return version
+        try:
+            version = self.session.get(f"{self.api_url}/data/version", timeout=1).json()["version"]
+        except Exception:
+            pass  # API недоступен - работаем с последней известной версией
+        self._version = (version, time.monotonic())
+        return version
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get_frame(self, ticker: str, interval: str, limit: int = 5000) -> pd.DataFrame:
+        key = (ticker.upper(), interval, limit, self.data_version())
+        with self._key_lock(key):
+            with self._lock:
+                if key in self._frames:
+                    self._frames.move_to_end(key)
+                    return self._frames[key]
+
+            resp = self.session.get(f"{self.api_url}/metrics/{ticker}", params={"interval": interval, "limit": limit, "format": "arrow"}, timeout=30)
+            resp.raise_for_status()
+            if resp.headers.get("content-type", "").startswith("application/vnd.apache.arrow"):
+                df = read_arrow_frame(resp.content, key[0], interval)
+            else:
+                df = prepare_frame(resp.json())  # ошибка API отдает []
+
+            with self._lock:
+                self._frames[key] = df
+                while len(self._frames) > self.max_items:
+                    old_key, _ = self._frames.popitem(last=False)
+                    self._key_locks.pop(old_key, None)
+            return df
+
+    def availability(self, ticker: str) -> dict:
+        key = (ticker.upper(), self.data_version())
+        if key not in self._availability:
+            resp = self.session.get(f"{self.api_url}/availability/{ticker}", timeout=5)
+            resp.raise_for_status()
+            if len(self._availability) > 256: self._availability.clear()
+            self._availability[key] = resp.json()
+        return self._availability[key]
@@ -0,0 +1,128 @@
+# File: src/dashboard/result_cache.py
+import atexit
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# --- CONFIG ---
+RESULT_CACHE_DIR = os.getenv("SANDBOX_RESULT_DIR", os.path.join(tempfile.gettempdir(), "moex_sandbox_results"))
+RESULT_CACHE_MAX_ITEMS = int(os.getenv("SANDBOX_RESULT_MAX_ITEMS", "64"))
+RESULT_CACHE_MAX_MB = int(os.getenv("SANDBOX_RESULT_MAX_MB", "1024"))
+RESULT_CACHE_TTL = int(os.getenv("SANDBOX_RESULT_TTL", "3600"))  # сек
+
+RUN_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+@dataclass
+class CachedResult:
+    path: str
+    size: int
+    label: str
+    rows: int
+    created: float
+
+
+class ResultCache:
+    """
+    Серверный кэш результатов песочницы: Parquet-файлы во временной папке, ключ - run_id.
+    В браузер (dcc.Store) уходит только run_id, выгрузка CSV/Parquet читает файл с диска.
+    Вытеснение: LRU по числу записей и суммарному размеру + TTL.
+    root общий для процессов хоста: каждый экземпляр пишет в свою подпапку (mkdtemp), удаляемую
+    при выходе; папки и файлы, не менявшиеся дольше TTL (упавшие процессы), удаляются при старте.
+    """
+
+    def __init__(self, root: str = RESULT_CACHE_DIR, max_items: int = RESULT_CACHE_MAX_ITEMS,
+                 max_mb: int = RESULT_CACHE_MAX_MB, ttl: int = RESULT_CACHE_TTL):
+        self.max_items = max_items
+        self.max_bytes = max_mb * 1024 * 1024
+        self.ttl = ttl
+        self._entries = OrderedDict()  # run_id -> CachedResult
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._sweep(root)
+        # Индекс живет в памяти процесса: чужие файлы ему не нужны, а свои никто другой не удаляет
+        self.root = tempfile.mkdtemp(prefix="cache-", dir=root)
+        atexit.register(shutil.rmtree, self.root, True)
+
+    def _sweep(self, root: str):
+        """Остатки процессов, завершившихся без atexit: все их записи уже старше TTL"""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+            except OSError:
+                pass  # удалил параллельно стартующий процесс
+
+    def put(self, table: pa.Table, label: str = "result") -> str:
+        run_id = uuid.uuid4().hex
+        path = os.path.join(self.root, f"{run_id}.parquet")
+        # Папку простаивавшего дольше TTL процесса мог удалить _sweep соседа (все ее записи уже истекли)
+        os.makedirs(self.root, exist_ok=True)
+        pq.write_table(table, path, compression="snappy")
+        entry = CachedResult(path=path, size=os.path.getsize(path), label=label, rows=table.num_rows, created=time.time())
+        with self._lock:
+            self._entries[run_id] = entry
+            self._evict()
+        return run_id
+
+    def get(self, run_id: str) -> Optional[CachedResult]:
+        if not run_id or not RUN_ID_RE.match(run_id):
+            return None
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(run_id)
+            if entry:
+                self._entries.move_to_end(run_id)
+            return entry
+
+    def iter_csv(self, run_id: str, batch_rows: int = 50_000) -> Optional[Iterator[bytes]]:
+        """CSV по батчам Parquet: память не зависит от размера результата"""
+        entry = self.get(run_id)
+        if not entry:
+            return None
+        # Файл открываем сразу: даже если запись вытеснят во время выгрузки, дескриптор останется валидным
+        parquet = pq.ParquetFile(entry.path)
+
+        def generate():
+            for i, batch in enumerate(parquet.iter_batches(batch_size=batch_rows)):
+                buf = io.BytesIO()
+                pa_csv.write_csv(batch, buf, pa_csv.WriteOptions(include_header=(i == 0)))
+                yield buf.getvalue()
+        return generate()
+
+    def _evict(self):
+        now = time.time()
+        expired = [k for k, e in self._entries.items() if now - e.created > self.ttl]
+        for key in expired:
+            self._remove(key)
+        while self._entries and (len(self._entries) > self.max_items or
+                                 sum(e.size for e in self._entries.values()) > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, run_id: str):
+        entry = self._entries.pop(run_id)
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+result_cache = ResultCache()
@@ -0,0 +1,194 @@
+# File: src/dashboard/sandbox.py
+import os
+import queue
+import resource
+import threading
+import traceback
+import multiprocessing as mp
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import plotly.graph_objects as go
+import plotly.express as px
+from plotly.subplots import make_subplots
+
+# --- CONFIG ---
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))          # пре-форкнутые процессы
+SANDBOX_QUEUE_SIZE = int(os.getenv("SANDBOX_QUEUE_SIZE", "4"))    # сколько задач может ждать свободного воркера
+SANDBOX_TIMEOUT = float(os.getenv("SANDBOX_TIMEOUT", "30"))       # wall-clock на одну задачу, сек
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "20")) # CPU-время на одну задачу, сек
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "1024"))   # память пользовательского кода сверх базовой
+
+
+class SandboxError(Exception):
+    pass
+
+class SandboxBusy(SandboxError):
+    pass
+
+class SandboxTimeout(SandboxError):
+    pass
+
+class SandboxCrashed(SandboxError):
+    pass
+
+
+@dataclass
+class SandboxResult:
+    figure: Optional[str] = None   # plotly JSON
+    data: Optional[bytes] = None   # Arrow IPC: df после custom_plot (для выгрузки результата)
+    error: Optional[str] = None    # traceback пользовательского кода
+
+
+# --- Arrow transport ---
+def to_arrow(df: pd.DataFrame) -> bytes:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def read_table(payload: bytes) -> pa.Table:
+    return pa.ipc.open_stream(payload).read_all()
+
+def from_arrow(payload: bytes) -> pd.DataFrame:
+    return read_table(payload).to_pandas()
+
+
+# --- Worker process ---
+def _address_space_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[0]) * resource.getpagesize()
+
+def _set_limits(memory_mb: int):
+    # Лимит адресного пространства: то, что уже занято импортами pandas/plotly + бюджет задачи
+    if memory_mb:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (_address_space_bytes() + memory_mb * 1024 * 1024, hard))
+
+def _set_cpu_budget(cpu_seconds: int):
+    # RLIMIT_CPU считается на процесс целиком, поэтому двигаем мягкий лимит перед каждой задачей.
+    # При превышении ядро шлет SIGXCPU и процесс умирает - пул пересоздаст воркер.
+    if cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (int(usage.ru_utime + usage.ru_stime) + cpu_seconds, hard))
+
+def _run_job(code: str, payload: bytes):
+    df = from_arrow(payload)
+    local_env = {'df': df, 'pd': pd, 'np': np, 'go': go, 'px': px, 'make_subplots': make_subplots}
+    exec(code, {}, local_env)
+    if 'custom_plot' not in local_env:
+        return ("error", "Error: Function 'custom_plot' missing.")
+    fig = local_env['custom_plot'](df)
+    try:
+        data = to_arrow(df)
+    except Exception:
+        data = None  # пользователь положил в df что-то, что не сериализуется в Arrow
+    return ("ok", fig.to_json(), data)
+
+def _worker_main(conn, cpu_seconds: int, memory_mb: int):
+    _set_limits(memory_mb)
+    while True:
+        try:
+            code, payload = conn.recv()
+        except (EOFError, OSError):
+            return
+        _set_cpu_budget(cpu_seconds)
+        try:
+            reply = _run_job(code, payload)
+        except MemoryError:
+            reply = ("error", "MemoryError: sandbox memory limit exceeded")
+        except Exception:
+            reply = ("error", traceback.format_exc())
+        conn.send(reply)
+
+
+# --- Pool ---
+class _Worker:
+    def __init__(self, ctx, cpu_seconds: int, memory_mb: int):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, cpu_seconds, memory_mb), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Пул процессов для пользовательского кода дашборда.
+    Колбэк Dash только ждет ответа в пайпе, поэтому тяжелый или зависший custom_plot
+    не блокирует сервер для остальных пользователей. Зависшие и упавшие воркеры
+    убиваются и пересоздаются.
+    """
+
+    def __init__(self, workers: int = SANDBOX_WORKERS, queue_size: int = SANDBOX_QUEUE_SIZE,
+                 timeout: float = SANDBOX_TIMEOUT, cpu_seconds: int = SANDBOX_CPU_SECONDS,
+                 memory_mb: int = SANDBOX_MEMORY_MB):
+        self.workers = workers
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self._ctx = mp.get_context("forkserver")
+        # Воркеры форкаются из forkserver, в котором pandas/plotly уже импортированы
+        self._ctx.set_forkserver_preload([__name__])
+        self._idle = queue.Queue()
+        self._slots = threading.BoundedSemaphore(workers + queue_size)  # backpressure
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._ctx, self.cpu_seconds, self.memory_mb)
+
+    def _ensure_started(self):
+        with self._lock:
+            if not self._started:
+                for _ in range(self.workers):
+                    self._idle.put(self._spawn())
+                self._started = True
+
+    def run(self, code: str, df: pd.DataFrame) -> SandboxResult:
+        self._ensure_started()
+        if not self._slots.acquire(blocking=False):
+            raise SandboxBusy("Sandbox is busy, please retry in a few seconds.")
+        try:
+            try:
+                worker = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise SandboxBusy("Timed out waiting for a free sandbox worker.")
+
+            try:
+                worker.conn.send((code, to_arrow(df)))
+                if not worker.conn.poll(self.timeout):
+                    worker.kill()
+                    worker = self._spawn()
+                    raise SandboxTimeout(f"Execution exceeded {self.timeout:.0f}s and was terminated.")
+                status, *reply = worker.conn.recv()
+            except (EOFError, OSError):
+                worker.kill()
+                worker = self._spawn()
+                raise SandboxCrashed("Sandbox process was killed (CPU or memory limit exceeded).")
+            finally:
+                self._idle.put(worker)
+        finally:
+            self._slots.release()
+
+        if status == "error":
+            return SandboxResult(error=reply[0])
+        return SandboxResult(figure=reply[0], data=reply[1])
+
+    def shutdown(self):
+        with self._lock:
+            while not self._idle.empty():
+                self._idle.get_nowait().kill()
+            self._started = False
+
+
+sandbox_pool = SandboxPool()
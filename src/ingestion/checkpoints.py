@@ -0,0 +1,74 @@
+# File: src/ingestion/checkpoints.py
+"""
+Чекпоинты постраничной загрузки чанков Bronze (download_chunk в src/ingestion/moex.py).
+
+    SBER/1m/2024/01.json.part/0000000.page  - полные страницы ISS (по 500 свечей) по start_index
+    SBER/1m/2024/01.json                    - чанк целиком, пишется только после полной пагинации
+    SBER/1m/2024/01.json.done               - маркер: период закрыт, чанк больше не качается
+
+Оборванная загрузка продолжается с последней сохраненной страницы, а не с начала месяца.
+Чанк незакрытого периода (текущий месяц/год) сохраняется без маркера и с флагом .part/open:
+следующий запуск докачивает его с последней полной страницы. Spark читает только *.json,
+поэтому страницы и маркеры в Silver не попадают.
+"""
+from typing import List, Tuple
+
+PAGE_SUFFIX = ".page"
+OPEN_FLAG = "open"
+
+
+def part_dir(path: str) -> str:
+    return f"{path}.part"
+
+
+def done_path(path: str) -> str:
+    return f"{path}.done"
+
+
+def page_path(path: str, start_index: int) -> str:
+    return f"{part_dir(path)}/{start_index:07d}{PAGE_SUFFIX}"
+
+
+class ChunkCheckpoint:
+    """storage - объект с exists/save_json/load_json/list_paths/delete (MinioClient)"""
+
+    def __init__(self, storage, path: str, trust_legacy: bool = True):
+        self.storage = storage
+        self.path = path
+        # Чанк, записанный до появления маркеров (json без .done и без .part), считается полным
+        self.trust_legacy = trust_legacy
+
+    def is_done(self) -> bool:
+        if self.storage.exists(done_path(self.path)):
+            return True
+        return (self.trust_legacy and self.storage.exists(self.path)
+                and not self.storage.exists(part_dir(self.path)))
+
+    def resume(self) -> Tuple[int, List[dict]]:
+        """(start_index следующей страницы, уже скачанные свечи)"""
+        pages = sorted(p for p in self.storage.list_paths(part_dir(self.path)) if p.endswith(PAGE_SUFFIX))
+        rows, start_index = [], 0
+        for page in pages:
+            start = int(page.rsplit("/", 1)[-1][:-len(PAGE_SUFFIX)])
+            if start != start_index:
+                break  # дыра в страницах: дальше с нее
+            try:
+                page_rows = self.storage.load_json(page)
+            except FileNotFoundError:
+                # Страницу удалил complete() другого воркера после листинга: чанк качается заново
+                return 0, []
+            rows.extend(page_rows)
+            start_index += len(page_rows)
+        return start_index, rows
+
+    def save_page(self, start_index: int, rows: List[dict]):
+        self.storage.save_json(rows, page_path(self.path, start_index))
+
+    def complete(self, rows: List[dict], closed: bool):
+        """Чанк целиком; для закрытого периода - маркер .done и удаление страниц"""
+        self.storage.save_json(rows, self.path)
+        if closed:
+            self.storage.save_json({"rows": len(rows)}, done_path(self.path))
+            self.storage.delete(part_dir(self.path))
+        else:
+            self.storage.save_json([], f"{part_dir(self.path)}/{OPEN_FLAG}")
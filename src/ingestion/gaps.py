@@ -0,0 +1,122 @@
+# File: src/ingestion/gaps.py
+"""
+Отчет качества данных (data_quality) и планировщик точечной докачки пропусков.
+
+Отчет пишет Spark (src/processing/quality.py) на каждом Bronze -> Silver. Дни с completeness ниже
+DQ_MIN_COMPLETENESS склеиваются в диапазоны подряд идущих торговых дней, и докачиваются только они
+(repair_gaps_task), а не вся многолетняя история тикера. repair_attempts ограничивает повторы:
+у неликвидной бумаги минутки без сделок отсутствуют в ISS, и докачка их не добавит.
+"""
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Tuple
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+from src.config import settings
+from src.ingestion.watermarks import expected_watermark, previous_trading_day
+
+REPORT_COLUMNS = ("ticker", "interval", "day", "rows", "session_rows", "expected", "completeness",
+                  "bad_ohlc", "zero_volume", "first_ts", "last_ts")
+
+
+def get_db_connection():
+    return psycopg2.connect(
+        host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT,
+        user=settings.POSTGRES_USER, password=settings.POSTGRES_PASSWORD,
+        dbname=settings.POSTGRES_DB
+    )
+
+
+def save_quality_report(rows: Iterable[dict]) -> int:
+    """Upsert отчета; счетчик попыток докачки сохраняется"""
+    values = [tuple(row[c] for c in REPORT_COLUMNS) for row in rows]
+    if not values:
+        return 0
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_values(cur, f"""
+                INSERT INTO data_quality ({", ".join(REPORT_COLUMNS)}) VALUES %s
+                ON CONFLICT (ticker, interval, day) DO UPDATE SET
+                    rows = EXCLUDED.rows, session_rows = EXCLUDED.session_rows, expected = EXCLUDED.expected,
+                    completeness = EXCLUDED.completeness, bad_ohlc = EXCLUDED.bad_ohlc,
+                    zero_volume = EXCLUDED.zero_volume, first_ts = EXCLUDED.first_ts, last_ts = EXCLUDED.last_ts,
+                    checked_at = now()
+            """, values, page_size=5000)
+        conn.commit()
+    finally:
+        conn.close()
+    return len(values)
+
+
+def load_gap_days(tickers: List[str] = None) -> List[Tuple[str, str, date]]:
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT ticker, interval, day FROM data_quality
+                WHERE completeness < %s AND repair_attempts < %s AND (%s::text[] IS NULL OR ticker = ANY(%s))
+                ORDER BY ticker, interval, day
+            """, (settings.DQ_MIN_COMPLETENESS, settings.DQ_MAX_REPAIRS, tickers, tickers))
+            return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def mark_repair_attempted(ranges: List[dict]):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            for r in ranges:
+                cur.execute("""
+                    UPDATE data_quality SET repair_attempts = repair_attempts + 1
+                    WHERE ticker = %s AND interval = %s AND day = ANY(%s)
+                """, (r["ticker"], r["interval"], r["days"]))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def quality_summary(ticker: str = None, limit: int = 100) -> Dict[str, list]:
+    """Сводка по (ticker, interval) и худшие дни для API"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT ticker, interval, count(*) AS days, avg(completeness) AS avg_completeness,
+                       count(*) FILTER (WHERE completeness < %s) AS gap_days,
+                       sum(bad_ohlc) AS bad_ohlc, sum(zero_volume) AS zero_volume, max(checked_at) AS checked_at
+                FROM data_quality WHERE (%s::text IS NULL OR ticker = %s)
+                GROUP BY ticker, interval ORDER BY ticker, interval
+            """, (settings.DQ_MIN_COMPLETENESS, ticker, ticker))
+            summary = cur.fetchall()
+            cur.execute("""
+                SELECT ticker, interval, day, rows, expected, completeness, bad_ohlc, zero_volume, repair_attempts
+                FROM data_quality
+                WHERE (completeness < %s OR bad_ohlc > 0) AND (%s::text IS NULL OR ticker = %s)
+                ORDER BY completeness, day DESC LIMIT %s
+            """, (settings.DQ_MIN_COMPLETENESS, ticker, ticker, limit))
+            return {"summary": summary, "worst_days": cur.fetchall()}
+    finally:
+        conn.close()
+
+
+def plan_gap_refetch(gap_days: List[Tuple[str, str, date]], now: datetime, max_ranges: int = None) -> List[dict]:
+    """
+    [{"ticker", "interval", "start", "end", "days"}]: подряд идущие торговые дни с пропусками -
+    один запрос к ISS. Дни, сессия которых еще не закрыта, не планируются.
+    """
+    last_closed = expected_watermark("1d", now).date()
+    ranges: List[dict] = []
+    for ticker, interval, day in sorted(gap_days):
+        if day > last_closed:
+            continue
+        prev = ranges[-1] if ranges else None
+        if prev and (prev["ticker"], prev["interval"]) == (ticker, interval) \
+                and previous_trading_day(day) <= prev["end"]:
+            prev["end"] = day
+            prev["days"].append(day)
+            continue
+        ranges.append({"ticker": ticker, "interval": interval, "start": day, "end": day, "days": [day]})
+    return ranges[:max_ranges] if max_ranges else ranges
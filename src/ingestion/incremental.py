@@ -0,0 +1,60 @@
+# File: src/ingestion/incremental.py
+"""
+Инкрементальное обновление управляемого набора тикеров (ETL_UNIVERSE) по расписанию Celery beat.
+
+Для отставших тикеров (см. src/ingestion/watermarks.py) докачиваются свечи с даты водяного знака.
+Свечи пишутся в Bronze по дням (SBER/1m/2024/03/15.json) и перезаписываются при следующем проходе,
+поэтому текущий день дорастает без перекачки месячного файла. Незакрытая текущая свеча не сохраняется.
+Теми же дневными файлами закрываются пропуски из отчета качества (refetch_range).
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Optional
+
+from src.ingestion.moex import ChunkIncomplete, fetch_candles
+from src.ingestion.watermarks import is_closed, moscow_now
+from src.storage.minio_client import minio_client
+
+INTERVALS = {"1m": 1, "1d": 24}
+
+
+def day_path(ticker: str, interval: str, day: str) -> str:
+    year, month, dd = day.split("-")
+    return f"{ticker}/{interval}/{year}/{month}/{dd}.json"
+
+
+def refresh_ticker(ticker: str, interval: str, since: datetime, now: Optional[datetime] = None) -> str:
+    """Свечи с даты водяного знака -> дневные файлы Bronze; только закрытые свечи"""
+    now = now or moscow_now()
+    try:
+        rows = fetch_candles(ticker, INTERVALS[interval], since.strftime("%Y-%m-%d"), None,
+                             ticker == "IMOEX", f"{ticker} {interval} since {since:%Y-%m-%d %H:%M}")
+    except ChunkIncomplete as e:
+        # Обрезанные дни не пишутся: водяной знак не уедет за пропуск, следующий проход повторит
+        print(f"❌ {e}")
+        return f"ERROR: {ticker} {interval}"
+    since_str = since.strftime("%Y-%m-%d %H:%M:%S")
+    closed = [r for r in rows if is_closed(r, interval, now)]
+    if not any(r["begin"] > since_str for r in closed):
+        return f"CURRENT: {ticker} {interval}"
+
+    by_day = defaultdict(list)
+    for row in closed:
+        by_day[row["begin"][:10]].append(row)
+    minio_client.save_json_many({day_path(ticker, interval, day): day_rows for day, day_rows in by_day.items()})
+    return f"SUCCESS: {ticker} {interval} ({len(closed)} rows, {len(by_day)} days)"
+
+
+def refetch_range(ticker: str, interval: str, start: date, end: date) -> str:
+    """Докачка дней с пропусками (план src/ingestion/gaps.py) в дневные файлы Bronze поверх старых чанков"""
+    try:
+        rows = fetch_candles(ticker, INTERVALS[interval], start.isoformat(), end.isoformat(),
+                             ticker == "IMOEX", f"{ticker} {interval} gap {start}..{end}")
+    except ChunkIncomplete as e:
+        print(f"❌ {e}")
+        return f"ERROR: {ticker} {interval} {start}..{end}"
+    by_day = defaultdict(list)
+    for row in rows:
+        by_day[row["begin"][:10]].append(row)
+    minio_client.save_json_many({day_path(ticker, interval, day): day_rows for day, day_rows in by_day.items()})
+    return f"SUCCESS: {ticker} {interval} {start}..{end} ({len(rows)} rows)"
@@ -0,0 +1,121 @@
+# File: src/ingestion/live.py
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import psycopg2
+
+from src.config import settings
+from src.ingestion.moex import BASE_URL_INDEX, BASE_URL_SHARES, get_robust_session
+from src.ingestion.watermarks import moscow_now
+from src.processing.indicators import LEGACY_COLUMNS, compute_indicators, indicator_output_names, load_indicator_specs
+from src.storage.live_stream import live_stream
+
+
+class LivePoller:
+    """
+    Легкий поллер внутридневных минуток для watchlist.
+    Забирает свежие свечи ISS, досчитывает индикаторы инкрементально (состояние в памяти,
+    стартует с indicator_state из Gold) и публикует бары в Redis Stream.
+    Batch-путь (run_etl_task) позже перезаписывает эти бары в Gold.
+    """
+
+    def __init__(self, tickers: List[str], interval: str = "1m", session=None):
+        self.tickers = [t.upper().strip() for t in tickers if t.strip()]
+        self.interval = interval
+        self.session = session or get_robust_session()
+        self.specs = load_indicator_specs(settings.GOLD_INDICATORS)
+        self.extra_cols = [c for c in indicator_output_names(self.specs) if c not in LEGACY_COLUMNS]
+        self.states: Dict[str, Optional[dict]] = {}
+        # Последний опубликованный бар тикера: (ts, open, high, low, close, volume)
+        self.published: Dict[str, Tuple] = {}
+
+    def warm_up(self):
+        """Состояние индикаторов из последнего batch-прогона, чтобы SMA/RSI не стартовали с нуля"""
+        try:
+            conn = psycopg2.connect(
+                host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT,
+                user=settings.POSTGRES_USER, password=settings.POSTGRES_PASSWORD,
+                dbname=settings.POSTGRES_DB
+            )
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT ticker, state FROM indicator_state WHERE ticker = ANY(%s) AND interval = %s",
+                                (self.tickers, self.interval))
+                    self.states.update(dict(cur.fetchall()))
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️ [Live] Warm-up skipped: {e}")
+
+    def resume_from(self, ticker: str) -> str:
+        """
+        Начало запроса к ISS: последний закрытый бар состояния (следующие за ним пересчитываются),
+        иначе последний опубликованный, иначе начало текущего дня по Москве
+        """
+        state = self.states.get(ticker)
+        if state:
+            return pd.Timestamp(state["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+        if ticker in self.published:
+            return self.published[ticker][0].strftime("%Y-%m-%d %H:%M:%S")
+        return moscow_now().strftime("%Y-%m-%d")
+
+    def fetch(self, ticker: str) -> pd.DataFrame:
+        base_url = (BASE_URL_INDEX if ticker == "IMOEX" else BASE_URL_SHARES).format(ticker=ticker)
+        # Только свечи с последнего учтенного бара, а не весь день с start=0
+        params = {"from": self.resume_from(ticker), "interval": 1, "start": 0}
+        rows = []
+        while True:
+            data = self.session.get(base_url, params=params, timeout=10).json()
+            page = data.get("candles", {})
+            rows += [dict(zip(page["columns"], r)) for r in page.get("data", [])]
+            if len(page.get("data", [])) < 500:
+                break
+            params["start"] += 500
+        if not rows:
+            return pd.DataFrame()
+        df = pd.DataFrame(rows)
+        df["ts"] = pd.to_datetime(df["begin"])
+        return df[["ts", "open", "high", "low", "close", "volume"]]
+
+    def poll_ticker(self, ticker: str) -> List[dict]:
+        fetched_at = time.time()
+        df = self.fetch(ticker)
+        if df.empty:
+            return []
+        result, state = compute_indicators(df, self.specs, self.states.get(ticker))
+        if state is not None:
+            self.states[ticker] = state
+
+        bars = []
+        last = self.published.get(ticker)
+        for row in result.to_dict("records"):
+            key = tuple(row[c] for c in ("ts", "open", "high", "low", "close", "volume"))
+            # Уже опубликованные бары и незакрытый бар без изменений не отправляем повторно
+            if last is not None and (key[0] < last[0] or key == last):
+                continue
+            bar = {k: (None if pd.isna(v) else v) for k, v in row.items() if k not in self.extra_cols}
+            bar["indicators"] = {c: (None if pd.isna(row[c]) else row[c]) for c in self.extra_cols}
+            bar.update(ticker=ticker, interval=self.interval, ts=row["ts"].isoformat(), fetched_at=fetched_at)
+            bars.append(bar)
+            last = key
+        if bars:
+            self.published[ticker] = last
+            live_stream.publish(ticker, bars, self.interval)
+        return bars
+
+    def run_forever(self, poll_seconds: float = settings.LIVE_POLL_SECONDS):
+        print(f"📡 [Live] Streaming {self.tickers} every {poll_seconds}s")
+        self.warm_up()
+        while True:
+            started = time.time()
+            for ticker in self.tickers:
+                try:
+                    self.poll_ticker(ticker)
+                except Exception as e:
+                    print(f"❌ [Live] {ticker}: {e}")
+            time.sleep(max(0.0, poll_seconds - (time.time() - started)))
+
+
+if __name__ == "__main__":
+    LivePoller(settings.LIVE_WATCHLIST.split(",")).run_forever()
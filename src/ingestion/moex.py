@@ -7,11 +7,17 @@ import calendar  # <--- НОВОЕ: Для работы с датами меся
 import dask
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from src.config import settings
+from typing import Callable
 from src.storage.minio_client import minio_client
+from src.ingestion.checkpoints import ChunkCheckpoint
+from src.ingestion.watermarks import moscow_now
+from src.telemetry import ISS_PAGES_PER_CHUNK, ISS_REQUEST_SECONDS
+from src import profiling
 
 # Константы API
-BASE_URL_SHARES = "https://iss.moex.com/iss/engines/stock/markets/shares/boards/TQBR/securities/{ticker}/candles.json"
-BASE_URL_INDEX = "https://iss.moex.com/iss/engines/stock/markets/index/boards/SNDX/securities/{ticker}/candles.json"
+BASE_URL_SHARES = settings.MOEX_ISS_URL + "/engines/stock/markets/shares/boards/TQBR/securities/{ticker}/candles.json"
+BASE_URL_INDEX = settings.MOEX_ISS_URL + "/engines/stock/markets/index/boards/SNDX/securities/{ticker}/candles.json"
 
 def get_robust_session():
     session = requests.Session()
@@ -24,19 +30,92 @@ def get_robust_session():
     )
     adapter = HTTPAdapter(max_retries=retry)
     session.mount("https://", adapter)
+    session.mount("http://", adapter)
     session.headers.update({
         'User-Agent': 'Mozilla/5.0 (DataEngineer Student Project)' 
     })
     return session
 
+class ChunkIncomplete(Exception):
+    """ISS оборвался посреди пагинации: скачанное нельзя сохранять как полный чанк"""
+
+
+def fetch_candles(ticker: str, interval: int, start_date: str, end_date: str = None,
+                  is_index: bool = False, log_prefix: str = None, start_index: int = 0,
+                  on_page: Callable[[int, list], None] = None) -> list:
+    """
+    Свечи ISS за период (постранично по 500, начиная со start_index), отсортированные по begin.
+    on_page(start_index, rows) вызывается для каждой полной страницы (чекпоинт);
+    ChunkIncomplete - если страница не получена после ретраев сессии.
+    """
+    base_url = BASE_URL_INDEX if is_index else BASE_URL_SHARES
+    base_url = base_url.format(ticker=ticker)
+    interval_name = "1m" if interval == 1 else "1d"
+    log_prefix = log_prefix or f"{ticker} {start_date}"
+
+    all_data = []
+    pages = 0
+    session = get_robust_session()
+
+    # print(f"🔄 START: {log_prefix} | {start_date} -> {end_date}")
+
+    try:
+        while True:
+            params = {
+                "from": start_date,
+                "start": start_index,
+                "interval": interval
+            }
+            if end_date:
+                params["till"] = end_date
+
+            try:
+                started = time.perf_counter()
+                resp = session.get(base_url, params=params, timeout=20)  # с ретраями 429/5xx внутри
+                ISS_REQUEST_SECONDS.labels(interval_name, resp.status_code).observe(time.perf_counter() - started)
+                pages += 1
+                if resp.status_code != 200:
+                    raise ChunkIncomplete(f"HTTP {resp.status_code} on {log_prefix} at start={start_index}")
+                data = resp.json()
+            except (requests.RequestException, ValueError) as e:
+                raise ChunkIncomplete(f"{log_prefix} at start={start_index}: {e}") from e
+
+            if 'candles' not in data:
+                raise ChunkIncomplete(f"No candles block on {log_prefix} at start={start_index}")
+
+            rows = data['candles']['data']
+            columns = data['candles']['columns']
+
+            if not rows:
+                break
+
+            records = [dict(zip(columns, row)) for row in rows]
+            all_data.extend(records)
+
+            # Если вернулось < 500, значит конец данных
+            if len(rows) < 500:
+                break
+
+            if on_page:
+                on_page(start_index, records)
+            start_index += len(rows)
+
+            # Пауза, чтобы не дудосить (Jitter)
+            time.sleep(0.3 + random.uniform(0.1, 0.3))
+    finally:
+        ISS_PAGES_PER_CHUNK.labels(interval_name).observe(pages)
+
+    # Сортировка по времени
+    all_data.sort(key=lambda x: x.get('begin', ''))
+    return all_data
+
 def download_chunk(ticker: str, year: int, interval: int, month: int = None, is_index: bool = False) -> str:
     """
     Скачивает данные. 
     Если передан month, качает только этот месяц и сохраняет в подпапку.
+    Полные страницы сохраняются чекпоинтами (src/ingestion/checkpoints.py): оборванная загрузка
+    продолжается с последней страницы, а в Bronze не попадает неполный чанк.
     """
-    base_url = BASE_URL_INDEX if is_index else BASE_URL_SHARES
-    base_url = base_url.format(ticker=ticker)
-    
     interval_name = "1m" if interval == 1 else "1d"
     
     # --- ЛОГИКА ДАТ И ПУТЕЙ ---
@@ -54,64 +133,29 @@ def download_chunk(ticker: str, year: int, interval: int, month: int = None, is_
         s3_path = f"{ticker}/{interval_name}/{year}.json"
         log_prefix = f"{ticker} {year}"
 
-    # Проверка наличия (Идемпотентность)
-    if minio_client.exists(s3_path):
-        return f"SKIP: {log_prefix} (Exists)"
-
-    all_data = []
-    start_index = 0
-    session = get_robust_session()
-
-    # print(f"🔄 START: {log_prefix} | {start_date} -> {end_date}")
+    # Проверка наличия (Идемпотентность): полным считается только чанк с маркером .done
+    checkpoint = ChunkCheckpoint(minio_client, s3_path, trust_legacy=settings.BRONZE_TRUST_LEGACY)
+    with profiling.stage("bronze_exists"):
+        if checkpoint.is_done():
+            return f"SKIP: {log_prefix} (Exists)"
+        start_index, resumed = checkpoint.resume()
 
-    while True:
-        params = {
-            "from": start_date,
-            "till": end_date,
-            "start": start_index,
-            "interval": interval
-        }
-        
-        try:
-            resp = session.get(base_url, params=params, timeout=20)
-            
-            if resp.status_code != 200:
-                print(f"❌ HTTP {resp.status_code} on {log_prefix}")
-                break
-                
-            data = resp.json()
-            if 'candles' not in data:
-                break
-                
-            rows = data['candles']['data']
-            columns = data['candles']['columns']
-            
-            if not rows:
-                break
-                
-            for row in rows:
-                record = dict(zip(columns, row))
-                all_data.append(record)
-            
-            # Если вернулось < 500, значит конец данных
-            if len(rows) < 500:
-                break
-                
-            start_index += len(rows)
-            
-            # Пауза, чтобы не дудосить (Jitter)
-            time.sleep(0.3 + random.uniform(0.1, 0.3))
-            
-        except Exception as e:
-            print(f"❌ Error on {log_prefix}: {e}")
-            time.sleep(5) # Длинная пауза при ошибке
-            break
+    try:
+        with profiling.stage("download", item=log_prefix):
+            fresh = fetch_candles(ticker, interval, start_date, end_date, is_index, log_prefix,
+                                  start_index=start_index, on_page=checkpoint.save_page)
+    except ChunkIncomplete as e:
+        # Страницы уже в чекпоинте: следующий запуск докачает с места обрыва
+        print(f"❌ {e}")
+        return f"PARTIAL: {log_prefix} (resume from {start_index})"
 
+    all_data = sorted(resumed + fresh, key=lambda x: x.get('begin', ''))
     if all_data:
-        # Сортировка по времени
-        all_data.sort(key=lambda x: x.get('begin', ''))
-        minio_client.save_json(all_data, s3_path)
-        return f"SUCCESS: {log_prefix} ({len(all_data)} rows)"
+        # Незакрытый период (текущий месяц/год) сохраняется без маркера и будет докачан
+        closed = end_date < moscow_now().strftime("%Y-%m-%d")
+        with profiling.stage("bronze_write", item=s3_path):
+            checkpoint.complete(all_data, closed)
+        return f"SUCCESS: {log_prefix} ({len(all_data)} rows{', resumed' if resumed else ''})"
     
     # Если данных нет (например, будущий месяц), не создаем файл
     return f"EMPTY: {log_prefix}"
@@ -0,0 +1,92 @@
+# File: src/ingestion/watermarks.py
+"""
+Водяные знаки Gold и календарь торгов для инкрементального обновления (src/ingestion/incremental.py).
+
+Водяной знак - последний бар (ticker, interval) в Gold (таблица stock_latest).
+Тикер актуален, если его водяной знак не старше последнего закрытого бара по календарю торгов.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Tuple
+from zoneinfo import ZoneInfo
+
+import psycopg2
+
+from src.config import settings
+
+MSK = ZoneInfo("Europe/Moscow")
+SESSION_OPEN = time(10, 0)
+SESSION_CLOSE = time(18, 40)  # основная сессия TQBR; последняя минутка начинается в 18:39
+
+
+def moscow_now() -> datetime:
+    """Время ISS: наивное московское, как begin/end свечей"""
+    return datetime.now(MSK).replace(tzinfo=None, second=0, microsecond=0)
+
+
+def previous_trading_day(day: date) -> date:
+    day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def expected_watermark(interval: str, now: datetime) -> datetime:
+    """Начало последнего закрытого бара на момент now (праздники не учитываются)"""
+    today = now.date()
+    trading_today = today.weekday() < 5
+    if interval == "1d":
+        day = today if trading_today and now.time() >= SESSION_CLOSE else previous_trading_day(today)
+        return datetime.combine(day, time(0, 0))
+
+    last_minute = (datetime.combine(datetime.min, SESSION_CLOSE) - timedelta(minutes=1)).time()
+    if trading_today and now.time() > SESSION_OPEN:
+        return min(now - timedelta(minutes=1), datetime.combine(today, last_minute))
+    day = today if trading_today and now.time() >= SESSION_CLOSE else previous_trading_day(today)
+    return datetime.combine(day, last_minute)
+
+
+def get_db_connection():
+    return psycopg2.connect(
+        host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT,
+        user=settings.POSTGRES_USER, password=settings.POSTGRES_PASSWORD,
+        dbname=settings.POSTGRES_DB
+    )
+
+
+def load_watermarks(tickers: List[str], intervals: List[str]) -> Dict[Tuple[str, str], datetime]:
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT ticker, interval, ts FROM stock_latest WHERE ticker = ANY(%s) AND interval = ANY(%s)",
+                        (tickers, intervals))
+            return {(t, i): ts for t, i, ts in cur.fetchall()}
+    finally:
+        conn.close()
+
+
+def plan_refresh(universe: List[str], intervals: List[str], watermarks: Dict[Tuple[str, str], datetime],
+                 now: datetime) -> dict:
+    """
+    {"due": {interval: {ticker: since}}, "current": [(ticker, interval)], "missing": [ticker]}.
+    missing - тикеры без истории в Gold: им нужен полный backfill, а не инкремент.
+    """
+    due, current, missing = defaultdict(dict), [], set()
+    for interval in intervals:
+        expected = expected_watermark(interval, now)
+        for ticker in universe:
+            wm = watermarks.get((ticker, interval))
+            if wm is None:
+                missing.add(ticker)
+            elif wm >= expected:
+                current.append((ticker, interval))
+            else:
+                due[interval][ticker] = wm
+    return {"due": dict(due), "current": current, "missing": sorted(missing)}
+
+
+def is_closed(row: dict, interval: str, now: datetime) -> bool:
+    if interval == "1d":
+        # end дневки - 23:59:59, хотя торги по ней закончились с закрытием сессии
+        return row["begin"][:10] < now.strftime("%Y-%m-%d") or now.time() >= SESSION_CLOSE
+    return row.get("end", "") < now.strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,298 @@
+# File: src/processing/indicators.py
+import json
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Колонки, которые нужны индикаторам (и которые храним в "хвосте" состояния)
+PRICE_COLUMNS = ["ts", "open", "high", "low", "close", "volume"]
+
+# Эти индикаторы исторически лежат в отдельных колонках stock_metrics,
+# все остальные уходят в JSONB-колонку `indicators`
+LEGACY_COLUMNS = ["sma_20", "rsi_14"]
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    name: str                       # имя (префикс) выходной колонки
+    kind: str                       # ключ в INDICATOR_KINDS
+    params: Dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class IndicatorKind:
+    func: Callable
+    outputs: Tuple[str, ...] = ("",)                 # суффиксы выходных колонок ("" -> просто name)
+    lookback: Callable[[dict], int] = lambda p: 0    # сколько прошлых строк нужно оконному расчету
+
+
+INDICATOR_KINDS: Dict[str, IndicatorKind] = {}
+
+
+def register_indicator(kind: str, outputs: Tuple[str, ...] = ("",), lookback: Callable[[dict], int] = lambda p: 0):
+    """
+    Регистрирует функцию расчета индикатора.
+    Сигнатура: func(frame, start, commit, state, **params) -> (outputs, new_state)
+      frame  - хвост из прошлого запуска + новые строки (PRICE_COLUMNS), отсортировано по ts
+      start  - индекс первой новой строки во frame
+      commit - индекс строки, на которой фиксируется состояние (предпоследняя строка)
+      outputs - {суффикс: np.ndarray длины len(frame) - start}
+    """
+    def decorator(func):
+        INDICATOR_KINDS[kind] = IndicatorKind(func=func, outputs=outputs, lookback=lookback)
+        return func
+    return decorator
+
+
+def output_names(spec: IndicatorSpec) -> List[str]:
+    return [spec.name if not suffix else f"{spec.name}_{suffix}" for suffix in INDICATOR_KINDS[spec.kind].outputs]
+
+
+def indicator_output_names(specs: List[IndicatorSpec]) -> List[str]:
+    return [name for spec in specs for name in output_names(spec)]
+
+
+# --- Helpers ---
+
+def _ewm_step(x: np.ndarray, alpha: float, state: dict, commit_pos: int):
+    """
+    Рекурсивное сглаживание y_t = (1 - alpha) * y_{t-1} + alpha * x_t.
+    Продолжает ряд с сохраненного значения, поэтому инкрементальный расчет
+    совпадает с полным пересчетом истории.
+    """
+    seed = state.get("value")
+    count = state.get("count", 0)
+    if seed is None:
+        y = pd.Series(x).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    else:
+        y = pd.Series(np.concatenate([[seed], x])).ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+    counts = count + np.arange(1, len(x) + 1)
+    if commit_pos < 0:
+        return y, counts, dict(state)
+    return y, counts, {"value": float(y[commit_pos]), "count": int(counts[commit_pos])}
+
+
+def _changes(close: np.ndarray, prev_close: Optional[float]) -> np.ndarray:
+    prev = np.concatenate([[np.nan if prev_close is None else prev_close], close[:-1]])
+    return close - prev
+
+
+def _rolling_slice(series: pd.Series, start: int) -> np.ndarray:
+    return series.to_numpy()[start:]
+
+
+# --- Indicators ---
+
+@register_indicator("sma", lookback=lambda p: p["window"] - 1)
+def sma(frame, start, commit, state, window: int):
+    # min_periods=1 повторяет поведение старого Spark-окна rowsBetween(-19, 0)
+    mean = frame["close"].rolling(window, min_periods=1).mean()
+    return {"": _rolling_slice(mean, start)}, {}
+
+
+@register_indicator("rsi_sma", lookback=lambda p: p["window"])
+def rsi_sma(frame, start, commit, state, window: int):
+    # Простое (не Wilder) усреднение, как в исходной колонке rsi_14
+    change = frame["close"].diff()
+    gain = change.where(change > 0, 0.0)
+    loss = (-change).where(change < 0, 0.0)
+    avg_gain = gain.rolling(window, min_periods=1).mean()
+    avg_loss = loss.rolling(window, min_periods=1).mean()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    rsi = np.where(avg_loss == 0, 100.0, rsi)
+    return {"": rsi[start:]}, {}
+
+
+@register_indicator("bollinger", outputs=("mid", "upper", "lower"), lookback=lambda p: p["window"] - 1)
+def bollinger(frame, start, commit, state, window: int = 20, k: float = 2.0):
+    roll = frame["close"].rolling(window, min_periods=window)
+    mid = roll.mean()
+    std = roll.std(ddof=0)
+    return {
+        "mid": _rolling_slice(mid, start),
+        "upper": _rolling_slice(mid + k * std, start),
+        "lower": _rolling_slice(mid - k * std, start),
+    }, {}
+
+
+@register_indicator("ema")
+def ema(frame, start, commit, state, window: int):
+    close = frame["close"].to_numpy()[start:]
+    y, counts, new_state = _ewm_step(close, 2.0 / (window + 1), state, commit - start)
+    return {"": np.where(counts >= window, y, np.nan)}, new_state
+
+
+@register_indicator("macd", outputs=("", "signal", "hist"))
+def macd(frame, start, commit, state, fast: int = 12, slow: int = 26, signal: int = 9):
+    close = frame["close"].to_numpy()[start:]
+    pos = commit - start
+    fast_y, _, fast_st = _ewm_step(close, 2.0 / (fast + 1), state.get("fast", {}), pos)
+    slow_y, counts, slow_st = _ewm_step(close, 2.0 / (slow + 1), state.get("slow", {}), pos)
+    line = fast_y - slow_y
+    sig_y, _, sig_st = _ewm_step(line, 2.0 / (signal + 1), state.get("signal", {}), pos)
+    line = np.where(counts >= slow, line, np.nan)
+    sig_y = np.where(counts >= slow + signal - 1, sig_y, np.nan)
+    return {"": line, "signal": sig_y, "hist": line - sig_y}, {"fast": fast_st, "slow": slow_st, "signal": sig_st}
+
+
+@register_indicator("rsi_wilder")
+def rsi_wilder(frame, start, commit, state, window: int = 14):
+    close = frame["close"].to_numpy()[start:]
+    change = _changes(close, state.get("prev_close"))
+    # Без состояния у первой строки нет изменения: сглаживание стартует со второй
+    skip = 1 if state.get("prev_close") is None else 0
+    pos = commit - start - skip
+    gains = np.where(change > 0, change, 0.0)[skip:]
+    losses = np.where(change < 0, -change, 0.0)[skip:]
+    ag, counts, ag_st = _ewm_step(gains, 1.0 / window, state.get("gain", {}), pos)
+    al, _, al_st = _ewm_step(losses, 1.0 / window, state.get("loss", {}), pos)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(al == 0, 100.0, 100 - 100 / (1 + ag / al))
+    rsi = np.concatenate([[np.nan] * skip, np.where(counts >= window, rsi, np.nan)])
+
+    new_state = dict(state)
+    if commit >= start:
+        new_state = {"prev_close": float(close[commit - start]), "gain": ag_st, "loss": al_st}
+    return {"": rsi}, new_state
+
+
+@register_indicator("atr")
+def atr(frame, start, commit, state, window: int = 14):
+    high = frame["high"].to_numpy()[start:]
+    low = frame["low"].to_numpy()[start:]
+    close = frame["close"].to_numpy()[start:]
+    prev = np.concatenate([[np.nan if state.get("prev_close") is None else state["prev_close"]], close[:-1]])
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+    y, counts, tr_st = _ewm_step(tr, 1.0 / window, state.get("tr", {}), commit - start)
+
+    new_state = dict(state)
+    if commit >= start:
+        new_state = {"prev_close": float(close[commit - start]), "tr": tr_st}
+    return {"": np.where(counts >= window, y, np.nan)}, new_state
+
+
+@register_indicator("vwap")
+def vwap(frame, start, commit, state):
+    # VWAP торговой сессии: накопление typical price * volume с начала дня
+    seg = frame.iloc[start:]
+    days = seg["ts"].dt.strftime("%Y-%m-%d").to_numpy()
+    typical = ((seg["high"] + seg["low"] + seg["close"]) / 3).to_numpy()
+    volume = seg["volume"].fillna(0.0).to_numpy()
+    groups = pd.Series(days)
+    cum_pv = pd.Series(typical * volume).groupby(groups).cumsum().to_numpy()
+    cum_v = pd.Series(volume).groupby(groups).cumsum().to_numpy()
+    if state.get("day") is not None:
+        same_day = days == state["day"]
+        cum_pv = cum_pv + np.where(same_day, state["pv"], 0.0)
+        cum_v = cum_v + np.where(same_day, state["v"], 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = np.where(cum_v > 0, cum_pv / cum_v, np.nan)
+
+    new_state = dict(state)
+    pos = commit - start
+    if pos >= 0:
+        new_state = {"day": days[pos], "pv": float(cum_pv[pos]), "v": float(cum_v[pos])}
+    return {"": values}, new_state
+
+
+DEFAULT_INDICATORS: List[IndicatorSpec] = [
+    IndicatorSpec("sma_20", "sma", {"window": 20}),
+    IndicatorSpec("rsi_14", "rsi_sma", {"window": 14}),
+    IndicatorSpec("rsi_wilder_14", "rsi_wilder", {"window": 14}),
+    IndicatorSpec("ema_12", "ema", {"window": 12}),
+    IndicatorSpec("ema_26", "ema", {"window": 26}),
+    IndicatorSpec("macd", "macd", {"fast": 12, "slow": 26, "signal": 9}),
+    IndicatorSpec("bb", "bollinger", {"window": 20, "k": 2.0}),
+    IndicatorSpec("atr_14", "atr", {"window": 14}),
+    IndicatorSpec("vwap", "vwap", {}),
+]
+
+
+def load_indicator_specs(config: Optional[List[dict]] = None) -> List[IndicatorSpec]:
+    """
+    Собирает реестр из конфига вида [{"name": "ema_50", "kind": "ema", "params": {"window": 50}}].
+    Колонки sma_20 / rsi_14 обязательны (на них завязаны API и дашборд), поэтому всегда добавляются.
+    """
+    if not config:
+        return list(DEFAULT_INDICATORS)
+
+    specs = [IndicatorSpec(c["name"], c["kind"], dict(c.get("params", {}))) for c in config]
+    for spec in specs:
+        if spec.kind not in INDICATOR_KINDS:
+            raise ValueError(f"Unknown indicator kind: {spec.kind}")
+    names = {s.name for s in specs}
+    legacy = [s for s in DEFAULT_INDICATORS if s.name in LEGACY_COLUMNS and s.name not in names]
+    return legacy + specs
+
+
+# --- Engine ---
+
+def _tail_frame(state: Optional[dict]) -> pd.DataFrame:
+    if not state or not state.get("tail"):
+        return pd.DataFrame({c: pd.Series(dtype="float64") for c in PRICE_COLUMNS}).astype({"ts": "datetime64[ns]"})
+    tail = pd.DataFrame(state["tail"])
+    tail["ts"] = pd.to_datetime(tail["ts"])
+    return tail[PRICE_COLUMNS]
+
+
+def compute_indicators(pdf: pd.DataFrame, specs: Optional[List[IndicatorSpec]] = None,
+                       state: Optional[dict] = None) -> Tuple[pd.DataFrame, Optional[dict]]:
+    """
+    Считает все индикаторы реестра за один векторизованный проход по одному (ticker, interval).
+
+    Состояние фиксируется на предпоследней строке: последний бар может быть еще
+    не закрыт (текущая минута/день), поэтому следующий инкрементальный запуск
+    начинает со строк ts > state["ts"] и пересчитывает его заново.
+    """
+    specs = specs or DEFAULT_INDICATORS
+    pdf = pdf.sort_values("ts").reset_index(drop=True)
+    if state:
+        pdf = pdf[pdf["ts"] > pd.Timestamp(state["ts"])].reset_index(drop=True)
+    if pdf.empty:
+        return pdf, state
+
+    tail = _tail_frame(state)
+    frame = pd.concat([tail, pdf[PRICE_COLUMNS]], ignore_index=True)
+    start, commit = len(tail), len(frame) - 2
+
+    result = pdf.copy()
+    kinds_state = dict(state["kinds"]) if state else {}
+    for spec in specs:
+        kind = INDICATOR_KINDS[spec.kind]
+        values, kinds_state[spec.name] = kind.func(frame, start, commit, kinds_state.get(spec.name, {}), **spec.params)
+        for suffix, name in zip(kind.outputs, output_names(spec)):
+            result[name] = values[suffix]
+
+    if commit < start:
+        # Пришла только одна (незакрытая) строка - состояние не двигаем
+        return result, state
+
+    lookback = max([INDICATOR_KINDS[s.kind].lookback(s.params) for s in specs] + [1])
+    committed = frame.iloc[max(0, commit + 1 - lookback):commit + 1]
+    new_state = {
+        "ts": committed["ts"].iloc[-1].isoformat(),
+        "tail": {
+            "ts": [t.isoformat() for t in committed["ts"]],
+            **{c: committed[c].astype("float64").tolist() for c in PRICE_COLUMNS if c != "ts"},
+        },
+        "kinds": kinds_state,
+    }
+    return result, new_state
+
+
+def _json_safe(value):
+    # NaN в JSONB недопустим
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def dump_state(state: Optional[dict]) -> Optional[str]:
+    return json.dumps(_json_safe(state), allow_nan=False) if state else None
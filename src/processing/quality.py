@@ -0,0 +1,51 @@
+# File: src/processing/quality.py
+"""
+Проверка качества Bronze -> Silver в том же проходе, что и запись Silver (spark_job.process_bronze_to_silver).
+
+- ohlc_ok: high >= low, open/close внутри [low, high], цены > 0. Нарушения в Silver не попадают
+  (иначе портят окна SMA/RSI в Gold), но учитываются в отчете.
+- Отчет по (ticker, interval, day): строк, минуток в основной сессии против календаря торгов,
+  completeness, нулевой объем, первый/последний бар. Сохраняется в data_quality
+  (src/ingestion/gaps.py), по нему планировщик докачивает только дни с пропусками.
+"""
+from pyspark.sql import Column, DataFrame
+from pyspark.sql import functions as F
+
+from src.ingestion.watermarks import SESSION_CLOSE, SESSION_OPEN
+
+SESSION_START_MIN = SESSION_OPEN.hour * 60 + SESSION_OPEN.minute
+SESSION_END_MIN = SESSION_CLOSE.hour * 60 + SESSION_CLOSE.minute  # не включая: последняя минутка 18:39
+SESSION_MINUTES = SESSION_END_MIN - SESSION_START_MIN
+
+
+def ohlc_ok() -> Column:
+    """Согласованность свечи; null в ценах - тоже брак"""
+    low, high = F.col("low"), F.col("high")
+    ok = (low > 0) & (high >= low) \
+        & F.col("open").between(low, high) & F.col("close").between(low, high)
+    return F.coalesce(ok, F.lit(False))
+
+
+def quality_report(df: DataFrame) -> DataFrame:
+    """df - Silver до фильтрации брака, с колонкой ohlc_ok"""
+    minute_of_day = F.hour("ts") * 60 + F.minute("ts")
+    in_session = minute_of_day.between(SESSION_START_MIN, SESSION_END_MIN - 1)
+    weekday = ~F.dayofweek("ts").isin(1, 7)  # 1 - воскресенье, 7 - суббота
+
+    report = df.groupBy("ticker", "interval", F.to_date("ts").alias("day")).agg(
+        F.count(F.lit(1)).alias("rows"),
+        F.sum(in_session.cast("int")).alias("session_rows"),
+        F.sum((~F.col("ohlc_ok")).cast("int")).alias("bad_ohlc"),
+        F.sum((F.coalesce(F.col("volume"), F.lit(0.0)) <= 0).cast("int")).alias("zero_volume"),
+        F.min("ts").alias("first_ts"),
+        F.max("ts").alias("last_ts"),
+        F.max(weekday.cast("int")).alias("weekday"),
+    )
+    # Минутки в будни сверяются с длиной сессии; дневка за день - одна свеча; выходные сессии не нормируются
+    expected = F.when(F.col("interval") == "1d", F.lit(1)) \
+        .when(F.col("weekday") == 1, F.lit(SESSION_MINUTES))
+    rows_seen = F.when(F.col("interval") == "1d", F.col("rows")).otherwise(F.col("session_rows"))
+    return report.withColumn("expected", expected) \
+        .withColumn("completeness", F.when(F.col("expected").isNull(), F.lit(1.0))
+                    .otherwise(F.least(F.lit(1.0), rows_seen / F.col("expected")))) \
+        .drop("weekday")
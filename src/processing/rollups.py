@@ -0,0 +1,58 @@
+# File: src/processing/rollups.py
+from pyspark.sql import DataFrame
+from pyspark.sql import functions as F
+
+# Интервал Gold -> (исходный интервал Silver, правило бакета)
+# Минутные бары агрегируем в 5m/15m/1h, дневные - в недели и месяцы
+ROLLUPS = {
+    "5m": ("1m", 5 * 60),
+    "15m": ("1m", 15 * 60),
+    "1h": ("1m", 60 * 60),
+    "1w": ("1d", "week"),
+    "1mo": ("1d", "month"),
+}
+
+
+def bucket_start(rule):
+    """Начало бакета: секунды -> выравнивание по эпохе, иначе date_trunc (week начинается с понедельника)"""
+    if isinstance(rule, int):
+        return F.timestamp_seconds(F.floor(F.unix_timestamp("ts") / rule) * rule)
+    return F.date_trunc(rule, F.col("ts"))
+
+
+def build_rollups(df: DataFrame, state_df: DataFrame = None) -> DataFrame:
+    """
+    Агрегирует OHLCV базовых интервалов в ROLLUPS.
+    df - Silver (ticker, interval, ts, open, high, low, close, volume).
+    state_df - (ticker, interval, state_ts) из indicator_state: в инкрементальном режиме
+    пересчитываются только бакеты, начиная с последнего незафиксированного.
+    """
+    parts = []
+    for name, (source, rule) in ROLLUPS.items():
+        src = df.filter(F.col("interval") == source)
+        if state_df is not None:
+            st = state_df.filter(F.col("interval") == name).select("ticker", "state_ts")
+            src = src.join(F.broadcast(st), "ticker", "left") \
+                .filter(F.col("state_ts").isNull() | (F.col("ts") >= F.col("state_ts"))) \
+                .drop("state_ts")
+
+        parts.append(
+            src.withColumn("bucket", bucket_start(rule))
+            .groupBy("ticker", "bucket")
+            .agg(
+                F.min_by("open", "ts").alias("open"),
+                F.max("high").alias("high"),
+                F.min("low").alias("low"),
+                F.max_by("close", "ts").alias("close"),
+                F.sum("volume").alias("volume"),
+            )
+            .select(
+                "ticker", F.lit(name).alias("interval"), F.col("bucket").alias("ts"),
+                "open", "high", "low", "close", "volume",
+            )
+        )
+
+    result = parts[0]
+    for part in parts[1:]:
+        result = result.unionByName(part)
+    return result
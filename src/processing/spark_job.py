@@ -1,32 +1,106 @@
 # File: src/processing/spark_job.py
 import uuid
 import socket
+import threading
 import psycopg2
-from typing import List
+from datetime import datetime
+from typing import Dict, List, Tuple
+from pyspark import StorageLevel
 from pyspark.sql import SparkSession
 from pyspark.sql import functions as F
-from pyspark.sql.window import Window
-from pyspark.sql.types import StructType, StructField, StringType, DoubleType
+from pyspark.sql.types import StructType, StructField, StringType, DoubleType, TimestampType
 from src.config import settings
+from src.processing.indicators import (
+    PRICE_COLUMNS, LEGACY_COLUMNS, compute_indicators, dump_state, indicator_output_names, load_indicator_specs
+)
+from src.processing.rollups import ROLLUPS, build_rollups
+from src.processing.quality import ohlc_ok, quality_report
+from src.ingestion.gaps import save_quality_report
+from src.storage.db import db_router
+from src.storage.gold_swap import SHADOW_TABLE, build_shadow, lock_shared, rebuild, swap_in
+from src.storage.tiers import SILVER_INTERVALS, cold_cutoff, cold_intervals
+from src.processing.tuning import LARGE_INPUT_BYTES, SparkPlan, apply_plan, plan_spark
+from src.storage.bronze_manifest import diff_manifest, list_bronze_objects, load_manifest, record_manifest, ticker_of
+from src.telemetry import DB_OPERATION_SECONDS, STAGE_ROWS, STAGE_SECONDS, span, timed
+from src import profiling
 
-def get_spark_session(app_name: str = "MOEX_ETL_Strict"):
+def get_spark_session(app_name: str = "MOEX_ETL_Strict", plan: SparkPlan = None):
+    """
+    plan - память и начальные SQL-настройки (src/processing/tuning.py). Память применяется, только если
+    в процессе еще нет SparkContext: getOrCreate() возвращает живую сессию и статические настройки игнорирует.
+    """
+    plan = plan or plan_spark(0)
     container_ip = socket.gethostbyname(socket.gethostname())
-    return (SparkSession.builder
+    builder = (SparkSession.builder
         .appName(app_name)
         .master(settings.SPARK_MASTER_URL)
         .config("spark.sql.ansi.enabled", "false")
+        # Silver читается и вне Spark (src/storage/silver_reader.py): ts московские часы как UTC-instant,
+        # TIMESTAMP_MICROS вместо INT96 - у row group есть статистика ts для predicate pushdown
+        .config("spark.sql.session.timeZone", "UTC")
+        .config("spark.sql.parquet.outputTimestampType", "TIMESTAMP_MICROS")
         .config("spark.hadoop.fs.s3a.endpoint", settings.MINIO_ENDPOINT)
         .config("spark.hadoop.fs.s3a.access.key", settings.MINIO_ACCESS_KEY)
         .config("spark.hadoop.fs.s3a.secret.key", settings.MINIO_SECRET_KEY)
         .config("spark.hadoop.fs.s3a.path.style.access", "true")
         .config("spark.hadoop.fs.s3a.impl", "org.apache.hadoop.fs.s3a.S3AFileSystem")
         .config("spark.hadoop.fs.s3a.connection.ssl.enabled", "false")
-        # Optimization & Memory
-        .config("spark.driver.memory", "1g") 
-        .config("spark.executor.memory", "1g")
         .config("spark.driver.bindAddress", "0.0.0.0")
-        .config("spark.driver.host", container_ip)
-        .getOrCreate())
+        .config("spark.driver.host", container_ip))
+    # Optimization & Memory
+    for key, value in plan.session_conf().items():
+        builder = builder.config(key, value)
+    print(f"⚙️ Spark session plan: {plan.describe()}")
+    return builder.getOrCreate()
+
+# Мы берем строку ts_str и кастуем её в timestamp: ts_str::timestamp
+STAGING_INSERT = """
+    INSERT INTO {target}
+    (ticker, interval, ts, open, high, low, close, volume, sma_20, rsi_14, indicators)
+    SELECT
+        ticker,
+        interval,
+        ts_str::timestamp as ts,
+        open,
+        high,
+        low,
+        close,
+        volume,
+        sma_20,
+        rsi_14,
+        indicators::jsonb
+    FROM {temp_table}
+"""
+STAGING_UPSERT = """
+    ON CONFLICT (ticker, interval, ts) DO UPDATE SET
+        open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+        close = EXCLUDED.close, volume = EXCLUDED.volume,
+        sma_20 = EXCLUDED.sma_20, rsi_14 = EXCLUDED.rsi_14, indicators = EXCLUDED.indicators
+"""
+STATE_UPSERT = """
+    INSERT INTO indicator_state (ticker, interval, state, updated_at)
+    SELECT ticker, interval, state_json::jsonb, now()
+    FROM {temp_table} WHERE state_json IS NOT NULL
+    ON CONFLICT (ticker, interval) DO UPDATE SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at
+"""
+
+# Последний бар пар из staging (ts_str 'yyyy-MM-dd HH:mm:ss' сортируется как время); старые бары не затирают новые
+LATEST_UPSERT = """
+    INSERT INTO stock_latest (ticker, interval, ts, open, high, low, close, volume, sma_20, rsi_14, indicators)
+    SELECT DISTINCT ON (ticker, interval)
+        ticker, interval, ts_str::timestamp, open, high, low, close, volume, sma_20, rsi_14, indicators::jsonb
+    FROM {temp_table}
+    ORDER BY ticker, interval, ts_str DESC
+    ON CONFLICT (ticker, interval) DO UPDATE SET
+        ts = EXCLUDED.ts, open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+        close = EXCLUDED.close, volume = EXCLUDED.volume,
+        sma_20 = EXCLUDED.sma_20, rsi_14 = EXCLUDED.rsi_14, indicators = EXCLUDED.indicators
+    WHERE stock_latest.ts <= EXCLUDED.ts
+"""
+
+
+def staging_insert(target: str, temp_table: str, upsert: bool = False) -> str:
+    return STAGING_INSERT.format(target=target, temp_table=temp_table) + (STAGING_UPSERT if upsert else "")
 
 def get_pg_connection():
     return psycopg2.connect(
@@ -35,7 +109,11 @@ def get_pg_connection():
         dbname=settings.POSTGRES_DB
     )
 
-def process_bronze_to_silver(spark, target_tickers: List[str] = None):
+def process_bronze_to_silver(spark, target_tickers: List[str] = None, paths: List[str] = None) -> Dict[str, int]:
+    """
+    paths - объекты Bronze (относительно бакета) из манифеста: читаются только они, без листинга
+    всего бакета. Возвращает строки, попавшие в Silver, по объекту (для bronze_manifest).
+    """
     print(f"🚀 [STAGE 1] Bronze -> Silver (Targets: {target_tickers or 'ALL'})")
     raw_path_root = f"s3a://{settings.MINIO_BUCKET_RAW}"
     silver_path = f"s3a://{settings.MINIO_BUCKET_SILVER}/market_data"
@@ -52,11 +130,16 @@ def process_bronze_to_silver(spark, target_tickers: List[str] = None):
     ])
 
     try:
-        df = spark.read.format("json") \
-            .schema(schema) \
-            .option("recursiveFileLookup", "true") \
-            .option("pathGlobFilter", "*.json") \
-            .load(raw_path_root)
+        reader = spark.read.format("json").schema(schema)
+        if paths is not None:
+            if not paths:
+                print("⚠️ [Bronze->Silver] No data found.")
+                return {}
+            df = reader.load([f"{raw_path_root}/{p}" for p in paths])
+        else:
+            df = reader.option("recursiveFileLookup", "true") \
+                .option("pathGlobFilter", "*.json") \
+                .load(raw_path_root)
 
         df = df.withColumn("file_path", F.input_file_name())
         df = df.withColumn("ticker", F.regexp_extract(F.col("file_path"), r"\/([A-Z0-9]{3,6})\/(1[dm])\/", 1))
@@ -65,11 +148,14 @@ def process_bronze_to_silver(spark, target_tickers: List[str] = None):
         if target_tickers:
             df = df.filter(F.col("ticker").isin(target_tickers))
 
-        if df.rdd.isEmpty():
+        with profiling.stage("bronze_read", spark=spark):
+            empty = df.rdd.isEmpty()
+        if empty:
             print("⚠️ [Bronze->Silver] No data found.")
-            return
+            return {}
 
         df_clean = df.select(
+            F.col("file_path"),
             F.col("ticker"),
             F.col("interval_type").alias("interval"),
             F.to_timestamp(F.col("begin")).alias("ts"),
@@ -79,19 +165,153 @@ def process_bronze_to_silver(spark, target_tickers: List[str] = None):
             F.col("close"),
             F.col("volume")
         ).dropna(subset=["ticker", "interval", "ts", "close"]) \
-         .dropDuplicates(["ticker", "interval", "ts"])
+         .dropDuplicates(["ticker", "interval", "ts"]) \
+         .withColumn("ohlc_ok", ohlc_ok())
+
+        # Один скан Bronze на запись Silver и отчет качества: второй action читает кэш
+        df_clean.persist(StorageLevel.MEMORY_AND_DISK)
+        try:
+            spark.conf.set("spark.sql.sources.partitionOverwriteMode", "dynamic")
+            print("💾 Saving to Silver Layer (Parquet)...")
+            with profiling.stage("silver_write", spark=spark):
+                df_clean.filter(F.col("ohlc_ok")).drop("ohlc_ok", "file_path") \
+                    .sortWithinPartitions("ticker", "interval", "ts") \
+                    .write.mode("overwrite").partitionBy("ticker").parquet(silver_path)
+            print("✅ Silver Layer Updated.")
+
+            with span("spark.quality"), timed(STAGE_SECONDS, "quality"), profiling.stage("quality", spark=spark):
+                report = [row.asDict() for row in quality_report(df_clean).collect()]
+                saved = save_quality_report(report)
+            gaps = sum(1 for r in report if r["completeness"] < settings.DQ_MIN_COMPLETENESS)
+            bad = sum(r["bad_ohlc"] for r in report)
+            print(f"🩺 Data quality: {saved} ticker-days, {gaps} with gaps, {bad} inconsistent candles dropped")
 
-        spark.conf.set("spark.sql.sources.partitionOverwriteMode", "dynamic")
-        print("💾 Saving to Silver Layer (Parquet)...")
-        df_clean.write.mode("overwrite").partitionBy("ticker").parquet(silver_path)
-        print("✅ Silver Layer Updated.")
+            prefix = f"{settings.MINIO_BUCKET_RAW}/"
+            return {row["file_path"].split(prefix, 1)[-1]: row["count"]
+                    for row in df_clean.groupBy("file_path").count().collect()}
+        finally:
+            df_clean.unpersist()
 
     except Exception as e:
         print(f"❌ Error in Bronze->Silver: {e}")
         raise e
 
-def process_silver_to_gold_atomic(spark, target_tickers: List[str] = None):
-    print(f"🚀 [STAGE 2] Silver -> Gold (Atomic Swap) Targets: {target_tickers or 'ALL'}")
+def load_indicator_states(target_tickers: List[str] = None) -> Dict[Tuple[str, str], dict]:
+    """Состояние рекурсивных индикаторов (EMA, Wilder RSI, ...) с прошлого запуска"""
+    conn = get_pg_connection()
+    try:
+        with conn.cursor() as cur:
+            if target_tickers:
+                cur.execute("SELECT ticker, interval, state FROM indicator_state WHERE ticker = ANY(%s)", (target_tickers,))
+            else:
+                cur.execute("SELECT ticker, interval, state FROM indicator_state")
+            return {(t, i): state for t, i, state in cur.fetchall()}
+    finally:
+        conn.close()
+
+def build_state_frame(spark, states: Dict[Tuple[str, str], dict]):
+    """(ticker, interval, state_ts) - маленькая таблица для broadcast-фильтрации новых баров"""
+    if not states:
+        return None
+    state_rows = [(t, i, datetime.fromisoformat(st["ts"])) for (t, i), st in states.items()]
+    return spark.createDataFrame(state_rows, "ticker string, interval string, state_ts timestamp")
+
+def calculate_indicators(df, states: Dict[Tuple[str, str], dict] = None, state_df=None):
+    """
+    Один векторизованный проход реестра индикаторов на каждую пару (ticker, interval).
+    Если передано состояние, считаются только бары после state['ts'].
+    Возвращает df с колонками PRICE_COLUMNS + выходы индикаторов + state_json
+    (заполнен только в последней строке группы).
+    """
+    states = states or {}
+    specs = load_indicator_specs(settings.GOLD_INDICATORS)
+    output_cols = indicator_output_names(specs)
+
+    if state_df is not None:
+        df = df.join(F.broadcast(state_df), ["ticker", "interval"], "left") \
+            .filter(F.col("state_ts").isNull() | (F.col("ts") > F.col("state_ts"))) \
+            .drop("state_ts")
+
+    schema = StructType(
+        [StructField("ticker", StringType()), StructField("interval", StringType()), StructField("ts", TimestampType())]
+        + [StructField(c, DoubleType()) for c in PRICE_COLUMNS if c != "ts"]
+        + [StructField(c, DoubleType()) for c in output_cols]
+        + [StructField("state_json", StringType())]
+    )
+
+    def calc(pdf):
+        key = (pdf["ticker"].iloc[0], pdf["interval"].iloc[0])
+        prev_state = states.get(key)
+        result, state = compute_indicators(pdf[PRICE_COLUMNS], specs, prev_state)
+        result["ticker"], result["interval"] = key
+        result["state_json"] = None
+        if len(result) and state is not prev_state:
+            result.loc[result.index[-1], "state_json"] = dump_state(state)
+        return result[schema.fieldNames()]
+
+    return df.groupBy("ticker", "interval").applyInPandas(calc, schema), output_cols
+
+def merge_gold(conn, temp_table: str, target_tickers: List[str], incremental: bool = False,
+               full_refresh: bool = False):
+    """
+    Staging -> Gold. full_refresh - весь Gold из staging через теневую таблицу и swap под эксклюзивной
+    блокировкой Gold; иначе merge тикеров в живую таблицу под разделяемой: во время перезаливки он
+    ждет swap и пишется в новый срез, а не теряется вместе со старым.
+    """
+    if full_refresh and not incremental:
+        # Full refresh: новый срез собирается в теневой таблице, читатели живой не блокируются
+        print("🔄 Building SHADOW Gold and swapping it in...")
+        with rebuild(conn):
+            with span("gold.shadow_build", table=SHADOW_TABLE), timed(DB_OPERATION_SECONDS, "shadow_build"), \
+                    profiling.stage("shadow_build"):
+                build_shadow(conn, staging_insert(SHADOW_TABLE, temp_table))
+
+            def replace_state(cur):
+                # DELETE, а не TRUNCATE: indicator_state читается без ожидания блокировки
+                cur.execute("DELETE FROM indicator_state")
+                cur.execute(STATE_UPSERT.format(temp_table=temp_table))
+
+            with span("gold.swap", incremental=False), timed(DB_OPERATION_SECONDS, "merge"), profiling.stage("merge"):
+                attempts = swap_in(conn, before=replace_state)
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE {temp_table}")
+        conn.commit()
+        print(f"✅ SHADOW SWAP COMPLETED SUCCESSFULLY (attempts: {attempts}).")
+        return
+
+    print("🔄 Performing ATOMIC MERGE in Postgres...")
+    with conn.cursor() as cur, span("gold.swap", incremental=incremental), timed(DB_OPERATION_SECONDS, "merge"), \
+            profiling.stage("merge"):
+        # 1. Start Transaction: идущая полная перезаливка сначала переключит срез
+        lock_shared(cur)
+        # Удаляем старые данные для этих тикеров
+        # (в инкрементальном режиме ничего не удаляем - только upsert новых баров)
+        if not incremental:
+            cur.execute(f"DELETE FROM stock_metrics WHERE ticker = ANY(%s)", (target_tickers,))
+            cur.execute("DELETE FROM indicator_state WHERE ticker = ANY(%s)", (target_tickers,))
+            cur.execute("DELETE FROM stock_latest WHERE ticker = ANY(%s)", (target_tickers,))
+
+        # 2. Insert from Temp with EXPLICIT CASTING
+        cur.execute(staging_insert("stock_metrics", temp_table, upsert=incremental))
+
+        # 3. Состояние индикаторов для следующего инкрементального запуска
+        cur.execute(STATE_UPSERT.format(temp_table=temp_table))
+
+        # 4. Последние бары для скринера - только пары из staging, без пересчета всего stock_metrics
+        #    (в той же транзакции: читатели видят старый срез до COMMIT)
+        with timed(DB_OPERATION_SECONDS, "refresh_latest"):
+            cur.execute(LATEST_UPSERT.format(temp_table=temp_table))
+
+        # 5. Cleanup
+        cur.execute(f"DROP TABLE {temp_table}")
+
+        conn.commit()
+        print("✅ ATOMIC SWAP COMPLETED SUCCESSFULLY.")
+
+def process_silver_to_gold_atomic(spark, target_tickers: List[str] = None, incremental: bool = False,
+                                  plan: SparkPlan = None, full_refresh: bool = False):
+    print(f"🚀 [STAGE 2] Silver -> Gold (Atomic Swap) Targets: {target_tickers or 'ALL'} | incremental={incremental}"
+          f" | full_refresh={full_refresh}")
     silver_path = f"s3a://{settings.MINIO_BUCKET_SILVER}/market_data"
     
     try:
@@ -100,24 +320,33 @@ def process_silver_to_gold_atomic(spark, target_tickers: List[str] = None):
         if target_tickers:
             df = df.filter(F.col("ticker").isin(target_tickers))
         
-        if df.rdd.isEmpty():
+        with profiling.stage("silver_read", spark=spark):
+            empty = df.rdd.isEmpty()
+        if empty:
             print("⚠️ [Silver->Gold] No data found.")
             return
 
-        # --- Calculations ---
-        w = Window.partitionBy("ticker", "interval").orderBy("ts")
-        df_indicators = df.withColumn("sma_20", F.avg("close").over(w.rowsBetween(-19, 0)))
-        
-        change = F.col("close") - F.lag("close", 1).over(w)
-        gain = F.when(change > 0, change).otherwise(0)
-        loss = F.when(change < 0, F.abs(change)).otherwise(0)
-        avg_gain = F.avg(gain).over(w.rowsBetween(-13, 0))
-        avg_loss = F.avg(loss).over(w.rowsBetween(-13, 0))
-        rs = avg_gain / avg_loss
-        rsi_calc = 100 - (100 / (1 + rs))
-        rsi_safe = F.when(avg_loss == 0, 100.0).otherwise(rsi_calc)
-        
-        df_final = df_indicators.withColumn("rsi_14", F.coalesce(rsi_safe, F.lit(50.0)))
+        with profiling.stage("state_load"):
+            states = load_indicator_states(target_tickers) if incremental else {}
+        state_df = build_state_frame(spark, states)
+
+        # --- Rollups: 5m/15m/1h из минуток, 1w/1mo из дневок (см. src/processing/rollups.py) ---
+        df = df.select("ticker", "interval", *PRICE_COLUMNS)
+        df = df.unionByName(build_rollups(df, state_df))
+
+        # --- Calculations (реестр индикаторов, см. src/processing/indicators.py) ---
+        df_final, output_cols = calculate_indicators(df, states, state_df)
+
+        # Все индикаторы кроме исторических колонок хранятся в JSONB:
+        # новый индикатор не требует миграции схемы stock_metrics
+        extra_cols = [c for c in output_cols if c not in LEGACY_COLUMNS]
+        indicators_json = F.to_json(F.struct(*extra_cols)) if extra_cols else F.lit(None).cast("string")
+        df_final = df_final.withColumn("indicators", indicators_json).drop(*extra_cols)
+
+        # Холодная история (src/storage/tiers.py) в Gold не грузится: API читает ее из Silver.
+        # Индикаторы к этому моменту посчитаны на полной истории.
+        for interval in cold_intervals():
+            df_final = df_final.filter((F.col("interval") != interval) | (F.col("ts") >= F.lit(cold_cutoff(interval))))
         
         # --- FIX: Convert Timestamp to String for Safe Transport ---
         # Postgres can cast string '2024-01-01 10:00:00' to Timestamp easily.
@@ -126,58 +355,35 @@ def process_silver_to_gold_atomic(spark, target_tickers: List[str] = None):
         # Drop original ts object to avoid confusion in JDBC
         df_final = df_final.drop("ts")
 
-        row_count = df_final.count()
-        print(f"✅ Calculated {row_count} rows.")
-        if row_count == 0: return
+        # Один расчет на count и запись в staging: без кэша rollups и applyInPandas индикаторов шли бы дважды
+        df_final = df_final.persist(StorageLevel.MEMORY_AND_DISK)
+        try:
+            # count() запускает весь план: rollups + applyInPandas индикаторов
+            with span("gold.compute"), timed(STAGE_SECONDS, "gold_compute"), profiling.stage("indicators", spark=spark):
+                row_count = df_final.count()
+            STAGE_ROWS.labels("gold").inc(row_count)
+            print(f"✅ Calculated {row_count} rows.")
+            if row_count == 0: return
 
-        # --- STAGING WRITE ---
-        run_id = str(uuid.uuid4()).replace("-", "")[:8]
-        temp_table = f"temp_metrics_{run_id}"
-        
-        jdbc_url = f"jdbc:postgresql://{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
-        props = {"user": settings.POSTGRES_USER, "password": settings.POSTGRES_PASSWORD, "driver": "org.postgresql.Driver"}
+            # --- STAGING WRITE ---
+            run_id = str(uuid.uuid4()).replace("-", "")[:8]
+            temp_table = f"temp_metrics_{run_id}"
+
+            jdbc_url = f"jdbc:postgresql://{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+            props = {"user": settings.POSTGRES_USER, "password": settings.POSTGRES_PASSWORD, "driver": "org.postgresql.Driver",
+                     **(plan or plan_spark(0)).jdbc_properties()}
 
-        print(f"💾 Writing to STAGING table: {temp_table}...")
-        df_final.write.jdbc(url=jdbc_url, table=temp_table, mode="overwrite", properties=props)
+            print(f"💾 Writing to STAGING table: {temp_table}...")
+            with span("gold.staging_write", table=temp_table, rows=row_count), timed(DB_OPERATION_SECONDS, "staging_write"), \
+                    profiling.stage("staging_load", spark=spark):
+                df_final.write.jdbc(url=jdbc_url, table=temp_table, mode="overwrite", properties=props)
+        finally:
+            df_final.unpersist()
         
         # --- ATOMIC MERGE ---
-        print("🔄 Performing ATOMIC MERGE in Postgres...")
         conn = get_pg_connection()
         try:
-            with conn.cursor() as cur:
-                # 1. Start Transaction
-                # Удаляем старые данные для этих тикеров
-                if target_tickers:
-                    cur.execute(f"DELETE FROM stock_metrics WHERE ticker = ANY(%s)", (target_tickers,))
-                else:
-                    cur.execute("TRUNCATE TABLE stock_metrics") # Full refresh case
-                
-                # 2. Insert from Temp with EXPLICIT CASTING
-                # Мы берем строку ts_str и кастуем её в timestamp: ts_str::timestamp
-                insert_query = f"""
-                    INSERT INTO stock_metrics 
-                    (ticker, interval, ts, open, high, low, close, volume, sma_20, rsi_14)
-                    SELECT 
-                        ticker, 
-                        interval, 
-                        ts_str::timestamp as ts, 
-                        open, 
-                        high, 
-                        low, 
-                        close, 
-                        volume, 
-                        sma_20, 
-                        rsi_14 
-                    FROM {temp_table}
-                """
-                cur.execute(insert_query)
-                
-                # 3. Cleanup
-                cur.execute(f"DROP TABLE {temp_table}")
-                
-                conn.commit()
-                print("✅ ATOMIC SWAP COMPLETED SUCCESSFULLY.")
-                
+            merge_gold(conn, temp_table, target_tickers, incremental, full_refresh or not target_tickers)
         except Exception as e:
             conn.rollback()
             print(f"❌ Transaction FAILED. Rollback executed. Error: {e}")
@@ -191,17 +397,93 @@ def process_silver_to_gold_atomic(spark, target_tickers: List[str] = None):
         finally:
             conn.close()
 
+        # Версия данных растет после возврата отсюда: к этому моменту новый срез должен быть на репликах
+        if settings.GOLD_WAIT_FOR_REPLICAS:
+            with timed(DB_OPERATION_SECONDS, "replica_catchup"):
+                db_router.wait_for_replicas(settings.GOLD_REPLICA_WAIT_SECONDS)
+
     except Exception as e:
         print(f"❌ Error in Silver->Gold: {e}")
         raise e
 
-def process_data(tickers: List[str] = None):
-    spark = get_spark_session()
-    try:
-        process_bronze_to_silver(spark, tickers)
-        process_silver_to_gold_atomic(spark, tickers)
-    finally:
-        spark.stop()
+def changed_bronze(tickers: List[str] = None, force: bool = False):
+    """
+    (тикеры к пересчету, объекты Bronze): тикеры, чьи объекты изменились с прошлого Gold
+    (bronze_manifest); force - все запрошенные, например после смены набора индикаторов.
+    """
+    with span("bronze.manifest"), profiling.stage("manifest"):
+        current = list_bronze_objects(tickers)
+        if force:
+            return (tickers or sorted({ticker_of(p) for p in current})), current
+        changed = diff_manifest(current, load_manifest(tickers))
+    skipped = len(set(tickers or {ticker_of(p) for p in current}) - set(changed))
+    if skipped:
+        print(f"⏭️ Bronze unchanged for {skipped} tickers: Silver/Gold skipped for them")
+    return changed, current
+
+def full_gold_refresh(requested: List[str], bronze: tuple, incremental: bool = False) -> bool:
+    """Запрошены все тикеры, и пересчитываются все тикеры Bronze: теневой срез заменит весь Gold"""
+    tickers, current = bronze
+    return requested is None and not incremental and set(tickers) >= {ticker_of(p) for p in current}
+
+def process_tickers(spark, tickers: List[str] = None, incremental: bool = False, force: bool = False,
+                    bronze: tuple = None, full_refresh: bool = None) -> List[str]:
+    """
+    Bronze -> Silver -> Gold только для изменившихся тикеров; возвращает пересчитанные.
+    Прогон идет в своей сессии (newSession: общий SparkContext, свои SQL-настройки) - параллельные
+    прогоны в потоках воркера не перетирают друг другу shuffle и AQE.
+    full_refresh - полная перезаливка Gold через теневую таблицу; по умолчанию (None) - при запросе
+    всех тикеров (tickers=None), если пересчитываются все тикеры Bronze (full_gold_refresh).
+    """
+    requested = tickers
+    tickers, current = bronze or changed_bronze(tickers, force)
+    if not tickers:
+        print("✅ Bronze unchanged: nothing to process.")
+        return []
+    if full_refresh is None:
+        full_refresh = full_gold_refresh(requested, (tickers, current), incremental)
+    spark = spark.newSession()
+    paths = sorted(p for p in current if ticker_of(p) in tickers)
+    input_bytes = sum(current[p][1] for p in paths)
+    parallelism = spark.sparkContext.defaultParallelism
+    apply_plan(spark, plan_spark(input_bytes, parallelism), "bronze_to_silver")
+    with span("spark.bronze_to_silver"), timed(STAGE_SECONDS, "bronze_to_silver"):
+        row_counts = process_bronze_to_silver(spark, tickers, paths)
+    # applyInPandas индикаторов группирует по (тикер, интервал): Silver-интервалы + роллапы
+    gold_plan = plan_spark(input_bytes, parallelism, groups=len(tickers) * (len(SILVER_INTERVALS) + len(ROLLUPS)))
+    apply_plan(spark, gold_plan, "silver_to_gold")
+    with span("spark.silver_to_gold", incremental=incremental), timed(STAGE_SECONDS, "silver_to_gold"):
+        process_silver_to_gold_atomic(spark, tickers, incremental=incremental, plan=gold_plan,
+                                      full_refresh=full_refresh)
+    record_manifest(current, row_counts, tickers)
+    return tickers
+
+def process_data(tickers: List[str] = None, incremental: bool = False, force: bool = False) -> List[str]:
+    # Манифест проверяется до старта Spark: неизмененный Bronze не стоит даже сессии
+    bronze = changed_bronze(tickers, force)
+    if not bronze[0]:
+        print("✅ Bronze unchanged: nothing to process.")
+        return []
+    # Сессия процесса не останавливается после прогона: воркер (worker_pool=threads) ведет несколько
+    # прогонов в одном SparkContext, и stop() одного оборвал бы остальные
+    return process_tickers(get_shared_spark_session(), incremental=incremental, bronze=bronze,
+                           full_refresh=full_gold_refresh(tickers, bronze, incremental))
+
+_shared_spark = None
+_shared_lock = threading.Lock()
+
+def get_shared_spark_session():
+    """
+    Долгоживущая сессия процесса воркера: старт Spark не повторяется на каждый прогон.
+    Память драйвера и executors задается один раз на JVM, поэтому - по потолкам SPARK_MAX_*_MEMORY
+    (tier large); под объем прогона настраиваются только SQL-настройки его newSession().
+    """
+    global _shared_spark
+    with _shared_lock:
+        if _shared_spark is None or _shared_spark.sparkContext._jsc is None:
+            with span("spark.session"), timed(STAGE_SECONDS, "spark_startup"), profiling.stage("spark_startup"):
+                _shared_spark = get_spark_session("MOEX_ETL_Pipeline", plan_spark(LARGE_INPUT_BYTES))
+        return _shared_spark
 
 if __name__ == "__main__":
     process_data(["SBER"])
\ No newline at end of file
@@ -0,0 +1,116 @@
+# File: src/processing/tuning.py
+"""
+Настройки Spark по объему входа: размер читаемого Bronze известен из листинга манифеста
+(src/storage/bronze_manifest.py) еще до старта прогона.
+
+Дневное обновление одного тикера (килобайты) не дробится на 200 пустых shuffle-задач, а полный
+resync минуток получает партиции по ~128 МБ и пакетную запись в Postgres.
+Память (session_conf) применяется только при запуске JVM: воркер ведет все прогоны в одном
+SparkContext, поэтому он создается с потолками SPARK_MAX_*_MEMORY (tier large). Shuffle, AQE
+и размер сплитов (runtime_conf) ставятся на newSession() каждого прогона и друг другу не мешают.
+"""
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from src.config import settings
+
+MB = 1024 * 1024
+TARGET_PARTITION_BYTES = 128 * MB
+MIN_SPLIT_BYTES = 8 * MB
+MAX_SHUFFLE_PARTITIONS = 2000
+
+# Объем входа (Bronze JSON) -> (tier, память драйвера и executor в МБ, memoryOverhead в МБ, JDBC batchsize)
+TIERS = [
+    (256 * MB, "small", 1024, 384, 5_000),
+    (4096 * MB, "medium", 2048, 512, 10_000),
+    (None, "large", 4096, 1024, 20_000),
+]
+LARGE_INPUT_BYTES = TIERS[1][0]
+
+
+def parse_mb(value: str) -> int:
+    """"2g" / "1536m" -> МБ"""
+    value = value.strip().lower()
+    if value.endswith("g"):
+        return int(float(value[:-1]) * 1024)
+    return int(float(value.rstrip("m")))
+
+
+@dataclass(frozen=True)
+class SparkPlan:
+    input_bytes: int
+    tier: str
+    driver_memory_mb: int
+    executor_memory_mb: int
+    memory_overhead_mb: int
+    shuffle_partitions: int
+    max_split_bytes: int
+    jdbc_batch_size: int
+    jdbc_writers: int
+
+    def session_conf(self) -> Dict[str, str]:
+        """Только при создании сессии (JVM драйвера и executors)"""
+        return {
+            "spark.driver.memory": f"{self.driver_memory_mb}m",
+            "spark.executor.memory": f"{self.executor_memory_mb}m",
+            "spark.executor.memoryOverhead": f"{self.memory_overhead_mb}m",
+            **self.runtime_conf(),
+        }
+
+    def runtime_conf(self) -> Dict[str, str]:
+        """SQL-настройки, которые меняются на живой сессии перед каждым прогоном"""
+        return {
+            "spark.sql.shuffle.partitions": str(self.shuffle_partitions),
+            "spark.sql.adaptive.enabled": "true",
+            # AQE склеивает мелкие партиции после shuffle до advisory-размера, а не до числа ядер
+            "spark.sql.adaptive.coalescePartitions.enabled": "true",
+            "spark.sql.adaptive.coalescePartitions.parallelismFirst": "false",
+            "spark.sql.adaptive.coalescePartitions.initialPartitionNum": str(self.shuffle_partitions),
+            "spark.sql.adaptive.advisoryPartitionSizeInBytes": str(min(TARGET_PARTITION_BYTES, max(
+                MIN_SPLIT_BYTES, self.input_bytes // max(self.shuffle_partitions, 1)))),
+            # Тикер с многолетними минутками рядом с десятком неликвидных - перекос партиций
+            "spark.sql.adaptive.skewJoin.enabled": "true",
+            "spark.sql.files.maxPartitionBytes": str(self.max_split_bytes),
+        }
+
+    def jdbc_properties(self) -> Dict[str, str]:
+        # numPartitions ограничивает число одновременных соединений записи (coalesce до него)
+        return {"batchsize": str(self.jdbc_batch_size), "numPartitions": str(self.jdbc_writers)}
+
+    def describe(self) -> str:
+        return (f"tier={self.tier} input={self.input_bytes / MB:.1f}MB driver={self.driver_memory_mb}m "
+                f"executor={self.executor_memory_mb}m+{self.memory_overhead_mb}m "
+                f"shuffle_partitions={self.shuffle_partitions} max_split={self.max_split_bytes // MB}MB "
+                f"jdbc_batch={self.jdbc_batch_size} jdbc_writers={self.jdbc_writers}")
+
+
+def plan_spark(input_bytes: int, parallelism: Optional[int] = None, groups: Optional[int] = None) -> SparkPlan:
+    """
+    input_bytes - объем Bronze, который прочитает прогон; parallelism - ядра кластера
+    (defaultParallelism живой сессии или SPARK_PARALLELISM); groups - число групп applyInPandas
+    (тикер x интервал): партиций больше, чем групп, индикаторам не нужно.
+    """
+    parallelism = max(1, parallelism or settings.SPARK_PARALLELISM)
+    _, tier, memory_mb, overhead_mb, jdbc_batch = next(t for t in TIERS if t[0] is None or input_bytes < t[0])
+    partitions = max(parallelism, min(MAX_SHUFFLE_PARTITIONS, math.ceil(input_bytes / TARGET_PARTITION_BYTES)))
+    if groups:
+        partitions = min(partitions, max(parallelism, groups))
+    return SparkPlan(
+        input_bytes=input_bytes,
+        tier=tier,
+        driver_memory_mb=min(memory_mb, parse_mb(settings.SPARK_MAX_DRIVER_MEMORY)),
+        executor_memory_mb=min(memory_mb, parse_mb(settings.SPARK_MAX_EXECUTOR_MEMORY)),
+        memory_overhead_mb=overhead_mb,
+        shuffle_partitions=partitions,
+        # Мелкий вход делится на все ядра, крупный - сплитами по 128 МБ
+        max_split_bytes=min(TARGET_PARTITION_BYTES, max(MIN_SPLIT_BYTES, input_bytes // parallelism)),
+        jdbc_batch_size=jdbc_batch,
+        jdbc_writers=max(1, min(settings.SPARK_JDBC_MAX_WRITERS, partitions)),
+    )
+
+
+def apply_plan(spark, plan: SparkPlan, stage: str = ""):
+    for key, value in plan.runtime_conf().items():
+        spark.conf.set(key, value)
+    print(f"⚙️ Spark plan{f' [{stage}]' if stage else ''}: {plan.describe()}")
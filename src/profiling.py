@@ -0,0 +1,275 @@
+# File: src/profiling.py
+"""
+Опциональное профилирование run_etl_task: wall/CPU время по стадиям, самые медленные чанки,
+сэмплы Python-стеков и метрики стадий Spark (StatusTracker).
+
+Стадии размечаются через profiling.stage("name") прямо в коде пайплайна; без активного
+профиля это пустой контекст. Профиль ищется сначала в contextvar, иначе берется единственный
+активный профиль процесса: потоки Dask и Prefect не наследуют contextvar, а воркеры из
+start.sh (--pool=solo) выполняют одну задачу за раз.
+
+Сэмплер раз в PROFILE_SAMPLE_MS снимает стеки только тех потоков, которые сейчас внутри стадии,
+поэтому простаивающие потоки Celery/Dask не засоряют отчет. Отчет сохраняется в etl_run_profiles
+(src/storage/run_profiles.py) и открывается из панели задач дашборда.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+TOP_FUNCTIONS = 25
+TOP_SLOWEST = 10
+
+_current: ContextVar[Optional["RunProfile"]] = ContextVar("etl_profile", default=None)
+_active: Dict[str, "RunProfile"] = {}
+_active_lock = threading.Lock()
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Статистический профайлер на sys._current_frames(): без оверхеда cProfile и работает во всех потоках"""
+
+    def __init__(self, profile: "RunProfile", interval: float):
+        self.profile = profile
+        self.interval = interval
+        self.samples = 0
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self.stage_counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="etl-profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            threads = self.profile.sampled_threads()
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stage_name in threads.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                self.sample(frame, stage_name)
+
+    def sample(self, frame, stage_name: str):
+        self.samples += 1
+        self.stage_counts[stage_name] += 1
+        self.self_counts[frame_label(frame)] += 1
+        seen = set()
+        while frame is not None:
+            label = frame_label(frame)
+            if label not in seen:  # рекурсия не должна раздувать cumulative
+                seen.add(label)
+                self.total_counts[label] += 1
+            frame = frame.f_back
+
+    def report(self) -> dict:
+        def top(counts: Counter) -> List[dict]:
+            return [{"function": f, "samples": n, "share": round(n / self.samples, 4)}
+                    for f, n in counts.most_common(TOP_FUNCTIONS)]
+
+        return {
+            "interval_ms": round(self.interval * 1000, 2),
+            "samples": self.samples,
+            "by_stage": dict(self.stage_counts),
+            "top_self": top(self.self_counts) if self.samples else [],
+            "top_cumulative": top(self.total_counts) if self.samples else [],
+        }
+
+
+class RunProfile:
+    """Отчет одного запуска ETL; stage() безопасен для вызова из потоков Dask"""
+
+    def __init__(self, task_id: str, tickers: List[str] = None, sample_ms: float = 10.0):
+        self.task_id = task_id
+        self.tickers = list(tickers or [])
+        self.started_at = datetime.now()
+        self.stages: Dict[str, dict] = {}
+        self.slowest: List[dict] = []
+        self.spark_stages: List[dict] = []
+        self.status = "RUNNING"
+        self._lock = threading.Lock()
+        self._threads: Dict[int, List[str]] = {}
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._wall = self._cpu = None
+        self.sampler = StackSampler(self, sample_ms / 1000) if sample_ms else None
+
+    # --- Стадии ---
+    def record(self, name: str, wall: float, cpu: float, item: str = None):
+        with self._lock:
+            s = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_wall_s": 0.0})
+            s["calls"] += 1
+            s["wall_s"] += wall
+            s["cpu_s"] += cpu
+            s["max_wall_s"] = max(s["max_wall_s"], wall)
+            if item is not None:
+                self.slowest.append({"stage": name, "item": item, "wall_s": wall})
+                if len(self.slowest) > TOP_SLOWEST * 4:
+                    self.slowest = sorted(self.slowest, key=lambda r: r["wall_s"], reverse=True)[:TOP_SLOWEST]
+
+    @contextmanager
+    def stage(self, name: str, item: str = None):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._threads.setdefault(thread_id, []).append(name)
+        wall0, cpu0 = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            # thread_time - CPU только этого потока: параллельные чанки Dask не суммируются друг в друга
+            self.record(name, time.perf_counter() - wall0, time.thread_time() - cpu0, item)
+            with self._lock:
+                names = self._threads[thread_id]
+                names.pop()
+                if not names:
+                    del self._threads[thread_id]
+
+    def sampled_threads(self) -> Dict[int, str]:
+        """{thread_id: самая вложенная стадия} для сэмплера"""
+        with self._lock:
+            return {tid: names[-1] for tid, names in self._threads.items()}
+
+    # --- Spark ---
+    def collect_spark(self, spark, group: str, name: str):
+        """Стадии Spark всех джобов группы: задачи, упавшие задачи, имя (callsite)"""
+        tracker = spark.sparkContext.statusTracker()
+        for job_id in tracker.getJobIdsForGroup(group):
+            job = tracker.getJobInfo(job_id)
+            if job is None:
+                continue
+            for stage_id in job.stageIds:
+                info = tracker.getStageInfo(stage_id)
+                if info is None:
+                    continue
+                with self._lock:
+                    self.spark_stages.append({
+                        "stage": name, "job_id": job_id, "job_status": job.status, "stage_id": stage_id,
+                        "name": info.name, "num_tasks": info.numTasks,
+                        "completed_tasks": info.numCompletedTasks, "failed_tasks": info.numFailedTasks,
+                    })
+
+    # --- Жизненный цикл ---
+    def start(self) -> "RunProfile":
+        if self.sampler:
+            self.sampler.start()
+        return self
+
+    def finish(self, status: str = "SUCCESS"):
+        if self.sampler:
+            self.sampler.stop()
+        self.status = status
+        self._wall = time.perf_counter() - self._wall0
+        self._cpu = time.process_time() - self._cpu0
+
+    def report(self) -> dict:
+        wall = self._wall if self._wall is not None else time.perf_counter() - self._wall0
+        cpu = self._cpu if self._cpu is not None else time.process_time() - self._cpu0
+        with self._lock:
+            stages = {name: {k: round(v, 4) if isinstance(v, float) else v for k, v in s.items()}
+                      for name, s in self.stages.items()}
+            slowest = sorted(self.slowest, key=lambda r: r["wall_s"], reverse=True)[:TOP_SLOWEST]
+            spark_stages = list(self.spark_stages)
+        return {
+            "task_id": self.task_id,
+            "tickers": self.tickers,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_s": round(wall, 3),
+            "cpu_s": round(cpu, 3),  # CPU всего процесса (все потоки драйвера)
+            "stages": stages,
+            "slowest": [{**r, "wall_s": round(r["wall_s"], 4)} for r in slowest],
+            "spark_stages": spark_stages,
+            "python": self.sampler.report() if self.sampler else None,
+        }
+
+
+def current() -> Optional[RunProfile]:
+    profile = _current.get()
+    if profile is not None:
+        return profile
+    with _active_lock:
+        return next(iter(_active.values())) if len(_active) == 1 else None
+
+
+@contextmanager
+def stage(name: str, item: str = None, spark=None):
+    """
+    Размечает стадию пайплайна. Без активного профиля ничего не делает.
+    spark: стадия запускает джобы Spark - они собираются в job group, и после стадии
+    в отчет добавляются их стадии из StatusTracker.
+    """
+    profile = current()
+    if profile is None:
+        yield
+        return
+    group = None
+    if spark is not None:
+        group = f"profile-{profile.task_id}-{name}"
+        spark.sparkContext.setJobGroup(group, f"{name} ({profile.task_id})")
+    try:
+        with profile.stage(name, item):
+            yield
+    finally:
+        if group is not None:
+            spark.sparkContext.setLocalProperty("spark.jobGroup.id", None)
+            try:
+                profile.collect_spark(spark, group, name)
+            except Exception as e:
+                print(f"⚠️ Spark StatusTracker unavailable: {e}")
+
+
+@contextmanager
+def profile_run(task_id: str, tickers: List[str] = None, enabled: bool = True, sample_ms: float = 10.0,
+                on_finish=None):
+    """Активирует профиль на время запуска; on_finish(report) - сохранение отчета"""
+    if not enabled:
+        yield None
+        return
+    profile = RunProfile(task_id, tickers, sample_ms).start()
+    token = _current.set(profile)
+    with _active_lock:
+        _active[task_id] = profile
+    status = "FAILURE"
+    try:
+        yield profile
+        status = "SUCCESS"
+    finally:
+        _current.reset(token)
+        with _active_lock:
+            _active.pop(task_id, None)
+        profile.finish(status)
+        if on_finish is not None:
+            try:
+                on_finish(profile.report())
+            except Exception as e:
+                print(f"⚠️ Failed to save profile {task_id}: {e}")
+
+
+def compare_stages(report: dict, previous: Optional[dict]) -> List[dict]:
+    """Строки таблицы стадий: текущее время, прошлый запуск и изменение (для дашборда и API)"""
+    prev_stages = (previous or {}).get("stages", {})
+    rows = []
+    for name, s in sorted(report.get("stages", {}).items(), key=lambda kv: kv[1]["wall_s"], reverse=True):
+        prev = prev_stages.get(name)
+        change = None
+        if prev and prev["wall_s"]:
+            change = round((s["wall_s"] - prev["wall_s"]) / prev["wall_s"], 4)
+        rows.append({"stage": name, **s, "prev_wall_s": prev["wall_s"] if prev else None, "change": change})
+    return rows
@@ -0,0 +1,81 @@
+# File: src/storage/bronze_manifest.py
+"""
+Манифест обработки Bronze (таблица bronze_manifest): ETag, размер и число строк каждого объекта,
+попавшего в Gold. Перед Spark объекты бакета сравниваются с манифестом, и Silver/Gold
+пересчитываются только для тикеров с новыми, измененными или удаленными объектами.
+Гранулярность - тикер: Silver перезаписывается партицией тикера целиком.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from src.config import settings
+
+# path (относительно бакета Bronze) -> (etag, size)
+Objects = Dict[str, Tuple[str, int]]
+
+
+def get_db_connection():
+    return psycopg2.connect(
+        host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT,
+        user=settings.POSTGRES_USER, password=settings.POSTGRES_PASSWORD,
+        dbname=settings.POSTGRES_DB
+    )
+
+
+def ticker_of(path: str) -> str:
+    return path.split("/", 1)[0]
+
+
+def is_chunk(path: str) -> bool:
+    """Только то, что читает Spark (*.json): страницы .part и маркеры .done не в счет"""
+    return path.endswith(".json") and ".json.part/" not in path
+
+
+def list_bronze_objects(tickers: Optional[List[str]] = None) -> Objects:
+    """Свежий листинг (не из кэша): от него зависит, какие тикеры пересчитывать"""
+    from src.storage.minio_client import minio_client
+
+    objects = {}
+    for ticker in tickers or minio_client.list_downloaded_tickers(fresh=True):
+        for path, meta in minio_client.inventory.objects(ticker, fresh=True).items():
+            if path.startswith(ticker + "/") and is_chunk(path):
+                objects[path] = meta
+    return objects
+
+
+def load_manifest(tickers: Optional[List[str]] = None) -> Objects:
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT path, etag, size FROM bronze_manifest WHERE %s::text[] IS NULL OR ticker = ANY(%s)",
+                        (tickers, tickers))
+            return {path: (etag, size) for path, etag, size in cur.fetchall()}
+    finally:
+        conn.close()
+
+
+def diff_manifest(current: Objects, recorded: Objects) -> List[str]:
+    """Тикеры, у которых объект появился, изменился (ETag/размер) или исчез"""
+    changed = {ticker_of(p) for p, meta in current.items() if recorded.get(p) != meta}
+    changed |= {ticker_of(p) for p in recorded.keys() - current.keys()}
+    return sorted(changed)
+
+
+def record_manifest(current: Objects, row_counts: Dict[str, int], tickers: Iterable[str]):
+    """После успешного Gold: манифест тикеров приводится к текущему состоянию бакета"""
+    tickers = sorted(set(tickers))
+    values = [(p, ticker_of(p), etag, size, row_counts.get(p)) for p, (etag, size) in current.items()
+              if ticker_of(p) in tickers]
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM bronze_manifest WHERE ticker = ANY(%s)", (tickers,))
+            if values:
+                execute_values(cur, """
+                    INSERT INTO bronze_manifest (path, ticker, etag, size, rows) VALUES %s
+                """, values, page_size=5000)
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,220 @@
+# File: src/storage/db.py
+"""
+Маршрутизация соединений Postgres: чтения Gold из API - на streaming-реплики, записи и ETL - на primary.
+
+Реплика годится для чтения, пока ее лаг не больше REPLICA_MAX_LAG_SECONDS. Лаг проверяется
+на самом соединении не чаще раза в REPLICA_CHECK_SECONDS; недоступная реплика пропускается
+до следующей проверки. Если подходящих реплик нет (или POSTGRES_REPLICAS пуст), чтение
+идет на primary - поведение без реплик не меняется.
+
+Версия данных (task_registry) публикуется вместе с позицией WAL primary после коммита Gold.
+read(min_lsn=...) отдает реплику, только если та проиграла WAL до этой позиции, иначе primary:
+горячий хвост API и кэш дашборда, перегружаемые по новой версии, не кэшируют старый срез
+под новой версией, даже если GOLD_WAIT_FOR_REPLICAS выключен или ожидание истекло.
+Gold swap может и дождаться реплик (GOLD_WAIT_FOR_REPLICAS), чтобы чтения сразу шли на них.
+"""
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from src.config import settings
+from src.telemetry import DB_READS
+
+# Лаг по времени последней проигранной транзакции; 0, если реплика проиграла все, что получила -
+# иначе на простаивающем primary лаг "растет" без новых записей. Без активного WAL receiver
+# "проиграла все полученное" верно всегда - такая реплика отстает неизвестно насколько (NULL)
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN NULL
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def lsn_value(lsn: str) -> int:
+    """"16/B374D848" -> число для сравнения позиций WAL"""
+    high, _, low = lsn.partition("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def parse_hosts(value: str) -> List[Tuple[str, int]]:
+    """"replica1,replica2:5433" -> [("replica1", 5432), ("replica2", 5433)]"""
+    hosts = []
+    for item in filter(None, (v.strip() for v in value.split(","))):
+        host, _, port = item.partition(":")
+        hosts.append((host, int(port or settings.POSTGRES_PORT)))
+    return hosts
+
+
+class Replica:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.lag: Optional[float] = None  # None - не проверялась, недоступна или не в recovery
+        self.checked_at = float("-inf")
+        self.replayed = 0  # наибольшая виденная позиция проигранного WAL (только растет)
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+class DbRouter:
+    def __init__(self, replicas: List[Tuple[str, int]], max_lag: float = 5.0, check_interval: float = 5.0,
+                 connect: Callable = psycopg2.connect, clock: Callable[[], float] = time.monotonic):
+        self.replicas = [Replica(host, port) for host, port in replicas]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.connect = connect
+        self.clock = clock
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "DbRouter":
+        return cls(parse_hosts(settings.POSTGRES_REPLICAS), settings.REPLICA_MAX_LAG_SECONDS,
+                   settings.REPLICA_CHECK_SECONDS)
+
+    def _params(self, host: str, port: int, **extra) -> Dict:
+        return dict(host=host, port=port, user=settings.POSTGRES_USER, password=settings.POSTGRES_PASSWORD,
+                    dbname=settings.POSTGRES_DB, **extra)
+
+    def primary(self):
+        """Записи, ETL и чтения, которым нужны только что записанные данные (read-your-writes)"""
+        return self.connect(**self._params(settings.POSTGRES_HOST, settings.POSTGRES_PORT))
+
+    def _candidates(self) -> List[Replica]:
+        """Реплики по кругу; заведомо отстающие/недоступные - только если пора перепроверить"""
+        with self._lock:
+            start = next(self._order)
+        n = len(self.replicas)
+        ordered = [self.replicas[(start + i) % n] for i in range(n)]
+        now = self.clock()
+        return [r for r in ordered if now - r.checked_at > self.check_interval
+                or (r.lag is not None and r.lag <= self.max_lag)]
+
+    def _try_replica(self, replica: Replica):
+        try:
+            conn = self.connect(**self._params(replica.host, replica.port, connect_timeout=2))
+        except psycopg2.Error as e:
+            print(f"⚠️ Replica {replica.name} unavailable: {e}")
+            replica.lag, replica.checked_at = None, self.clock()
+            return None
+        if self.clock() - replica.checked_at > self.check_interval:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(LAG_QUERY)
+                    lag = cur.fetchone()[0]
+                conn.rollback()  # не держать транзакцию проверки открытой на реплике
+            except psycopg2.Error as e:
+                print(f"⚠️ Replica {replica.name} lag check failed: {e}")
+                lag = None
+            replica.lag, replica.checked_at = (None if lag is None else float(lag)), self.clock()
+        if replica.lag is None or replica.lag > self.max_lag:
+            conn.close()
+            return None
+        return conn
+
+    def _replayed_to(self, replica: Replica, conn, lsn: int) -> bool:
+        """Реплика проиграла WAL до lsn; запрос к ней - только пока кэшированная позиция меньше"""
+        if replica.replayed >= lsn:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_last_wal_replay_lsn()::text")
+                replayed = cur.fetchone()[0]
+            conn.rollback()
+        except psycopg2.Error as e:
+            print(f"⚠️ Replica {replica.name} replay position check failed: {e}")
+            return False
+        if replayed:
+            replica.replayed = max(replica.replayed, lsn_value(replayed))
+        return replica.replayed >= lsn
+
+    def read(self, min_lsn: Optional[str] = None):
+        """
+        Соединение только для чтения: реплика с допустимым лагом, иначе primary.
+        min_lsn - позиция WAL опубликованной версии данных: реплика, не проигравшая ее, пропускается.
+        """
+        need = lsn_value(min_lsn) if min_lsn else 0
+        for replica in self._candidates():
+            conn = self._try_replica(replica)
+            if conn is not None and need and not self._replayed_to(replica, conn, need):
+                conn.close()
+                conn = None
+            if conn is not None:
+                DB_READS.labels("replica").inc()
+                return conn
+        DB_READS.labels("primary").inc()
+        return self.primary()
+
+    def current_lsn(self) -> Optional[str]:
+        """Позиция WAL primary (после COMMIT покрывает его); None без реплик или при ошибке"""
+        if not self.replicas:
+            return None
+        try:
+            conn = self.primary()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_current_wal_lsn()::text")
+                    return cur.fetchone()[0]
+            finally:
+                conn.close()
+        except psycopg2.Error as e:
+            print(f"⚠️ Cannot read primary WAL position: {e}")
+            return None
+
+    def wait_for_replicas(self, timeout: float = 30.0, poll: float = 0.2) -> bool:
+        """
+        Ждет, пока все реплики проиграют WAL до текущей позиции primary (вызывается после COMMIT).
+        False - кто-то не догнал за timeout; чтения новой версии с него уйдут на primary (min_lsn).
+        """
+        if not self.replicas:
+            return True
+        lsn = self.current_lsn()
+        if lsn is None:
+            print("⚠️ Not waiting for replicas: primary WAL position unknown")
+            return False
+
+        pending = list(self.replicas)
+        deadline = self.clock() + timeout
+        while pending:
+            for replica in list(pending):
+                try:
+                    conn = self.connect(**self._params(replica.host, replica.port, connect_timeout=2))
+                    try:
+                        with conn.cursor() as cur:
+                            cur.execute("SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn", (lsn,))
+                            if cur.fetchone()[0]:
+                                pending.remove(replica)
+                    finally:
+                        conn.close()
+                except psycopg2.Error as e:
+                    print(f"⚠️ Replica {replica.name} unavailable while waiting for catch-up: {e}")
+            if not pending:
+                return True
+            if self.clock() >= deadline:
+                print(f"⚠️ Replicas did not catch up in {timeout}s: {[r.name for r in pending]}")
+                return False
+            time.sleep(poll)
+        return True
+
+
+db_router = DbRouter.from_settings()
+
+
+def data_lsn() -> Optional[str]:
+    """Позиция WAL опубликованной версии данных (min_lsn для read); без реплик Redis не опрашивается"""
+    if not db_router.replicas:
+        return None
+    from src.storage.task_registry import task_registry
+
+    try:
+        return task_registry.get_data_lsn()
+    except Exception:
+        return None  # Redis недоступен - остается проверка по лагу
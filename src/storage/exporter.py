@@ -0,0 +1,166 @@
+# File: src/storage/exporter.py
+import io
+import uuid
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from src.config import settings
+from src.storage.db import data_lsn, db_router
+from src.storage.silver_reader import silver_reader
+from src.storage.tiers import split_range
+
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+EXPORT_BATCH_ROWS = 50_000
+
+EXPORT_SCHEMA = pa.schema([
+    ("ticker", pa.string()), ("interval", pa.string()), ("ts", pa.timestamp("us")),
+    ("open", pa.float64()), ("high", pa.float64()), ("low", pa.float64()), ("close", pa.float64()),
+    ("volume", pa.float64()), ("sma_20", pa.float64()), ("rsi_14", pa.float64()),
+    ("indicators", pa.string()),  # JSONB как JSON-строка: набор индикаторов зависит от реестра
+])
+
+
+def get_db_connection():
+    """
+    Выгрузка только читает Gold: реплика с допустимым лагом, проигравшая коммит опубликованной
+    версии данных, иначе primary - выгрузка сразу после ETL не читает старый срез
+    """
+    return db_router.read(min_lsn=data_lsn())
+
+
+def iter_batches(tickers: List[str], interval: str, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    """
+    Строки по (ticker, ts). Диапазон, заходящий за границу уровней (src/storage/tiers.py), по каждому
+    тикеру: сначала холодная история из Silver, затем горячее окно из Gold.
+    """
+    tiers = split_range(interval, start, end)
+    if tiers["cold"] is None:
+        yield from iter_gold_batches(tickers, interval, start, end, batch_rows)
+        return
+    for ticker in sorted({t.upper() for t in tickers}):
+        for batch in silver_reader.iter_batches(ticker, interval, *tiers["cold"], batch_rows):
+            yield silver_to_export(batch, ticker, interval)
+        if tiers["hot"]:
+            yield from iter_gold_batches([ticker], interval, *tiers["hot"], batch_rows)
+
+
+def silver_to_export(batch: pa.RecordBatch, ticker: str, interval: str) -> pa.RecordBatch:
+    n = batch.num_rows
+    columns = {"ticker": pa.array([ticker] * n, pa.string()), "interval": pa.array([interval] * n, pa.string())}
+    columns.update({name: batch.column(name) for name in batch.schema.names})
+    return pa.RecordBatch.from_arrays(
+        [columns[f.name].cast(f.type) if f.name in columns else pa.nulls(n, f.type) for f in EXPORT_SCHEMA],
+        schema=EXPORT_SCHEMA,
+    )
+
+
+def iter_gold_batches(tickers: List[str], interval: str, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None, batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    """
+    Строки Gold серверным (named) курсором: Postgres отдает их порциями по batch_rows,
+    в памяти процесса одновременно не больше одного батча.
+    """
+    clauses, params = ["ticker = ANY(%s)", "interval = %s"], [[t.upper() for t in tickers], interval]
+    if start:
+        clauses.append("ts >= %s"); params.append(start)
+    if end:
+        clauses.append("ts < %s"); params.append(end)
+    query = f"""
+        SELECT ticker, interval, ts, open, high, low, close, volume, sma_20, rsi_14, indicators::text
+        FROM stock_metrics WHERE {" AND ".join(clauses)}
+        ORDER BY ticker, ts
+    """
+    conn = get_db_connection()
+    try:
+        # Named cursor живет только внутри транзакции; withhold не нужен
+        with conn.cursor(name=f"export_{uuid.uuid4().hex[:8]}") as cur:
+            cur.itersize = batch_rows
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(batch_rows)
+                if not rows:
+                    break
+                yield pa.RecordBatch.from_arrays(
+                    [pa.array(col, type=field.type) for col, field in zip(zip(*rows), EXPORT_SCHEMA)],
+                    schema=EXPORT_SCHEMA,
+                )
+    finally:
+        conn.close()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файловый объект для ParquetWriter, из которого готовые байты забираются по кускам"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def iter_csv(batches: Iterator[pa.RecordBatch]) -> Iterator[bytes]:
+    for i, batch in enumerate(batches):
+        buf = io.BytesIO()
+        pa_csv.write_csv(batch, buf, pa_csv.WriteOptions(include_header=(i == 0)))
+        yield buf.getvalue()
+
+
+def iter_parquet(batches: Iterator[pa.RecordBatch]) -> Iterator[bytes]:
+    """Каждый батч - отдельная row group; footer уходит последним куском"""
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, EXPORT_SCHEMA, compression="snappy")
+    try:
+        for batch in batches:
+            writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_export(tickers: List[str], interval: str, fmt: str, start: Optional[datetime] = None,
+                end: Optional[datetime] = None) -> Iterator[bytes]:
+    batches = iter_batches(tickers, interval, start, end)
+    return iter_csv(batches) if fmt == "csv" else iter_parquet(batches)
+
+
+def export_filename(tickers: List[str], interval: str, fmt: str) -> str:
+    label = tickers[0].upper() if len(tickers) == 1 else f"{len(tickers)}_tickers"
+    return f"{label}_{interval}_{datetime.now():%Y%m%d_%H%M%S}.{fmt}"
+
+
+def export_to_minio(tickers: List[str], interval: str, fmt: str, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None, progress=None) -> dict:
+    """Фоновая выгрузка: пишет файл в бакет экспорта по кускам и возвращает presigned URL"""
+    from src.storage.minio_client import minio_client
+
+    key = f"{uuid.uuid4().hex[:8]}/{export_filename(tickers, interval, fmt)}"
+    path = f"{settings.MINIO_BUCKET_EXPORTS}/{key}"
+    size = 0
+    with minio_client.fs.open(path, "wb") as f:
+        for chunk in iter_export(tickers, interval, fmt, start, end):
+            f.write(chunk)
+            size += len(chunk)
+            if progress: progress(size)
+    return {"key": key, "bytes": size, "url": minio_client.presigned_url(path, settings.EXPORT_URL_TTL)}
+
@@ -0,0 +1,233 @@
+# File: src/storage/gold_swap.py
+"""
+Полная перезаливка Gold без блокировки читателей (blue-green).
+
+TRUNCATE stock_metrics внутри транзакции загрузки держал ACCESS EXCLUSIVE все время перезаливки:
+/metrics, /tickers и /screener висели до COMMIT. Вместо этого новый срез собирается рядом:
+
+  1. build_shadow: stock_metrics_shadow без индексов -> INSERT из staging -> PK и индексы
+     одним проходом -> ANALYZE -> stock_latest_shadow (последние бары, таблица) со своими индексами.
+     Каждый шаг - отдельная транзакция, живая таблица не блокируется.
+  2. swap_in: короткая транзакция из одних переименований (live -> _old, _shadow -> live)
+     с lock_timeout: если блокировку держит долгий читатель (выгрузка), попытка отменяется,
+     не выстраивая за собой очередь новых запросов, и повторяется.
+
+Предыдущий срез остается как stock_metrics_old / stock_latest_old для отката (rollback)
+и удаляется через GOLD_SWAP_KEEP_OLD_HOURS (drop_expired из retention_task) или следующей перезаливкой.
+
+Сборка и swap идут под эксклюзивным advisory lock Gold (rebuild), merge тикеров в живую таблицу -
+под разделяемым (lock_shared): merge, закоммиченный во время сборки, пропал бы при переименовании,
+поэтому он ждет переключения и пишется уже в новый срез. rollback берет ее эксклюзивно, drop_expired -
+разделяемо без ожидания: во время перезаливки _old не удаляется (там может быть только что отставленный срез).
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Optional
+
+import psycopg2
+import psycopg2.errors
+
+from src.config import settings
+from src.ingestion.watermarks import moscow_now
+
+TABLE = "stock_metrics"
+LATEST = "stock_latest"
+SHADOW, OLD = "_shadow", "_old"
+SHADOW_TABLE = TABLE + SHADOW
+RETIRED_PREFIX = "retired "
+GOLD_LOCK_KEY = 0x4D4F4558  # "MOEX": ключ advisory lock Gold, общий для всех воркеров
+
+# Индексы поколения (имена без суффикса), как в docker/init.sql
+TABLE_INDEXES = {
+    "idx_ticker_interval": "(ticker, interval)",
+    "idx_ts": "(ts)",
+}
+LATEST_INDEXES = {
+    "idx_stock_latest_pk": "UNIQUE INDEX {name} ON {table} (ticker, interval)",
+    "idx_stock_latest_interval": "INDEX {name} ON {table} (interval)",
+}
+LATEST_QUERY = """
+    INSERT INTO {latest}
+    SELECT DISTINCT ON (ticker, interval)
+        ticker, interval, ts, open, high, low, close, volume, sma_20, rsi_14, indicators
+    FROM {table}
+    ORDER BY ticker, interval, ts DESC
+"""
+
+
+def get_db_connection():
+    return psycopg2.connect(
+        host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT,
+        user=settings.POSTGRES_USER, password=settings.POSTGRES_PASSWORD,
+        dbname=settings.POSTGRES_DB
+    )
+
+
+def drop_generation(cur, suffix: str):
+    cur.execute(f"DROP TABLE IF EXISTS {LATEST}{suffix}")
+    cur.execute(f"DROP TABLE IF EXISTS {TABLE}{suffix}")
+
+
+def build_shadow(conn, load_sql: str):
+    """
+    load_sql - INSERT INTO stock_metrics_shadow ... из staging. Прошлые _shadow и _old удаляются:
+    одновременно на диске живой срез и собираемый, а не три.
+    """
+    with conn.cursor() as cur:
+        drop_generation(cur, SHADOW)
+        drop_generation(cur, OLD)
+        # Без INCLUDING INDEXES: вставка в голую кучу, индексы строятся после одним проходом
+        cur.execute(f"CREATE TABLE {SHADOW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS)")
+    conn.commit()
+
+    with conn.cursor() as cur:
+        cur.execute(load_sql)
+    conn.commit()
+
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL maintenance_work_mem = %s", (settings.GOLD_SWAP_MAINTENANCE_WORK_MEM,))
+        cur.execute(f"ALTER TABLE {SHADOW_TABLE} ADD CONSTRAINT {TABLE}{SHADOW}_pkey PRIMARY KEY (ticker, interval, ts)")
+        for name, columns in TABLE_INDEXES.items():
+            cur.execute(f"CREATE INDEX {name}{SHADOW} ON {SHADOW_TABLE} {columns}")
+    conn.commit()
+
+    with conn.cursor() as cur:
+        # Статистика до переключения: первые запросы к новой таблице не планируются вслепую
+        cur.execute(f"ANALYZE {SHADOW_TABLE}")
+        cur.execute(f"CREATE TABLE {LATEST}{SHADOW} (LIKE {LATEST} INCLUDING DEFAULTS)")
+        cur.execute(LATEST_QUERY.format(latest=LATEST + SHADOW, table=SHADOW_TABLE))
+        for name, definition in LATEST_INDEXES.items():
+            cur.execute(f"CREATE {definition.format(name=name + SHADOW, table=LATEST + SHADOW)}")
+    conn.commit()
+
+
+def lock_shared(cur):
+    """Первым запросом транзакции merge: ждет идущую перезаливку, с другими merge не конфликтует"""
+    cur.execute("SELECT pg_advisory_xact_lock_shared(%s)", (GOLD_LOCK_KEY,))
+
+
+@contextmanager
+def rebuild(conn):
+    """
+    Эксклюзивный advisory lock Gold на всю перезаливку (build_shadow ... swap_in). Блокировка
+    сессионная - переживает промежуточные COMMIT сборки. При ошибке недособранный _shadow
+    удаляется еще под ней: следующая перезаливка не застанет чужую теневую таблицу.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (GOLD_LOCK_KEY,))
+    conn.commit()
+    try:
+        yield
+    except Exception:
+        try:
+            conn.rollback()
+            with conn.cursor() as cur:
+                drop_generation(cur, SHADOW)
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"⚠️ Shadow Gold cleanup failed: {e}")
+        raise
+    finally:
+        try:
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (GOLD_LOCK_KEY,))
+            conn.commit()
+        except psycopg2.Error as e:
+            # Сессионная блокировка все равно снимается закрытием соединения
+            print(f"⚠️ Gold lock release failed: {e}")
+
+
+def rename_generation(cur, src: str, dst: str):
+    """Таблицы поколения и их индексы: суффикс src -> dst (имена индексов уникальны в схеме)"""
+    cur.execute(f"ALTER TABLE {LATEST}{src} RENAME TO {LATEST}{dst}")
+    cur.execute(f"ALTER TABLE {TABLE}{src} RENAME TO {TABLE}{dst}")
+    # Переименование индекса PK переименовывает и ограничение
+    for name in [f"{TABLE}{{}}_pkey", *(n + "{}" for n in TABLE_INDEXES), *(n + "{}" for n in LATEST_INDEXES)]:
+        cur.execute(f"ALTER INDEX IF EXISTS {name.format(src)} RENAME TO {name.format(dst)}")
+
+
+def exchange(conn, out: str, into: str, before: Optional[Callable] = None, now: Optional[datetime] = None) -> int:
+    """
+    Живое поколение -> суффикс out, поколение into -> живое, одной транзакцией.
+    before(cur) выполняется в ней же до переименований (состояние индикаторов нового среза).
+    Возвращает число попыток.
+    """
+    attempts = max(1, settings.GOLD_SWAP_LOCK_RETRIES)
+    for attempt in range(1, attempts + 1):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL lock_timeout = %s", (f"{settings.GOLD_SWAP_LOCK_TIMEOUT_MS}ms",))
+                if before:
+                    before(cur)
+                rename_generation(cur, "", out)
+                rename_generation(cur, into, "")
+                cur.execute(f"COMMENT ON TABLE {TABLE}{out} IS %s",
+                            (RETIRED_PREFIX + (now or moscow_now()).isoformat(),))
+            conn.commit()
+            return attempt
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            if attempt == attempts:
+                raise
+            print(f"⏳ Gold swap: lock busy, retry {attempt}/{attempts - 1}")
+            time.sleep(min(0.05 * 2 ** attempt, 2.0))
+
+
+def swap_in(conn, before: Optional[Callable] = None) -> int:
+    """Собранный _shadow становится stock_metrics, прошлый срез - stock_metrics_old"""
+    return exchange(conn, OLD, SHADOW, before)
+
+
+def rollback(conn=None) -> bool:
+    """Вернуть срез до последней перезаливки; откатанный становится _shadow. False - нечего возвращать"""
+    own = conn is None
+    conn = conn or get_db_connection()
+    try:
+        # Под блокировкой Gold: не посреди перезаливки и не одновременно с drop_expired
+        with rebuild(conn):
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass(%s)", (TABLE + OLD,))
+                if cur.fetchone()[0] is None:
+                    return False
+            # Недособранный _shadow освобождает имя в той же транзакции (повторяется вместе с ней)
+            exchange(conn, SHADOW, OLD, before=lambda cur: drop_generation(cur, SHADOW))
+        return True
+    finally:
+        if own:
+            conn.close()
+
+
+def drop_expired(now: Optional[datetime] = None, conn=None) -> bool:
+    """
+    Удаляет stock_metrics_old старше GOLD_SWAP_KEEP_OLD_HOURS (время отставки - в комментарии таблицы).
+    Во время перезаливки не трогает ничего: swap_in мог бы отставить новый _old между проверкой и DROP.
+    """
+    own = conn is None
+    conn = conn or get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            # Разделяемая: с merge не конфликтует, с перезаливкой и rollback (эксклюзивные) - да
+            cur.execute("SELECT pg_try_advisory_xact_lock_shared(%s)", (GOLD_LOCK_KEY,))
+            if not cur.fetchone()[0]:
+                print("⏭️ Gold rebuild in progress: previous generation kept until the next run")
+                conn.rollback()
+                return False
+            cur.execute("SELECT to_regclass(%s)", (TABLE + OLD,))
+            expired = cur.fetchone()[0] is not None
+            if expired:
+                # Блокировка до чтения комментария: удаляется та же таблица, чей срок проверен
+                cur.execute(f"LOCK TABLE {TABLE}{OLD} IN ACCESS EXCLUSIVE MODE")
+                cur.execute(f"SELECT obj_description('{TABLE}{OLD}'::regclass, 'pg_class')")
+                comment = cur.fetchone()[0]
+                expired = bool(comment and comment.startswith(RETIRED_PREFIX)) and (
+                    (now or moscow_now()) - datetime.fromisoformat(comment[len(RETIRED_PREFIX):])
+                ).total_seconds() >= settings.GOLD_SWAP_KEEP_OLD_HOURS * 3600
+            if expired:
+                drop_generation(cur, OLD)
+        conn.commit()
+        return expired
+    finally:
+        if own:
+            conn.close()
@@ -0,0 +1,100 @@
+# File: src/storage/inventory.py
+"""
+Кэш листингов Bronze: одна постраничная выборка на префикс тикера вместо HEAD на каждый объект.
+
+Планирование backfill проверяет сотни чанков тикера (exists, маркеры .done, страницы .part):
+с кэшем это один LIST на тикер в TTL. Свои записи и удаления процесс вносит в кэш сразу,
+чужие (другие воркеры) становятся видны по истечении TTL - для идемпотентной загрузки этого
+достаточно: в худшем случае чанк перекачается. Решения, где нужна точность (манифест Bronze,
+планирование загрузки под блокировкой тикера), берут листинг с fresh=True.
+"""
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+# путь (относительно бакета) -> (etag, size); etag "" для своих записей до следующего листинга
+Listing = Dict[str, Tuple[str, int]]
+
+
+def prefix_of(path: str) -> str:
+    return path.split("/", 1)[0]
+
+
+class Inventory:
+    def __init__(self, lister: Callable[[str], Listing], ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.lister = lister
+        self.ttl = ttl
+        self.clock = clock
+        self._listings: Dict[str, Tuple[float, Listing]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _lock(self, prefix: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(prefix, threading.Lock())
+
+    def objects(self, prefix: str, fresh: bool = False) -> Listing:
+        """
+        Снимок объектов под префиксом тикера. Параллельные потоки Dask ждут один листинг,
+        а не делают каждый свой.
+        """
+        with self._lock(prefix):
+            cached = self._listings.get(prefix)
+            if fresh or cached is None or self.clock() - cached[0] > self.ttl:
+                cached = (self.clock(), dict(self.lister(prefix)))
+                self._listings[prefix] = cached
+            return dict(cached[1])
+
+    def prefetch(self, prefixes: Iterable[str], workers: int = 8, fresh: bool = False):
+        """fresh=True - под блокировкой тикера: теплый снимок мог пропустить чужие .done и удаленные .part"""
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda prefix: self.objects(prefix, fresh), set(prefixes)))
+
+    @staticmethod
+    def _contains(objects: Listing, path: str) -> bool:
+        if path in objects:
+            return True
+        folder = path.rstrip("/") + "/"
+        return any(p.startswith(folder) for p in objects)
+
+    def exists(self, path: str) -> bool:
+        """Объект или "папка" (префикс с объектами под ним, например SBER/1m/2024/01.json.part)"""
+        return self._contains(self.objects(prefix_of(path)), path)
+
+    def exists_many(self, paths: Iterable[str]) -> Set[str]:
+        """Пакетная проверка: один снимок (и не больше одного листинга) на тикер"""
+        by_prefix = defaultdict(list)
+        for path in paths:
+            by_prefix[prefix_of(path)].append(path)
+        found = set()
+        for prefix, group in by_prefix.items():
+            objects = self.objects(prefix)
+            found.update(p for p in group if self._contains(objects, p))
+        return found
+
+    def list(self, folder: str) -> list:
+        folder = folder.rstrip("/") + "/"
+        return sorted(p for p in self.objects(prefix_of(folder)) if p.startswith(folder))
+
+    # --- Свои изменения ---
+    def added(self, path: str, size: int, etag: str = ""):
+        with self._lock(prefix_of(path)):
+            cached = self._listings.get(prefix_of(path))
+            if cached is not None:
+                cached[1][path] = (etag, size)
+
+    def removed(self, path: str):
+        with self._lock(prefix_of(path)):
+            cached = self._listings.get(prefix_of(path))
+            if cached is not None:
+                folder = path.rstrip("/") + "/"
+                for p in [p for p in cached[1] if p == path or p.startswith(folder)]:
+                    del cached[1][p]
+
+    def invalidate(self, prefix: Optional[str] = None):
+        if prefix is None:
+            self._listings.clear()
+        else:
+            self._listings.pop(prefix, None)
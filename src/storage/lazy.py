@@ -0,0 +1,27 @@
+# File: src/storage/lazy.py
+import threading
+
+
+class LazyProxy:
+    """
+    Синглтон клиента, создаваемый при первом обращении к атрибуту: импорт модуля не открывает
+    соединений (MinIO, Redis) и не падает, если сервис недоступен.
+    """
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _get(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    object.__setattr__(self, "_instance", self._factory())
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get(), name, value)
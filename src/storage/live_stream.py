@@ -0,0 +1,56 @@
+# File: src/storage/live_stream.py
+import json
+import time
+from typing import AsyncIterator, List
+
+import redis
+import redis.asyncio as aioredis
+
+from src.config import settings
+from src.storage.lazy import LazyProxy
+
+STREAM_MAXLEN = 5000  # ~ торговый день минуток с запасом
+
+
+def stream_key(ticker: str, interval: str = "1m") -> str:
+    return f"moex:live:{ticker.upper()}:{interval}"
+
+
+class LiveStream:
+    """Redis Stream с живыми барами: пишет поллер, читает WebSocket API"""
+
+    def __init__(self, redis_url: str = settings.REDIS_URL):
+        self.redis_url = redis_url
+        self.redis = redis.from_url(redis_url)
+
+    def publish(self, ticker: str, bars: List[dict], interval: str = "1m"):
+        if not bars:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        published_at = time.time()
+        for bar in bars:
+            bar = {**bar, "published_at": published_at}
+            pipe.xadd(stream_key(ticker, interval), {"bar": json.dumps(bar)}, maxlen=STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+
+    async def subscribe(self, ticker: str, interval: str = "1m", backlog: int = 120) -> AsyncIterator[dict]:
+        """Сначала последние `backlog` баров, затем блокирующее чтение новых записей"""
+        client = aioredis.from_url(self.redis_url)
+        key = stream_key(ticker, interval)
+        try:
+            last_id = "$"
+            history = await client.xrevrange(key, count=backlog)
+            for entry_id, fields in reversed(history):
+                last_id = entry_id
+                yield json.loads(fields[b"bar"])
+            while True:
+                resp = await client.xread({key: last_id}, block=5000, count=100)
+                for _, entries in resp:
+                    for entry_id, fields in entries:
+                        last_id = entry_id
+                        yield json.loads(fields[b"bar"])
+        finally:
+            await client.aclose()
+
+
+live_stream = LazyProxy(LiveStream)
@@ -1,19 +1,35 @@
 # File: src/storage/minio_client.py
 import json
-import s3fs
+import time
+from typing import Dict, Iterable, Optional, Set
 from src.config import settings
+from src.storage.inventory import Inventory, Listing
+from src.storage.lazy import LazyProxy
+from src.telemetry import MINIO_PUT_BYTES, MINIO_PUT_SECONDS, timed
 
 class MinioClient:
-    def __init__(self):
+    """
+    Bronze в MinIO. Проверки существования идут через кэш листингов (src/storage/inventory.py):
+    один LIST на тикер в MINIO_INVENTORY_TTL вместо HEAD на объект. Запись - бинарная, одним PUT
+    (крупные объекты - multipart), пакеты объектов - параллельно через async-ядро s3fs (save_many).
+    """
+
+    def __init__(self, bucket: Optional[str] = None):
+        import s3fs  # aiobotocore тяжелый: грузится в процессе, который реально ходит в MinIO
+
+        self.bucket = bucket or settings.MINIO_BUCKET_RAW
         self.fs = s3fs.S3FileSystem(
             key=settings.MINIO_ACCESS_KEY,
             secret=settings.MINIO_SECRET_KEY,
             client_kwargs={'endpoint_url': settings.MINIO_ENDPOINT},
             use_listings_cache=False
         )
-        # Инициализируем оба слоя
-        self._ensure_bucket(settings.MINIO_BUCKET_RAW)
+        self.inventory = Inventory(self._list_prefix, ttl=settings.MINIO_INVENTORY_TTL)
+        self._tickers = (0.0, [])
+        # Инициализируем слои и бакет выгрузок
+        self._ensure_bucket(self.bucket)
         self._ensure_bucket(settings.MINIO_BUCKET_SILVER)
+        self._ensure_bucket(settings.MINIO_BUCKET_EXPORTS)
 
     def _ensure_bucket(self, bucket_name: str):
         if not self.fs.exists(bucket_name):
@@ -22,26 +38,87 @@ class MinioClient:
             except Exception:
                 pass 
 
-    def save_json(self, data: list, path: str):
-        full_path = f"{settings.MINIO_BUCKET_RAW}/{path}"
-        with self.fs.open(full_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False)
-    
+    def _full(self, path: str) -> str:
+        return f"{self.bucket}/{path}"
+
+    def _list_prefix(self, prefix: str) -> Listing:
+        """Постраничный LIST префикса (без delimiter) -> {путь: (etag, size)}"""
+        root = f"{self.bucket}/"
+        try:
+            found = self.fs.find(root + prefix, detail=True)
+        except FileNotFoundError:
+            return {}
+        return {p[len(root):]: ((info.get("ETag") or info.get("etag") or "").strip('"'), int(info.get("size") or 0))
+                for p, info in found.items()}
+
+    # --- Запись ---
+    def save_bytes(self, payload: bytes, path: str):
+        with timed(MINIO_PUT_SECONDS, self.bucket):
+            self.fs.pipe_file(self._full(path), payload)
+        MINIO_PUT_BYTES.labels(self.bucket).observe(len(payload))
+        self.inventory.added(path, len(payload))
+
+    def save_json(self, data, path: str):
+        self.save_bytes(json.dumps(data, ensure_ascii=False).encode('utf-8'), path)
+
+    def save_many(self, objects: Dict[str, bytes]):
+        """Пакет объектов параллельно (MINIO_UPLOAD_CONCURRENCY одновременных PUT)"""
+        if not objects:
+            return
+        started = time.perf_counter()
+        self.fs.pipe({self._full(p): data for p, data in objects.items()},
+                     batch_size=settings.MINIO_UPLOAD_CONCURRENCY)
+        per_object = (time.perf_counter() - started) / len(objects)
+        for path, data in objects.items():
+            MINIO_PUT_SECONDS.labels(self.bucket).observe(per_object)
+            MINIO_PUT_BYTES.labels(self.bucket).observe(len(data))
+            self.inventory.added(path, len(data))
+
+    def save_json_many(self, objects: Dict[str, object]):
+        self.save_many({p: json.dumps(d, ensure_ascii=False).encode('utf-8') for p, d in objects.items()})
+
+    # --- Чтение и проверки ---
     def exists(self, path: str) -> bool:
-        full_path = f"{settings.MINIO_BUCKET_RAW}/{path}"
-        return self.fs.exists(full_path)
+        return self.inventory.exists(path)
+
+    def exists_many(self, paths: Iterable[str]) -> Set[str]:
+        """Какие из путей есть в бакете: один листинг на тикер, а не HEAD на путь"""
+        return self.inventory.exists_many(paths)
+
+    def load_json(self, path: str):
+        return json.loads(self.fs.cat_file(self._full(path)))
+
+    def list_paths(self, prefix: str) -> list:
+        """Пути объектов под prefix (относительно бакета Bronze); [] если префикса нет"""
+        return self.inventory.list(prefix)
+
+    def delete(self, path: str):
+        """Объект или префикс целиком; отсутствующий путь - не ошибка"""
+        if self.inventory.exists(path):
+            self.fs.rm(self._full(path), recursive=True)
+        self.inventory.removed(path)
+
+    def presigned_url(self, full_path: str, expires: int = 3600) -> str:
+        """Временная ссылка на скачивание без доступа к MinIO (хост - MINIO_ENDPOINT)"""
+        return self.fs.url(full_path, expires=expires)
 
-    def list_downloaded_tickers(self) -> list:
+    def list_downloaded_tickers(self, fresh: bool = False) -> list:
+        """Тикеры верхнего уровня Bronze (LIST с delimiter, постранично), кэш на MINIO_INVENTORY_TTL"""
+        listed_at, tickers = self._tickers
+        if not fresh and tickers and time.monotonic() - listed_at <= settings.MINIO_INVENTORY_TTL:
+            return tickers
         try:
-            paths = self.fs.ls(settings.MINIO_BUCKET_RAW, detail=False)
+            paths = self.fs.ls(self.bucket, detail=False, refresh=True)
             tickers = []
             for p in paths:
                 name = p.split('/')[-1]
                 if name.isupper() and len(name) >= 3:
                     tickers.append(name)
-            return sorted(tickers)
+            self._tickers = (time.monotonic(), sorted(tickers))
+            return self._tickers[1]
         except Exception as e:
             print(f"Error listing MinIO: {e}")
             return []
 
-minio_client = MinioClient()
\ No newline at end of file
+# Подключение и проверка бакетов - при первом обращении, а не при импорте
+minio_client = LazyProxy(MinioClient)
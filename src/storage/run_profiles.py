@@ -0,0 +1,66 @@
+# File: src/storage/run_profiles.py
+"""Отчеты профилирования ETL (src/profiling.py) в Postgres: таблица etl_run_profiles"""
+import json
+from typing import List, Optional
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from src.config import settings
+
+
+def get_db_connection():
+    return psycopg2.connect(
+        host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT,
+        user=settings.POSTGRES_USER, password=settings.POSTGRES_PASSWORD,
+        dbname=settings.POSTGRES_DB
+    )
+
+
+def save_profile(report: dict):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO etl_run_profiles (task_id, started_at, status, tickers_count, wall_s, cpu_s, report)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (task_id) DO UPDATE SET
+                    status = EXCLUDED.status, wall_s = EXCLUDED.wall_s, cpu_s = EXCLUDED.cpu_s, report = EXCLUDED.report
+            """, (report["task_id"], report["started_at"], report["status"], len(report["tickers"]),
+                  report["wall_s"], report["cpu_s"], json.dumps(report)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def list_profiles(limit: int = 20) -> List[dict]:
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT task_id, started_at, status, tickers_count, wall_s, cpu_s
+                FROM etl_run_profiles ORDER BY started_at DESC LIMIT %s
+            """, (limit,))
+            return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def get_profile(task_id: str) -> Optional[dict]:
+    """Отчет и предыдущий успешный запуск того же масштаба (число тикеров) для сравнения"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT started_at, tickers_count, report FROM etl_run_profiles WHERE task_id = %s", (task_id,))
+            row = cur.fetchone()
+            if not row:
+                return None
+            cur.execute("""
+                SELECT report FROM etl_run_profiles
+                WHERE started_at < %s AND tickers_count = %s AND status = 'SUCCESS'
+                ORDER BY started_at DESC LIMIT 1
+            """, (row["started_at"], row["tickers_count"]))
+            prev = cur.fetchone()
+            return {"report": row["report"], "previous": prev["report"] if prev else None}
+    finally:
+        conn.close()
@@ -0,0 +1,117 @@
+# File: src/storage/silver_reader.py
+"""
+Холодный уровень чтений: Silver Parquet (silver-data/market_data/ticker=XXX) напрямую через
+pyarrow.dataset, без Spark и без Postgres.
+
+Отсечение партиций - путь тикера (остальные тикеры не листятся), фильтр interval/ts уходит
+в сканер Parquet: row group, чья статистика ts вне диапазона, не читается. Для этого Silver
+пишется с TIMESTAMP_MICROS и сортировкой по (interval, ts) внутри файла (src/processing/spark_job.py);
+файлы, записанные раньше (INT96, без сортировки), читаются корректно, но без пропуска row group.
+С limit (постраничное чтение /metrics) row group читаются по возрастанию min(ts) из статистики
+и чтение останавливается, как только следующая группа не может попасть в первые limit баров:
+страница стоит O(limit), а не O(весь диапазон до границы уровней).
+Индикаторов в Silver нет: sma_20/rsi_14 холодных баров - NaN.
+"""
+import threading
+from datetime import datetime
+from typing import Iterator, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+import pyarrow as pa
+
+from src.config import settings
+
+PRICE_COLUMNS = ["ts", "open", "high", "low", "close", "volume"]
+
+
+def s3_filesystem():
+    from pyarrow import fs
+
+    endpoint = urlparse(settings.MINIO_ENDPOINT)
+    return fs.S3FileSystem(access_key=settings.MINIO_ACCESS_KEY, secret_key=settings.MINIO_SECRET_KEY,
+                           endpoint_override=endpoint.netloc or settings.MINIO_ENDPOINT,
+                           scheme=endpoint.scheme or "http", region="us-east-1")
+
+
+class SilverReader:
+    def __init__(self, filesystem_factory=s3_filesystem, root: str = f"{settings.MINIO_BUCKET_SILVER}/market_data"):
+        self.filesystem_factory = filesystem_factory
+        self.root = root
+        self._filesystem = None
+        self._lock = threading.Lock()
+
+    @property
+    def filesystem(self):
+        # pyarrow проверяет тип FileSystem, поэтому LazyProxy не подходит - создаем при первом чтении
+        with self._lock:
+            if self._filesystem is None:
+                self._filesystem = self.filesystem_factory()
+            return self._filesystem
+
+    def read(self, ticker: str, interval: str, start: Optional[datetime] = None,
+             end: Optional[datetime] = None, limit: Optional[int] = None) -> pa.Table:
+        """Первые limit (None - все) баров [start, end) по возрастанию ts; ts - наивное московское время, как в Gold"""
+        import pyarrow.dataset as ds
+
+        try:
+            dataset = ds.dataset(f"{self.root}/ticker={ticker}", filesystem=self.filesystem, format="parquet")
+        except FileNotFoundError:
+            return empty_table()
+        ts_type = dataset.schema.field("ts").type
+        condition = ds.field("interval") == interval
+        # Spark пишет ts как instant в UTC-сессии, т.е. московские часы с пометкой UTC: сравниваем в том же типе
+        if start is not None:
+            condition &= ds.field("ts") >= pa.scalar(start, type=ts_type)
+        if end is not None:
+            condition &= ds.field("ts") < pa.scalar(end, type=ts_type)
+        if limit is None:
+            table = dataset.to_table(columns=PRICE_COLUMNS, filter=condition).sort_by("ts")
+        else:
+            table = head(dataset, condition, limit)
+        return table.set_column(0, "ts", table["ts"].cast(pa.timestamp("us", tz=ts_type.tz)).cast(pa.timestamp("us")))
+
+    def iter_batches(self, ticker: str, interval: str, start: Optional[datetime], end: Optional[datetime],
+                     batch_rows: int) -> Iterator[pa.RecordBatch]:
+        """Для выгрузок: диапазон одного тикера читается целиком (колонки цен), отдается порциями"""
+        yield from self.read(ticker, interval, start, end).to_batches(max_chunksize=batch_rows)
+
+
+def min_ts(row_group) -> Optional[datetime]:
+    """Нижняя граница ts row group по статистике; None - статистики нет (INT96), группа читается первой"""
+    row_group.ensure_complete_metadata()
+    stats = row_group.row_groups[0].statistics or {}
+    return stats.get("ts", {}).get("min")
+
+
+def head(dataset, condition, limit: int) -> pa.Table:
+    """Первые limit строк по ts: row group по возрастанию min(ts), пока следующая может что-то вытеснить"""
+    groups = [(min_ts(rg), rg) for fragment in dataset.get_fragments(condition)
+              for rg in fragment.split_by_row_group(condition)]
+    groups.sort(key=lambda g: (g[0] is not None, g[0]))
+    table = None
+    for low, group in groups:
+        if table is not None and table.num_rows >= limit and low is not None and low > table["ts"][-1].as_py():
+            break  # в этой и следующих группах все бары позже limit-го
+        part = group.to_table(columns=PRICE_COLUMNS, filter=condition)
+        table = (part if table is None else pa.concat_tables([table, part])).sort_by("ts").slice(0, limit)
+    return table if table is not None else dataset.schema.empty_table().select(PRICE_COLUMNS)
+
+
+def empty_table() -> pa.Table:
+    return pa.table({"ts": pa.array([], pa.timestamp("us")),
+                     **{name: pa.array([], pa.float64()) for name in PRICE_COLUMNS[1:]}})
+
+
+def table_to_columns(table: pa.Table) -> dict:
+    """Таблица Silver -> колонки формата src/api/hot_tail.py (индикаторы - NaN)"""
+    n = table.num_rows
+    columns = {"ts": table["ts"].to_numpy().astype("datetime64[ns]")}
+    for name in ("open", "high", "low", "close", "volume"):
+        columns[name] = table[name].to_numpy(zero_copy_only=False).astype(float)
+    columns["sma_20"] = np.full(n, np.nan)
+    columns["rsi_14"] = np.full(n, np.nan)
+    return columns
+
+
+silver_reader = SilverReader()
@@ -1,23 +1,29 @@
 # File: src/storage/task_registry.py
-import redis
 import json
 import os
 
+from src.storage.lazy import LazyProxy
+
 
 class TaskRegistry:
     def __init__(self):
+        import redis
+
         # Подключаемся к тому же Redis, что и Celery
         redis_url = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
         self.redis = redis.from_url(redis_url)
         self.KEY = "moex:tasks:registry"
+        self.VERSION_KEY = "moex:data:version"
+        self.LSN_KEY = "moex:data:lsn"
 
     def add_task(self, task_id: str, ticker: str):
         """Регистрируем новую задачу"""
         data = {"id": task_id, "ticker": ticker, "progress": 0, "status": "Queued", "state": "PENDING"}
         self.save_task(task_id, data)
 
-    def update_task(self, task_id: str, progress: int = None, status: str = None, state: str = None):
-        """Обновляем статус"""
+    def update_task(self, task_id: str, progress: int = None, status: str = None, state: str = None,
+                    result: dict = None):
+        """Обновляем статус (result - итог задачи, например ссылка на выгрузку)"""
         data = self.get_task(task_id)
         if not data:
             return
@@ -28,6 +34,8 @@ class TaskRegistry:
             data["status"] = status
         if state:
             data["state"] = state
+        if result is not None:
+            data["result"] = result
 
         self.save_task(task_id, data)
 
@@ -48,5 +56,23 @@ class TaskRegistry:
     def delete_task(self, task_id: str):
         self.redis.hdel(self.KEY, task_id)
 
+    def bump_data_version(self, lsn: str = None) -> int:
+        """
+        Вызывается после каждого успешного обновления Gold: инвалидирует кэши дашборда.
+        lsn - позиция WAL primary после коммита: читатели новой версии не берут реплики, отстающие от нее
+        """
+        pipe = self.redis.pipeline()
+        if lsn:
+            pipe.set(self.LSN_KEY, lsn)
+        pipe.incr(self.VERSION_KEY)
+        return pipe.execute()[-1]
+
+    def get_data_version(self) -> int:
+        return int(self.redis.get(self.VERSION_KEY) or 0)
+
+    def get_data_lsn(self):
+        lsn = self.redis.get(self.LSN_KEY)
+        return lsn.decode() if lsn else None
+
 
-task_registry = TaskRegistry()
+task_registry = LazyProxy(TaskRegistry)
@@ -0,0 +1,102 @@
+# File: src/storage/tiers.py
+"""
+Уровни хранения Gold: интервалы GOLD_COLD_INTERVALS хранятся в Postgres только за последние
+GOLD_HOT_DAYS дней, более старая история читается из Silver Parquet (src/storage/silver_reader.py).
+
+Граница - полночь (сегодня по Москве - GOLD_HOT_DAYS). Gold swap не грузит строки старше нее,
+retention_task раз в день удаляет то, что за нее ушло, а чтения делят диапазон по ней же:
+граница только сдвигается вперед, поэтому горячая часть диапазона всегда есть в Postgres.
+Холодными могут быть только интервалы Silver (1m, 1d) - роллапы и индикаторы есть только в Gold.
+"""
+from datetime import datetime, time, timedelta
+from typing import Dict, List, Optional
+
+import psycopg2
+
+from src.config import settings
+from src.ingestion.watermarks import moscow_now
+
+SILVER_INTERVALS = ("1m", "1d")
+TRIM_BATCH_ROWS = 50_000
+
+
+def get_db_connection():
+    return psycopg2.connect(
+        host=settings.POSTGRES_HOST, port=settings.POSTGRES_PORT,
+        user=settings.POSTGRES_USER, password=settings.POSTGRES_PASSWORD,
+        dbname=settings.POSTGRES_DB
+    )
+
+
+def cold_intervals() -> List[str]:
+    intervals = [i.strip() for i in settings.GOLD_COLD_INTERVALS.split(",") if i.strip()]
+    unknown = sorted(set(intervals) - set(SILVER_INTERVALS))
+    if unknown:
+        raise ValueError(f"GOLD_COLD_INTERVALS: {unknown} are not in Silver {SILVER_INTERVALS}")
+    return intervals if settings.GOLD_HOT_DAYS > 0 else []
+
+
+def cold_cutoff(interval: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Начало горячего окна интервала в Gold; None - интервал целиком в Postgres"""
+    if interval not in cold_intervals():
+        return None
+    day = (now or moscow_now()).date() - timedelta(days=settings.GOLD_HOT_DAYS)
+    return datetime.combine(day, time(0, 0))
+
+
+def split_range(interval: str, start: Optional[datetime], end: Optional[datetime],
+                now: Optional[datetime] = None) -> Dict[str, Optional[tuple]]:
+    """
+    Диапазон [start, end) -> {"cold": (start, end) из Silver или None, "hot": (start, end) из Gold или None}.
+    start=None - с начала истории, end=None - до последнего бара.
+    """
+    cutoff = cold_cutoff(interval, now)
+    if cutoff is None or (start is not None and start >= cutoff):
+        return {"cold": None, "hot": (start, end)}
+    if end is not None and end <= cutoff:
+        return {"cold": (start, end), "hot": None}
+    return {"cold": (start, cutoff), "hot": (cutoff, end)}
+
+
+def trim_gold(now: Optional[datetime] = None, batch_rows: int = TRIM_BATCH_ROWS) -> Dict[str, int]:
+    """
+    Удаляет из stock_metrics холодную историю пачками (короткие транзакции: Gold swap и чтения
+    не ждут одну многоминутную блокировку). Место переиспользуется после autovacuum;
+    вернуть его ОС - VACUUM FULL / pg_repack в окно обслуживания.
+    """
+    deleted = {}
+    conn = get_db_connection()
+    try:
+        for interval in cold_intervals():
+            cutoff = cold_cutoff(interval, now)
+            deleted[interval] = 0
+            while True:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        DELETE FROM stock_metrics WHERE ctid = ANY(ARRAY(
+                            SELECT ctid FROM stock_metrics WHERE interval = %s AND ts < %s LIMIT %s
+                        ))
+                    """, (interval, cutoff, batch_rows))
+                    n = cur.rowcount
+                conn.commit()
+                deleted[interval] += n
+                if n < batch_rows:
+                    break
+    finally:
+        conn.close()
+    return deleted
+
+
+def gold_size() -> Dict[str, int]:
+    """Размер stock_metrics с индексами и TOAST, байт, и число строк по статистике"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT pg_total_relation_size('stock_metrics'), reltuples::bigint
+                FROM pg_class WHERE oid = 'stock_metrics'::regclass
+            """)
+            size, rows = cur.fetchone()
+        return {"bytes": size, "rows": rows}
+    finally:
+        conn.close()
@@ -0,0 +1,132 @@
+# File: src/telemetry.py
+"""
+Метрики Prometheus и трейсинг OpenTelemetry для ingestion, Spark, API и воркера.
+
+Метрики: API, Celery-воркеры и Spark-драйвер работают в одном контейнере (start.sh), поэтому
+используется multiprocess-режим prometheus_client (PROMETHEUS_MULTIPROC_DIR): каждый процесс
+пишет свои значения в общую папку, /metrics в API агрегирует их все.
+
+Трейсы: экспорт по OTLP/HTTP, если задан OTEL_EXPORTER_OTLP_ENDPOINT (см. docker/otel-collector.yaml),
+иначе спаны только связывают контекст. task_id из /etl/run передается в Celery через carrier
+(traceparent), дальше ingest_flow -> transform_flow -> Gold swap идут дочерними спанами.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SLOW_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 3600)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+# --- Ingestion ---
+ISS_REQUEST_SECONDS = Histogram("moex_iss_request_seconds", "Латентность запроса к ISS", ["interval", "status"], buckets=FAST_BUCKETS)
+ISS_PAGES_PER_CHUNK = Histogram("moex_iss_pages_per_chunk", "Страниц ISS на один чанк", ["interval"], buckets=(1, 2, 5, 10, 20, 50, 100))
+MINIO_PUT_SECONDS = Histogram("moex_minio_put_seconds", "Время записи объекта в MinIO", ["bucket"], buckets=FAST_BUCKETS)
+MINIO_PUT_BYTES = Histogram("moex_minio_put_bytes", "Размер объекта, записанного в MinIO", ["bucket"], buckets=SIZE_BUCKETS)
+
+# --- Spark / Gold ---
+STAGE_SECONDS = Histogram("moex_stage_seconds", "Длительность стадии пайплайна", ["stage"], buckets=SLOW_BUCKETS)
+STAGE_ROWS = Counter("moex_stage_rows", "Строк обработано стадией", ["stage"])
+DB_OPERATION_SECONDS = Histogram("moex_db_operation_seconds", "Время операции Postgres (staging, merge, refresh)", ["operation"], buckets=SLOW_BUCKETS)
+
+# --- Планировщик ETL (src/worker/scheduler.py): справедливость interactive vs bulk ---
+ETL_JOBS = Counter("moex_etl_jobs", "Заявки ETL по очереди и исходу", ["queue", "outcome"])
+ETL_QUEUE_WAIT_SECONDS = Histogram("moex_etl_queue_wait_seconds", "Ожидание задачи ETL в очереди до старта", ["queue"], buckets=SLOW_BUCKETS)
+ETL_LOCK_WAIT_SECONDS = Histogram("moex_etl_lock_wait_seconds", "Ожидание блокировок тикеров", ["queue"], buckets=FAST_BUCKETS + SLOW_BUCKETS[4:])
+ETL_JOB_SECONDS = Histogram("moex_etl_job_seconds", "Длительность задачи ETL после старта", ["queue"], buckets=SLOW_BUCKETS)
+
+# --- API ---
+API_REQUEST_SECONDS = Histogram("moex_api_request_seconds", "Латентность эндпоинтов API", ["method", "route", "status"], buckets=FAST_BUCKETS)
+DB_CONNECT_SECONDS = Histogram("moex_db_connect_seconds", "Ожидание соединения с Postgres", ["component"], buckets=FAST_BUCKETS)
+DB_READS = Counter("moex_db_reads", "Чтения API по месту исполнения (replica или primary)", ["target"])
+AUTH_HASH_SECONDS = Histogram("moex_auth_hash_seconds", "bcrypt в пуле хеширования вместе с ожиданием потока", ["operation"], buckets=FAST_BUCKETS)
+AUTH_HASH_REJECTED = Counter("moex_auth_hash_rejected", "Запросы, отклоненные из-за переполненной очереди хеширования", ["operation"])
+
+tracer = trace.get_tracer("moex")
+_tracing_initialized = False
+
+
+def init_tracing(service_name: str):
+    """Один TracerProvider на процесс; без OTEL_EXPORTER_OTLP_ENDPOINT спаны никуда не отправляются"""
+    global _tracing_initialized
+    if _tracing_initialized:
+        return
+    _tracing_initialized = True
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+
+
+@contextmanager
+def span(name: str, carrier: Optional[dict] = None, **attributes):
+    """Спан с атрибутами; carrier - контекст родителя из другого процесса (Celery)"""
+    context = propagate.extract(carrier) if carrier else None
+    with tracer.start_as_current_span(name, context=context, attributes=attributes) as s:
+        yield s
+
+
+def trace_carrier() -> dict:
+    """traceparent текущего спана для передачи в задачу Celery"""
+    carrier = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+@contextmanager
+def timed(histogram: Histogram, *labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(*labels).observe(time.perf_counter() - started)
+
+
+# --- Scrape ---
+class CeleryQueueCollector:
+    """Глубина очередей Celery (длина списков брокера Redis) - читается в момент scrape"""
+
+    def __init__(self, redis_client, queues: Iterable[str] = ("celery",)):
+        self.redis = redis_client
+        self.queues = list(queues)
+
+    def collect(self):
+        gauge = GaugeMetricFamily("moex_celery_queue_depth", "Задач в очереди Celery", labels=["queue"])
+        for queue in self.queues:
+            try:
+                gauge.add_metric([queue], self.redis.llen(queue))
+            except Exception:
+                continue
+        yield gauge
+
+
+_extra_collectors = []
+
+
+def register_collector(collector):
+    _extra_collectors.append(collector)
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        REGISTRY.register(collector)
+
+
+def render_metrics():
+    """(payload, content_type) для эндпоинта /metrics"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _extra_collectors:
+            registry.register(collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,29 @@
+# File: src/worker/client.py
+"""
+Тонкий клиент Celery для API: постановка задач по имени (send_task) без импорта их кода.
+
+Задачи (src/worker/tasks.py) тянут Prefect, Dask и pyspark - API они не нужны. Здесь только
+приложение Celery с брокером, планировщик (коалесинг, очереди) и конвейер resync; воркер
+регистрирует задачи на этом же приложении.
+"""
+import os
+
+from celery import Celery
+
+from src.storage.lazy import LazyProxy
+from src.storage.task_registry import task_registry
+from src.worker.pipeline import EtlPipeline
+from src.worker.scheduler import EtlScheduler
+
+EXPORT_TASK = "src.worker.tasks.export_task"
+REPAIR_GAPS_TASK = "src.worker.tasks.repair_gaps_task"
+
+celery_app = Celery(
+    "moex_worker",
+    broker=os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0"),
+    backend=os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0"),
+)
+
+# Клиент Redis реестра создается при первой постановке, а не при импорте
+etl_scheduler = LazyProxy(lambda: EtlScheduler(task_registry.redis, celery_app))
+etl_pipeline = LazyProxy(lambda: EtlPipeline(task_registry.redis, celery_app, etl_scheduler))
@@ -0,0 +1,129 @@
+# File: src/worker/pipeline.py
+"""
+Конвейер resync: загрузка и Spark перекрываются во времени.
+
+    ingest_ticker_task (etl_ingest, по задаче на тикер; чанки - потоки Dask)
+        -> тикер скачан: RPUSH в moex:pipeline:<run>:ready
+        -> набралось batch_size тикеров (или скачано все): process_batch_task (etl_process)
+        -> Bronze -> Silver -> Gold с атомарным merge на батч, в долгоживущей сессии Spark
+
+Пока первые батчи считаются в Spark, остальные тикеры еще качаются. Счетчики запуска в
+moex:pipeline:<run> (total/ingested/processed/failed/batches, started_at); по завершении
+в реестр задач пишется общее wall-clock время.
+"""
+import time
+from typing import List, Optional
+
+INGEST_QUEUE = "etl_ingest"
+PROCESS_QUEUE = "etl_process"
+PIPELINE_QUEUES = (INGEST_QUEUE, PROCESS_QUEUE)
+INGEST_TASK = "src.worker.tasks.ingest_ticker_task"
+PROCESS_TASK = "src.worker.tasks.process_batch_task"
+
+
+class EtlPipeline:
+    RUN_KEY = "moex:pipeline:{}"
+    READY_KEY = "moex:pipeline:{}:ready"
+
+    def __init__(self, redis_client, celery_app, scheduler, ttl: int = 24 * 3600):
+        self.redis = redis_client
+        self.celery = celery_app
+        self.scheduler = scheduler  # коалесинг заявок по тикеру (src/worker/scheduler.py)
+        self.ttl = ttl
+
+    def start(self, run_id: str, tickers: List[str], years_back: int, batch_size: int, force: bool = False,
+              **task_kwargs) -> dict:
+        """
+        Ставит загрузку по тикерам; тикеры, уже ждущие в очереди, не дублируются.
+        force - пересчитать Silver/Gold и для тикеров с неизмененным Bronze.
+        """
+        from src.worker.scheduler import BULK, normalize_tickers
+
+        tickers = normalize_tickers(tickers)
+        key = self.RUN_KEY.format(run_id)
+        # total сразу полный: быстрая загрузка не должна "завершить" запуск, пока ставятся остальные
+        self.redis.hset(key, mapping={"total": len(tickers), "ingested": 0, "processed": 0, "failed": 0,
+                                      "batches": 0, "batch_size": max(1, batch_size), "sealed": 0,
+                                      "force": int(force),
+                                      "started_at": time.time()})
+        self.redis.expire(key, self.ttl)
+        submitted = 0
+        for ticker in tickers:
+            job = self.scheduler.submit([ticker], years_back, BULK, batch_id=run_id, task=INGEST_TASK,
+                                        route=INGEST_QUEUE, **task_kwargs)
+            submitted += bool(job["task_id"])
+        coalesced = len(tickers) - submitted
+        if coalesced:
+            self.redis.hincrby(key, "total", -coalesced)
+        self.redis.hset(key, "sealed", 1)
+        self.dispatch(run_id)
+        return {"submitted": submitted, "coalesced": coalesced}
+
+    # --- Переходы между стадиями ---
+    def ticker_ingested(self, run_id: str, tickers: List[str], ok: bool, skipped: int = 0):
+        """
+        Конец загрузки тикера. Успешные ждут Spark в ready; упавшие и перехваченные интерактивным
+        запросом (skipped) сразу считаются обработанными.
+        """
+        key = self.RUN_KEY.format(run_id)
+        if ok and tickers:
+            self.redis.rpush(self.READY_KEY.format(run_id), *tickers)
+            self.redis.expire(self.READY_KEY.format(run_id), self.ttl)
+        else:
+            self.redis.hincrby(key, "processed", len(tickers) + skipped)
+            if not ok:
+                self.redis.hincrby(key, "failed", len(tickers))
+        self.redis.hincrby(key, "ingested", max(1, len(tickers) + skipped))
+        self.dispatch(run_id)
+
+    def dispatch(self, run_id: str) -> List[List[str]]:
+        """Отправляет в Spark полные батчи, а когда все скачано - остаток"""
+        key = self.RUN_KEY.format(run_id)
+        ready = self.READY_KEY.format(run_id)
+        batches = []
+        while True:
+            state = self.status(run_id)
+            all_ingested = state["sealed"] and state["ingested"] >= state["total"]
+            waiting = self.redis.llen(ready)
+            if not waiting or (waiting < state["batch_size"] and not all_ingested):
+                break
+            batch = [self._decode(t) for t in (self.redis.lpop(ready, state["batch_size"]) or [])]
+            if not batch:
+                break  # батч забрал параллельный dispatch
+            self.redis.hincrby(key, "batches", 1)
+            result = self.celery.send_task(PROCESS_TASK, args=[run_id, batch], kwargs={"force": bool(state["force"])},
+                                           queue=PROCESS_QUEUE)
+            self.redis.sadd(self.scheduler.BATCH_TASKS_KEY.format(run_id), result.id)
+            batches.append(batch)
+        return batches
+
+    def batch_processed(self, run_id: str, tickers: List[str], ok: bool):
+        key = self.RUN_KEY.format(run_id)
+        self.redis.hincrby(key, "processed", len(tickers))
+        if not ok:
+            self.redis.hincrby(key, "failed", len(tickers))
+
+    # --- Состояние ---
+    def status(self, run_id: str) -> dict:
+        raw = {self._decode(k): self._decode(v) for k, v in self.redis.hgetall(self.RUN_KEY.format(run_id)).items()}
+        state = {k: int(float(raw.get(k, 0))) for k in
+                 ("total", "ingested", "processed", "failed", "batches", "batch_size", "sealed", "force")}
+        state["started_at"] = float(raw.get("started_at", 0))
+        state["finished_at"] = float(raw["finished_at"]) if raw.get("finished_at") else None
+        state["done"] = bool(state["sealed"]) and state["processed"] >= state["total"]
+        end = state["finished_at"] or time.time()
+        state["wall_s"] = round(end - state["started_at"], 1) if state["started_at"] else None
+        return state
+
+    def finish(self, run_id: str) -> Optional[dict]:
+        """Итог запуска ровно один раз (для последнего завершившегося батча), иначе None"""
+        state = self.status(run_id)
+        if not state["done"]:
+            return None
+        if not self.redis.hsetnx(self.RUN_KEY.format(run_id), "finished_at", time.time()):
+            return None
+        return self.status(run_id)
+
+    @staticmethod
+    def _decode(value):
+        return value.decode() if isinstance(value, bytes) else value
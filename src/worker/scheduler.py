@@ -0,0 +1,189 @@
+# File: src/worker/scheduler.py
+"""
+Планировщик перед Celery для run_etl_task.
+
+- Коалесинг: на тикер одна ожидающая заявка (moex:etl:pending:<T> -> task_id). Повторный запрос
+  SBER, пока прошлый не стартовал, возвращает уже созданную задачу вместо второй загрузки и Spark.
+- Приоритеты: интерактивные запросы идут в очередь etl_interactive, resync - в etl_bulk по задаче
+  на тикер. Воркер worker1 (start.sh) слушает только etl_interactive, поэтому resync не занимает
+  все слоты. Интерактивный запрос забирает тикер у ожидающей bulk-задачи: та при старте его пропустит.
+- Блокировки: перед загрузкой задача берет moex:etl:lock:<T> на каждый тикер (в отсортированном
+  порядке - без взаимных блокировок), чтобы два запуска не писали одну партицию Silver и строки Gold.
+- Батчи: resync - родительская запись реестра задач, прогресс считается по завершенным дочерним.
+
+Метрики справедливости и пропускной способности - moex_etl_* в src/telemetry.py.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from src.telemetry import ETL_JOBS, ETL_LOCK_WAIT_SECONDS
+
+INTERACTIVE = "etl_interactive"
+BULK = "etl_bulk"
+QUEUES = (INTERACTIVE, BULK)
+ETL_TASK = "src.worker.tasks.run_etl_task"
+
+# Удалить ключ, только если в нем наше значение (заявка или токен блокировки)
+COMPARE_AND_DELETE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LockTimeout(Exception):
+    """Тикер занят другим запуском дольше lock_wait секунд"""
+
+
+def normalize_tickers(tickers: List[str]) -> List[str]:
+    return list(dict.fromkeys(t.upper().strip() for t in tickers if t and t.strip()))
+
+
+class EtlScheduler:
+    PENDING_KEY = "moex:etl:pending:{}"
+    JOB_KEY = "moex:etl:job:{}"
+    SUPERSEDED_KEY = "moex:etl:superseded:{}"
+    LOCK_KEY = "moex:etl:lock:{}"
+    BATCH_KEY = "moex:etl:batch:{}"
+    BATCH_TASKS_KEY = "moex:etl:batch:{}:tasks"
+
+    def __init__(self, redis_client, celery_app, pending_ttl: int = 6 * 3600, lock_ttl: int = 3 * 3600,
+                 lock_wait: float = 60.0):
+        self.redis = redis_client
+        self.celery = celery_app
+        self.pending_ttl = pending_ttl
+        self.lock_ttl = lock_ttl  # страховка: упавший воркер не держит тикер вечно
+        self.lock_wait = lock_wait
+        self._compare_and_delete = redis_client.register_script(COMPARE_AND_DELETE)
+
+    # --- Постановка ---
+    def submit(self, tickers: List[str], years_back: int, queue: str = INTERACTIVE,
+               batch_id: Optional[str] = None, task: str = ETL_TASK, route: Optional[str] = None,
+               **task_kwargs) -> dict:
+        """
+        {"task_id": новая задача или None, "tickers": что в нее попало, "coalesced": {тикер: task_id}}.
+        Тикеры, у которых уже есть ожидающая заявка, в новую задачу не попадают.
+        queue - класс приоритета заявки; route - очередь Celery, если задача не run_etl_task
+        (стадия загрузки конвейера, src/worker/pipeline.py).
+        """
+        task_id = str(uuid.uuid4())
+        fresh, coalesced = [], {}
+        for ticker in normalize_tickers(tickers):
+            key = self.PENDING_KEY.format(ticker)
+            if self.redis.set(key, task_id, nx=True, ex=self.pending_ttl):
+                fresh.append(ticker)
+                continue
+            existing = self._decode(self.redis.get(key))
+            if existing and queue == INTERACTIVE and self.job_queue(existing) == BULK:
+                # Интерактивный запрос не ждет позади resync: тикер переходит к нему
+                self.redis.set(key, task_id, ex=self.pending_ttl)
+                self.redis.sadd(self.SUPERSEDED_KEY.format(existing), ticker)
+                self.redis.expire(self.SUPERSEDED_KEY.format(existing), self.pending_ttl)
+                fresh.append(ticker)
+            elif existing:
+                coalesced[ticker] = existing
+            elif self.redis.set(key, task_id, nx=True, ex=self.pending_ttl):  # заявка успела стартовать
+                fresh.append(ticker)
+            else:
+                coalesced[ticker] = self._decode(self.redis.get(key))
+
+        if coalesced:
+            ETL_JOBS.labels(queue, "coalesced").inc(len(coalesced))
+        if not fresh:
+            return {"task_id": None, "tickers": [], "coalesced": coalesced}
+
+        self.redis.hset(self.JOB_KEY.format(task_id), mapping={"queue": queue, "tickers": ",".join(fresh)})
+        self.redis.expire(self.JOB_KEY.format(task_id), self.pending_ttl)
+        if batch_id:
+            self.redis.sadd(self.BATCH_TASKS_KEY.format(batch_id), task_id)
+        self.celery.send_task(
+            task, args=[fresh, years_back], task_id=task_id, queue=route or queue,
+            kwargs={**task_kwargs, "queue": queue, "enqueued_at": time.time(), "batch_id": batch_id},
+        )
+        ETL_JOBS.labels(queue, "submitted").inc()
+        return {"task_id": task_id, "tickers": fresh, "coalesced": coalesced}
+
+    def submit_batch(self, batch_id: str, tickers: List[str], years_back: int, **task_kwargs) -> dict:
+        """Resync: задача на тикер в etl_bulk; {"submitted": N, "coalesced": M}"""
+        tickers = normalize_tickers(tickers)
+        self.redis.hset(self.BATCH_KEY.format(batch_id), mapping={"total": 0, "done": 0, "failed": 0})
+        submitted, coalesced = 0, 0
+        for ticker in tickers:
+            result = self.submit([ticker], years_back, BULK, batch_id=batch_id, **task_kwargs)
+            if result["task_id"]:
+                submitted += 1
+            else:
+                coalesced += 1
+        self.redis.hset(self.BATCH_KEY.format(batch_id), "total", submitted)
+        self.redis.expire(self.BATCH_KEY.format(batch_id), self.pending_ttl)
+        return {"submitted": submitted, "coalesced": coalesced}
+
+    def job_queue(self, task_id: str) -> Optional[str]:
+        return self._decode(self.redis.hget(self.JOB_KEY.format(task_id), "queue"))
+
+    # --- Исполнение (воркер) ---
+    def claim(self, task_id: str, tickers: List[str]) -> List[str]:
+        """
+        Вызывается при старте задачи: снимает ее заявки (следующий запрос поставит новую задачу)
+        и возвращает тикеры, которые не забрал интерактивный запрос.
+        """
+        superseded = {self._decode(t) for t in self.redis.smembers(self.SUPERSEDED_KEY.format(task_id))}
+        claimed = []
+        for ticker in tickers:
+            if ticker in superseded:
+                continue
+            self._compare_and_delete(keys=[self.PENDING_KEY.format(ticker)], args=[task_id])
+            claimed.append(ticker)
+        self.redis.delete(self.SUPERSEDED_KEY.format(task_id))
+        return claimed
+
+    def unclaim(self, task_id: str, tickers: List[str]):
+        """
+        Задача уходит на retry: заявки тикеров возвращаются к ней, и новые запросы снова сливаются
+        с ней (интерактивный - перехватывает тикер, как до старта). Уже чужие заявки не трогаются.
+        """
+        for ticker in tickers:
+            self.redis.set(self.PENDING_KEY.format(ticker), task_id, nx=True, ex=self.pending_ttl)
+
+    @contextmanager
+    def ticker_locks(self, tickers: List[str], queue: str = INTERACTIVE):
+        """Блокировки всех тикеров задачи; LockTimeout, если не получены за lock_wait"""
+        token = str(uuid.uuid4())
+        held = []
+        started = time.perf_counter()
+        try:
+            for ticker in sorted(tickers):
+                key = self.LOCK_KEY.format(ticker)
+                while not self.redis.set(key, token, nx=True, ex=self.lock_ttl):
+                    if time.perf_counter() - started > self.lock_wait:
+                        raise LockTimeout(ticker)
+                    time.sleep(0.5)
+                held.append(key)
+            ETL_LOCK_WAIT_SECONDS.labels(queue).observe(time.perf_counter() - started)
+            yield
+        finally:
+            for key in held:
+                self._compare_and_delete(keys=[key], args=[token])
+
+    def batch_done(self, batch_id: str, ok: bool) -> Dict[str, int]:
+        key = self.BATCH_KEY.format(batch_id)
+        self.redis.hincrby(key, "done" if ok else "failed", 1)
+        return {k: int(v) for k, v in ((self._decode(k), v) for k, v in self.redis.hgetall(key).items())}
+
+    # --- Отмена ---
+    def cancel(self, task_id: str) -> List[str]:
+        """task_id задачи или батча -> id задач Celery для revoke; их заявки снимаются"""
+        children = [self._decode(t) for t in self.redis.smembers(self.BATCH_TASKS_KEY.format(task_id))]
+        task_ids = children or [task_id]
+        for tid in task_ids:
+            tickers = self._decode(self.redis.hget(self.JOB_KEY.format(tid), "tickers")) or ""
+            for ticker in filter(None, tickers.split(",")):
+                self._compare_and_delete(keys=[self.PENDING_KEY.format(ticker)], args=[tid])
+        return task_ids
+
+    @staticmethod
+    def _decode(value):
+        return value.decode() if isinstance(value, bytes) else value
@@ -1,22 +1,78 @@
 # File: src/worker/tasks.py
-from celery import Celery
+from celery.schedules import crontab
+from celery.signals import worker_init
 import os
 import time
 import requests
-from flows.ingest_flow import ingest_flow
+import dask
+from datetime import datetime
+from flows.ingest_flow import generate_download_tasks, ingest_flow
 from flows.transform_flow import transform_flow
+from flows.refresh_flow import refresh_flow
 from src.storage.task_registry import task_registry
+from src.storage.exporter import export_to_minio
+from src.telemetry import DB_OPERATION_SECONDS, ETL_JOB_SECONDS, ETL_JOBS, ETL_QUEUE_WAIT_SECONDS, STAGE_SECONDS, init_tracing, span, timed
+from src.config import settings
+from src.profiling import profile_run
+from src.storage.run_profiles import save_profile
+from src.worker.scheduler import BULK, INTERACTIVE, LockTimeout, normalize_tickers
+from src.worker.pipeline import PROCESS_QUEUE
+from src.worker.client import celery_app, etl_pipeline, etl_scheduler
+from src.ingestion.watermarks import load_watermarks, moscow_now, plan_refresh
+from src.ingestion.gaps import load_gap_days, mark_repair_attempted, plan_gap_refetch
+from src.ingestion.incremental import refetch_range
+from src.storage.db import db_router
+from src.storage.tiers import gold_size, trim_gold
+from src.storage import gold_swap
 
-celery_app = Celery(
-    "moex_worker",
-    broker=os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0"),
-    backend=os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0"),
-)
+# Приложение и брокер - в src/worker/client.py (его же импортирует API); здесь настройки воркера и задачи
 # ВАЖНО: Возвращаем "fork" или "prefork", чтобы работала параллельность, 
 # НО для Spark внутри контейнера безопаснее "threads" или "solo", если мало памяти.
 # С новой логикой (append) можно попробовать "threads".
 celery_app.conf.worker_pool = "threads" 
 celery_app.conf.worker_concurrency = 4  # 4 одновременных задачи
+# Задача забирается только когда слот свободен: длинные bulk-задачи не копятся в prefetch
+# и не задерживают интерактивные (очереди etl_interactive/etl_bulk - см. src/worker/scheduler.py)
+celery_app.conf.worker_prefetch_multiplier = 1
+
+# --- Расписание (celery beat, start.sh): ETL_UNIVERSE держится актуальным без ручных запусков ---
+celery_app.conf.timezone = "Europe/Moscow"
+celery_app.conf.beat_schedule = {
+    # В сессию: минутки с водяного знака; expires - просроченный запуск не копится за долгим resync
+    "intraday-refresh": {
+        "task": "src.worker.tasks.refresh_universe_task",
+        "schedule": crontab(minute=f"*/{settings.REFRESH_INTRADAY_MINUTES}", hour="10-18", day_of_week="mon-fri"),
+        "args": (["1m"],),
+        "options": {"queue": INTERACTIVE, "expires": settings.REFRESH_INTRADAY_MINUTES * 60},
+    },
+    # После закрытия: дневка дня + добор минуток; тикеры без истории уходят в полный backfill
+    "eod-refresh": {
+        "task": "src.worker.tasks.refresh_universe_task",
+        "schedule": crontab(hour=settings.REFRESH_EOD_HOUR, minute=settings.REFRESH_EOD_MINUTE, day_of_week="mon-fri"),
+        "args": (["1m", "1d"],),
+        "kwargs": {"backfill": True},
+        "options": {"queue": INTERACTIVE},
+    },
+    # Через час после EOD: докачка дней с пропусками по отчету data_quality
+    "gap-repair": {
+        "task": "src.worker.tasks.repair_gaps_task",
+        "schedule": crontab(hour=(settings.REFRESH_EOD_HOUR + 1) % 24, minute=settings.REFRESH_EOD_MINUTE,
+                            day_of_week="mon-fri"),
+        "options": {"queue": BULK},
+    },
+    # Ночью: холодная история Gold (старше GOLD_HOT_DAYS) удаляется - она остается в Silver
+    "gold-retention": {
+        "task": "src.worker.tasks.retention_task",
+        "schedule": crontab(hour=3, minute=30),
+        "options": {"queue": BULK},
+    },
+}
+
+
+@worker_init.connect
+def init_worker_tracing(**kwargs):
+    init_tracing("moex-worker")
+
 
 def wait_for_prefect(api_url: str, timeout: int = 60):
     start_time = time.time()
@@ -28,29 +84,281 @@ def wait_for_prefect(api_url: str, timeout: int = 60):
         if time.time() - start_time > timeout: return False
         time.sleep(2)
 
-@celery_app.task(bind=True)
-def run_etl_task(self, tickers: list, years_back: int):
+def finish_batch(batch_id: str, ok: bool):
+    """Прогресс родительской записи resync по завершенным дочерним задачам"""
+    if not batch_id:
+        return
+    counts = etl_scheduler.batch_done(batch_id, ok)
+    total, finished = counts.get("total", 0), counts.get("done", 0) + counts.get("failed", 0)
+    if not total:
+        return
+    status = f"♻️ {counts.get('done', 0)}/{total} tickers" + (f", {counts['failed']} failed" if counts.get("failed") else "")
+    state = ("SUCCESS" if not counts.get("failed") else "FAILURE") if finished >= total else "RUNNING"
+    task_registry.update_task(batch_id, progress=int(100 * finished / total), status=status, state=state)
+
+
+def publish_data_version():
+    # Версия вместе с позицией WAL: чтения новой версии не уходят на реплики, еще не проигравшие коммит
+    task_registry.bump_data_version(db_router.current_lsn())
+
+
+def run_pipeline(task_id: str, tickers: list, years_back: int, trace_context: dict, profiled: bool,
+                 force: bool = False):
+    # Спан-продолжение трейса /etl/run: ingest_flow, transform_flow и Gold swap - его потомки
+    with span("run_etl_task", carrier=trace_context, task_id=task_id, tickers=list(tickers)), \
+            profile_run(task_id, tickers, enabled=profiled, sample_ms=settings.PROFILE_SAMPLE_MS, on_finish=save_profile):
+        try:
+            # 1. Ingestion
+            ingest_flow(tickers, years_back, task_id=task_id)
+
+            # 2. Processing (Только для этих тикеров!)
+            task_registry.update_task(task_id, progress=75, status="🔥 Processing (Spark)...", state="RUNNING")
+            processed = transform_flow(tickers, force=force) # <-- Передаем список тикеров
+            if processed:
+                publish_data_version()
+
+            # 3. Done
+            task_registry.update_task(task_id, progress=100, status="✅ Completed", state="SUCCESS",
+                                      result={"profile": True} if profiled else None)
+            return "OK"
+        except Exception as e:
+            print(f"❌ Task failed: {e}")
+            task_registry.update_task(task_id, progress=100, status=f"Error: {str(e)[:20]}", state="FAILURE",
+                                      result={"profile": True} if profiled else None)
+            raise e
+
+
+@celery_app.task(bind=True, max_retries=20)
+def run_etl_task(self, tickers: list, years_back: int, trace_context: dict = None, profile: bool = False,
+                 queue: str = INTERACTIVE, enqueued_at: float = None, batch_id: str = None, force: bool = False):
+    """Ставится только через etl_scheduler.submit/submit_batch (коалесинг, очереди, блокировки тикеров)"""
     task_id = self.request.id
-    print(f"👷 Worker picked up task {task_id} for {tickers}")
+    if enqueued_at and not self.request.retries:
+        ETL_QUEUE_WAIT_SECONDS.labels(queue).observe(time.time() - enqueued_at)
+
+    tickers = etl_scheduler.claim(task_id, tickers)
+    if not tickers:
+        # Все тикеры забрал более поздний интерактивный запрос
+        ETL_JOBS.labels(queue, "superseded").inc()
+        task_registry.update_task(task_id, progress=100, status="⏭ Superseded", state="SUCCESS")
+        finish_batch(batch_id, True)
+        return "SKIPPED"
+
+    print(f"👷 Worker picked up task {task_id} for {tickers} ({queue})")
     task_registry.update_task(task_id, progress=1, status="🚀 Initializing...", state="RUNNING")
     
     prefect_url = os.getenv("PREFECT_API_URL", "http://prefect-server:4200/api")
     if not wait_for_prefect(prefect_url):
         task_registry.update_task(task_id, progress=100, status="❌ Prefect Timeout", state="FAILURE")
+        finish_batch(batch_id, False)
         return
 
+    # profile=True (или ETL_PROFILE): отчет по стадиям в etl_run_profiles, кнопка 📊 в панели задач
+    profiled = profile or settings.ETL_PROFILE
+    started = time.perf_counter()
     try:
-        # 1. Ingestion
-        ingest_flow(tickers, years_back, task_id=task_id)
+        # Один запуск на тикер: параллельные задачи не пишут одну партицию Silver и строки Gold
+        with etl_scheduler.ticker_locks(tickers, queue):
+            result = run_pipeline(task_id, tickers, years_back, trace_context, profiled, force)
+    except LockTimeout as e:
+        task_registry.update_task(task_id, status=f"🔒 Waiting for {e}...", state="PENDING")
+        raise self.retry(exc=e, countdown=30)
+    except Exception:
+        ETL_JOBS.labels(queue, "failure").inc()
+        finish_batch(batch_id, False)
+        raise
+    ETL_JOB_SECONDS.labels(queue).observe(time.perf_counter() - started)
+    ETL_JOBS.labels(queue, "success").inc()
+    finish_batch(batch_id, True)
+    return result
+
+
+def report_pipeline(run_id: str):
+    """Прогресс resync по обеим стадиям; последний батч пишет итог с wall-clock временем"""
+    state = etl_pipeline.status(run_id)
+    total = state["total"]
+    if not total:
+        return
+    failed = f", {state['failed']} failed" if state["failed"] else ""
+    summary = etl_pipeline.finish(run_id)
+    if summary is None:
+        task_registry.update_task(run_id, progress=int(50 * (state["ingested"] + state["processed"]) / total),
+                                  status=f"⛓ ingest {state['ingested']}/{total} · spark {state['processed']}/{total}{failed}",
+                                  state="RUNNING")
+        return
+    STAGE_SECONDS.labels("pipeline_total").observe(summary["wall_s"])
+    print(f"🏁 Pipeline {run_id}: {total} tickers, {summary['batches']} Spark batches in {summary['wall_s']}s{failed}")
+    task_registry.update_task(run_id, progress=100, status=f"✅ {total} tickers in {summary['wall_s']:.0f}s{failed}",
+                              state="FAILURE" if summary["failed"] else "SUCCESS",
+                              result={"wall_s": summary["wall_s"], "tickers": total, "batches": summary["batches"],
+                                      "failed": summary["failed"]})
+
+
+@celery_app.task(bind=True, max_retries=20)
+def ingest_ticker_task(self, tickers: list, years_back: int, trace_context: dict = None, profile: bool = False,
+                       queue: str = BULK, enqueued_at: float = None, batch_id: str = None):
+    """
+    Стадия загрузки конвейера resync (очередь etl_ingest): чанки тикера качаются потоками Dask
+    без обертки Prefect-флоу, готовый тикер уходит в Spark батчем (src/worker/pipeline.py).
+    """
+    task_id = self.request.id
+    if enqueued_at and not self.request.retries:
+        ETL_QUEUE_WAIT_SECONDS.labels(queue).observe(time.time() - enqueued_at)
 
-        # 2. Processing (Только для этих тикеров!)
-        task_registry.update_task(task_id, progress=75, status="🔥 Processing (Spark)...", state="RUNNING")
-        transform_flow(tickers) # <-- Передаем список тикеров
+    claimed = etl_scheduler.claim(task_id, tickers)
+    if not claimed:
+        ETL_JOBS.labels(queue, "superseded").inc()
+        etl_pipeline.ticker_ingested(batch_id, [], True, skipped=len(tickers))
+        report_pipeline(batch_id)
+        return "SKIPPED"
 
-        # 3. Done
-        task_registry.update_task(task_id, progress=100, status="✅ Completed", state="SUCCESS")
-        return "OK"
+    ok = True
+    started = time.perf_counter()
+    try:
+        # Блокировка только на время записи Bronze: Silver/Gold тикера пишет process_batch_task под своей
+        with etl_scheduler.ticker_locks(claimed, queue), \
+                span("pipeline.ingest", carrier=trace_context, task_id=task_id, tickers=claimed), \
+                profile_run(task_id, claimed, enabled=profile or settings.ETL_PROFILE,
+                            sample_ms=settings.PROFILE_SAMPLE_MS, on_finish=save_profile):
+            lazy = generate_download_tasks.fn(claimed, years_back)
+            dask.compute(*lazy, scheduler='threads', num_workers=settings.PIPELINE_INGEST_THREADS)
+        STAGE_SECONDS.labels("pipeline_ingest").observe(time.perf_counter() - started)
+    except LockTimeout as e:
+        if self.request.retries < self.max_retries:
+            etl_scheduler.unclaim(task_id, claimed)
+            raise self.retry(exc=e, countdown=30)
+        # Повторы кончились: тикеры считаются упавшими, иначе запуск не дойдет до total и не завершится
+        print(f"❌ Ingest gave up for {claimed}: {e} still locked after {self.max_retries} retries")
+        ok = False
+    except Exception as e:
+        print(f"❌ Ingest failed for {claimed}: {e}")
+        ok = False
+    ETL_JOBS.labels(queue, "success" if ok else "failure").inc()
+    etl_pipeline.ticker_ingested(batch_id, claimed, ok, skipped=len(tickers) - len(claimed))
+    report_pipeline(batch_id)
+    return "OK" if ok else "FAILED"
+
+
+@celery_app.task(bind=True, max_retries=20)
+def process_batch_task(self, run_id: str, tickers: list, force: bool = False):
+    """
+    Стадия Spark конвейера resync (очередь etl_process, воркер --pool=solo): Bronze -> Silver -> Gold
+    для батча тикеров в сессии Spark, переиспользуемой между батчами.
+    """
+    from src.processing.spark_job import get_shared_spark_session, process_tickers  # pyspark - только в Spark-воркере
+
+    ok = True
+    started = time.perf_counter()
+    try:
+        with etl_scheduler.ticker_locks(tickers, PROCESS_QUEUE), \
+                span("pipeline.process", run_id=run_id, tickers=list(tickers)):
+            # Тикеры с неизмененным Bronze (bronze_manifest) Spark пропускает
+            if process_tickers(get_shared_spark_session(), tickers, force=force):
+                publish_data_version()
+        STAGE_SECONDS.labels("pipeline_process").observe(time.perf_counter() - started)
+    except LockTimeout as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=30)
+        print(f"❌ Spark batch gave up for {tickers}: {e} still locked after {self.max_retries} retries")
+        ok = False
     except Exception as e:
-        print(f"❌ Task failed: {e}")
-        task_registry.update_task(task_id, progress=100, status=f"Error: {str(e)[:20]}", state="FAILURE")
-        raise e
\ No newline at end of file
+        print(f"❌ Spark batch failed for {tickers}: {e}")
+        ok = False
+    etl_pipeline.batch_processed(run_id, tickers, ok)
+    report_pipeline(run_id)
+    return "OK" if ok else "FAILED"
+
+
+@celery_app.task
+def refresh_universe_task(intervals: list, backfill: bool = False):
+    """Инкремент по водяным знакам Gold: одна загрузка и один Spark-прогон на все отставшие тикеры"""
+    universe = normalize_tickers(settings.ETL_UNIVERSE.split(","))
+    now = moscow_now()
+    plan = plan_refresh(universe, intervals, load_watermarks(universe, intervals), now)
+    if backfill and plan["missing"]:
+        etl_scheduler.submit(plan["missing"], 3, BULK)
+
+    due = sorted({t for tickers in plan["due"].values() for t in tickers})
+    summary = {"due": due, "current": len(plan["current"]), "missing": plan["missing"], "updated": []}
+    if not due:
+        ETL_JOBS.labels("refresh", "current").inc()
+        return summary
+
+    try:
+        with etl_scheduler.ticker_locks(due, INTERACTIVE):
+            summary["updated"] = refresh_flow(plan["due"], now)
+    except LockTimeout as e:
+        # Тикер занят ручным запуском: он и так обновит данные, следующий тик расписания догонит
+        print(f"⏭️ Refresh skipped: {e} is locked")
+        ETL_JOBS.labels("refresh", "skipped").inc()
+        return summary
+    if summary["updated"]:
+        publish_data_version()
+    ETL_JOBS.labels("refresh", "success").inc()
+    return summary
+
+
+@celery_app.task
+def retention_task():
+    """
+    Обрезка Gold до горячего окна (src/storage/tiers.py); чтения старше него идут в Silver.
+    Заодно удаляется срез прошлой полной перезаливки, если срок отката истек (src/storage/gold_swap.py).
+    """
+    before = gold_size()
+    with span("gold.retention"), timed(DB_OPERATION_SECONDS, "retention"):
+        deleted = trim_gold()
+        dropped_old = gold_swap.drop_expired()
+    summary = {"deleted": deleted, "dropped_old": dropped_old, "before": before, "after": gold_size()}
+    print(f"🧊 Gold retention: deleted {deleted}, stock_metrics {before['bytes']} -> {summary['after']['bytes']} bytes")
+    return summary
+
+
+@celery_app.task
+def repair_gaps_task(tickers: list = None):
+    """Докачка только диапазонов дней с пропусками и пересчет Gold затронутых тикеров"""
+    ranges = plan_gap_refetch(load_gap_days(tickers), moscow_now(), settings.DQ_REPAIR_MAX_RANGES)
+    summary = {"ranges": len(ranges), "days": sum(len(r["days"]) for r in ranges), "updated": []}
+    if not ranges:
+        return summary
+
+    affected = sorted({r["ticker"] for r in ranges})
+    print(f"🩹 Gap repair: {summary['days']} days in {len(ranges)} ranges for {affected}")
+    try:
+        with etl_scheduler.ticker_locks(affected, BULK), span("repair_gaps", ranges=len(ranges)), \
+                timed(STAGE_SECONDS, "gap_repair"):
+            results = dask.compute(*[dask.delayed(refetch_range)(r["ticker"], r["interval"], r["start"], r["end"])
+                                     for r in ranges], scheduler='threads', num_workers=8)
+            # Попытка засчитывается и без новых баров: неликвидные минутки ISS не вернет
+            mark_repair_attempted(ranges)
+            summary["updated"] = sorted({r["ticker"] for r, res in zip(ranges, results) if res.startswith("SUCCESS")})
+            if summary["updated"]:
+                # Полный пересчет тикера: старые дни меняют окна индикаторов после них
+                transform_flow(summary["updated"])
+                publish_data_version()
+    except LockTimeout as e:
+        print(f"⏭️ Gap repair skipped: {e} is locked")
+    return summary
+
+
+@celery_app.task(bind=True)
+def export_task(self, tickers: list, interval: str, fmt: str, start: str = None, end: str = None,
+                trace_context: dict = None):
+    """Фоновая выгрузка истории в MinIO: результат - presigned URL в реестре задач"""
+    task_id = self.request.id
+    task_registry.update_task(task_id, progress=5, status="📦 Exporting...", state="RUNNING")
+
+    def progress(size: int):
+        task_registry.update_task(task_id, status=f"📦 {size / 1024 / 1024:.0f} MB written")
+
+    with span("export_task", carrier=trace_context, task_id=task_id, interval=interval, format=fmt):
+        try:
+            result = export_to_minio(tickers, interval, fmt,
+                                     datetime.fromisoformat(start) if start else None,
+                                     datetime.fromisoformat(end) if end else None,
+                                     progress=progress)
+            task_registry.update_task(task_id, progress=100, status="✅ Export ready", state="SUCCESS", result=result)
+            return result
+        except Exception as e:
+            print(f"❌ Export failed: {e}")
+            task_registry.update_task(task_id, progress=100, status=f"Error: {str(e)[:20]}", state="FAILURE")
+            raise e
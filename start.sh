@@ -2,19 +2,35 @@
 
 echo "🚀 Starting System with MULTIPLE ISOLATED Workers..."
 
+# Prometheus multiprocess: воркеры, API и Spark-драйвер пишут метрики в общую папку, /metrics их агрегирует
+export PROMETHEUS_MULTIPROC_DIR=/tmp/moex_metrics
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 # Worker 1 (Обрабатывает задачи по одной, полностью изолирован)
-# Очереди берет любые
-nohup celery -A src.worker.tasks worker --loglevel=info --pool=solo -n worker1 > worker1.log 2>&1 &
+# Выделенная полоса для интерактивных запросов (/etl/run) и выгрузок: resync сюда не попадает
+nohup celery -A src.worker.tasks worker --loglevel=info --pool=solo -n worker1 -Q etl_interactive,celery > worker1.log 2>&1 &
 
 # Worker 2 (Тоже изолирован, работает параллельно с первым)
-nohup celery -A src.worker.tasks worker --loglevel=info --pool=solo -n worker2 > worker2.log 2>&1 &
+# Берет и интерактивные, и bulk (resync по тикеру)
+nohup celery -A src.worker.tasks worker --loglevel=info --pool=solo -n worker2 -Q etl_interactive,etl_bulk,celery > worker2.log 2>&1 &
+
+# Конвейер resync (src/worker/pipeline.py): загрузка тикеров потоками, пока Spark считает готовые батчи
+nohup celery -A src.worker.tasks worker --loglevel=info --pool=threads -c 4 -n ingest -Q etl_ingest > worker_ingest.log 2>&1 &
+# Spark-стадия: одна долгоживущая сессия на процесс, батчи по очереди
+nohup celery -A src.worker.tasks worker --loglevel=info --pool=solo -n spark -Q etl_process > worker_spark.log 2>&1 &
 
 # Хочешь еще больше мощности? Раскомментируй третьего:
-# nohup celery -A src.worker.tasks worker --loglevel=info --pool=solo -n worker3 > worker3.log 2>&1 &
+# nohup celery -A src.worker.tasks worker --loglevel=info --pool=solo -n worker3 -Q etl_bulk,etl_interactive > worker3.log 2>&1 &
+
+# Расписание инкрементальных обновлений ETL_UNIVERSE (см. beat_schedule в src/worker/tasks.py)
+nohup celery -A src.worker.tasks beat --loglevel=info -s /tmp/celerybeat-schedule > beat.log 2>&1 &
 
 echo "🔌 Starting API..."
 nohup uvicorn src.api.app:app --host 0.0.0.0 --port 8000 > api.log 2>&1 &
 
+echo "📡 Starting Live Poller..."
+nohup python -m src.ingestion.live > live.log 2>&1 &
+
 echo "⏳ Waiting for services..."
 sleep 5
 
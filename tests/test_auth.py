@@ -0,0 +1,157 @@
+# File: tests/test_auth.py
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from src.api import auth
+from src.api.auth import HashPool, create_access_token, get_current_user
+from src.api.users import UserDirectory
+
+
+class FakePool:
+    def __init__(self, users):
+        self.users = users  # username -> {"id", "username", "role", "password_hash"}
+        self.queries = 0
+
+    async def fetchrow(self, query, *args):
+        self.queries += 1
+        if query.lstrip().startswith("INSERT"):
+            username, password_hash, role = args
+            if username in self.users:
+                return None
+            self.users[username] = {"id": len(self.users) + 1, "username": username, "role": role,
+                                    "password_hash": password_hash}
+        return self.users.get(args[0])
+
+    async def close(self):
+        pass
+
+
+def make_directory(users=None, **kwargs):
+    pool = FakePool(users if users is not None else {"alice": {"id": 7, "username": "alice", "role": "user",
+                                                               "password_hash": "h"}})
+
+    async def connect():
+        return pool
+
+    return UserDirectory(connect, **kwargs), pool
+
+
+class TestUserDirectory:
+    def test_resolve_is_cached_until_ttl(self):
+        now = [0.0]
+        directory, pool = make_directory(ttl=60, clock=lambda: now[0])
+
+        async def scenario():
+            first = await directory.resolve("alice")
+            second = await directory.resolve("alice")
+            now[0] = 61
+            third = await directory.resolve("alice")
+            return first, second, third
+
+        first, second, third = asyncio.run(scenario())
+        assert first.id == second.id == third.id == 7
+        assert pool.queries == 2
+
+    def test_invalidate_and_role_change(self):
+        directory, pool = make_directory()
+
+        async def scenario():
+            await directory.resolve("alice")
+            pool.users["alice"]["role"] = "admin"
+            stale = await directory.resolve("alice")
+            directory.invalidate("alice")
+            return stale, await directory.resolve("alice")
+
+        stale, fresh = asyncio.run(scenario())
+        assert (stale.role, fresh.role) == ("user", "admin")
+
+    def test_login_always_reads_hash_and_refreshes_cache(self):
+        directory, pool = make_directory()
+
+        async def scenario():
+            await directory.credentials("alice")
+            await directory.credentials("alice")
+            return await directory.resolve("alice"), await directory.credentials("bob")
+
+        record, missing = asyncio.run(scenario())
+        assert record.id == 7 and missing is None
+        assert pool.queries == 3  # два входа + bob, resolve из кэша
+
+    def test_create_conflict(self):
+        directory, _ = make_directory()
+
+        async def scenario():
+            return await directory.create("bob", "h2"), await directory.create("alice", "h3")
+
+        created, taken = asyncio.run(scenario())
+        assert created.username == "bob" and taken is None
+        assert directory.cached("bob") == created
+
+    def test_lru_bound(self):
+        directory, _ = make_directory(users={}, max_size=2)
+
+        async def scenario():
+            for name in ("a", "b", "c"):
+                await directory.create(name, "h")
+
+        asyncio.run(scenario())
+        assert directory.cached("a") is None and directory.cached("c") is not None
+
+
+class TestHashPool:
+    def test_hashing_does_not_block_event_loop(self):
+        pool = HashPool(workers=2, max_pending=8)
+
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.005)
+
+            task = asyncio.create_task(ticker())
+            await asyncio.gather(*(pool.run("verify", time.sleep, 0.1) for _ in range(2)))
+            task.cancel()
+            return ticks
+
+        assert asyncio.run(scenario()) >= 5
+
+    def test_rejects_over_max_pending(self):
+        pool = HashPool(workers=1, max_pending=2)
+
+        async def scenario():
+            return await asyncio.gather(*(pool.run("verify", time.sleep, 0.05) for _ in range(3)),
+                                        return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        rejected = [r for r in results if isinstance(r, HTTPException)]
+        assert len(rejected) == 1 and rejected[0].status_code == 503
+        assert pool.pending == 0
+
+    def test_unknown_user_still_pays_bcrypt(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(auth, "verify_password", lambda plain, hashed: calls.append(hashed) or True)
+        monkeypatch.setattr(auth, "hash_pool", HashPool(1, 4))
+        assert asyncio.run(auth.verify_password_async("x", None)) is False
+        assert calls == [auth.DUMMY_HASH]
+
+
+class TestToken:
+    def test_uid_from_token_skips_lookup(self, monkeypatch):
+        directory, pool = make_directory()
+        monkeypatch.setattr(auth, "user_directory", directory)
+        user = asyncio.run(get_current_user(create_access_token({"sub": "alice", "uid": 7, "role": "user"})))
+        assert (user.id, user.role) == (7, "user") and pool.queries == 0
+
+    def test_legacy_token_resolves_id(self, monkeypatch):
+        directory, pool = make_directory()
+        monkeypatch.setattr(auth, "user_directory", directory)
+        user = asyncio.run(get_current_user(create_access_token({"sub": "alice", "role": "user"})))
+        assert user.id == 7 and pool.queries == 1
+        with pytest.raises(HTTPException):
+            asyncio.run(get_current_user(create_access_token({"sub": "ghost", "role": "user"})))
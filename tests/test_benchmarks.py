@@ -0,0 +1,50 @@
+# File: tests/test_benchmarks.py
+from datetime import datetime
+
+import requests
+
+from benchmarks.fake_iss import PAGE_SIZE, FakeISS, candle_times
+from benchmarks.run_pipeline import compare_reports
+
+CANDLES = "/engines/stock/markets/shares/boards/TQBR/securities/SBER/candles.json"
+
+
+class TestFakeISS:
+    def test_pagination_is_deterministic(self):
+        fake = FakeISS(port=0).start()
+        try:
+            params = {"from": "2023-03-01", "till": "2023-03-31", "interval": 1}
+            pages, start = [], 0
+            while True:
+                rows = requests.get(fake.url + CANDLES, params={**params, "start": start}, timeout=5).json()["candles"]["data"]
+                pages += rows
+                if len(rows) < PAGE_SIZE:
+                    break
+                start += len(rows)
+            again = requests.get(fake.url + CANDLES, params={**params, "start": 0}, timeout=5).json()["candles"]["data"]
+            assert len(pages) == 23 * 520  # 23 рабочих дня x 10:00-18:40
+            assert again == pages[:PAGE_SIZE]
+            assert fake.snapshot()["rows"] == len(pages) + PAGE_SIZE
+        finally:
+            fake.stop()
+
+    def test_throttling(self):
+        fake = FakeISS(port=0, error_rate=1.0, retry_after=3).start()
+        try:
+            resp = requests.get(fake.url + CANDLES, params={"from": "2023-03-01", "interval": 24}, timeout=5)
+            assert resp.status_code == 429 and resp.headers["Retry-After"] == "3"
+            assert fake.snapshot()["throttled"] == 1
+        finally:
+            fake.stop()
+
+    def test_daily_candles_skip_weekends(self):
+        assert len(candle_times(datetime(2023, 3, 4), datetime(2023, 3, 12), interval=24)) == 5
+
+
+def test_compare_reports_flags_regressions():
+    base = {"results": {"ingest": {"elapsed_s": 10.0, "rows_per_s": 1000.0, "rows": 5}}}
+    head = {"results": {"ingest": {"elapsed_s": 10.5, "rows_per_s": 800.0, "rows": 9}}}
+    rows = {r["metric"]: r for r in compare_reports(base, head, threshold=0.10)}
+    assert not rows["ingest.elapsed_s"]["regression"]  # +5% в пределах порога
+    assert rows["ingest.rows_per_s"]["regression"]
+    assert not rows["ingest.rows"]["regression"]  # информационная метрика
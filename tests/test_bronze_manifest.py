@@ -0,0 +1,30 @@
+# File: tests/test_bronze_manifest.py
+from src.storage.bronze_manifest import diff_manifest, is_chunk
+
+RECORDED = {
+    "SBER/1m/2024/01.json": ("a1", 100),
+    "SBER/1m/2024/02.json": ("a2", 100),
+    "GAZP/1d/2024.json": ("b1", 50),
+    "LKOH/1d/2024.json": ("c1", 50),
+}
+
+
+class TestDiffManifest:
+    def test_unchanged_bucket_skips_everything(self):
+        assert diff_manifest(dict(RECORDED), RECORDED) == []
+
+    def test_only_changed_tickers(self):
+        current = dict(RECORDED)
+        current["SBER/1m/2024/02.json"] = ("a2-new", 120)  # перекачан месяц
+        current["YNDX/1d/2024.json"] = ("d1", 50)           # новый тикер
+        del current["LKOH/1d/2024.json"]                    # объект удален
+        assert diff_manifest(current, RECORDED) == ["LKOH", "SBER", "YNDX"]
+
+    def test_same_etag_different_size_is_change(self):
+        current = {**RECORDED, "GAZP/1d/2024.json": ("b1", 51)}
+        assert diff_manifest(current, RECORDED) == ["GAZP"]
+
+    def test_only_spark_inputs_are_tracked(self):
+        assert is_chunk("SBER/1m/2024/03/15.json")
+        assert not is_chunk("SBER/1m/2024/01.json.done")
+        assert not is_chunk("SBER/1m/2024/01.json.part/0000500.page")
@@ -0,0 +1,87 @@
+# File: tests/test_checkpoints.py
+import pytest
+
+from src.ingestion.checkpoints import ChunkCheckpoint, done_path, page_path
+
+PATH = "SBER/1m/2024/01.json"
+
+
+class FakeStorage:
+    """Bronze в словаре: путь -> json"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def exists(self, path):
+        return path in self.objects or any(p.startswith(path + "/") for p in self.objects)
+
+    def save_json(self, data, path):
+        self.objects[path] = data
+
+    def load_json(self, path):
+        if path not in self.objects:
+            raise FileNotFoundError(path)  # как s3fs.cat_file
+        return self.objects[path]
+
+    def list_paths(self, prefix):
+        return [p for p in self.objects if p.startswith(prefix + "/")]
+
+    def delete(self, path):
+        for p in [p for p in self.objects if p == path or p.startswith(path + "/")]:
+            del self.objects[p]
+
+
+def page(start, n=500):
+    return [{"begin": f"2024-01-01 {i:05d}"} for i in range(start, start + n)]
+
+
+@pytest.fixture
+def storage():
+    return FakeStorage()
+
+
+class TestChunkCheckpoint:
+    def test_resume_from_last_page(self, storage):
+        checkpoint = ChunkCheckpoint(storage, PATH)
+        checkpoint.save_page(0, page(0))
+        checkpoint.save_page(500, page(500))
+        # Обрыв на третьей странице: чанка нет, загрузка продолжится с 1000
+        assert not checkpoint.is_done()
+        start, rows = checkpoint.resume()
+        assert start == 1000 and len(rows) == 1000
+
+    def test_page_deleted_after_listing_restarts_chunk(self, storage):
+        checkpoint = ChunkCheckpoint(storage, PATH)
+        checkpoint.save_page(0, page(0))
+        checkpoint.save_page(500, page(500))
+        listed = storage.list_paths(PATH + ".part")
+        storage.list_paths = lambda prefix: listed  # устаревший листинг
+        del storage.objects[page_path(PATH, 500)]
+        assert checkpoint.resume() == (0, [])
+
+    def test_gap_in_pages_resumes_from_gap(self, storage):
+        checkpoint = ChunkCheckpoint(storage, PATH)
+        checkpoint.save_page(0, page(0))
+        checkpoint.save_page(1000, page(1000))
+        assert checkpoint.resume()[0] == 500
+
+    def test_closed_chunk_is_done(self, storage):
+        checkpoint = ChunkCheckpoint(storage, PATH)
+        checkpoint.save_page(0, page(0))
+        checkpoint.complete(page(0, 700), closed=True)
+        assert checkpoint.is_done()
+        assert storage.objects[done_path(PATH)] == {"rows": 700}
+        assert page_path(PATH, 0) not in storage.objects
+
+    def test_open_period_is_not_done(self, storage):
+        checkpoint = ChunkCheckpoint(storage, PATH)
+        checkpoint.save_page(0, page(0))
+        checkpoint.complete(page(0, 520), closed=False)
+        assert PATH in storage.objects and not checkpoint.is_done()
+        # Докачка текущего месяца - только хвост после полных страниц
+        assert checkpoint.resume()[0] == 500
+
+    def test_legacy_chunk(self, storage):
+        storage.save_json(page(0, 10), PATH)
+        assert ChunkCheckpoint(storage, PATH).is_done()
+        assert not ChunkCheckpoint(storage, PATH, trust_legacy=False).is_done()
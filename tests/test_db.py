@@ -0,0 +1,187 @@
+# File: tests/test_db.py
+import psycopg2
+import pytest
+
+from src.storage import db
+from src.storage.db import LAG_QUERY, DbRouter, lsn_value, parse_hosts
+
+
+class FakeServer:
+    def __init__(self, lag=0.0, up=True, caught_up=True, streaming=True, replayed="0/3000060"):
+        self.lag = lag
+        self.up = up
+        self.caught_up = caught_up
+        self.streaming = streaming
+        self.replayed = replayed
+        self.lag_checks = 0
+        self.replay_checks = 0
+        self.connects = 0
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if "pg_is_in_recovery" in query:
+            self.server.lag_checks += 1
+            # LAG_QUERY: без WAL receiver в состоянии streaming лаг неизвестен
+            self.result = (self.server.lag if self.server.streaming else None,)
+        elif "pg_last_wal_replay_lsn()::text" in query:
+            self.server.replay_checks += 1
+            self.result = (self.server.replayed,)
+        elif "pg_current_wal_lsn" in query:
+            self.result = ("0/3000060",)
+        elif "pg_last_wal_replay_lsn" in query:
+            self.result = (self.server.caught_up,)
+
+    def fetchone(self):
+        return self.result
+
+
+class FakeConnection:
+    def __init__(self, host):
+        self.host = host
+        self.server = SERVERS[host]
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self.server)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+SERVERS = {}
+
+
+def fake_connect(host, port, **kwargs):
+    server = SERVERS[host]
+    server.connects += 1
+    if not server.up:
+        raise psycopg2.OperationalError(f"{host} is down")
+    return FakeConnection(host)
+
+
+@pytest.fixture
+def servers():
+    SERVERS.clear()
+    SERVERS.update({db.settings.POSTGRES_HOST: FakeServer(lag=None), "r1": FakeServer(), "r2": FakeServer()})
+    return SERVERS
+
+
+def make_router(now, **kwargs):
+    return DbRouter([("r1", 5432), ("r2", 5432)], max_lag=5.0, check_interval=10.0, connect=fake_connect,
+                    clock=lambda: now[0], **kwargs)
+
+
+class TestDbRouter:
+    def test_reads_round_robin_over_replicas(self, servers):
+        router = make_router([0.0])
+        hosts = [router.read().host for _ in range(4)]
+        assert sorted(hosts) == ["r1", "r1", "r2", "r2"]
+        assert servers[db.settings.POSTGRES_HOST].connects == 0
+        assert router.primary().host == db.settings.POSTGRES_HOST
+
+    def test_lag_checked_once_per_interval(self, servers):
+        now = [0.0]
+        router = make_router(now)
+        for _ in range(6):
+            router.read()
+        assert servers["r1"].lag_checks == servers["r2"].lag_checks == 1
+        now[0] = 11
+        router.read(), router.read()
+        assert servers["r1"].lag_checks == servers["r2"].lag_checks == 2
+
+    def test_lagging_or_down_replica_falls_back(self, servers):
+        now = [0.0]
+        servers["r1"].lag = 30.0
+        servers["r2"].up = False
+        router = make_router(now)
+        assert router.read().host == db.settings.POSTGRES_HOST
+        # до следующей проверки отстающие реплики даже не открываются
+        connects = servers["r1"].connects + servers["r2"].connects
+        assert router.read().host == db.settings.POSTGRES_HOST
+        assert servers["r1"].connects + servers["r2"].connects == connects
+        # реплика догнала - после интервала проверки чтения возвращаются на нее
+        servers["r1"].lag = 0.0
+        now[0] = 11
+        assert router.read().host == "r1"
+
+    def test_no_replicas_reads_primary(self, servers):
+        router = DbRouter([], connect=fake_connect)
+        assert router.read().host == db.settings.POSTGRES_HOST
+        assert router.wait_for_replicas() is True
+
+
+    def test_disconnected_receiver_is_not_fresh(self, servers):
+        assert "pg_stat_wal_receiver" in LAG_QUERY and "'streaming'" in LAG_QUERY
+        servers["r1"].streaming = servers["r2"].streaming = False
+        assert make_router([0.0]).read().host == db.settings.POSTGRES_HOST
+
+    def test_new_data_version_not_read_from_replica_behind_it(self, servers):
+        router = make_router([0.0])
+        servers["r1"].replayed = "0/2FFFFFF"  # коммит Gold еще не проигран
+        hosts = [router.read(min_lsn="0/3000000").host for _ in range(4)]
+        assert "r1" not in hosts and "r2" in hosts
+        # Догнавшая реплика проверяется один раз: позиция WAL только растет
+        servers["r1"].replayed = "0/3000010"
+        assert sorted(router.read(min_lsn="0/3000000").host for _ in range(4)) == ["r1", "r1", "r2", "r2"]
+        checks = servers["r1"].replay_checks
+        router.read(min_lsn="0/3000000"), router.read(min_lsn="0/3000000")
+        assert servers["r1"].replay_checks == checks
+
+    def test_export_reads_published_version(self, servers, monkeypatch):
+        from src.storage import exporter, task_registry
+
+        router = make_router([0.0])
+        monkeypatch.setattr(db, "db_router", router)
+        monkeypatch.setattr(exporter, "db_router", router)
+        monkeypatch.setattr(task_registry, "task_registry", type("Registry", (), {"get_data_lsn": lambda self: "0/3000000"})())
+        servers["r1"].replayed = "0/2FFFFFF"  # ETL только что опубликовал версию, r1 ее еще не проиграл
+        assert {exporter.get_db_connection().host for _ in range(4)} == {"r2"}
+
+
+class TestWaitForReplicas:
+    def test_waits_until_replay_reaches_commit(self, servers, monkeypatch):
+        now = [0.0]
+        router = make_router(now)
+        servers["r2"].caught_up = False
+        polls = []
+
+        def sleep(_):
+            polls.append(1)
+            servers["r2"].caught_up = len(polls) >= 2
+
+        monkeypatch.setattr(db.time, "sleep", sleep)
+        assert router.wait_for_replicas(timeout=5) is True
+        assert len(polls) == 2
+
+    def test_timeout(self, servers, monkeypatch):
+        now = [0.0]
+        router = make_router(now)
+        servers["r1"].caught_up = False
+
+        def sleep(seconds):
+            now[0] += 1
+
+        monkeypatch.setattr(db.time, "sleep", sleep)
+        assert router.wait_for_replicas(timeout=3) is False
+
+
+def test_lsn_value():
+    assert lsn_value("1/0") > lsn_value("0/FFFFFFFF") > lsn_value("0/3000060")
+
+
+def test_parse_hosts():
+    assert parse_hosts("replica1, replica2:5433,") == [("replica1", db.settings.POSTGRES_PORT), ("replica2", 5433)]
@@ -0,0 +1,49 @@
+# File: tests/test_exporter.py
+import io
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.storage.exporter import EXPORT_SCHEMA, export_filename, iter_csv, iter_parquet
+
+
+def make_batches(n_batches: int = 3, rows: int = 10):
+    for k in range(n_batches):
+        data = [("SBER", "1m", datetime(2024, 1, 1, 10, i), 1.0, 2.0, 0.5, 1.5, 10.0, None, None, '{"ema_12": 1.0}')
+                for i in range(k * rows, (k + 1) * rows)]
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(zip(*data), EXPORT_SCHEMA)], schema=EXPORT_SCHEMA)
+
+
+class TestExporter:
+    def test_csv_chunk_per_batch_single_header(self):
+        chunks = list(iter_csv(make_batches()))
+        assert len(chunks) == 3
+        lines = b"".join(chunks).decode().splitlines()
+        assert lines[0].startswith('"ticker","interval","ts"')
+        assert len(lines) == 31
+
+    def test_parquet_streamed_as_row_groups(self):
+        chunks = list(iter_parquet(make_batches()))
+        assert len(chunks) == 4  # 3 row group + footer
+        parquet = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+        assert parquet.num_row_groups == 3
+        assert parquet.read().num_rows == 30
+
+    def test_empty_export_is_valid_parquet(self):
+        table = pq.read_table(io.BytesIO(b"".join(iter_parquet(iter([])))))
+        assert table.num_rows == 0 and table.schema.names == EXPORT_SCHEMA.names
+
+    def test_filename(self):
+        assert export_filename(["sber"], "1m", "csv").startswith("SBER_1m_")
+        assert export_filename(["A", "B"], "1d", "parquet").startswith("2_tickers_1d_")
+
+    def test_stream_export_capped_like_batch(self):
+        from fastapi.testclient import TestClient
+
+        from src.api.app import MAX_BATCH_TICKERS, app
+
+        tickers = ",".join(f"T{i}" for i in range(MAX_BATCH_TICKERS + 1))
+        response = TestClient(app).get("/export", params={"tickers": tickers})
+        assert response.status_code == 400 and "/export/jobs" in response.json()["detail"]
@@ -0,0 +1,39 @@
+# File: tests/test_gaps.py
+from datetime import date, datetime
+
+from src.ingestion.gaps import plan_gap_refetch
+
+# 2024-03-15 - пятница
+NOW = datetime(2024, 3, 18, 12)  # понедельник, сессия идет
+
+
+class TestPlanGapRefetch:
+    def test_consecutive_trading_days_form_one_range(self):
+        gaps = [
+            ("SBER", "1m", date(2024, 3, 14)),
+            ("SBER", "1m", date(2024, 3, 15)),
+            ("SBER", "1m", date(2024, 3, 13)),
+            ("SBER", "1m", date(2024, 3, 11)),  # 12-е в порядке - отдельный диапазон
+        ]
+        ranges = plan_gap_refetch(gaps, NOW)
+        assert [(r["start"], r["end"]) for r in ranges] == [
+            (date(2024, 3, 11), date(2024, 3, 11)),
+            (date(2024, 3, 13), date(2024, 3, 15)),
+        ]
+        assert ranges[1]["days"] == [date(2024, 3, 13), date(2024, 3, 14), date(2024, 3, 15)]
+
+    def test_range_spans_weekend_but_not_tickers(self):
+        gaps = [
+            ("SBER", "1m", date(2024, 3, 15)),
+            ("SBER", "1m", date(2024, 3, 18)),  # текущий день: сессия не закрыта
+            ("GAZP", "1m", date(2024, 3, 8)),
+            ("GAZP", "1m", date(2024, 3, 11)),
+            ("GAZP", "1d", date(2024, 3, 12)),
+        ]
+        ranges = plan_gap_refetch(gaps, NOW)
+        assert [(r["ticker"], r["interval"], r["start"], r["end"]) for r in ranges] == [
+            ("GAZP", "1d", date(2024, 3, 12), date(2024, 3, 12)),
+            ("GAZP", "1m", date(2024, 3, 8), date(2024, 3, 11)),
+            ("SBER", "1m", date(2024, 3, 15), date(2024, 3, 15)),
+        ]
+        assert len(plan_gap_refetch(gaps, NOW, max_ranges=1)) == 1
@@ -0,0 +1,175 @@
+# File: tests/test_gold_swap.py
+from datetime import datetime
+
+import psycopg2.errors
+import pytest
+
+from src.storage import gold_swap
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        query = " ".join(query.split())
+        self.conn.pending.append((query, params))
+        if query.startswith("ALTER TABLE stock_metrics RENAME") and self.conn.busy:
+            self.conn.busy -= 1
+            raise psycopg2.errors.LockNotAvailable("canceling statement due to lock timeout")
+
+    def fetchone(self):
+        if self.conn.pending[-1][0].startswith("SELECT pg_try_advisory"):
+            return (not self.conn.rebuilding,)
+        return self.conn.result
+
+
+class FakeConnection:
+    """Транзакции - списки выполненных запросов: commit фиксирует, rollback отбрасывает"""
+    def __init__(self, busy=0, result=None, rebuilding=False):
+        self.busy = busy
+        self.result = result
+        self.rebuilding = rebuilding  # advisory lock Gold держит перезаливка
+        self.pending = []
+        self.committed = []
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed.append(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.pending = []
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(gold_swap.time, "sleep", lambda s: None)
+
+
+def sql(transaction):
+    return [query for query, _ in transaction]
+
+
+class TestBuildShadow:
+    def test_load_then_indexes_then_analyze(self):
+        conn = FakeConnection()
+        gold_swap.build_shadow(conn, "INSERT INTO stock_metrics_shadow SELECT 1")
+        create, load, indexes, finish = map(sql, conn.committed)
+        assert create[-1] == "CREATE TABLE stock_metrics_shadow (LIKE stock_metrics INCLUDING DEFAULTS)"
+        assert "DROP TABLE IF EXISTS stock_metrics_old" in create  # на диске не больше двух срезов
+        assert load == ["INSERT INTO stock_metrics_shadow SELECT 1"]
+        assert any("PRIMARY KEY (ticker, interval, ts)" in q for q in indexes)
+        assert "CREATE INDEX idx_ts_shadow ON stock_metrics_shadow (ts)" in indexes
+        assert finish[0] == "ANALYZE stock_metrics_shadow"
+        assert "CREATE TABLE stock_latest_shadow (LIKE stock_latest INCLUDING DEFAULTS)" in finish
+        assert any(q.startswith("INSERT INTO stock_latest_shadow") and "FROM stock_metrics_shadow" in q for q in finish)
+        assert "CREATE UNIQUE INDEX idx_stock_latest_pk_shadow ON stock_latest_shadow (ticker, interval)" in finish
+        # Ни один шаг сборки не трогает живые таблицы
+        assert not any(q.endswith((" stock_metrics", " stock_latest")) for q in create + load + indexes + finish)
+
+
+class TestSwap:
+    def test_swap_is_renames_only(self):
+        conn = FakeConnection()
+        assert gold_swap.exchange(conn, gold_swap.OLD, gold_swap.SHADOW, now=datetime(2024, 6, 1, 12)) == 1
+        (swap,) = conn.committed
+        queries = sql(swap)
+        assert queries[0] == "SET LOCAL lock_timeout = %s" and swap[0][1] == ("500ms",)
+        assert all(q.startswith(("SET LOCAL", "ALTER ", "COMMENT ")) for q in queries)
+        assert queries.index("ALTER TABLE stock_metrics RENAME TO stock_metrics_old") < \
+            queries.index("ALTER TABLE stock_metrics_shadow RENAME TO stock_metrics")
+        assert "ALTER INDEX IF EXISTS stock_metrics_shadow_pkey RENAME TO stock_metrics_pkey" in queries
+        assert "ALTER TABLE stock_latest_shadow RENAME TO stock_latest" in queries
+        assert swap[-1][1] == ("retired 2024-06-01T12:00:00",)
+
+    def test_state_written_in_swap_transaction(self):
+        conn = FakeConnection()
+        gold_swap.swap_in(conn, before=lambda cur: cur.execute("DELETE FROM indicator_state"))
+        queries = sql(conn.committed[0])
+        assert queries.index("DELETE FROM indicator_state") < queries.index("ALTER TABLE stock_metrics RENAME TO stock_metrics_old")
+
+    def test_lock_timeout_retries_whole_transaction(self):
+        conn = FakeConnection(busy=2)
+        assert gold_swap.swap_in(conn, before=lambda cur: cur.execute("DELETE FROM indicator_state")) == 3
+        assert conn.rollbacks == 2
+        assert sql(conn.committed[0]).count("DELETE FROM indicator_state") == 1
+
+    def test_gives_up_after_retries(self, monkeypatch):
+        monkeypatch.setattr(gold_swap.settings, "GOLD_SWAP_LOCK_RETRIES", 2)
+        conn = FakeConnection(busy=5)
+        with pytest.raises(psycopg2.errors.LockNotAvailable):
+            gold_swap.swap_in(conn)
+        assert conn.committed == []
+
+    def test_rollback_restores_previous_generation(self):
+        conn = FakeConnection(result=("stock_metrics_old",))
+        assert gold_swap.rollback(conn)
+        lock, swap, unlock = map(sql, conn.committed)
+        assert lock == ["SELECT pg_advisory_lock(%s)"] and unlock == ["SELECT pg_advisory_unlock(%s)"]
+        queries = swap
+        assert queries[0] == "SELECT to_regclass(%s)"  # проверка - в транзакции переключения, под блокировкой
+        assert queries.index("DROP TABLE IF EXISTS stock_metrics_shadow") < \
+            queries.index("ALTER TABLE stock_metrics RENAME TO stock_metrics_shadow") < \
+            queries.index("ALTER TABLE stock_metrics_old RENAME TO stock_metrics")
+        assert not gold_swap.rollback(FakeConnection(result=(None,)))
+
+
+class TestRebuildLock:
+    def test_held_from_build_to_swap(self):
+        conn = FakeConnection()
+        with gold_swap.rebuild(conn):
+            gold_swap.build_shadow(conn, "INSERT INTO stock_metrics_shadow SELECT 1")
+            gold_swap.swap_in(conn)
+        queries = [q for t in conn.committed for q in sql(t)]
+        lock, unlock = (queries.index(f"SELECT pg_advisory_{op}(%s)") for op in ("lock", "unlock"))
+        assert lock < queries.index("CREATE TABLE stock_metrics_shadow (LIKE stock_metrics INCLUDING DEFAULTS)")
+        assert queries.index("ALTER TABLE stock_metrics_shadow RENAME TO stock_metrics") < unlock
+
+    def test_failed_build_drops_shadow_before_unlock(self):
+        conn = FakeConnection()
+        with pytest.raises(RuntimeError):
+            with gold_swap.rebuild(conn):
+                raise RuntimeError("load failed")
+        cleanup, release = map(sql, conn.committed[1:])
+        assert "DROP TABLE IF EXISTS stock_metrics_shadow" in cleanup
+        assert release == ["SELECT pg_advisory_unlock(%s)"]
+
+    def test_merge_shares_rebuild_key(self):
+        conn = FakeConnection()
+        gold_swap.lock_shared(conn.cursor())
+        assert conn.pending == [("SELECT pg_advisory_xact_lock_shared(%s)", (gold_swap.GOLD_LOCK_KEY,))]
+
+
+class TestDropExpired:
+    def test_kept_for_rollback_window(self, monkeypatch):
+        monkeypatch.setattr(gold_swap.settings, "GOLD_SWAP_KEEP_OLD_HOURS", 6)
+        retired = ("retired 2024-06-01T12:00:00",)
+        conn = FakeConnection(result=retired)
+        assert not gold_swap.drop_expired(datetime(2024, 6, 1, 17), conn)
+        conn = FakeConnection(result=retired)
+        assert gold_swap.drop_expired(datetime(2024, 6, 1, 18), conn)
+        queries = sql(conn.committed[0])
+        assert queries.index("SELECT pg_try_advisory_xact_lock_shared(%s)") < \
+            queries.index("LOCK TABLE stock_metrics_old IN ACCESS EXCLUSIVE MODE") < \
+            queries.index("SELECT obj_description('stock_metrics_old'::regclass, 'pg_class')") < \
+            queries.index("DROP TABLE IF EXISTS stock_metrics_old")
+        assert not gold_swap.drop_expired(datetime(2024, 6, 1, 18), FakeConnection(result=(None,)))
+
+    def test_skipped_during_rebuild(self):
+        conn = FakeConnection(result=("retired 2024-06-01T12:00:00",), rebuilding=True)
+        assert not gold_swap.drop_expired(datetime(2024, 6, 2), conn)
+        assert conn.committed == [] and conn.rollbacks == 1
@@ -0,0 +1,112 @@
+# File: tests/test_hot_tail.py
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.api.hot_tail import HotTailStore, TailBuffer, align, rows_to_columns, to_arrow_ipc, to_columnar, to_records
+
+
+def make_rows(n: int, start: str = "2024-01-01 10:00") -> list:
+    ts = pd.date_range(start, periods=n, freq="1min")
+    return [{"ts": t.to_pydatetime(), "open": i, "high": i + 1, "low": i - 1, "close": float(i), "volume": 10,
+             "sma_20": None, "rsi_14": 50.0, "indicators": {"ema_12": float(i)}} for i, t in enumerate(ts)]
+
+
+def bar(ts: str, close: float) -> dict:
+    return {"ts": ts, "open": close, "high": close, "low": close, "close": close, "volume": 1,
+            "sma_20": None, "rsi_14": None, "indicators": {"vwap": close}, "fetched_at": 1.0}
+
+
+class FakeDB:
+    def __init__(self, rows):
+        self.rows, self.calls = rows, 0
+
+    def __call__(self, tickers, interval, limit):
+        self.calls += 1
+        return {t: rows_to_columns(self.rows[-limit:]) for t in tickers if t != "EMPTY"}
+
+
+class TestTailBuffer:
+    def test_keeps_last_capacity_bars_across_compaction(self):
+        buf = TailBuffer(4, rows_to_columns(make_rows(3)))
+        for i in range(3, 20):
+            buf.append(bar(str(pd.Timestamp("2024-01-01 10:00") + pd.Timedelta(minutes=i)), float(i)))
+        tail = buf.tail(10)
+        assert tail["close"].tolist() == [16.0, 17.0, 18.0, 19.0]
+        assert np.isnan(tail["ema_12"]).all() and tail["vwap"].tolist() == [16.0, 17.0, 18.0, 19.0]
+
+    def test_same_ts_replaces_last_bar(self):
+        buf = TailBuffer(10, rows_to_columns(make_rows(2)))
+        buf.append(bar("2024-01-01 10:01", 99.0))
+        buf.append(bar("2024-01-01 09:00", -1.0))  # старый бар игнорируется
+        assert buf.tail(10)["close"].tolist() == [0.0, 99.0]
+
+    def test_slot_reuse_does_not_leak_indicators(self):
+        rows = [{**r, "indicators": {"ema_50": float(i)}} for i, r in enumerate(make_rows(3))]
+        buf = TailBuffer(3, rows_to_columns(rows))
+        for i in range(3, 7):  # live-бары без ema_50; _compact оставляет старые строки за size
+            live = bar(str(pd.Timestamp("2024-01-01 10:00") + pd.Timedelta(minutes=i)), float(i))
+            buf.append({**live, "indicators": {}})
+        assert np.isnan(buf.tail(3)["ema_50"]).all()
+
+        buf.append({**bar("2024-01-01 10:06", 7.0), "indicators": {"ema_50": 1.0}})
+        buf.append({**bar("2024-01-01 10:06", 8.0), "indicators": {}})  # новая версия той же свечи
+        assert np.isnan(buf.tail(1)["ema_50"][-1]) and buf.tail(1)["close"].tolist() == [8.0]
+
+
+class TestHotTailStore:
+    def test_serves_from_memory_until_version_changes(self):
+        db, version = FakeDB(make_rows(50)), [1]
+        store = HotTailStore(db, lambda: version[0], capacity=20, version_ttl=0)
+        assert store.get("sber", "1m", 5)["close"].tolist() == [45.0, 46.0, 47.0, 48.0, 49.0]
+        store.get("SBER", "1m", 20)
+        assert db.calls == 1
+        version[0] = 2
+        store.get("SBER", "1m", 5)
+        assert db.calls == 2
+
+    def test_deep_requests_fall_back(self):
+        store = HotTailStore(FakeDB(make_rows(50)), lambda: 1, capacity=20)
+        assert store.get("SBER", "1m", 21) is None
+
+    def test_live_bars_survive_reload(self):
+        db, version = FakeDB(make_rows(5)), [1]
+        store = HotTailStore(db, lambda: version[0], capacity=20, version_ttl=0)
+        store.get("SBER", "1m", 20)
+        store.append("SBER", "1m", [bar("2024-01-01 10:05", 5.5), bar("2024-01-01 10:06", 6.5)])
+        db.rows = make_rows(6)  # ETL догнал только 10:05
+        version[0] = 2
+        assert store.get("SBER", "1m", 3)["close"].tolist() == [4.0, 5.0, 6.5]
+
+    def test_get_many_loads_misses_in_one_query(self):
+        db = FakeDB(make_rows(10))
+        store = HotTailStore(db, lambda: 1, capacity=20)
+        store.get("SBER", "1d", 5)
+        out = store.get_many(["sber", "GAZP", "LKOH", "EMPTY"], "1d", 3)
+        assert db.calls == 2
+        assert list(out) == ["SBER", "GAZP", "LKOH", "EMPTY"]
+        assert out["GAZP"]["close"].tolist() == [7.0, 8.0, 9.0] and len(out["EMPTY"]["ts"]) == 0
+
+
+def test_align_on_union_of_timestamps():
+    a = rows_to_columns(make_rows(3))
+    b = rows_to_columns(make_rows(3, start="2024-01-01 10:02"))
+    out = align({"SBER": a, "GAZP": b}, ["close", "missing"])
+    assert len(out["ts"]) == 5
+    np.testing.assert_array_equal(out["SBER.close"], [0.0, 1.0, 2.0, np.nan, np.nan])
+    np.testing.assert_array_equal(out["GAZP.close"], [np.nan, np.nan, 0.0, 1.0, 2.0])
+    assert np.isnan(out["GAZP.missing"]).all()
+
+
+class TestFormats:
+    def test_records_match_legacy_shape(self):
+        rec = to_records(rows_to_columns(make_rows(2)), "SBER", "1m")[1]
+        assert rec["ts"] == "2024-01-01T10:01:00"
+        assert rec["sma_20"] is None and rec["close"] == 1.0
+        assert rec["indicators"] == {"ema_12": 1.0}
+
+    def test_columnar_and_arrow(self):
+        columns = rows_to_columns(make_rows(3))
+        assert to_columnar(columns, ticker="SBER")["close"] == [0.0, 1.0, 2.0]
+        table = pa.ipc.open_stream(to_arrow_ipc(columns)).read_all()
+        assert table.num_rows == 3 and table.column("sma_20").null_count == 3
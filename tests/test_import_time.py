@@ -0,0 +1,17 @@
+# File: tests/test_import_time.py
+from benchmarks.import_time import ENTRYPOINTS, measure, parse_importtime, violations
+
+
+class TestImportTime:
+    def test_parse(self):
+        stderr = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       120 |        120 |   json.decoder\n"
+                  "import time:       300 |        420 | json\n")
+        assert parse_importtime(stderr) == {"json.decoder": 120, "json": 420}
+
+    def test_api_does_not_load_worker_stack(self):
+        # Импорт без MinIO/Redis: клиенты ленивые, задачи ставятся по имени через src/worker/client.py
+        report = measure("src.api.app")
+        assert report["ok"], report["error"]
+        assert violations(report, ENTRYPOINTS["src.api.app"]) == []
+        assert "src.worker.client" in report["modules"]
@@ -0,0 +1,66 @@
+# File: tests/test_indicators.py
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.processing.indicators import (
+    DEFAULT_INDICATORS, compute_indicators, dump_state, indicator_output_names, load_indicator_specs,
+)
+
+
+def make_bars(n: int = 300, freq: str = "min") -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    spread = rng.uniform(0.1, 1.0, n)
+    return pd.DataFrame({
+        "ts": pd.date_range("2024-01-15 10:00", periods=n, freq=freq),
+        "open": close + rng.normal(0, 0.2, n),
+        "high": close + spread,
+        "low": close - spread,
+        "close": close,
+        "volume": rng.integers(100, 1000, n).astype(float),
+    })
+
+
+class TestIndicators:
+    def test_all_outputs_present(self):
+        result, state = compute_indicators(make_bars(50))
+        for name in indicator_output_names(DEFAULT_INDICATORS):
+            assert name in result.columns
+        # Состояние фиксируется на предпоследней строке
+        assert pd.Timestamp(state["ts"]) == result["ts"].iloc[-2]
+
+    def test_legacy_sma_matches_rolling_mean(self):
+        bars = make_bars(40)
+        result, _ = compute_indicators(bars)
+        expected = bars["close"].rolling(20, min_periods=1).mean()
+        np.testing.assert_allclose(result["sma_20"], expected)
+
+    @pytest.mark.parametrize("split", [1, 2, 35, 200, 299])
+    def test_incremental_matches_full_recompute(self, split):
+        """
+        Инкрементальный расчет (состояние из JSON + новые бары) должен давать
+        те же значения, что и полный пересчет истории.
+        """
+        bars = make_bars(300)
+        full, _ = compute_indicators(bars)
+
+        _, state = compute_indicators(bars.iloc[:split])
+        state = json.loads(dump_state(state)) if state else None
+        tail, _ = compute_indicators(bars, state=state)
+
+        expected = full[full["ts"].isin(tail["ts"])].reset_index(drop=True)
+        assert len(tail) == len(expected)
+        for name in indicator_output_names(DEFAULT_INDICATORS):
+            np.testing.assert_allclose(tail[name], expected[name], rtol=1e-9, equal_nan=True, err_msg=name)
+
+    def test_custom_specs_keep_legacy_columns(self):
+        specs = load_indicator_specs([{"name": "ema_50", "kind": "ema", "params": {"window": 50}}])
+        names = [s.name for s in specs]
+        assert names == ["sma_20", "rsi_14", "ema_50"]
+
+    def test_unknown_kind_rejected(self):
+        with pytest.raises(ValueError):
+            load_indicator_specs([{"name": "x", "kind": "nope"}])
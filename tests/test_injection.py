@@ -79,5 +79,6 @@ class TestMoexIngestion:
 
         result = download_chunk("BROKEN_TICKER", 2023, 24)
 
-        assert "EMPTY" in result
+        # Оборванная загрузка не сохраняется как чанк: следующий запуск докачает
+        assert "PARTIAL" in result
         mock_minio.save_json.assert_not_called()
@@ -0,0 +1,70 @@
+# File: tests/test_inventory.py
+import threading
+import time
+
+from src.storage.inventory import Inventory
+
+
+class FakeLister:
+    def __init__(self, objects):
+        self.objects = objects
+        self.calls = []
+
+    def __call__(self, prefix):
+        self.calls.append(prefix)
+        time.sleep(0.01)
+        return {p: ("etag", 1) for p in self.objects if p.startswith(prefix + "/")}
+
+
+OBJECTS = ["SBER/1m/2024/01.json", "SBER/1m/2024/02.json.part/0000000.page", "GAZP/1d/2024.json"]
+
+
+class TestInventory:
+    def test_one_listing_per_ticker(self):
+        lister = FakeLister(OBJECTS)
+        inventory = Inventory(lister)
+        paths = ["SBER/1m/2024/01.json", "SBER/1m/2024/02.json", "SBER/1m/2024/02.json.part", "GAZP/1d/2024.json",
+                 "LKOH/1d/2024.json"]
+        assert inventory.exists_many(paths) == {"SBER/1m/2024/01.json", "SBER/1m/2024/02.json.part",
+                                                "GAZP/1d/2024.json"}
+        assert inventory.exists("SBER/1m/2024/01.json")
+        assert sorted(lister.calls) == ["GAZP", "LKOH", "SBER"]
+
+    def test_concurrent_threads_share_listing(self):
+        lister = FakeLister(OBJECTS)
+        inventory = Inventory(lister)
+        threads = [threading.Thread(target=inventory.exists, args=("SBER/1m/2024/01.json",)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert lister.calls == ["SBER"]
+
+    def test_own_writes_and_ttl(self):
+        now = [0.0]
+        lister = FakeLister(OBJECTS)
+        inventory = Inventory(lister, ttl=60, clock=lambda: now[0])
+        assert not inventory.exists("SBER/1m/2024/03.json")
+        inventory.added("SBER/1m/2024/03.json", 10)
+        inventory.removed("SBER/1m/2024/02.json.part")
+        assert inventory.exists("SBER/1m/2024/03.json")
+        assert inventory.list("SBER/1m/2024/02.json.part") == []
+        assert lister.calls == ["SBER"]
+
+        now[0] = 61  # чужие записи видны после TTL
+        lister.objects.append("SBER/1m/2024/04.json")
+        assert inventory.exists("SBER/1m/2024/04.json")
+        assert inventory.objects("SBER", fresh=True) and lister.calls == ["SBER", "SBER", "SBER"]
+
+    def test_fresh_prefetch_sees_other_workers_changes(self):
+        lister = FakeLister(list(OBJECTS))
+        inventory = Inventory(lister, ttl=300)
+        assert inventory.exists("SBER/1m/2024/02.json.part")
+        # Другой воркер закрыл чанк в пределах TTL: теплый снимок этого не видит, свежий - видит
+        lister.objects.remove("SBER/1m/2024/02.json.part/0000000.page")
+        lister.objects.append("SBER/1m/2024/02.json.done")
+        inventory.prefetch(["SBER"])
+        assert inventory.exists("SBER/1m/2024/02.json.part")
+        inventory.prefetch(["SBER"], fresh=True)
+        assert not inventory.exists("SBER/1m/2024/02.json.part")
+        assert inventory.exists("SBER/1m/2024/02.json.done")
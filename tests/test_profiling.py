@@ -0,0 +1,130 @@
+# File: tests/test_profiling.py
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+
+from src import profiling
+from src.profiling import RunProfile, compare_stages, profile_run
+
+JobInfo = namedtuple("JobInfo", "jobId stageIds status")
+StageInfo = namedtuple("StageInfo", "stageId currentAttemptId name numTasks numActiveTasks numCompletedTasks numFailedTasks")
+
+
+class FakeTracker:
+    def getJobIdsForGroup(self, group):
+        return [7] if group.endswith("-indicators") else []
+
+    def getJobInfo(self, job_id):
+        return JobInfo(job_id, [1, 2], "SUCCEEDED")
+
+    def getStageInfo(self, stage_id):
+        return StageInfo(stage_id, 0, f"count at spark_job.py:{stage_id}", 8, 0, 8, stage_id - 1)
+
+
+class FakeSparkContext:
+    def __init__(self):
+        self.props = {}
+
+    def setJobGroup(self, group, description):
+        self.props["spark.jobGroup.id"] = group
+
+    def setLocalProperty(self, key, value):
+        self.props[key] = value
+
+    def statusTracker(self):
+        return FakeTracker()
+
+
+class FakeSpark:
+    def __init__(self):
+        self.sparkContext = FakeSparkContext()
+
+
+class TestStages:
+    def test_noop_without_profile(self):
+        with profiling.stage("download", item="SBER 2024-01"):
+            pass
+        assert profiling.current() is None
+
+    def test_records_from_worker_threads(self):
+        reports = []
+        with profile_run("t1", ["SBER"], sample_ms=0, on_finish=reports.append):
+            def chunk(i):
+                # Поток Dask не видит contextvar: профиль находится как единственный активный
+                with profiling.stage("download", item=f"chunk-{i}"):
+                    time.sleep(0.01 * i)
+            threads = [threading.Thread(target=chunk, args=(i,)) for i in range(1, 4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            with profiling.stage("merge"):
+                pass
+
+        [report] = reports
+        assert report["status"] == "SUCCESS"
+        assert report["stages"]["download"]["calls"] == 3
+        assert report["stages"]["download"]["max_wall_s"] >= 0.03
+        assert report["slowest"][0]["item"] == "chunk-3"
+        assert report["stages"]["merge"]["calls"] == 1
+        assert profiling.current() is None
+
+    def test_failure_is_saved(self):
+        reports = []
+        with pytest.raises(RuntimeError):
+            with profile_run("t2", ["SBER"], sample_ms=0, on_finish=reports.append):
+                with profiling.stage("indicators"):
+                    raise RuntimeError("boom")
+        assert reports[0]["status"] == "FAILURE"
+        assert reports[0]["stages"]["indicators"]["calls"] == 1
+
+    def test_disabled(self):
+        with profile_run("t3", enabled=False) as profile:
+            assert profile is None and profiling.current() is None
+
+    def test_spark_stage_metrics(self):
+        spark = FakeSpark()
+        reports = []
+        with profile_run("t4", ["SBER"], sample_ms=0, on_finish=reports.append):
+            with profiling.stage("indicators", spark=spark):
+                assert spark.sparkContext.props["spark.jobGroup.id"] == "profile-t4-indicators"
+        assert spark.sparkContext.props["spark.jobGroup.id"] is None
+        stages = reports[0]["spark_stages"]
+        assert [s["stage_id"] for s in stages] == [1, 2]
+        assert stages[1]["failed_tasks"] == 1 and stages[0]["stage"] == "indicators"
+
+
+class TestSampler:
+    def test_samples_only_threads_inside_stages(self):
+        profile = RunProfile("t5", sample_ms=1).start()
+
+        def busy_wait(seconds):
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                pass
+
+        idle = threading.Thread(target=busy_wait, args=(0.2,))
+        idle.start()
+        with profile.stage("indicators"):
+            busy_wait(0.2)
+        idle.join()
+        profile.finish()
+
+        python = profile.report()["python"]
+        assert python["samples"] > 0
+        assert set(python["by_stage"]) == {"indicators"}
+        assert any("busy_wait" in f["function"] for f in python["top_cumulative"])
+
+
+class TestCompare:
+    def test_change_vs_previous(self):
+        report = {"stages": {"download": {"calls": 2, "wall_s": 3.0, "cpu_s": 0.5, "max_wall_s": 2.0},
+                             "merge": {"calls": 1, "wall_s": 1.0, "cpu_s": 0.1, "max_wall_s": 1.0}}}
+        previous = {"stages": {"download": {"calls": 2, "wall_s": 2.0, "cpu_s": 0.5, "max_wall_s": 1.0}}}
+        rows = compare_stages(report, previous)
+        assert [r["stage"] for r in rows] == ["download", "merge"]
+        assert rows[0]["change"] == 0.5 and rows[0]["prev_wall_s"] == 2.0
+        assert rows[1]["change"] is None
+        assert compare_stages(report, None)[0]["prev_wall_s"] is None
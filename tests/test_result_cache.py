@@ -0,0 +1,58 @@
+# File: tests/test_result_cache.py
+import os
+import time
+
+import pyarrow as pa
+
+from src.dashboard.result_cache import ResultCache
+
+
+def make_table(n: int = 10) -> pa.Table:
+    return pa.table({"ts": list(range(n)), "close": [float(i) for i in range(n)]})
+
+
+class TestResultCache:
+    def test_csv_streamed_in_batches(self, tmp_path):
+        cache = ResultCache(root=str(tmp_path / "c"), max_items=4, max_mb=10, ttl=60)
+        run_id = cache.put(make_table(25), label="SBER")
+
+        chunks = list(cache.iter_csv(run_id, batch_rows=10))
+        assert len(chunks) == 3
+        lines = b"".join(chunks).decode().splitlines()
+        assert lines[0] == '"ts","close"'
+        assert len(lines) == 26
+
+    def test_lru_eviction(self, tmp_path):
+        cache = ResultCache(root=str(tmp_path / "c"), max_items=2, max_mb=10, ttl=60)
+        first, second = cache.put(make_table()), cache.put(make_table())
+        cache.get(first)  # first становится "свежим"
+        cache.put(make_table())
+        assert cache.get(first) is not None
+        assert cache.get(second) is None
+
+    def test_ttl_expiry(self, tmp_path):
+        cache = ResultCache(root=str(tmp_path / "c"), max_items=2, max_mb=10, ttl=-1)
+        run_id = cache.put(make_table())
+        assert cache.get(run_id) is None
+        assert cache.iter_csv(run_id) is None
+
+    def test_rejects_non_run_id(self, tmp_path):
+        cache = ResultCache(root=str(tmp_path / "c"))
+        assert cache.get("../../etc/passwd") is None
+
+    def test_shared_root_is_not_wiped_by_another_instance(self, tmp_path):
+        root = str(tmp_path / "c")
+        live = ResultCache(root=root, ttl=60)
+        run_id = live.put(make_table())
+        ResultCache(root=root, ttl=60)  # второй дашборд или тест на том же хосте
+        assert list(live.iter_csv(run_id))
+
+    def test_stale_leftovers_swept(self, tmp_path):
+        root = tmp_path / "c"
+        (root / "cache-dead").mkdir(parents=True)
+        (root / "legacy.parquet").write_bytes(b"")
+        old = time.time() - 120
+        for name in ("cache-dead", "legacy.parquet"):
+            os.utime(root / name, (old, old))
+        cache = ResultCache(root=str(root), ttl=60)
+        assert os.listdir(root) == [os.path.basename(cache.root)]
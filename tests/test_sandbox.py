@@ -0,0 +1,74 @@
+# File: tests/test_sandbox.py
+import json
+
+import pandas as pd
+import pytest
+
+from src.dashboard.sandbox import SandboxBusy, SandboxCrashed, SandboxPool, SandboxTimeout, from_arrow
+
+SIMPLE_CODE = """
+def custom_plot(df):
+    import plotly.express as px
+    df['spread'] = df['high'] - df['low']
+    return px.line(df, x='ts', y='close')
+"""
+
+
+@pytest.fixture(scope="module")
+def df():
+    return pd.DataFrame({
+        "ts": pd.date_range("2024-01-01", periods=10, freq="D"),
+        "high": [float(i + 1) for i in range(10)],
+        "low": [float(i) for i in range(10)],
+        "close": [float(i) + 0.5 for i in range(10)],
+    })
+
+
+@pytest.fixture
+def pool():
+    p = SandboxPool(workers=1, queue_size=0, timeout=5, cpu_seconds=2, memory_mb=256)
+    yield p
+    p.shutdown()
+
+
+class TestSandboxPool:
+    def test_runs_code_out_of_process(self, pool, df):
+        result = pool.run(SIMPLE_CODE, df)
+        assert result.error is None
+        assert json.loads(result.figure)["data"]
+        # df после custom_plot возвращается через Arrow вместе с новыми колонками
+        assert "spread" in from_arrow(result.data).columns
+
+    def test_user_error_returns_traceback(self, pool, df):
+        result = pool.run("def custom_plot(df):\n    return 1 / 0", df)
+        assert "ZeroDivisionError" in result.error
+
+    def test_missing_function(self, pool, df):
+        assert "custom_plot" in pool.run("x = 1", df).error
+
+    def test_runaway_loop_is_killed_and_worker_replaced(self, df):
+        pool = SandboxPool(workers=1, queue_size=0, timeout=1, cpu_seconds=30, memory_mb=256)
+        try:
+            with pytest.raises(SandboxTimeout):
+                pool.run("def custom_plot(df):\n    while True: pass", df)
+            assert pool.run(SIMPLE_CODE, df).error is None
+        finally:
+            pool.shutdown()
+
+    def test_cpu_limit_kills_worker(self, pool, df):
+        with pytest.raises((SandboxCrashed, SandboxTimeout)):
+            pool.run("def custom_plot(df):\n    while True: pass", df)
+        assert pool.run(SIMPLE_CODE, df).error is None
+
+    def test_memory_limit(self, pool, df):
+        result = pool.run("def custom_plot(df):\n    x = bytearray(2 * 1024 ** 3)\n    return None", df)
+        assert "MemoryError" in result.error
+
+    def test_backpressure(self, pool, df):
+        # Единственный слот занят - следующая задача отклоняется сразу, без ожидания
+        assert pool._slots.acquire(blocking=False)
+        try:
+            with pytest.raises(SandboxBusy):
+                pool.run(SIMPLE_CODE, df)
+        finally:
+            pool._slots.release()
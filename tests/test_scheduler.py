@@ -0,0 +1,234 @@
+# File: tests/test_scheduler.py
+import threading
+
+import pytest
+
+from src.worker.pipeline import INGEST_QUEUE, PROCESS_QUEUE, EtlPipeline
+from src.worker.scheduler import BULK, INTERACTIVE, EtlScheduler, LockTimeout
+
+
+class FakeRedis:
+    """Подмножество команд Redis, которые использует планировщик (без TTL)"""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def register_script(self, source):
+        def compare_and_delete(keys, args):
+            with self.lock:
+                if self.data.get(keys[0]) == args[0]:
+                    del self.data[keys[0]]
+                    return 1
+                return 0
+        return compare_and_delete
+
+    def set(self, key, value, nx=False, ex=None):
+        with self.lock:
+            if nx and key in self.data:
+                return None
+            self.data[key] = value
+            return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def expire(self, key, ttl):
+        pass
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        h = self.data.setdefault(key, {})
+        h.update(mapping or {field: value})
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hincrby(self, key, field, amount):
+        h = self.data.setdefault(key, {})
+        h[field] = int(h.get(field, 0)) + amount
+
+    def hsetnx(self, key, field, value):
+        h = self.data.setdefault(key, {})
+        if field in h:
+            return 0
+        h[field] = value
+        return 1
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+
+    def lpop(self, key, count):
+        items = self.data.get(key, [])
+        popped, self.data[key] = items[:count], items[count:]
+        return popped or None
+
+    def llen(self, key):
+        return len(self.data.get(key, []))
+
+    def sadd(self, key, value):
+        self.data.setdefault(key, set()).add(value)
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+
+class FakeCelery:
+    def __init__(self):
+        self.sent = []
+
+    def send_task(self, name, args, kwargs=None, task_id=None, queue=None):
+        task_id = task_id or f"t{len(self.sent)}"
+        self.sent.append({"name": name, "args": args, "kwargs": kwargs, "task_id": task_id, "queue": queue})
+        return type("AsyncResult", (), {"id": task_id})()
+
+
+@pytest.fixture
+def scheduler():
+    return EtlScheduler(FakeRedis(), FakeCelery(), lock_wait=0.2)
+
+
+class TestCoalescing:
+    def test_identical_pending_requests_coalesce(self, scheduler):
+        first = scheduler.submit(["sber"], 3)
+        second = scheduler.submit(["SBER", "GAZP"], 3)
+        assert first["tickers"] == ["SBER"]
+        assert second["tickers"] == ["GAZP"] and second["coalesced"] == {"SBER": first["task_id"]}
+        assert [m["queue"] for m in scheduler.celery.sent] == [INTERACTIVE, INTERACTIVE]
+
+        again = scheduler.submit(["SBER"], 3)
+        assert again["task_id"] is None and again["coalesced"]["SBER"] == first["task_id"]
+        assert len(scheduler.celery.sent) == 2
+
+    def test_started_job_accepts_new_request(self, scheduler):
+        first = scheduler.submit(["SBER"], 3)
+        assert scheduler.claim(first["task_id"], ["SBER"]) == ["SBER"]
+        second = scheduler.submit(["SBER"], 3)
+        assert second["task_id"] and second["task_id"] != first["task_id"]
+
+    def test_retried_job_takes_requests_again(self, scheduler):
+        first = scheduler.submit(["SBER"], 3)
+        scheduler.claim(first["task_id"], ["SBER"])
+        scheduler.unclaim(first["task_id"], ["SBER"])  # LockTimeout -> retry
+        assert scheduler.submit(["SBER"], 3)["coalesced"] == {"SBER": first["task_id"]}
+
+    def test_interactive_supersedes_pending_bulk(self, scheduler):
+        batch = scheduler.submit_batch("b1", ["SBER", "GAZP"], 3)
+        assert batch == {"submitted": 2, "coalesced": 0}
+        bulk = {m["args"][0][0]: m["task_id"] for m in scheduler.celery.sent}
+        assert all(m["queue"] == BULK and m["kwargs"]["batch_id"] == "b1" for m in scheduler.celery.sent)
+
+        interactive = scheduler.submit(["SBER"], 3)
+        assert interactive["tickers"] == ["SBER"] and interactive["coalesced"] == {}
+        # Bulk-задача SBER стартует и пропускает тикер; GAZP обрабатывается как обычно
+        assert scheduler.claim(bulk["SBER"], ["SBER"]) == []
+        assert scheduler.claim(bulk["GAZP"], ["GAZP"]) == ["GAZP"]
+        assert scheduler.claim(interactive["task_id"], ["SBER"]) == ["SBER"]
+
+    def test_bulk_coalesces_into_pending_interactive(self, scheduler):
+        interactive = scheduler.submit(["SBER"], 3)
+        batch = scheduler.submit_batch("b1", ["SBER", "GAZP"], 3)
+        assert batch == {"submitted": 1, "coalesced": 1}
+        assert scheduler.redis.hget("moex:etl:batch:b1", "total") == 1
+        assert interactive["task_id"] not in scheduler.cancel("b1")
+
+
+class TestLocksAndBatches:
+    def test_ticker_lock_is_exclusive(self, scheduler):
+        with scheduler.ticker_locks(["SBER", "GAZP"]):
+            with pytest.raises(LockTimeout):
+                with scheduler.ticker_locks(["GAZP"]):
+                    pass
+        with scheduler.ticker_locks(["GAZP"]):
+            pass
+        assert not any(k.startswith("moex:etl:lock:") for k in scheduler.redis.data)
+
+    def test_batch_progress(self, scheduler):
+        scheduler.submit_batch("b1", ["SBER", "GAZP", "LKOH"], 3)
+        scheduler.batch_done("b1", True)
+        counts = scheduler.batch_done("b1", False)
+        assert counts == {"total": 3, "done": 1, "failed": 1}
+
+    def test_cancel_batch_clears_pending(self, scheduler):
+        scheduler.submit_batch("b1", ["SBER", "GAZP"], 3)
+        ids = scheduler.cancel("b1")
+        assert sorted(ids) == sorted(m["task_id"] for m in scheduler.celery.sent)
+        # Отмененные заявки не поглощают новые запросы
+        assert scheduler.submit(["SBER"], 3)["task_id"] is not None
+
+
+class TestPipeline:
+    @pytest.fixture
+    def pipeline(self, scheduler):
+        return EtlPipeline(scheduler.redis, scheduler.celery, scheduler)
+
+    @staticmethod
+    def spark_batches(pipeline):
+        return [m["args"][1] for m in pipeline.celery.sent if m["queue"] == PROCESS_QUEUE]
+
+    def test_batches_start_before_ingest_finishes(self, pipeline):
+        assert pipeline.start("r1", ["SBER", "GAZP", "LKOH", "YNDX", "MOEX"], 3, batch_size=2) == \
+            {"submitted": 5, "coalesced": 0}
+        ingest = [m for m in pipeline.celery.sent if m["queue"] == INGEST_QUEUE]
+        assert len(ingest) == 5 and all(m["kwargs"]["queue"] == BULK for m in ingest)
+
+        pipeline.ticker_ingested("r1", ["SBER"], True)
+        assert self.spark_batches(pipeline) == []
+        pipeline.ticker_ingested("r1", ["GAZP"], True)
+        assert self.spark_batches(pipeline) == [["SBER", "GAZP"]]  # три тикера еще качаются
+
+        pipeline.ticker_ingested("r1", ["LKOH"], False)  # упавший тикер не ждет Spark
+        pipeline.ticker_ingested("r1", [], True, skipped=1)  # YNDX забрал интерактивный запрос
+        pipeline.ticker_ingested("r1", ["MOEX"], True)
+        assert self.spark_batches(pipeline) == [["SBER", "GAZP"], ["MOEX"]]  # остаток после загрузки всех
+
+        pipeline.batch_processed("r1", ["SBER", "GAZP"], True)
+        assert pipeline.finish("r1") is None
+        pipeline.batch_processed("r1", ["MOEX"], True)
+        summary = pipeline.finish("r1")
+        assert summary["done"] and summary["failed"] == 1 and summary["batches"] == 2
+        assert summary["wall_s"] is not None
+        assert pipeline.finish("r1") is None  # итог пишется один раз
+        assert len(pipeline.scheduler.cancel("r1")) == 7  # загрузки и Spark-батчи
+
+    def test_coalesced_tickers_are_not_awaited(self, pipeline, scheduler):
+        scheduler.submit(["SBER"], 3)
+        assert pipeline.start("r1", ["SBER", "GAZP"], 3, batch_size=10) == {"submitted": 1, "coalesced": 1}
+        pipeline.ticker_ingested("r1", ["GAZP"], True)
+        assert self.spark_batches(pipeline) == [["GAZP"]]
+        pipeline.batch_processed("r1", ["GAZP"], True)
+        assert pipeline.finish("r1")["total"] == 1
+
+    @pytest.fixture
+    def tasks(self, pipeline, scheduler, monkeypatch):
+        tasks = pytest.importorskip("src.worker.tasks")  # Prefect/Dask - только в окружении воркера
+        monkeypatch.setattr(tasks, "etl_scheduler", scheduler)
+        monkeypatch.setattr(tasks, "etl_pipeline", pipeline)
+        monkeypatch.setattr(tasks.task_registry, "update_task", lambda *a, **kw: None)
+        scheduler.lock_wait = 0
+        scheduler.redis.set("moex:etl:lock:SBER", "other-run")  # тикер занят дольше всех повторов
+        return tasks
+
+    def test_ingest_gives_up_after_last_retry(self, tasks, pipeline):
+        pipeline.start("r1", ["SBER"], 3, batch_size=1)
+        (job,) = pipeline.celery.sent
+        # apply() повторяет задачу синхронно, пока не кончатся max_retries
+        result = tasks.ingest_ticker_task.apply(args=job["args"], kwargs=job["kwargs"], task_id=job["task_id"])
+        assert result.get() == "FAILED"
+        state = pipeline.status("r1")
+        assert state["done"] and state["failed"] == 1
+        assert pipeline.finish("r1") is None  # итог уже записал report_pipeline
+
+    def test_spark_batch_gives_up_after_last_retry(self, tasks, pipeline):
+        pytest.importorskip("pyspark")
+        pipeline.start("r1", ["SBER"], 3, batch_size=1)
+        pipeline.ticker_ingested("r1", ["SBER"], True)
+        job = pipeline.celery.sent[-1]
+        assert tasks.process_batch_task.apply(args=job["args"], kwargs=job["kwargs"]).get() == "FAILED"
+        state = pipeline.status("r1")
+        assert state["done"] and state["failed"] == 1
@@ -0,0 +1,128 @@
+# File: tests/test_spark_job.py
+import pytest
+
+pytest.importorskip("pyspark")  # Spark-воркер; в окружении API тесты пропускаются
+
+from src.processing import spark_job  # noqa: E402
+
+BRONZE = (["SBER", "GAZP"], {"SBER/1d/2024.json": ("e1", 1000), "GAZP/1d/2024.json": ("e2", 2000)})
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.queries.append(" ".join(query.split()))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.queries.append("COMMIT")
+
+    def rollback(self):
+        pass
+
+
+class FakeConf:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+class FakeContext:
+    defaultParallelism = 4
+
+
+class FakeSpark:
+    def __init__(self, parent=None):
+        self.conf = FakeConf()
+        self.sparkContext = FakeContext()
+        self.children = []
+        self.stopped = False
+
+    def newSession(self):
+        child = FakeSpark(self)
+        self.children.append(child)
+        return child
+
+    def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    calls = []
+    monkeypatch.setattr(spark_job, "process_bronze_to_silver", lambda spark, tickers, paths: calls.append(
+        ("silver", spark, tickers)) or {})
+    monkeypatch.setattr(spark_job, "process_silver_to_gold_atomic", lambda spark, tickers, **kw: calls.append(
+        ("gold", spark, tickers, kw)))
+    monkeypatch.setattr(spark_job, "record_manifest", lambda *a: None)
+    return calls
+
+
+class TestSessions:
+    def test_each_run_gets_own_sql_conf(self, stages):
+        base = FakeSpark()
+        spark_job.process_tickers(base, bronze=BRONZE)
+        spark_job.process_tickers(base, bronze=(["SBER"], BRONZE[1]))
+        first, second = base.children
+        assert base.conf.values == {}  # общая сессия не перенастраивается прогонами
+        assert first.conf.values["spark.sql.shuffle.partitions"] and second.conf.values
+        assert {s[1] for s in stages} == {first, second}
+
+    def test_process_data_does_not_stop_shared_session(self, stages, monkeypatch):
+        base = FakeSpark()
+        monkeypatch.setattr(spark_job, "changed_bronze", lambda tickers, force: BRONZE)
+        monkeypatch.setattr(spark_job, "get_shared_spark_session", lambda: base)
+        assert spark_job.process_data(["SBER", "GAZP"]) == ["SBER", "GAZP"]
+        assert not base.stopped
+
+
+class TestFullRefresh:
+    def test_all_tickers_go_through_shadow(self, stages):
+        spark_job.process_tickers(FakeSpark(), tickers=None, bronze=BRONZE)
+        assert stages[-1][3]["full_refresh"]
+
+    def test_partial_or_explicit_sets_merge_live(self, stages):
+        spark_job.process_tickers(FakeSpark(), tickers=None, bronze=(["SBER"], BRONZE[1]))
+        spark_job.process_tickers(FakeSpark(), tickers=["SBER", "GAZP"], bronze=BRONZE)
+        spark_job.process_tickers(FakeSpark(), tickers=None, incremental=True, bronze=BRONZE)
+        assert not any(s[3]["full_refresh"] for s in stages if s[0] == "gold")
+
+    def test_process_data_passes_flag(self, stages, monkeypatch):
+        monkeypatch.setattr(spark_job, "changed_bronze", lambda tickers, force: (
+            tickers or BRONZE[0], {p: v for p, v in BRONZE[1].items() if not tickers or p.split("/")[0] in tickers}))
+        monkeypatch.setattr(spark_job, "get_shared_spark_session", FakeSpark)
+        spark_job.process_data()
+        spark_job.process_data(["SBER"])  # срез Bronze по одному тикеру - не весь Gold
+        assert [s[3]["full_refresh"] for s in stages if s[0] == "gold"] == [True, False]
+
+    def test_full_refresh_builds_shadow_under_lock(self, monkeypatch):
+        conn = FakeConnection()
+        monkeypatch.setattr(spark_job, "build_shadow", lambda c, load_sql: c.queries.append("BUILD " + load_sql.split()[2]))
+        monkeypatch.setattr(spark_job, "swap_in", lambda c, before: c.queries.append("SWAP") or 1)
+        spark_job.merge_gold(conn, "temp_metrics_x", ["SBER", "GAZP"], full_refresh=True)
+        queries = conn.queries
+        assert queries.index("SELECT pg_advisory_lock(%s)") < queries.index("BUILD stock_metrics_shadow") < \
+            queries.index("SWAP") < queries.index("SELECT pg_advisory_unlock(%s)")
+
+    def test_ticker_merge_waits_for_rebuild(self):
+        conn = FakeConnection()
+        spark_job.merge_gold(conn, "temp_metrics_x", ["SBER"])
+        assert conn.queries[0] == "SELECT pg_advisory_xact_lock_shared(%s)"
+        assert "DELETE FROM stock_metrics WHERE ticker = ANY(%s)" in conn.queries
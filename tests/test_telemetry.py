@@ -0,0 +1,55 @@
+# File: tests/test_telemetry.py
+from opentelemetry import trace
+
+from src.telemetry import (STAGE_SECONDS, CeleryQueueCollector, init_tracing, render_metrics, span, timed,
+                           trace_carrier)
+
+
+class FakeRedis:
+    def __init__(self, lengths: dict):
+        self.lengths = lengths
+
+    def llen(self, key):
+        if key not in self.lengths:
+            raise ConnectionError("down")
+        return self.lengths[key]
+
+
+class TestMetrics:
+    def test_timed_observes_on_error(self):
+        before = STAGE_SECONDS.labels("test_stage")._sum.get()
+        try:
+            with timed(STAGE_SECONDS, "test_stage"):
+                raise ValueError
+        except ValueError:
+            pass
+        assert STAGE_SECONDS.labels("test_stage")._sum.get() > before
+
+    def test_queue_collector_skips_unavailable(self):
+        [family] = CeleryQueueCollector(FakeRedis({"celery": 7}), ["celery", "etl_bulk"]).collect()
+        assert [(s.labels["queue"], s.value) for s in family.samples] == [("celery", 7)]
+
+    def test_render_metrics(self):
+        payload, content_type = render_metrics()
+        assert content_type.startswith("text/plain")
+        assert b"moex_stage_seconds" in payload
+
+
+class TestTracing:
+    def test_carrier_continues_trace(self):
+        init_tracing("moex-test")
+        with span("parent") as parent:
+            carrier = trace_carrier()
+        assert "traceparent" in carrier
+
+        # Продолжение в "другом процессе": тот же trace id, родитель - спан API
+        with span("child", carrier=carrier) as child:
+            assert child.get_span_context().trace_id == parent.get_span_context().trace_id
+            assert child.parent.span_id == parent.get_span_context().span_id
+
+    def test_span_without_carrier_is_root_or_nested(self):
+        init_tracing("moex-test")
+        with span("outer") as outer:
+            with span("inner", rows=3) as inner:
+                assert inner.parent.span_id == outer.get_span_context().span_id
+        assert trace.get_current_span() is not outer
@@ -0,0 +1,127 @@
+# File: tests/test_tiers.py
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from pyarrow import fs
+
+from src.api.hot_tail import concat_columns, rows_to_columns
+from src.storage import exporter, tiers
+from src.storage.silver_reader import SilverReader, table_to_columns
+
+NOW = datetime(2024, 6, 15, 12, 0)
+
+
+@pytest.fixture
+def hot_days(monkeypatch):
+    monkeypatch.setattr(tiers.settings, "GOLD_HOT_DAYS", 30)
+    monkeypatch.setattr(tiers.settings, "GOLD_COLD_INTERVALS", "1m")
+
+
+def write_silver(root, ticker, rows_per_group=100):
+    """Как Spark: партиция ticker=XXX, ts - instant в UTC-сессии, сортировка по (interval, ts)"""
+    ts = np.arange(np.datetime64("2024-05-01T10:00"), np.datetime64("2024-05-01T10:00") + 1000, dtype="datetime64[m]")
+    table = pa.table({
+        "interval": ["1m"] * len(ts) + ["1d"],
+        "ts": pa.array(np.append(ts.astype("datetime64[us]"), np.datetime64("2024-05-01T00:00", "us")))
+                .cast(pa.timestamp("us", tz="UTC")),
+        **{name: pa.array(np.arange(len(ts) + 1, dtype=float)) for name in ("open", "high", "low", "close", "volume")},
+    })
+    path = root / f"ticker={ticker}"
+    path.mkdir(parents=True)
+    pq.write_table(table, str(path / "part-00000.parquet"), row_group_size=rows_per_group)
+
+
+class TestSplitRange:
+    def test_boundary(self, hot_days):
+        cutoff = datetime(2024, 5, 16)
+        assert tiers.cold_cutoff("1m", NOW) == cutoff
+        assert tiers.split_range("1m", datetime(2023, 1, 1), None, NOW) == {"cold": (datetime(2023, 1, 1), cutoff),
+                                                                            "hot": (cutoff, None)}
+        assert tiers.split_range("1m", None, datetime(2024, 1, 1), NOW) == {"cold": (None, datetime(2024, 1, 1)),
+                                                                            "hot": None}
+        assert tiers.split_range("1m", datetime(2024, 6, 1), None, NOW)["cold"] is None
+
+    def test_hot_only_intervals(self, hot_days, monkeypatch):
+        assert tiers.split_range("1d", None, None, NOW) == {"cold": None, "hot": (None, None)}
+        monkeypatch.setattr(tiers.settings, "GOLD_HOT_DAYS", 0)
+        assert tiers.cold_cutoff("1m", NOW) is None
+
+    def test_rollups_cannot_be_cold(self, hot_days, monkeypatch):
+        monkeypatch.setattr(tiers.settings, "GOLD_COLD_INTERVALS", "1m,5m")
+        with pytest.raises(ValueError):
+            tiers.cold_intervals()
+
+
+class TestSilverReader:
+    def test_range_with_pushdown(self, tmp_path):
+        write_silver(tmp_path, "SBER")
+        reader = SilverReader(fs.LocalFileSystem, root=str(tmp_path))
+        table = reader.read("SBER", "1m", datetime(2024, 5, 1, 11, 0), datetime(2024, 5, 1, 12, 0))
+        assert table.num_rows == 60
+        assert table.column_names == ["ts", "open", "high", "low", "close", "volume"]
+        columns = table_to_columns(table)
+        assert columns["ts"][0] == np.datetime64("2024-05-01T11:00")  # московские часы, без сдвига зоны
+        assert np.isnan(columns["rsi_14"]).all()
+
+    def test_row_groups_outside_range_are_skipped(self, tmp_path):
+        import pyarrow.dataset as ds
+
+        write_silver(tmp_path, "SBER")
+        dataset = ds.dataset(str(tmp_path / "ticker=SBER"), format="parquet")
+        ts = dataset.schema.field("ts").type
+        condition = (ds.field("ts") >= pa.scalar(datetime(2024, 5, 1, 11), type=ts)) & \
+                    (ds.field("ts") < pa.scalar(datetime(2024, 5, 1, 12), type=ts))
+        assert sum(len(f.split_by_row_group(condition)) for f in dataset.get_fragments(condition)) == 2  # из 11
+
+    def test_limit_stops_after_first_row_groups(self, tmp_path, monkeypatch):
+        write_silver(tmp_path, "SBER")
+        # Второй файл той же партиции (другая задача Spark) с более ранними барами: порядок - по статистике
+        late = pa.table({"interval": ["1m"], "ts": pa.array([datetime(2024, 5, 1, 9, 59)], pa.timestamp("us", tz="UTC")),
+                         **{n: [-1.0] for n in ("open", "high", "low", "close", "volume")}})
+        pq.write_table(late, str(tmp_path / "ticker=SBER" / "part-00001.parquet"))
+        reader = SilverReader(fs.LocalFileSystem, root=str(tmp_path))
+        reads = []
+        concat = pa.concat_tables
+        monkeypatch.setattr(pa, "concat_tables", lambda tables: reads.append(1) or concat(tables))
+
+        table = reader.read("SBER", "1m", limit=150)
+        assert table.num_rows == 150 and table["open"][0].as_py() == -1.0
+        assert table["ts"][-1].as_py() == datetime(2024, 5, 1, 12, 28)
+        assert len(reads) == 2  # 3 row group из 12 (включая файл с одной строкой)
+        full = reader.read("SBER", "1m")
+        assert full.num_rows == 1001 and full.slice(0, 150).equals(table)
+        assert reader.read("SBER", "1m", datetime(2024, 5, 3), limit=10).num_rows == 0
+
+    def test_missing_ticker(self, tmp_path):
+        reader = SilverReader(fs.LocalFileSystem, root=str(tmp_path))
+        assert reader.read("NONE", "1m").num_rows == 0
+
+    def test_export_batches_cold_then_hot(self, tmp_path, hot_days, monkeypatch):
+        write_silver(tmp_path, "SBER")
+        monkeypatch.setattr(exporter, "silver_reader", SilverReader(fs.LocalFileSystem, root=str(tmp_path)))
+        monkeypatch.setattr(tiers, "moscow_now", lambda: datetime(2024, 6, 1, 12, 0))  # граница 2024-05-02
+        hot_calls = []
+
+        def gold(tickers, interval, start, end, batch_rows):
+            hot_calls.append((tickers, start, end))
+            return iter([])
+
+        monkeypatch.setattr(exporter, "iter_gold_batches", gold)
+        batches = list(exporter.iter_batches(["sber"], "1m", datetime(2024, 4, 1), None, batch_rows=10))
+        assert all(b.schema == exporter.EXPORT_SCHEMA for b in batches)
+        assert sum(b.num_rows for b in batches) == 14 * 60  # 10:00..23:59 1 мая
+        assert batches[0].column("ticker")[0].as_py() == "SBER"
+        assert hot_calls == [(["SBER"], datetime(2024, 5, 2), None)]
+
+
+def test_concat_columns_fills_missing_indicators():
+    cold = table_to_columns(pa.table({"ts": pa.array([datetime(2024, 1, 1)], pa.timestamp("us")),
+                                      **{n: [1.0] for n in ("open", "high", "low", "close", "volume")}}))
+    hot = rows_to_columns([{"ts": datetime(2024, 2, 1), "open": 2.0, "high": 2.0, "low": 2.0, "close": 2.0,
+                            "volume": 1.0, "sma_20": 2.0, "rsi_14": 50.0, "indicators": {"ema_50": 2.0}}])
+    out = concat_columns([cold, hot])
+    assert len(out["ts"]) == 2 and np.isnan(out["ema_50"][0]) and out["ema_50"][1] == 2.0
+    assert len(concat_columns([rows_to_columns([])])["ts"]) == 0
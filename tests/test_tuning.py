@@ -0,0 +1,58 @@
+# File: tests/test_tuning.py
+from src.processing import tuning
+from src.processing.tuning import MB, apply_plan, parse_mb, plan_spark
+
+
+class FakeConf:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+class FakeSpark:
+    def __init__(self):
+        self.conf = FakeConf()
+
+
+class TestPlanSpark:
+    def test_one_ticker_refresh_is_not_split_into_200_tasks(self):
+        plan = plan_spark(300 * 1024, parallelism=4)
+        assert plan.tier == "small"
+        assert plan.shuffle_partitions == 4
+        assert plan.max_split_bytes == tuning.MIN_SPLIT_BYTES
+        assert (plan.driver_memory_mb, plan.executor_memory_mb) == (1024, 1024)
+
+    def test_full_resync_scales_partitions_and_memory(self, monkeypatch):
+        monkeypatch.setattr(tuning.settings, "SPARK_MAX_EXECUTOR_MEMORY", "3g")
+        monkeypatch.setattr(tuning.settings, "SPARK_MAX_DRIVER_MEMORY", "2g")
+        plan = plan_spark(20 * 1024 * MB, parallelism=8)
+        assert plan.tier == "large"
+        assert plan.shuffle_partitions == 160  # по ~128 МБ
+        assert plan.max_split_bytes == tuning.TARGET_PARTITION_BYTES
+        assert (plan.driver_memory_mb, plan.executor_memory_mb) == (2048, 3072)  # потолки из настроек
+        assert plan.jdbc_batch_size > plan_spark(0).jdbc_batch_size
+
+    def test_gold_partitions_capped_by_groups(self):
+        assert plan_spark(20 * 1024 * MB, parallelism=8, groups=14).shuffle_partitions == 14
+        assert plan_spark(20 * 1024 * MB, parallelism=8, groups=2).shuffle_partitions == 8
+
+    def test_jdbc_writers_bounded(self, monkeypatch):
+        monkeypatch.setattr(tuning.settings, "SPARK_JDBC_MAX_WRITERS", 4)
+        assert plan_spark(20 * 1024 * MB, parallelism=8).jdbc_properties()["numPartitions"] == "4"
+        assert plan_spark(0, parallelism=2).jdbc_writers == 2
+
+    def test_session_and_runtime_conf(self):
+        plan = plan_spark(1024 * MB, parallelism=4)
+        spark = FakeSpark()
+        apply_plan(spark, plan)
+        assert spark.conf.values["spark.sql.shuffle.partitions"] == "8"
+        assert spark.conf.values["spark.sql.adaptive.enabled"] == "true"
+        assert spark.conf.values["spark.sql.adaptive.skewJoin.enabled"] == "true"
+        assert "spark.executor.memory" not in spark.conf.values  # только при создании сессии
+        assert plan.session_conf()["spark.executor.memory"] == "2048m"
+
+
+def test_parse_mb():
+    assert parse_mb("2g") == 2048 and parse_mb("1536m") == 1536 and parse_mb("512") == 512
@@ -0,0 +1,50 @@
+# File: tests/test_watermarks.py
+from datetime import datetime
+
+from src.ingestion.watermarks import expected_watermark, is_closed, plan_refresh
+
+# 2024-03-15 - пятница, 2024-03-16 - суббота
+FRI = datetime(2024, 3, 15)
+
+
+class TestExpectedWatermark:
+    def test_minutes_during_session(self):
+        assert expected_watermark("1m", FRI.replace(hour=12, minute=30)) == FRI.replace(hour=12, minute=29)
+
+    def test_minutes_after_close_and_weekend(self):
+        assert expected_watermark("1m", FRI.replace(hour=21)) == FRI.replace(hour=18, minute=39)
+        assert expected_watermark("1m", datetime(2024, 3, 16, 12)) == FRI.replace(hour=18, minute=39)
+
+    def test_minutes_before_open_use_previous_day(self):
+        assert expected_watermark("1m", datetime(2024, 3, 18, 9, 30)) == FRI.replace(hour=18, minute=39)
+
+    def test_daily(self):
+        assert expected_watermark("1d", FRI.replace(hour=12)) == datetime(2024, 3, 14)
+        assert expected_watermark("1d", FRI.replace(hour=19)) == FRI
+        assert expected_watermark("1d", datetime(2024, 3, 17, 12)) == FRI
+
+
+class TestPlan:
+    def test_due_current_missing(self):
+        now = FRI.replace(hour=12, minute=30)
+        watermarks = {
+            ("SBER", "1m"): FRI.replace(hour=12, minute=29),  # актуален
+            ("GAZP", "1m"): FRI.replace(hour=11),              # отстал
+            ("GAZP", "1d"): datetime(2024, 3, 14),             # дневка за пятницу еще не закрыта
+        }
+        plan = plan_refresh(["SBER", "GAZP", "LKOH"], ["1m", "1d"], watermarks, now)
+        assert plan["due"] == {"1m": {"GAZP": FRI.replace(hour=11)}}
+        assert ("SBER", "1m") in plan["current"] and ("GAZP", "1d") in plan["current"]
+        assert plan["missing"] == ["LKOH", "SBER"]  # SBER без дневок - тоже backfill
+
+
+class TestClosedCandles:
+    def test_current_minute_is_dropped(self):
+        now = FRI.replace(hour=12, minute=30)
+        assert is_closed({"begin": "2024-03-15 12:29:00", "end": "2024-03-15 12:29:59"}, "1m", now)
+        assert not is_closed({"begin": "2024-03-15 12:30:00", "end": "2024-03-15 12:30:59"}, "1m", now)
+
+    def test_daily_closes_with_session(self):
+        today = {"begin": "2024-03-15 00:00:00", "end": "2024-03-15 23:59:59"}
+        assert not is_closed(today, "1d", FRI.replace(hour=15))
+        assert is_closed(today, "1d", FRI.replace(hour=19))